@@ -1,24 +1,33 @@
 """
 FastAPI路由定义
 """
-from typing import Optional, List, Dict
+from typing import Awaitable, Callable, Optional, List, Dict
 from fastapi import APIRouter, HTTPException, UploadFile, File as FastAPIFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from backend.models import (
-    QueryRequest, QueryResponse, DocumentResult, FileUploadResponse,
+    QueryRequest, QueryResponse, DocumentResult, FileUploadResponse, BatchUploadResponse,
     SpeechRequest, SpeechResponse, VoiceQueryRequest, VoiceQueryResponse
 )
 from services.vector import retriever
-from services.llm import llm_client, unified_llm_client, usage_monitor
+from services.llm import llm_client, unified_llm_client, usage_monitor, get_hedge_controller
 from services.agent import agent
 from services.storage import file_storage, file_processor, file_indexer
+from services.storage.ingest_queue import get_ingest_queue, JOB_STATUSES
 from services.core import settings, logger
 from services.core.cache import get_cache_stats, clear_cache
+from services.core.executors import get_executor, get_executor_stats, PoolSaturatedError
+from services.core.http_client import get_http_stats
+from services.agent.plan_cache import get_plan_cache
+from services.agent.tool_cache import get_tool_cache
+from services.agent.tool_executor import get_tool_executor
 from services.speech import TextToSpeech
 from pydantic import BaseModel
+from functools import partial
 import asyncio
+import json
 import os
 import tempfile
+import uuid
 
 router = APIRouter()
 
@@ -59,6 +68,24 @@ def _should_speak(query: str, answer: str) -> bool:
     return False
 
 
+async def _run_blocking(pool: str, func, *args, **kwargs):
+    """
+    在子系统执行器池中执行阻塞调用，不阻塞事件循环
+    
+    Args:
+        pool: 执行器池名称（embedding, rerank, stt, ocr, ingest）
+        func: 阻塞函数
+        
+    Returns:
+        函数返回值（执行器排队已满时返回503）
+    """
+    try:
+        return await get_executor(pool).run(func, *args, **kwargs)
+    except PoolSaturatedError as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 # TTS 请求模型
 class TTSRequest(BaseModel):
     text: str
@@ -66,6 +93,148 @@ class TTSRequest(BaseModel):
     voice: Optional[str] = None
 
 
+async def _prepare_rag(request: QueryRequest) -> Dict:
+    """
+    RAG检索并构建Prompt
+    
+    Returns:
+        {"search_results", "system_prompt", "user_prompt", "use_rag", "context_packing"}
+    """
+    # 1. 从Milvus检索相关文档（包括上传的文件）
+    search_results = await _run_blocking("embedding", retriever.search, request.query, request.top_k)
+    
+    # 1.1 如果指定了file_ids，优先搜索这些上传的文件
+    if request.file_ids:
+        uploaded_results = await _run_blocking(
+            "embedding",
+            file_indexer.search_uploaded_files,
+            request.query, 
+            request.top_k or settings.TOP_K,
+            file_ids=request.file_ids
+        )
+        # 合并结果，上传的文件优先级更高
+        search_results = uploaded_results + search_results
+    
+    # 2. 判断是否有RAG结果，以及结果是否相关
+    has_rag_context = len(search_results) > 0
+    is_relevant = False
+    
+    if has_rag_context:
+        # 检查相似度分数：L2距离越小越相似
+        # 设置阈值：如果最好的结果分数 > 3.0，认为不相关
+        # (可以根据实际情况调整这个阈值)
+        RELEVANCE_THRESHOLD = 3.0
+        best_score = min(result.get('score', float('inf')) for result in search_results)
+        is_relevant = best_score <= RELEVANCE_THRESHOLD
+    
+    context_packing = None
+    if not has_rag_context or not is_relevant:
+        # 情况1: RAG库为空
+        # 情况2: 检索到的文档相似度太低（不相关）
+        # 直接使用LLM回答，不依赖上下文
+        system_prompt = "你是一个专业的AI助手，请直接回答问题。"
+        user_prompt = request.query
+        use_rag = False
+    else:
+        # 有相关的RAG结果，使用检索到的上下文
+        # 构建上下文（可选句子级压缩，并在token预算内打包）
+        if settings.CONTEXT_PACKING_ENABLED or settings.CONTEXT_COMPRESSION_ENABLED:
+            context, context_packing = await _run_blocking(
+                "embedding", retriever.build_context, request.query, search_results
+            )
+        else:
+            context_parts = []
+            for result in search_results:
+                context_parts.append(result['text'])
+            context = "\n\n".join(context_parts)
+        
+        # 构建Prompt
+        system_prompt = "你是一个专业的AI助手，请基于提供的上下文信息回答问题。"
+        user_prompt = f"基于以下信息：\n\n{context}\n\n请回答这个问题：{request.query}"
+        use_rag = True
+    
+    return {
+        "search_results": search_results,
+        "system_prompt": system_prompt,
+        "user_prompt": user_prompt,
+        "use_rag": use_rag,
+        "context_packing": context_packing
+    }
+
+
+def _rag_documents(prepared: Dict) -> List[DocumentResult]:
+    """格式化文档结果（只有使用RAG时才返回context）"""
+    if not prepared["use_rag"]:
+        return []
+    return [
+        DocumentResult(
+            text=result['text'],
+            source_file=result.get('source_file', 'unknown'),
+            score=float(result.get('score', 0.0))
+        )
+        for result in prepared["search_results"]
+    ]
+
+
+def _raise_for_llm_error(llm_result: Dict):
+    """LLM调用失败时抛出HTTPException（配额不足返回429）"""
+    if "error" not in llm_result:
+        return
+    # 如果是配额不足错误，返回更友好的错误信息
+    error_msg = llm_result.get("error", "")
+    if "配额已用完" in error_msg or "配额" in error_msg:
+        raise HTTPException(
+            status_code=429,
+            detail=error_msg,
+            headers={"X-Quota-Info": str(llm_result.get("quota_info", {}))}
+        )
+    # 记录详细错误（用于调试）
+    logger.error(f"LLM调用错误: {error_msg}")
+    raise HTTPException(status_code=500, detail=f"LLM调用失败: {error_msg}")
+
+
+def _rag_response(request: QueryRequest, prepared: Dict, llm_result: Dict) -> QueryResponse:
+    """根据检索结果和LLM结果构建RAG响应"""
+    answer = llm_result.get("content", "无法生成答案")
+    # 根据实际给出答案的provider确定使用的模型名称（HKGAI失败或对冲时可能是Gemini）
+    if request.provider == "gemini" or llm_result.get("provider") == "gemini":
+        model_used = llm_result.get("model", request.model or settings.GEMINI_DEFAULT_MODEL)
+    else:
+        model_used = settings.HKGAI_MODEL_ID
+    
+    # 获取token使用量（仅Gemini返回）
+    tokens_info = None
+    if "input_tokens" in llm_result:
+        tokens_info = {
+            "input": llm_result.get("input_tokens", 0),
+            "output": llm_result.get("output_tokens", 0),
+            "total": llm_result.get("total_tokens", 0)
+        }
+    
+    # 获取剩余配额（仅Gemini有配额限制）
+    quota_remaining = None
+    if request.provider == "gemini":
+        quota_info = usage_monitor.check_quota(model_used)
+        quota_remaining = quota_info.get("remaining_requests", 0)
+    
+    llm_timing = None
+    if "latency_ms" in llm_result:
+        llm_timing = {"ttft_ms": llm_result.get("ttft_ms"), "latency_ms": llm_result["latency_ms"],
+                      "provider": llm_result.get("provider"), "hedged": llm_result.get("hedged", False)}
+    
+    return QueryResponse(
+        answer=answer,
+        context=_rag_documents(prepared),
+        query=request.query,
+        answer_source="rag" if prepared["use_rag"] else "direct_llm",
+        model_used=model_used,
+        tokens_used=tokens_info,
+        context_packing=prepared["context_packing"],
+        quota_remaining=quota_remaining,
+        llm_timing=llm_timing
+    )
+
+
 @router.post("/rag_query", response_model=QueryResponse)
 async def rag_query(request: QueryRequest):
     """
@@ -80,117 +249,20 @@ async def rag_query(request: QueryRequest):
     if request.use_agent:
         return await agent_query(request)
     try:
-        # 1. 从Milvus检索相关文档（包括上传的文件）
-        search_results = retriever.search(request.query, request.top_k)
-        
-        # 1.1 如果指定了file_ids，优先搜索这些上传的文件
-        if request.file_ids:
-            uploaded_results = file_indexer.search_uploaded_files(
-                request.query, 
-                request.top_k or settings.TOP_K,
-                file_ids=request.file_ids
-            )
-            # 合并结果，上传的文件优先级更高
-            search_results = uploaded_results + search_results
-        
-        # 2. 判断是否有RAG结果，以及结果是否相关
-        has_rag_context = len(search_results) > 0
-        is_relevant = False
-        
-        if has_rag_context:
-            # 检查相似度分数：L2距离越小越相似
-            # 设置阈值：如果最好的结果分数 > 3.0，认为不相关
-            # (可以根据实际情况调整这个阈值)
-            RELEVANCE_THRESHOLD = 3.0
-            best_score = min(result.get('score', float('inf')) for result in search_results)
-            is_relevant = best_score <= RELEVANCE_THRESHOLD
-        
-        if not has_rag_context or not is_relevant:
-            # 情况1: RAG库为空
-            # 情况2: 检索到的文档相似度太低（不相关）
-            # 直接使用LLM回答，不依赖上下文
-            system_prompt = "你是一个专业的AI助手，请直接回答问题。"
-            user_prompt = request.query
-            use_rag = False
-        else:
-            # 有相关的RAG结果，使用检索到的上下文
-            # 构建上下文
-            context_parts = []
-            for result in search_results:
-                context_parts.append(result['text'])
-            context = "\n\n".join(context_parts)
-            
-            # 构建Prompt
-            system_prompt = "你是一个专业的AI助手，请基于提供的上下文信息回答问题。"
-            user_prompt = f"基于以下信息：\n\n{context}\n\n请回答这个问题：{request.query}"
-            use_rag = True
+        prepared = await _prepare_rag(request)
         
         # 3. 调用LLM生成答案（使用统一客户端，支持模型选择）
-        llm_result = unified_llm_client.chat(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
+        llm_result = await unified_llm_client.chat_async(
+            system_prompt=prepared["system_prompt"],
+            user_prompt=prepared["user_prompt"],
             max_tokens=2048,
             temperature=0.7,
             model=request.model,
             provider=request.provider
         )
+        _raise_for_llm_error(llm_result)
         
-        if "error" in llm_result:
-            # 如果是配额不足错误，返回更友好的错误信息
-            error_msg = llm_result.get("error", "")
-            if "配额已用完" in error_msg or "配额" in error_msg:
-                raise HTTPException(
-                    status_code=429,
-                    detail=error_msg,
-                    headers={"X-Quota-Info": str(llm_result.get("quota_info", {}))}
-                )
-            # 记录详细错误（用于调试）
-            logger.error(f"LLM调用错误: {error_msg}")
-            raise HTTPException(status_code=500, detail=f"LLM调用失败: {error_msg}")
-        
-        answer = llm_result.get("content", "无法生成答案")
-        # 根据provider确定使用的模型名称
-        if request.provider == "gemini":
-            model_used = llm_result.get("model", request.model or settings.GEMINI_DEFAULT_MODEL)
-        else:
-            model_used = settings.HKGAI_MODEL_ID
-        
-        # 获取token使用量（仅Gemini返回）
-        tokens_info = None
-        if "input_tokens" in llm_result:
-            tokens_info = {
-                "input": llm_result.get("input_tokens", 0),
-                "output": llm_result.get("output_tokens", 0),
-                "total": llm_result.get("total_tokens", 0)
-            }
-        
-        # 获取剩余配额（仅Gemini有配额限制）
-        quota_remaining = None
-        if request.provider == "gemini":
-            quota_info = usage_monitor.check_quota(model_used)
-            quota_remaining = quota_info.get("remaining_requests", 0)
-        
-        # 4. 格式化文档结果（只有使用RAG时才返回context）
-        document_results = []
-        if use_rag and has_rag_context:
-            document_results = [
-                DocumentResult(
-                    text=result['text'],
-                    source_file=result.get('source_file', 'unknown'),
-                    score=float(result.get('score', 0.0))
-                )
-                for result in search_results
-            ]
-        
-        return QueryResponse(
-            answer=answer,
-            context=document_results,
-            query=request.query,
-            answer_source="rag" if use_rag else "direct_llm",
-            model_used=model_used,
-            tokens_used=tokens_info,
-            quota_remaining=quota_remaining
-        )
+        return _rag_response(request, prepared, llm_result)
     
     except HTTPException:
         # 重新抛出HTTP异常（如配额错误）
@@ -203,6 +275,171 @@ async def rag_query(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"处理请求时出错: {str(e)}")
 
 
+def _sse_event(event: str, data: Dict) -> str:
+    """格式化一条SSE事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _sse_response(producer: Callable[[Callable[[str, Dict], Awaitable[None]]], Awaitable[Dict]]) -> StreamingResponse:
+    """
+    把 producer(emit) 发出的事件以SSE输出
+    
+    producer 运行期间通过 emit(事件名, 数据) 发出中间事件，返回值作为最后的 done 事件；
+    抛出的异常转换为 error 事件（status_code, detail）。客户端断开时取消producer。
+    """
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def emit(event: str, data: Dict):
+            await queue.put((event, data))
+        
+        async def run():
+            try:
+                await queue.put(("done", await producer(emit)))
+            except HTTPException as e:
+                await queue.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+            except Exception as e:
+                import traceback
+                logger.error(f"流式查询错误详情:\n{traceback.format_exc()}")
+                await queue.put(("error", {"status_code": 500, "detail": f"处理请求时出错: {str(e)}"}))
+        
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield _sse_event(event, data)
+                if event in ("done", "error"):
+                    break
+        finally:
+            task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/rag_query/stream")
+async def rag_query_stream(request: QueryRequest):
+    """
+    RAG查询接口（SSE流式）
+    
+    事件依次为：
+    - retrieval: 检索结果（documents、answer_source、context_packing）
+    - token: 答案增量（text），LLM每返回一块发出一次
+    - done: 完整响应（与 /rag_query 相同，llm_timing.ttft_ms 为首token耗时）
+    出错时发出 error 事件（status_code、detail）。use_agent=True 时等同于 /agent_query/stream。
+    """
+    if request.use_agent:
+        return await agent_query_stream(request)
+    
+    async def produce(emit) -> Dict:
+        prepared = await _prepare_rag(request)
+        await emit("retrieval", {
+            "documents": [document.model_dump() for document in _rag_documents(prepared)],
+            "answer_source": "rag" if prepared["use_rag"] else "direct_llm",
+            "context_packing": prepared["context_packing"]
+        })
+        
+        llm_result = {"error": "LLM没有返回结果"}
+        async for event in unified_llm_client.chat_stream_async(
+            system_prompt=prepared["system_prompt"],
+            user_prompt=prepared["user_prompt"],
+            max_tokens=2048,
+            temperature=0.7,
+            model=request.model,
+            provider=request.provider
+        ):
+            if event["type"] == "delta":
+                await emit("token", {"text": event["text"]})
+            else:
+                llm_result = event
+        _raise_for_llm_error(llm_result)
+        return _rag_response(request, prepared, llm_result).model_dump()
+    
+    return _sse_response(produce)
+
+
+async def _synthesize_answer_audio(query: str, answer: str) -> Optional[str]:
+    """
+    用Edge TTS合成答案语音
+    
+    Returns:
+        data URL（audio/mpeg, base64）；失败时返回None
+    """
+    try:
+        import edge_tts
+        import uuid
+        import base64
+        
+        # 检测语言
+        language = "yue-HK" if any(kw in query for kw in ["粤语", "粵語", "cantonese"]) else "zh-CN"
+        voice_map = {
+            "zh-CN": "zh-CN-XiaoxiaoNeural",
+            "yue-HK": "zh-HK-HiuGaaiNeural",
+        }
+        voice = voice_map.get(language, "zh-CN-XiaoxiaoNeural")
+        
+        # 生成临时音频文件
+        audio_filename = f"tts_{uuid.uuid4()}.mp3"
+        audio_path = os.path.join(tempfile.gettempdir(), audio_filename)
+        
+        logger.info(f"🎤 预生成TTS: lang={language}, voice={voice}")
+        
+        # 使用 edge_tts 生成
+        communicate = edge_tts.Communicate(answer, voice)
+        await communicate.save(audio_path)
+        
+        # 读取并转换为base64
+        if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
+            with open(audio_path, "rb") as f:
+                audio_data = f.read()
+                audio_url = f"data:audio/mpeg;base64,{base64.b64encode(audio_data).decode()}"
+            os.remove(audio_path)  # 清理临时文件
+            logger.info(f"✅ TTS预生成成功: {len(audio_data)} bytes")
+            return audio_url
+        logger.warning("❌ TTS文件生成失败")
+    except Exception as e:
+        logger.error(f"❌ TTS预生成失败: {e}")
+    return None
+
+
+def _agent_response(request: QueryRequest, agent_result: Dict, should_speak: bool = False,
+                    audio_url: Optional[str] = None) -> QueryResponse:
+    """根据Agent结果构建响应"""
+    # 获取token使用量和模型信息
+    tokens_info = None
+    model_used = settings.HKGAI_MODEL_ID  # Agent默认使用HKGAI
+    quota_remaining = None
+    
+    # 如果返回了Gemini的token信息，说明使用了Gemini
+    if "tokens" in agent_result and agent_result["tokens"]:
+        tokens_info = agent_result["tokens"]
+        if "model" in agent_result and agent_result["model"]:
+            model_used = agent_result["model"]
+            quota_info = usage_monitor.check_quota(model_used)
+            quota_remaining = quota_info.get("remaining_requests", 0)
+    
+    # 格式化响应
+    return QueryResponse(
+        answer=agent_result["answer"],
+        context=[],  # Agent模式下不返回具体文档片段
+        query=request.query,
+        tools_used=agent_result.get("tools_used", []),
+        answer_source="agent",
+        model_used=model_used,
+        tokens_used=tokens_info,
+        context_packing=agent_result.get("context_packing"),
+        tool_timings=agent_result.get("tool_timings"),
+        speculation=agent_result.get("speculation"),
+        quota_remaining=quota_remaining,
+        should_speak=should_speak,
+        audio_url=audio_url,
+        llm_timing=agent_result.get("llm_timing")
+    )
+
+
 @router.post("/agent_query", response_model=QueryResponse)
 async def agent_query(request: QueryRequest):
     """
@@ -213,20 +450,7 @@ async def agent_query(request: QueryRequest):
     """
     try:
         # 使用Agent处理问题（Agent默认使用HKGAI，如果指定了Gemini模型则使用Gemini）
-        agent_result = agent.execute(request.query, model=request.model)
-        
-        # 获取token使用量和模型信息
-        tokens_info = None
-        model_used = settings.HKGAI_MODEL_ID  # Agent默认使用HKGAI
-        quota_remaining = None
-        
-        # 如果返回了Gemini的token信息，说明使用了Gemini
-        if "tokens" in agent_result and agent_result["tokens"]:
-            tokens_info = agent_result["tokens"]
-            if "model" in agent_result and agent_result["model"]:
-                model_used = agent_result["model"]
-                quota_info = usage_monitor.check_quota(model_used)
-                quota_remaining = quota_info.get("remaining_requests", 0)
+        agent_result = await agent.execute_async(request.query, model=request.model)
         
         # 智能判断是否需要语音播报
         should_speak = _should_speak(request.query, agent_result["answer"])
@@ -234,56 +458,10 @@ async def agent_query(request: QueryRequest):
         
         # 如果需要语音播报，立即生成TTS音频
         if should_speak:
-            try:
-                import edge_tts
-                import uuid
-                import base64
-                
-                # 检测语言
-                language = "yue-HK" if any(kw in request.query for kw in ["粤语", "粵語", "cantonese"]) else "zh-CN"
-                voice_map = {
-                    "zh-CN": "zh-CN-XiaoxiaoNeural",
-                    "yue-HK": "zh-HK-HiuGaaiNeural",
-                }
-                voice = voice_map.get(language, "zh-CN-XiaoxiaoNeural")
-                
-                # 生成临时音频文件
-                audio_filename = f"tts_{uuid.uuid4()}.mp3"
-                audio_path = os.path.join(tempfile.gettempdir(), audio_filename)
-                
-                logger.info(f"🎤 预生成TTS: lang={language}, voice={voice}")
-                
-                # 使用 edge_tts 生成
-                communicate = edge_tts.Communicate(agent_result["answer"], voice)
-                await communicate.save(audio_path)
-                
-                # 读取并转换为base64
-                if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
-                    with open(audio_path, "rb") as f:
-                        audio_data = f.read()
-                        audio_url = f"data:audio/mpeg;base64,{base64.b64encode(audio_data).decode()}"
-                    os.remove(audio_path)  # 清理临时文件
-                    logger.info(f"✅ TTS预生成成功: {len(audio_data)} bytes")
-                else:
-                    logger.warning("❌ TTS文件生成失败")
-                    should_speak = False
-            except Exception as e:
-                logger.error(f"❌ TTS预生成失败: {e}")
-                should_speak = False
-        
-        # 格式化响应
-        return QueryResponse(
-            answer=agent_result["answer"],
-            context=[],  # Agent模式下不返回具体文档片段
-            query=request.query,
-            tools_used=agent_result.get("tools_used", []),
-            answer_source="agent",
-            model_used=model_used,
-            tokens_used=tokens_info,
-            quota_remaining=quota_remaining,
-            should_speak=should_speak,
-            audio_url=audio_url
-        )
+            audio_url = await _synthesize_answer_audio(request.query, agent_result["answer"])
+            should_speak = audio_url is not None
+        
+        return _agent_response(request, agent_result, should_speak, audio_url)
     
     except HTTPException:
         # 重新抛出HTTP异常（如配额错误）
@@ -296,6 +474,35 @@ async def agent_query(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"处理请求时出错: {str(e)}")
 
 
+@router.post("/agent_query/stream")
+async def agent_query_stream(request: QueryRequest):
+    """
+    Agent智能查询接口（SSE流式）
+    
+    事件依次为：
+    - tools / workflow: 工具调用结果摘要（tools_used、tool_timings）或工作流执行摘要
+    - token: 答案增量（text）
+    - done: 完整响应（与 /agent_query 相同，llm_timing.ttft_ms 为首token耗时）
+    出错时发出 error 事件。流式模式不预先合成语音：should_speak=True 时客户端可用答案调用 /tts。
+    """
+    async def produce(emit) -> Dict:
+        streamed = False
+        
+        async def forward(event: str, data: Dict):
+            nonlocal streamed
+            streamed = streamed or event == "token"
+            await emit(event, data)
+        
+        agent_result = await agent.execute_async(request.query, model=request.model, emit=forward)
+        if not streamed:
+            # 基于规则的工作流不流式生成答案，完整答案作为一个增量发出
+            await emit("token", {"text": agent_result["answer"]})
+        should_speak = _should_speak(request.query, agent_result["answer"])
+        return _agent_response(request, agent_result, should_speak).model_dump()
+    
+    return _sse_response(produce)
+
+
 @router.post("/tts")
 async def text_to_speech(request: TTSRequest):
     """
@@ -379,7 +586,7 @@ async def get_supported_models():
 
 
 @router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(file: UploadFile = FastAPIFile(...)):
+async def upload_file(file: UploadFile = FastAPIFile(...), priority: int = 0):
     """
     文件上传接口
     
@@ -389,66 +596,156 @@ async def upload_file(file: UploadFile = FastAPIFile(...)):
     - 代码文件 (.py, .js, .java等)
     - 文本文件 (.txt, .md, .json, .csv等)
     
-    上传的文件会自动解析、向量化并索引到Milvus
+    上传的文件进入后台索引队列（解析、向量化并索引到Milvus），
+    通过返回的job_id调用 GET /jobs/{job_id} 查询进度
+    
+    Args:
+        file: 上传的文件
+        priority: 索引优先级，数值越大越先处理
     """
     try:
-        # 读取文件内容
-        file_content = await file.read()
-        
-        # 保存文件
-        result = file_storage.save_file(
-            file_content=file_content,
-            filename=file.filename,
-            mime_type=file.content_type
-        )
-        
-        # 异步处理和索引文件（不阻塞响应）
-        if not result.get("already_exists") or not result.get("processed"):
-            asyncio.create_task(_process_and_index_file(result["file_id"]))
-            message = "文件上传成功，正在后台处理和索引..."
-        else:
-            message = "文件已存在且已处理"
-        
-        file_info = file_storage.get_file(result["file_id"])
-        
-        return FileUploadResponse(
-            file_id=result["file_id"],
-            filename=result["filename"],
-            file_type=result["file_type"],
-            file_size=result["file_size"],
-            uploaded_at=file_info["uploaded_at"] if file_info else "",
-            processed=result.get("processed", False),
-            already_exists=result.get("already_exists", False),
-            message=message
-        )
-        
+        return await _save_and_enqueue(file, priority)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
 
-async def _process_and_index_file(file_id: str):
-    """异步处理和索引文件"""
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_files_batch(files: List[UploadFile] = FastAPIFile(...), priority: int = 0):
+    """
+    批量上传接口
+    
+    每个文件单独保存并提交索引任务，单个文件失败不影响其他文件；
+    整批进度通过 GET /jobs?batch_id=... 查询
+    
+    Args:
+        files: 上传的文件列表
+        priority: 索引优先级，数值越大越先处理
+    """
+    batch_id = uuid.uuid4().hex
+    uploaded, errors = [], []
+    for file in files:
+        try:
+            uploaded.append(await _save_and_enqueue(file, priority, batch_id))
+        except HTTPException as e:
+            # 如ingest线程池饱和（503），只记录该文件失败
+            logger.warning(f"批量上传中文件 {file.filename} 保存失败: {e.detail}")
+            errors.append({"filename": file.filename, "error": str(e.detail)})
+        except Exception as e:
+            logger.warning(f"批量上传中文件 {file.filename} 保存失败: {e}")
+            errors.append({"filename": file.filename, "error": str(e)})
+    
+    return BatchUploadResponse(batch_id=batch_id, files=uploaded, errors=errors, total=len(files))
+
+
+async def _save_and_enqueue(file: UploadFile, priority: int = 0, batch_id: Optional[str] = None) -> FileUploadResponse:
+    """保存上传的文件，未处理的文件提交后台索引任务"""
+    # 分块流式写入存储目录（增量计算哈希、超过大小限制时中止，写盘在ingest池中执行）
+    writer = file_storage.open_upload(file.filename)
     try:
-        index_result = file_indexer.index_file(file_id)
-        logger.info(f"文件 {file_id} 处理完成: {index_result}")
-    except Exception as e:
-        logger.error(f"文件 {file_id} 处理失败: {e}")
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await _run_blocking("ingest", writer.write, chunk)
+        result = await _run_blocking("ingest", writer.commit, mime_type=file.content_type)
+    except BaseException:
+        writer.abort()
+        raise
+    
+    # 提交后台索引任务（不阻塞响应）
+    job_id = None
+    if not result.get("already_exists") or not result.get("processed"):
+        job = get_ingest_queue().enqueue(
+            result["file_id"],
+            filename=file.filename,
+            file_size=result["file_size"],
+            priority=priority,
+            batch_id=batch_id
+        )
+        job_id = job["job_id"]
+        message = "文件上传成功，正在后台处理和索引..."
+    else:
+        message = "文件已存在且已处理"
+    
+    file_info = file_storage.get_file(result["file_id"])
+    
+    return FileUploadResponse(
+        file_id=result["file_id"],
+        filename=result["filename"],
+        file_type=result["file_type"],
+        file_size=result["file_size"],
+        uploaded_at=file_info["uploaded_at"] if file_info else "",
+        processed=result.get("processed", False),
+        already_exists=result.get("already_exists", False),
+        message=message,
+        job_id=job_id
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    查询后台索引任务
+    
+    返回状态（queued/running/succeeded/failed）、当前阶段
+    （extracting/embedding/inserting/done）、进度、尝试次数、错误和吞吐量
+    """
+    job = get_ingest_queue().get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.get("/jobs")
+async def list_jobs(status: Optional[str] = None, batch_id: Optional[str] = None, limit: int = 100):
+    """
+    列出后台索引任务
+    
+    Args:
+        status: 状态过滤 (queued, running, succeeded, failed)
+        batch_id: 批次过滤（批量上传返回的batch_id）
+        limit: 最多返回数量
+    """
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status必须是{'、'.join(JOB_STATUSES)}之一")
+    queue = get_ingest_queue()
+    jobs = queue.list_jobs(status=status, batch_id=batch_id, limit=limit)
+    return {"jobs": jobs, "total": len(jobs), "stats": queue.stats()}
 
 
 @router.get("/files")
-async def list_files(file_type: Optional[str] = None, processed: Optional[bool] = None):
+async def list_files(file_type: Optional[str] = None, processed: Optional[bool] = None,
+                     limit: Optional[int] = None, cursor: Optional[str] = None):
     """
     列出所有上传的文件
     
     Args:
         file_type: 文件类型过滤 (pdf, image, code, text)
         processed: 是否已处理过滤 (true/false)
+        limit: 分页时每页文件数（按上传时间倒序）；不传时返回全部文件
+        cursor: 上一页返回的next_cursor
     """
+    if limit is None and cursor is None:
+        try:
+            files = file_storage.list_files(file_type=file_type, processed=processed)
+            return {"files": files, "total": len(files)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
+    
+    limit = limit or 100
+    if not 1 <= limit <= settings.FILES_PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit必须在1~{settings.FILES_PAGE_MAX_LIMIT}之间")
     try:
-        files = file_storage.list_files(file_type=file_type, processed=processed)
-        return {"files": files, "total": len(files)}
+        files, next_cursor = file_storage.list_files_page(
+            file_type=file_type, processed=processed, limit=limit, cursor=cursor
+        )
+        return {"files": files, "total": len(files), "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
 
@@ -475,8 +772,10 @@ async def delete_file(file_id: str):
 async def reindex_file(file_id: str):
     """重新处理和索引文件"""
     try:
-        result = file_indexer.index_file(file_id)
+        result = await _run_blocking("ingest", file_indexer.index_file, file_id)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"重新索引失败: {str(e)}")
 
@@ -498,6 +797,11 @@ async def get_cache_statistics():
     """获取缓存统计信息"""
     try:
         stats = get_cache_stats()
+        stats["plan_cache"] = get_plan_cache().stats()
+        stats["tool_speculation"] = get_tool_executor().speculation_stats()
+        stats["tool_cache"] = get_tool_cache().stats()
+        from services.vision import get_ocr_cache
+        stats["ocr_cache"] = get_ocr_cache().stats()
         return {
             "cache_enabled": settings.USE_CACHE,
             "statistics": stats
@@ -507,19 +811,40 @@ async def get_cache_statistics():
         raise HTTPException(status_code=500, detail=f"获取缓存统计失败: {str(e)}")
 
 
+@router.get("/executors/stats")
+async def get_executors_statistics():
+    """获取子系统执行器池统计（排队深度、运行数、等待/执行耗时、拒绝数）"""
+    return {"executors": get_executor_stats()}
+
+
+@router.get("/llm/stats")
+async def get_llm_statistics():
+    """获取LLM对冲请求统计（对冲比例、预算拒绝数、各提供商胜出次数和延迟直方图）"""
+    return {"hedging": get_hedge_controller().stats()}
+
+
+@router.get("/http/stats")
+async def get_http_statistics():
+    """获取出站HTTP客户端统计（按host的请求数、连接复用率、响应延迟分位数）"""
+    return get_http_stats()
+
+
 @router.post("/cache/clear")
 async def clear_cache_endpoint(cache_type: str = "all"):
     """
     清空缓存
     
     Args:
-        cache_type: 缓存类型 ("query", "embedding", "all")
+        cache_type: 缓存类型 ("query", "embedding", "tool", "all")
     """
     try:
-        if cache_type not in ("query", "embedding", "all"):
-            raise HTTPException(status_code=400, detail="cache_type必须是'query'、'embedding'或'all'")
+        if cache_type not in ("query", "embedding", "tool", "all"):
+            raise HTTPException(status_code=400, detail="cache_type必须是'query'、'embedding'、'tool'或'all'")
         
-        clear_cache(cache_type)
+        if cache_type != "tool":
+            clear_cache(cache_type)
+        if cache_type in ("tool", "all"):
+            get_tool_cache().clear()
         return {
             "message": f"缓存已清空: {cache_type}",
             "cache_type": cache_type
@@ -558,7 +883,7 @@ def _parse_voice_request_params(request: Optional[str]) -> Dict:
 
 async def _process_voice_query_with_agent(query_text: str, model: Optional[str] = None) -> Dict:
     """使用Agent处理查询"""
-    agent_result = agent.execute(query_text, model=model)
+    agent_result = await agent.execute_async(query_text, model=model)
     return {
         "answer": agent_result.get("answer", "无法生成答案"),
         "tools_used": agent_result.get("tools_used", []),
@@ -569,11 +894,11 @@ async def _process_voice_query_with_agent(query_text: str, model: Optional[str]
 
 async def _process_voice_query_with_rag(query_text: str) -> Dict:
     """使用RAG处理查询"""
-    search_results = retriever.search(query_text, top_k=settings.TOP_K)
+    search_results = await _run_blocking("embedding", retriever.search, query_text, top_k=settings.TOP_K)
     
     if search_results:
         context = "\n\n".join([r['text'] for r in search_results[:3]])
-        llm_result = unified_llm_client.chat(
+        llm_result = await unified_llm_client.chat_async(
             system_prompt="基于以下上下文回答问题。",
             user_prompt=f"上下文：\n{context}\n\n问题：{query_text}",
             max_tokens=2048
@@ -581,7 +906,7 @@ async def _process_voice_query_with_rag(query_text: str) -> Dict:
         answer = llm_result.get("content", "无法生成答案")
         tools_used = ["rag"]
     else:
-        llm_result = unified_llm_client.chat(
+        llm_result = await unified_llm_client.chat_async(
             system_prompt="你是一个智能助手。",
             user_prompt=query_text,
             max_tokens=2048
@@ -635,7 +960,9 @@ async def speech_to_text(audio: UploadFile = FastAPIFile(...)):
         logger.info(f"收到STT请求: {audio.filename}, 格式: {audio_format}, 大小: {len(audio_bytes)} bytes")
         
         # 语音转文本
-        transcription_result = voice_service.transcribe_audio(
+        transcription_result = await _run_blocking(
+            "stt",
+            voice_service.transcribe_audio,
             audio_bytes=audio_bytes,
             audio_format=audio_format,
             language=None  # 自动检测语言
@@ -708,7 +1035,9 @@ async def voice_query(audio: UploadFile = FastAPIFile(...), request: Optional[st
         params = _parse_voice_request_params(request)
         
         # 3. 语音转文本
-        transcription_result = voice_service.transcribe_audio(
+        transcription_result = await _run_blocking(
+            "stt",
+            voice_service.transcribe_audio,
             audio_bytes=audio_bytes,
             audio_format=audio_format,
             language=params["language"]
@@ -745,7 +1074,9 @@ async def voice_query(audio: UploadFile = FastAPIFile(...), request: Optional[st
         # 6. 生成语音回复（可选）
         answer_audio_url = None
         if settings.ENABLE_SPEECH and settings.USE_EDGE_TTS:
-            audio_file = voice_service.generate_audio_response(
+            audio_file = await _run_blocking(
+                "stt",
+                voice_service.generate_audio_response,
                 text=query_result["answer"],
                 language=detected_language
             )
@@ -878,7 +1209,7 @@ async def multimodal_query(request: dict):
     }
     """
     try:
-        from services.vision import get_image_processor, get_image_history
+        from services.vision import get_image_processor, get_image_history, get_ocr_cache, image_content_hash
         from backend.models import MultimodalQueryResponse, OCRResult
         
         # 解析请求
@@ -924,7 +1255,9 @@ async def multimodal_query(request: dict):
         for i, img_base64 in enumerate(images_base64):
             try:
                 # 预处理图片
-                processed = image_processor.process_image(
+                processed = await _run_blocking(
+                    "ocr",
+                    image_processor.process_image,
                     img_base64,
                     optimize_for_ocr=use_ocr
                 )
@@ -939,9 +1272,15 @@ async def multimodal_query(request: dict):
                     mime_type="image/jpeg"
                 )
                 
-                # OCR
+                # OCR（同一张图片、同一模型的结果按内容哈希缓存）
                 if use_ocr:
-                    ocr_result = multimodal_client.extract_text_from_image(processed["base64"])
+                    ocr_result = await _run_blocking(
+                        "ocr",
+                        get_ocr_cache().get_or_compute,
+                        f"{provider}:{model_name}:enhanced",
+                        image_content_hash(img_base64),
+                        partial(multimodal_client.extract_text_from_image, processed["base64"])
+                    )
                     if not ocr_result.get("error"):
                         ocr_results.append({
                             "text": ocr_result["text"],
@@ -951,6 +1290,8 @@ async def multimodal_query(request: dict):
                 
                 logger.info(f"✅ 图片 {i+1}/{len(images_base64)} 处理完成")
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"❌ 图片 {i+1} 处理失败: {e}")
                 raise HTTPException(status_code=400, detail=f"图片{i+1}处理失败: {e}")
@@ -962,7 +1303,9 @@ async def multimodal_query(request: dict):
             enhanced_query = f"{query_text}\n\n识别到的图片文字：\n{ocr_texts}"
         
         # 调用多模态LLM
-        llm_result = multimodal_client.query_with_images(
+        llm_result = await _run_blocking(
+            "ocr",
+            multimodal_client.query_with_images,
             query=enhanced_query,
             images=processed_images,
             max_tokens=2048,
@@ -1013,7 +1356,7 @@ async def ocr_image(request: dict):
     }
     """
     try:
-        from services.vision import get_image_processor
+        from services.vision import get_image_processor, get_ocr_cache, image_content_hash
         
         image_base64 = request.get("image", "")
         enhance = request.get("enhance", True)
@@ -1023,13 +1366,6 @@ async def ocr_image(request: dict):
         if not image_base64:
             raise HTTPException(status_code=400, detail="图片数据不能为空")
         
-        # 预处理
-        image_processor = get_image_processor()
-        processed = image_processor.process_image(
-            image_base64,
-            optimize_for_ocr=enhance
-        )
-        
         # 选择OCR客户端
         if provider == "doubao":
             from services.llm.doubao_multimodal import get_doubao_client
@@ -1042,8 +1378,20 @@ async def ocr_image(request: dict):
         else:
             raise HTTPException(status_code=400, detail=f"不支持的provider: {provider}")
         
-        # OCR
-        ocr_result = multimodal_client.extract_text_from_image(processed["base64"])
+        image_processor = get_image_processor()
+        
+        def preprocess_and_extract():
+            processed = image_processor.process_image(image_base64, optimize_for_ocr=enhance)
+            return multimodal_client.extract_text_from_image(processed["base64"])
+        
+        # 预处理 + OCR（同一张图片、同一模型的结果按内容哈希缓存，命中时跳过预处理和模型调用）
+        ocr_result = await _run_blocking(
+            "ocr",
+            get_ocr_cache().get_or_compute,
+            f"{provider}:{model_name or ''}:{'enhanced' if enhance else 'raw'}",
+            image_content_hash(image_base64),
+            preprocess_and_extract
+        )
         
         if "error" in ocr_result:
             raise HTTPException(status_code=500, detail=ocr_result["error"])
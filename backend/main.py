@@ -9,6 +9,10 @@ from fastapi.middleware.cors import CORSMiddleware
 import os
 from backend.api import router
 from services.vector import milvus_client
+from services.core.http_client import aclose_async_client, close_http_session
+from services.core.executors import shutdown_executors
+from services.storage.ingest_queue import get_ingest_queue
+from services.storage.pdf_extractor import shutdown_pdf_extractor
 
 
 @asynccontextmanager
@@ -23,11 +27,19 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("Milvus连接失败，请确保Milvus服务正在运行")
     
+    # 启动后台文件索引队列
+    get_ingest_queue().start()
+    
     yield
     
     # 关闭时
+    get_ingest_queue().stop()
     logger.info("正在断开Milvus连接...")
     milvus_client.disconnect()
+    await aclose_async_client()
+    close_http_session()
+    shutdown_executors()
+    shutdown_pdf_extractor()
 
 
 app = FastAPI(
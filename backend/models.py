@@ -37,9 +37,13 @@ class QueryResponse(BaseModel):
     answer_source: str = "rag"  # rag/agent/direct_llm
     model_used: Optional[str] = None
     tokens_used: Optional[Dict[str, Any]] = None
+    context_packing: Optional[Dict[str, Any]] = None  # 上下文打包统计（tokens_before/tokens_after/tokens_saved）
+    tool_timings: Optional[Dict[str, Any]] = None  # Agent各工具的耗时和状态（ok/empty/error/timeout/cancelled/ignored）
+    speculation: Optional[Dict[str, Any]] = None  # LLM规划期间推测执行的工具及命中情况
     quota_remaining: Optional[int] = None
     should_speak: bool = False  # 是否需要语音播报
     audio_url: Optional[str] = None  # TTS音频URL（如果生成了）
+    llm_timing: Optional[Dict[str, Any]] = None  # LLM耗时和给出答案的提供商（ttft_ms/latency_ms/provider/hedged，ttft_ms仅流式）
 
 
 class FileUploadResponse(BaseModel):
@@ -52,6 +56,15 @@ class FileUploadResponse(BaseModel):
     processed: bool
     already_exists: bool
     message: Optional[str] = None
+    job_id: Optional[str] = None  # 后台索引任务ID（GET /jobs/{job_id} 查询进度）
+
+
+class BatchUploadResponse(BaseModel):
+    """批量上传响应模型"""
+    batch_id: str  # 批次ID（GET /jobs?batch_id=... 查询整批进度）
+    files: List[FileUploadResponse] = []
+    errors: List[Dict[str, Any]] = []  # 保存失败的文件（filename, error）
+    total: int = 0
 
 
 class VoiceQueryRequest(BaseModel):
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量导入知识库（services/storage/bulk_ingest.py 流水线）
+
+discover → extract/chunk（进程池）→ 批量向量化 → 批量写入Milvus，阶段之间是有界队列。
+已导入的文档记录在检查点文件中，中断后重新运行会跳过未变化的文件和内容重复的文件。
+
+用法:
+    python scripts/ingest.py documents/                    # 导入目录（递归）
+    python scripts/ingest.py --preset project              # 项目文档 + 内置FAQ
+    python scripts/ingest.py --preset fictional --reset    # 重建集合后导入虚构知识库
+    python scripts/ingest.py --preset multilingual         # 多语言RAG指南
+    python scripts/ingest.py big_corpus/ --workers 16 --extensions .pdf .md
+
+离线构建（写入索引产物目录，不连接Milvus），复制到服务节点后一次性导入:
+    python scripts/ingest.py documents/ --output build/kb_index --format parquet
+    python scripts/ingest.py --load build/kb_index --reset
+"""
+import sys
+import os
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import numpy as np
+from services.core.config import settings
+from services.storage.bulk_ingest import (
+    BulkIngestPipeline, IngestCheckpoint, MilvusSink, SourceDocument, create_worker_pool, discover_files,
+    DEFAULT_EXTENSIONS
+)
+from services.storage.index_artifacts import ArtifactLoader, ArtifactSink, ARTIFACT_FORMATS, read_manifest
+from scripts.ingest_presets import PRESETS, FAQ_PRESETS, create_faq_documents
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def embedding_model_name() -> str:
+    """检索时使用的embedding模型（与 services/vector/retriever.py 一致）"""
+    return settings.MULTILINGUAL_EMBEDDING_MODEL if settings.USE_MULTILINGUAL_EMBEDDING else settings.EMBEDDING_MODEL
+
+
+def save_report(report: dict, name: str):
+    output_path = Path("logs") / name
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 报告已保存到: {output_path}")
+
+
+def load_artifacts(args) -> int:
+    """把离线索引产物导入Milvus"""
+    manifest = read_manifest(args.load)
+    if manifest["embedding_model"] != embedding_model_name():
+        print(f"❌ 产物的embedding模型 {manifest['embedding_model']} 与检索使用的 {embedding_model_name()} 不一致")
+        return 1
+
+    print("=" * 80)
+    print(f"📦 导入索引产物 {args.load}（{len(manifest['shards'])} 个分片，{manifest['rows']} 个chunk，"
+          f"集合 {settings.MILVUS_COLLECTION_NAME}）")
+    print("=" * 80)
+    loader = ArtifactLoader(
+        args.load,
+        mode=args.load_mode,
+        reset=args.reset,
+        verify=not args.no_verify,
+        insert_batch_size=settings.BULK_LOAD_INSERT_BATCH
+    )
+    report = loader.load()
+    report["timestamp"] = datetime.now().isoformat()
+    methods = sorted({shard["method"] for shard in report["shards"]})
+    print(f"导入 {report['rows']} 行，耗时 {report['elapsed_seconds']}s（{report['rows_per_sec']} 行/s，"
+          f"方式: {', '.join(methods) or '-'}）")
+    save_report(report, "ingest_load_report.json")
+    return 0
+
+
+def collect_sources(paths: List[str], presets: List[str], extensions: List[str]) -> Iterable[SourceDocument]:
+    """按命令行参数和预设惰性产出待导入文档"""
+    preset_paths = [str(PROJECT_ROOT / path) for preset in presets for path in PRESETS[preset]]
+    yield from discover_files(preset_paths, extensions=extensions, root=str(PROJECT_ROOT))
+    yield from discover_files(paths, extensions=extensions)
+    if FAQ_PRESETS.intersection(presets):
+        for faq_doc in create_faq_documents():
+            metadata = faq_doc["metadata"]
+            yield SourceDocument(
+                source_file=f"builtin_faq/{metadata['doc_id']}_{metadata['language']}.md",
+                text=faq_doc["content"]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入知识库")
+    parser.add_argument("paths", nargs="*", help="要导入的文件或目录（目录递归遍历）")
+    parser.add_argument("--preset", action="append", choices=sorted(PRESETS), default=[], help="内置的导入预设（可多次指定）")
+    parser.add_argument("--extensions", nargs="+", default=sorted(DEFAULT_EXTENSIONS), help="目录中导入的文件扩展名")
+    parser.add_argument("--workers", type=int, default=settings.BULK_INGEST_WORKERS, help="提取/切分进程数（0表示CPU核数）")
+    parser.add_argument("--embed-batch", type=int, default=settings.BULK_INGEST_EMBED_BATCH, help="每次向量化的chunk数")
+    parser.add_argument("--insert-batch", type=int, default=None,
+                        help="每次写入的chunk数（默认BULK_INGEST_INSERT_BATCH；--output时为每个分片的chunk数）")
+    parser.add_argument("--queue-size", type=int, default=settings.BULK_INGEST_QUEUE_SIZE, help="阶段之间队列长度")
+    parser.add_argument("--checkpoint", default=None,
+                        help="检查点文件（默认BULK_INGEST_CHECKPOINT；--output时为产物目录下的checkpoint.jsonl）")
+    parser.add_argument("--no-checkpoint", action="store_true", help="不使用检查点（全部重新导入）")
+    parser.add_argument("--reset", action="store_true", help="删除并重建集合（--output时清空产物目录；同时清空检查点）")
+    parser.add_argument("--output", help="离线构建：写入索引产物目录而不是Milvus")
+    parser.add_argument("--format", choices=ARTIFACT_FORMATS, default=settings.BULK_ARTIFACT_FORMAT, help="索引产物格式")
+    parser.add_argument("--load", help="把索引产物目录一次性导入Milvus")
+    parser.add_argument("--load-mode", choices=["auto", "bulk_insert", "insert"], default="auto",
+                        help="导入方式（auto：安装了minio时用do_bulk_insert，否则insert）")
+    parser.add_argument("--no-verify", action="store_true", help="导入前不校验产物文件的SHA-256")
+    args = parser.parse_args()
+
+    if args.load:
+        if args.paths or args.preset or args.output:
+            parser.error("--load 不能与导入路径、--preset、--output 同时使用")
+        sys.exit(load_artifacts(args))
+    if not args.paths and not args.preset:
+        parser.error("请指定要导入的路径或 --preset")
+    if args.insert_batch is None:
+        args.insert_batch = settings.BULK_ARTIFACT_SHARD_ROWS if args.output else settings.BULK_INGEST_INSERT_BATCH
+    if args.checkpoint is None:
+        args.checkpoint = str(Path(args.output) / "checkpoint.jsonl") if args.output else settings.BULK_INGEST_CHECKPOINT
+
+    # 提取进程池在加载embedding模型、连接Milvus之前fork（此时只有主线程）
+    pool = create_worker_pool(args.workers)
+
+    # 先创建写入目标（--reset --output 会清空产物目录，其中包括默认的检查点）
+    if args.output:
+        # 与检索时使用同一个embedding模型
+        from sentence_transformers import SentenceTransformer
+        embedding_model = SentenceTransformer(embedding_model_name())
+        sink = ArtifactSink(
+            args.output,
+            dimension=embedding_model.get_sentence_embedding_dimension(),
+            embedding_model=embedding_model_name(),
+            fmt=args.format,
+            reset=args.reset
+        )
+        target = f"产物目录 {args.output}（{args.format}）"
+    else:
+        from services.vector.retriever import retriever
+        embedding_model = retriever.embedding_model
+        sink = MilvusSink(reset=args.reset)
+        target = f"集合 {settings.MILVUS_COLLECTION_NAME}"
+
+    checkpoint = None
+    if not args.no_checkpoint:
+        if args.reset and Path(args.checkpoint).exists():
+            Path(args.checkpoint).unlink()
+        checkpoint = IngestCheckpoint(args.checkpoint)
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return np.asarray(
+            embedding_model.encode(texts, batch_size=len(texts), show_progress_bar=False),
+            dtype=np.float32
+        )
+
+    pipeline = BulkIngestPipeline(
+        embed_func=embed,
+        sink=sink,
+        checkpoint=checkpoint,
+        workers=args.workers,
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+        embed_batch_size=args.embed_batch,
+        insert_batch_size=args.insert_batch,
+        queue_size=args.queue_size,
+        pool=pool
+    )
+
+    print("=" * 80)
+    print(f"📥 批量导入知识库（{pipeline.workers} 个提取进程，{target}）")
+    print("=" * 80)
+    report = pipeline.run(collect_sources(args.paths, args.preset, args.extensions))
+    report["timestamp"] = datetime.now().isoformat()
+    report["paths"] = args.paths
+    report["presets"] = args.preset
+
+    docs = report["documents"]
+    print(f"\n文档: 发现 {docs['discovered']}，导入 {docs['ingested']}，"
+          f"未变化跳过 {docs['skipped_unchanged']}，内容重复跳过 {docs['skipped_duplicate']}，"
+          f"无文本 {docs['empty']}，失败 {docs['failed']}")
+    print(f"chunk: {report['chunks']}")
+    print(f"耗时: {report['elapsed_seconds']}s  "
+          f"{report['docs_per_sec']} 文档/s  {report['chunks_per_sec']} chunk/s")
+    stages = report["stage_seconds"]
+    print(f"阶段耗时: 遍历 {stages['discover']}s，提取/切分 {stages['extract']}s（所有进程合计），"
+          f"向量化 {stages['embed']}s，写入 {stages['insert']}s")
+    for failure in report["failures"][:10]:
+        print(f"  ❌ {failure['source_file']}: {failure['error']}")
+    if report.get("error"):
+        print(f"\n❌ 导入中止: {report['error']}（已完成的文档已记录在检查点中，重新运行可继续）")
+    if args.output:
+        print(f"\n📦 索引产物: {args.output}（复制到服务节点后运行 python scripts/ingest.py --load <目录>）")
+
+    save_report(report, "ingest_report.json")
+    sys.exit(0 if report["completed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
 """
-快速构建RAG知识库
-自动索引项目文档、README、配置文件等
+批量导入预设（scripts/ingest.py --preset 使用）
+
+- project: 项目文档 + 内置FAQ（原 scripts/build_knowledge_base.py）
+- fictional: 虚构知识库和测试问题集（原 scripts/utils/index_fictional_kb.py）
+- multilingual: 多语言RAG指南（原 scripts/utils/index_multilingual_docs.py）
 """
-import sys
-import os
-from pathlib import Path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
-
-from services.storage.file_indexer import FileIndexer
-from services.storage.file_storage import file_storage
-from services.vector.milvus_client import milvus_client
-from services.core.logger import logger
-import json
-
-# 定义要索引的文档路径
-KNOWLEDGE_SOURCES = {
-    "项目文档": [
+from typing import Dict, List
+
+# 预设 -> 要导入的文件/目录（相对于项目根目录，不存在的路径跳过）
+PRESETS: Dict[str, List[str]] = {
+    "project": [
         "docs/PROJECT_INFO.md",
         "docs/TROUBLESHOOTING.md",
         "docs/WORKFLOW_ARCHITECTURE.md",
         "docs/RAG_RESEARCH_FINDINGS.md",
         "docs/RAG_IMPROVEMENT_PLAN.md",
-    ],
-    "根目录文档": [
         "README.md",
-    ],
-    "配置文档": [
         "services/config.example.py",
         "services/core/config.example.py",
     ],
+    "fictional": [
+        "docs/archive/fictional_knowledge_base.md",
+        "docs/Test Questions Set 2.docx",
+    ],
+    "multilingual": [
+        "documents/multilingual_rag_guide_zh.md",
+        "documents/multilingual_rag_guide_yue.md",
+        "documents/multilingual_rag_guide_en.md",
+    ],
 }
 
+# 包含内置FAQ的预设
+FAQ_PRESETS = {"project"}
+
 # FAQ数据（内置）
 FAQ_DATA = [
     {
@@ -154,8 +158,8 @@ curl -X POST http://localhost:8000/api/upload \
 
 **方法2：使用命令行脚本**
 ```bash
-python scripts/index_documents.py --file document.pdf
-python scripts/index_documents.py --dir documents/ --recursive
+python scripts/ingest.py document.pdf
+python scripts/ingest.py documents/
 ```
 
 **方法3：通过存储目录**
@@ -211,6 +215,7 @@ This balances speed and accuracy.""",
     },
 ]
 
+
 def create_faq_documents():
     """将FAQ数据转换为可索引的文档"""
     faq_docs = []
@@ -239,157 +244,3 @@ def create_faq_documents():
             }
         })
     return faq_docs
-
-def build_knowledge_base():
-    """构建完整的知识库"""
-    logger.info("\n" + "="*100)
-    logger.info("🏗️  开始构建RAG知识库".center(100))
-    logger.info("="*100 + "\n")
-    
-    total_indexed = 0
-    total_failed = 0
-    
-    # 初始化索引器
-    file_indexer = FileIndexer()
-    
-    # 1. 索引项目文档
-    logger.info("📚 第1步：索引项目文档")
-    logger.info("-" * 100)
-    
-    for category, file_list in KNOWLEDGE_SOURCES.items():
-        logger.info(f"\n🔖 分类: {category}")
-        for file_path in file_list:
-            full_path = Path(file_path)
-            if not full_path.exists():
-                logger.warning(f"⚠️  文件不存在，跳过: {file_path}")
-                total_failed += 1
-                continue
-            
-            try:
-                logger.info(f"   📄 正在索引: {file_path}")
-                
-                # 上传文件到file_storage
-                with open(full_path, 'rb') as f:
-                    file_content = f.read()
-                
-                # 保存文件
-                result_info = file_storage.save_file(
-                    file_content=file_content,
-                    filename=full_path.name,
-                    mime_type='text/plain'  # 简化，实际可根据扩展名判断
-                )
-                file_id = result_info['file_id']
-                
-                # 调用文件索引器
-                result = file_indexer.index_file(file_id)
-                if result.get('success'):
-                    chunks_indexed = result.get('chunks_indexed', 0)
-                    total_indexed += chunks_indexed
-                    logger.info(f"   ✅ 成功索引 {chunks_indexed} 个块")
-                else:
-                    logger.error(f"   ❌ 索引失败: {result.get('message')}")
-                    total_failed += 1
-            except Exception as e:
-                logger.error(f"   ❌ 索引异常: {e}")
-                import traceback
-                traceback.print_exc()
-                total_failed += 1
-    
-    # 2. 索引FAQ数据
-    logger.info("\n" + "-" * 100)
-    logger.info("💬 第2步：索引FAQ数据")
-    logger.info("-" * 100)
-    
-    faq_docs = create_faq_documents()
-    logger.info(f"   准备索引 {len(faq_docs)} 个FAQ条目")
-    
-    for i, faq_doc in enumerate(faq_docs):
-        try:
-            # 将FAQ内容写入临时文件再索引
-            temp_faq_path = Path(f"data/temp_faq_{i}.md")
-            temp_faq_path.parent.mkdir(exist_ok=True)
-            
-            with open(temp_faq_path, 'w', encoding='utf-8') as f:
-                f.write(faq_doc['content'])
-            
-            # 保存文件
-            result_info = file_storage.save_file(
-                file_content=faq_doc['content'].encode('utf-8'),
-                filename=f"faq_{i+1}_{faq_doc['metadata']['language']}.md",
-                mime_type='text/markdown'
-            )
-            file_id = result_info['file_id']
-            
-            # 索引
-            result = file_indexer.index_file(file_id)
-            if result.get('success'):
-                chunks_indexed = result.get('chunks_indexed', 0)
-                total_indexed += chunks_indexed
-                logger.info(f"   ✅ FAQ索引成功: {faq_doc['metadata']['doc_title'][:50]}...")
-            else:
-                logger.error(f"   ❌ FAQ索引失败: {result.get('message')}")
-                total_failed += 1
-            
-            # 清理临时文件
-            if temp_faq_path.exists():
-                temp_faq_path.unlink()
-                
-        except Exception as e:
-            logger.error(f"   ❌ FAQ索引异常: {e}")
-            import traceback
-            traceback.print_exc()
-            total_failed += 1
-    
-    # 3. 获取最终统计
-    logger.info("\n" + "="*100)
-    logger.info("📊 知识库构建完成".center(100))
-    logger.info("="*100)
-    
-    try:
-        stats = milvus_client.get_collection_stats()
-        logger.info(f"\n知识库统计:")
-        logger.info(f"  - 总文档数: {stats.get('total_docs', 0)}")
-        logger.info(f"  - 总块数: {stats.get('total_chunks', 0)}")
-        logger.info(f"  - 本次索引成功: {total_indexed} 个块")
-        logger.info(f"  - 索引失败: {total_failed} 项")
-        
-        doc_types = stats.get('doc_types', {})
-        if doc_types:
-            logger.info(f"\n文档类型分布:")
-            for doc_type, count in doc_types.items():
-                logger.info(f"  - {doc_type}: {count}")
-    except Exception as e:
-        logger.error(f"获取统计信息失败: {e}")
-    
-    logger.info("\n" + "="*100)
-    logger.info("✅ 知识库构建流程完成！")
-    logger.info("="*100 + "\n")
-    
-    # 测试检索
-    logger.info("🧪 执行测试检索...")
-    logger.info("-" * 100)
-    
-    test_queries = [
-        "如何使用粤语输入？",
-        "What tools are available?",
-        "系统架构是什么？"
-    ]
-    
-    for query in test_queries:
-        logger.info(f"\n🔍 测试查询: {query}")
-        try:
-            from services.vector.retriever import retriever
-            results = retriever.search(query, top_k=3)
-            logger.info(f"   ✅ 找到 {len(results)} 个结果")
-            for i, result in enumerate(results[:2], 1):
-                logger.info(f"   {i}. [{result.get('score', 0):.3f}] {result.get('content', '')[:80]}...")
-        except Exception as e:
-            logger.error(f"   ❌ 检索失败: {e}")
-    
-    logger.info("\n" + "="*100)
-    logger.info("🎉 全部完成！知识库已就绪，可以开始使用了。")
-    logger.info("="*100 + "\n")
-
-if __name__ == "__main__":
-    build_knowledge_base()
-
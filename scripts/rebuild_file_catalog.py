@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+从Milvus集合重建文件目录（services/storage/file_catalog.py）
+
+/files 和 /files/{id} 读取索引器维护的文件目录。目录丢失、被删除或与向量集合不一致
+（例如直接操作过集合）时，运行本脚本一次遍历集合中上传文件的chunk重新统计。
+
+用法:
+    python scripts/rebuild_file_catalog.py
+    python scripts/rebuild_file_catalog.py --show       # 重建后列出目录中的文件
+    python scripts/rebuild_file_catalog.py --sync-storage  # 同时把chunk数批量写回存储后端（database后端）
+"""
+import sys
+import os
+import time
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from services.core.config import settings
+from services.storage.milvus_metadata import milvus_metadata
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="从Milvus集合重建文件目录")
+    parser.add_argument("--show", action="store_true", help="重建后列出目录中的文件")
+    parser.add_argument("--sync-storage", action="store_true",
+                        help="把目录中已索引文件的chunk数批量写回存储后端（STORAGE_BACKEND=database 时）")
+    args = parser.parse_args()
+
+    print(f"🔄 从集合 {settings.MILVUS_COLLECTION_NAME} 重建文件目录 {settings.FILE_CATALOG_DB} ...")
+    start = time.perf_counter()
+    try:
+        result = milvus_metadata.rebuild_catalog()
+    except Exception as e:
+        print(f"❌ 重建失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    stats = milvus_metadata.catalog().stats()
+    print(f"✅ 完成（{elapsed:.2f}s）: {result['files']} 个文件, {result['chunks']} 个chunk")
+    print(f"   目录状态: indexed {stats['indexed']}, indexing {stats['indexing']}, failed {stats['failed']}")
+
+    if args.sync_storage:
+        from services.storage.file_storage import file_storage
+        chunk_counts = {entry["file_id"]: entry["chunk_count"] for entry in milvus_metadata.catalog().list(status="indexed")}
+        updated = file_storage.mark_many_as_processed(chunk_counts)
+        print(f"   存储后端（{settings.STORAGE_BACKEND}）已更新 {updated}/{len(chunk_counts)} 个文件")
+
+    if args.show:
+        for entry in milvus_metadata.catalog().list():
+            print(f"   {entry['file_id']}  {entry['file_type'] or '-':<6} {entry['chunk_count']:>6} chunks  "
+                  f"{entry['status']:<9} {entry['filename']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
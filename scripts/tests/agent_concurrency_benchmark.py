@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Agent并发基准 - 单个事件循环（相当于一个uvicorn worker）内同时处理N个请求
+
+对比两种处理方式：
+- 同步: async处理函数里直接调用 agent.execute（原 /agent_query 的写法，阻塞事件循环）
+- 异步: async处理函数里 await agent.execute_async
+
+上游使用本地模拟服务（HKGAI兼容的 /chat/completions 和 wttr.in 兼容的天气接口），
+通过 --latency 设定上游延迟，结果不依赖外部网络和API额度。
+同时记录事件循环延迟（每10ms检查一次心跳的最大滞后），反映其他请求被阻塞的程度。
+
+用法:
+    python scripts/tests/agent_concurrency_benchmark.py --concurrency 20 --latency 0.5
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+QUERIES = [
+    "把'今天天气很好'翻译成英文",
+    "香港今天天气怎么样",
+    "How do you say 'thank you' in Cantonese?",
+    "深圳现在的天气如何",
+]
+
+
+def start_mock_upstream(latency: float) -> ThreadingHTTPServer:
+    """启动模拟上游服务（每个请求固定延迟latency秒）"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, data: dict):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self._reply({"choices": [{"message": {"content": "这是模拟的回答。"}, "finish_reason": "stop"}]})
+
+        def do_GET(self):
+            time.sleep(latency)
+            self._reply({"current_condition": [{
+                "temp_C": "25", "FeelsLikeC": "27", "humidity": "70",
+                "windspeedKmph": "10", "winddir16Point": "E",
+                "weatherDesc": [{"value": "Sunny"}]
+            }]})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """事件循环最大滞后（毫秒）"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag * 1000
+
+
+async def run_mode(agent, mode: str, concurrency: int) -> dict:
+    """在当前事件循环中并发处理concurrency个请求"""
+
+    async def handle_sync(query: str):
+        return agent.execute(query)
+
+    async def handle_async(query: str):
+        return await agent.execute_async(query)
+
+    handler = handle_sync if mode == "sync" else handle_async
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        result = await handler(QUERIES[i % len(QUERIES)])
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(concurrency)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    max_lag_ms = await lag_task
+
+    errors = sum(1 for r in results if isinstance(r, Exception))
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": concurrency,
+        "errors": errors,
+        "wall_time_s": round(elapsed, 3),
+        "throughput_rps": round(concurrency / elapsed, 2),
+        "p50_latency_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        "max_latency_s": round(latencies[-1], 3) if latencies else None,
+        "max_loop_lag_ms": round(max_lag_ms, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent单worker并发基准")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟上游延迟（秒）")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(args.latency)
+    upstream = f"http://127.0.0.1:{server.server_address[1]}"
+    # 必须在导入services之前设置（settings在导入时读取环境变量）
+    os.environ["HKGAI_BASE_URL"] = upstream
+    os.environ["HKGAI_API_KEY"] = "benchmark"
+    os.environ["GEMINI_ENABLED"] = "false"
+    os.environ["TOOL_CACHE_ENABLED"] = "false"  # 缓存会让后续请求不再访问上游
+    os.environ["PLAN_CACHE_ENABLED"] = "false"
+
+    from services.agent.agent import agent
+    from services.agent.tools import weather_tool
+    weather_tool._weather_url = lambda location: f"{upstream}/weather?location={location}"
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "concurrency": args.concurrency,
+        "upstream_latency_s": args.latency,
+        "results": []
+    }
+    for mode in ("sync", "async"):
+        report["results"].append(asyncio.run(run_mode(agent, mode, args.concurrency)))
+    server.shutdown()
+
+    print("=" * 80)
+    print(f"⚡ Agent单worker并发基准（并发 {args.concurrency}，上游延迟 {args.latency}s）")
+    print("=" * 80)
+    print(f"{'模式':<8}{'耗时(s)':>10}{'吞吐(req/s)':>14}{'P50(s)':>10}{'最大(s)':>10}{'循环滞后(ms)':>16}{'错误':>6}")
+    for r in report["results"]:
+        print(f"{r['mode']:<8}{r['wall_time_s']:>10}{r['throughput_rps']:>14}{r['p50_latency_s']:>10}"
+              f"{r['max_latency_s']:>10}{r['max_loop_lag_ms']:>16}{r['errors']:>6}")
+    sync_result, async_result = report["results"]
+    report["speedup"] = round(async_result["throughput_rps"] / sync_result["throughput_rps"], 2)
+    print(f"吞吐提升: {report['speedup']}x")
+
+    output_path = Path("logs") / "agent_concurrency_benchmark.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 结果已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文本切分基准 - 对比langchain RecursiveCharacterTextSplitter 与 services/storage/text_chunker.py
+
+在知识库文档上测量：
+- 导入耗时（各自在新进程中导入）
+- 切分吞吐量（MB/s）
+- TextChunker(cjk_sentences=False) 的输出与langchain是否完全一致
+- chunk统计：数量、字符长度、token长度（安装了tiktoken时）、中文chunk在句末标点处结束的比例
+
+用法:
+    python scripts/tests/chunker_benchmark.py --repeat 5
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.core.config import settings
+from services.storage.text_chunker import TextChunker, TIKTOKEN_AVAILABLE, token_length_function
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+# 知识库来源（与 scripts/ingest_presets.py 中的预设一致）
+KB_SOURCES = [
+    "documents",
+    "docs/WORKFLOW_ARCHITECTURE.md",
+    "docs/RAG_RESEARCH_FINDINGS.md",
+    "docs/archive/fictional_knowledge_base.md",
+    "README.md",
+]
+
+SENTENCE_ENDINGS = tuple("。！？.!?”」）")
+
+
+def collect_texts():
+    """收集知识库文本（PDF逐页提取，与索引时一样每页单独切分）"""
+    texts = []
+    for source in KB_SOURCES:
+        path = PROJECT_ROOT / source
+        files = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for file_path in files:
+            if file_path.suffix in (".md", ".txt"):
+                texts.append(file_path.read_text(encoding="utf-8", errors="ignore"))
+            elif file_path.suffix == ".pdf":
+                from services.storage.pdf_extractor import PDFPageExtractor
+                texts.extend(
+                    f"[页面 {page}]\n{text}"
+                    for page, text in PDFPageExtractor(workers=1).iter_pages(str(file_path)) if text.strip()
+                )
+    return texts
+
+
+def import_seconds(statement: str) -> float:
+    """在新进程中测量导入耗时"""
+    code = (
+        "import sys, time; sys.path.insert(0, %r); start = time.perf_counter(); %s; "
+        "print(time.perf_counter() - start)" % (str(PROJECT_ROOT), statement)
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run_splitter(split, texts, repeat):
+    """重复切分整个语料，返回 (最快一轮的秒数, 切分结果)"""
+    best, chunks = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = [split(text) for text in texts]
+        best = min(best, time.perf_counter() - start)
+    return best, chunks
+
+
+def chunk_stats(chunks_per_text, token_length=None):
+    chunks = [chunk for chunks in chunks_per_text for chunk in chunks]
+    lengths = sorted(len(chunk) for chunk in chunks)
+    cjk_chunks = [chunk for chunk in chunks if any("一" <= char <= "鿿" for char in chunk)]
+    stats = {
+        "chunks": len(chunks),
+        "chars_mean": round(sum(lengths) / len(lengths), 1) if lengths else 0,
+        "chars_max": lengths[-1] if lengths else 0,
+        "cjk_chunks": len(cjk_chunks),
+        "cjk_sentence_end_ratio": round(
+            sum(chunk.endswith(SENTENCE_ENDINGS) for chunk in cjk_chunks) / len(cjk_chunks), 3
+        ) if cjk_chunks else None
+    }
+    if token_length:
+        tokens = sorted(token_length(chunk) for chunk in chunks)
+        stats["tokens_p50"] = tokens[len(tokens) // 2] if tokens else 0
+        stats["tokens_p95"] = tokens[int(len(tokens) * 0.95)] if tokens else 0
+        stats["tokens_max"] = tokens[-1] if tokens else 0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本切分基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每种切分器重复次数（取最快一轮）")
+    parser.add_argument("--chunk-size", type=int, default=settings.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=settings.CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    texts = collect_texts()
+    total_mb = sum(len(text.encode("utf-8")) for text in texts) / 1024 / 1024
+    token_length = token_length_function(settings.CHUNK_TOKEN_ENCODING) if TIKTOKEN_AVAILABLE else None
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitters = {
+        "langchain": RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, length_function=len
+        ).split_text,
+        "chunker": TextChunker(args.chunk_size, args.chunk_overlap, cjk_sentences=False).split_text,
+        "chunker_cjk": TextChunker(args.chunk_size, args.chunk_overlap).split_text,
+    }
+    if TIKTOKEN_AVAILABLE:
+        # token模式下chunk_size按token计，换算成与字符模式大致相同的文本量（中英混合约1.5字符/token）
+        token_size = int(args.chunk_size / 1.5)
+        splitters["chunker_cjk_tokens"] = TextChunker(
+            token_size, int(args.chunk_overlap / 1.5), length_unit="tokens",
+            token_encoding=settings.CHUNK_TOKEN_ENCODING
+        ).split_text
+
+    results, outputs = {}, {}
+    for name, split in splitters.items():
+        seconds, outputs[name] = run_splitter(split, texts, args.repeat)
+        results[name] = {
+            "seconds": round(seconds, 4),
+            "mb_per_sec": round(total_mb / seconds, 2) if seconds else None,
+            **chunk_stats(outputs[name], token_length)
+        }
+    identical = outputs["chunker"] == outputs["langchain"]
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "texts": len(texts),
+        "corpus_mb": round(total_mb, 2),
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "import_seconds": {
+            "langchain": round(import_seconds("from langchain.text_splitter import RecursiveCharacterTextSplitter"), 3),
+            "chunker": round(import_seconds("from services.storage.text_chunker import TextChunker"), 3)
+        },
+        "identical_to_langchain": identical,
+        "splitters": results
+    }
+
+    print("=" * 80)
+    print(f"✂️  文本切分基准（{len(texts)} 段文本，{total_mb:.2f} MB，chunk_size={args.chunk_size}）")
+    print("=" * 80)
+    print(f"导入耗时: langchain {report['import_seconds']['langchain']}s，"
+          f"text_chunker {report['import_seconds']['chunker']}s")
+    print(f"{'切分器':<22}{'MB/s':>8}{'chunk数':>10}{'平均字符':>10}{'中文句末结束':>14}")
+    for name, result in results.items():
+        ratio = result["cjk_sentence_end_ratio"]
+        print(f"{name:<22}{result['mb_per_sec']:>8}{result['chunks']:>10}{result['chars_mean']:>10}"
+              f"{(f'{ratio:.1%}' if ratio is not None else '-'):>14}")
+    print(f"\nTextChunker(cjk_sentences=False) 与langchain输出一致: {'✅' if identical else '❌'}")
+
+    output_path = Path("logs") / "chunker_benchmark.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 报告已保存到: {output_path}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上下文压缩评估 - 对比"仅打包"与"句子级压缩+打包"两种模式
+在进程内直接调用检索器和LLM（需要Milvus和LLM API可用），统计：
+- 输入上下文token减少量
+- 端到端延迟（检索 + 构建上下文 + LLM）
+- 答案质量：压缩模式答案与完整上下文答案的embedding相似度（保真度）
+"""
+import sys
+import os
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+from services.core.config import settings
+from services.vector.retriever import retriever
+from services.vector.context_packer import estimate_tokens
+from services.llm.unified_client import unified_llm_client
+from scripts.tests.test_all_sets_complete import TEST_SET_1, TEST_SET_2, TEST_SET_3
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+SYSTEM_PROMPT = "你是一个专业的AI助手，请基于提供的上下文信息回答问题。"
+
+
+def run_mode(question: str, compress: bool) -> dict:
+    """用指定模式回答一个问题"""
+    settings.CONTEXT_COMPRESSION_ENABLED = compress
+    start = time.time()
+    results = retriever.search(question)
+    context, stats = retriever.build_context(question, results)
+    build_time = time.time() - start
+
+    user_prompt = f"基于以下信息：\n\n{context}\n\n请回答这个问题：{question}"
+    llm_result = unified_llm_client.chat(
+        system_prompt=SYSTEM_PROMPT,
+        user_prompt=user_prompt,
+        max_tokens=1024,
+        temperature=0.0
+    )
+    return {
+        "answer": llm_result.get("content", ""),
+        "error": llm_result.get("error"),
+        "context_tokens": estimate_tokens(context),
+        "prompt_tokens": estimate_tokens(SYSTEM_PROMPT + user_prompt),
+        "context_stats": stats,
+        "build_time": build_time,
+        "total_time": time.time() - start
+    }
+
+
+def answer_similarity(a: str, b: str) -> float:
+    """两个答案的余弦相似度"""
+    if not a or not b:
+        return 0.0
+    vectors = retriever.embedding_model.encode([a, b], show_progress_bar=False, normalize_embeddings=True)
+    return float(np.dot(vectors[0], vectors[1]))
+
+
+def main():
+    test_cases = TEST_SET_1 + TEST_SET_2 + TEST_SET_3
+    original_setting = settings.CONTEXT_COMPRESSION_ENABLED
+    rows = []
+
+    print("=" * 80)
+    print("🗜️  上下文压缩评估（仅打包 vs 压缩+打包）")
+    print("=" * 80)
+
+    try:
+        for i, case in enumerate(test_cases, 1):
+            question = case["question"]
+            print(f"\n[{i}/{len(test_cases)}] {case['id']}: {question}", flush=True)
+            retriever.search(question)  # 预热检索缓存，使两种模式的延迟只差在上下文构建和LLM
+            baseline = run_mode(question, compress=False)
+            compressed = run_mode(question, compress=True)
+            fidelity = answer_similarity(baseline["answer"], compressed["answer"])
+            reduction = (1 - compressed["context_tokens"] / baseline["context_tokens"]) * 100 if baseline["context_tokens"] else 0.0
+
+            print(f"   上下文tokens: {baseline['context_tokens']} -> {compressed['context_tokens']} ({reduction:.1f}% 减少)")
+            print(f"   端到端延迟: {baseline['total_time']:.2f}s -> {compressed['total_time']:.2f}s "
+                  f"(压缩阶段 {compressed['build_time'] * 1000:.0f}ms)")
+            print(f"   答案保真度: {fidelity:.3f}")
+
+            rows.append({
+                "id": case["id"],
+                "question": question,
+                "baseline": baseline,
+                "compressed": compressed,
+                "token_reduction_percent": reduction,
+                "answer_fidelity": fidelity
+            })
+    finally:
+        settings.CONTEXT_COMPRESSION_ENABLED = original_setting
+
+    valid = [r for r in rows if not r["baseline"]["error"] and not r["compressed"]["error"]]
+    if valid:
+        print("\n" + "=" * 80)
+        print("📊 汇总")
+        print("=" * 80)
+        print(f"有效问题数: {len(valid)}/{len(rows)}")
+        print(f"平均上下文token减少: {np.mean([r['token_reduction_percent'] for r in valid]):.1f}%")
+        print(f"平均prompt tokens: {np.mean([r['baseline']['prompt_tokens'] for r in valid]):.0f} -> "
+              f"{np.mean([r['compressed']['prompt_tokens'] for r in valid]):.0f}")
+        print(f"平均端到端延迟: {np.mean([r['baseline']['total_time'] for r in valid]):.2f}s -> "
+              f"{np.mean([r['compressed']['total_time'] for r in valid]):.2f}s")
+        print(f"平均答案保真度: {np.mean([r['answer_fidelity'] for r in valid]):.3f}")
+        low = [r for r in valid if r["answer_fidelity"] < 0.8]
+        if low:
+            print("\n⚠️  保真度低于0.8的问题（需人工检查）:")
+            for r in low:
+                print(f"   {r['id']}: {r['question']} ({r['answer_fidelity']:.3f})")
+
+    os.makedirs(PROJECT_ROOT / "logs", exist_ok=True)
+    report_path = PROJECT_ROOT / "logs" / f"context_compression_eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 结果已保存: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+近似重复检测报告 - 统计知识库在SimHash + LSH去重后的索引缩减比例
+不连接Milvus，只在本地切分知识库文档并模拟索引时去重
+"""
+import sys
+import os
+import json
+import time
+from pathlib import Path
+from collections import Counter
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.core.config import settings
+from services.storage.text_chunker import get_text_chunker
+from services.vector.dedup import NearDuplicateIndex, compute_simhash
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+# 知识库来源（与 scripts/ingest_presets.py 中的预设一致）
+KB_SOURCES = [
+    "documents",
+    "docs/WORKFLOW_ARCHITECTURE.md",
+    "docs/RAG_RESEARCH_FINDINGS.md",
+    "docs/archive/fictional_knowledge_base.md",
+    "README.md",
+]
+
+
+def collect_files():
+    """收集知识库文件（目录下的.md/.txt递归收集）"""
+    files = []
+    for source in KB_SOURCES:
+        path = PROJECT_ROOT / source
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix in (".md", ".txt")))
+        elif path.exists():
+            files.append(path)
+    return files
+
+
+def main():
+    splitter = get_text_chunker()
+    index = NearDuplicateIndex(threshold=settings.DEDUP_HAMMING_THRESHOLD)
+
+    total_chunks = 0
+    duplicates = 0
+    per_file = Counter()
+    examples = []
+    start = time.time()
+
+    for file_path in collect_files():
+        text = file_path.read_text(encoding="utf-8", errors="ignore")
+        rel = str(file_path.relative_to(PROJECT_ROOT))
+        for idx, chunk in enumerate(splitter.split_text(text)):
+            total_chunks += 1
+            fingerprint = compute_simhash(chunk)
+            canonical = index.find_duplicate(fingerprint)
+            if canonical is not None:
+                duplicates += 1
+                per_file[rel] += 1
+                if len(examples) < 5:
+                    examples.append({"chunk": f"{rel}#{idx}", "duplicate_of": canonical, "preview": chunk[:80]})
+                continue
+            index.add(f"{rel}#{idx}", fingerprint)
+
+    elapsed = time.time() - start
+    shrinkage = duplicates / total_chunks * 100 if total_chunks else 0.0
+
+    print("=" * 80)
+    print("🧹 知识库近似重复检测报告")
+    print("=" * 80)
+    print(f"汉明距离阈值: {settings.DEDUP_HAMMING_THRESHOLD}")
+    print(f"总chunk数: {total_chunks}")
+    print(f"近似重复chunk: {duplicates}")
+    print(f"去重后chunk数: {total_chunks - duplicates}")
+    print(f"索引缩减: {shrinkage:.1f}%")
+    print(f"耗时: {elapsed * 1000:.1f}ms（{total_chunks / elapsed if elapsed else 0:.0f} chunks/s）")
+    if per_file:
+        print("\n按文件统计重复chunk:")
+        for rel, count in per_file.most_common():
+            print(f"  {rel}: {count}")
+    if examples:
+        print("\n示例:")
+        for example in examples:
+            print(f"  {example['chunk']} ~ {example['duplicate_of']}: {example['preview']!r}")
+
+    os.makedirs(PROJECT_ROOT / "logs", exist_ok=True)
+    report_path = PROJECT_ROOT / "logs" / "dedup_index_report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "threshold": settings.DEDUP_HAMMING_THRESHOLD,
+            "total_chunks": total_chunks,
+            "duplicates": duplicates,
+            "shrinkage_percent": shrinkage,
+            "per_file": dict(per_file),
+            "examples": examples
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 报告已保存: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
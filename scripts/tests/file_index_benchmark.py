@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件索引基准 - 对比每次调用重新读取file_index.json与内存索引+追加日志（FileIndexStore）
+
+在临时目录中生成N个文件的索引，测量：
+- get_file 的索引查询延迟（原实现每次 json.load 整个文件）
+- 一次 search_uploaded_files（10个结果，每个结果查一次索引）的索引开销
+- 新增一个文件的写入延迟（原实现读取并以indent=2整体重写）
+
+用法:
+    python scripts/tests/file_index_benchmark.py --files 10000
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.storage.file_index_store import FileIndexStore
+
+
+def make_entry(i: int) -> tuple:
+    file_id = f"{i:064x}"
+    return file_id, {
+        "filename": f"document_{i}.pdf",
+        "stored_filename": f"{file_id}.pdf",
+        "file_path": f"uploaded_files/{file_id}.pdf",
+        "file_type": "pdf",
+        "file_size": 100000 + i,
+        "mime_type": "application/pdf",
+        "uploaded_at": datetime.utcnow().isoformat()
+    }
+
+
+def legacy_load(path: Path) -> dict:
+    """原 _load_index：每次读取并解析整个文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def legacy_save(path: Path, index: dict):
+    """原 _save_index：整体重写（indent=2）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+
+def timed(func, rounds: int) -> dict:
+    """返回每次调用的平均/P50/P99耗时（微秒）"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(sum(samples) / len(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p99_us": round(samples[min(int(len(samples) * 0.99), len(samples) - 1)], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件索引基准")
+    parser.add_argument("--files", type=int, default=10000, help="索引中的文件数")
+    parser.add_argument("--rounds", type=int, default=200, help="原实现的测量次数（新实现测量10倍）")
+    args = parser.parse_args()
+
+    entries = dict(make_entry(i) for i in range(args.files))
+    file_ids = list(entries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy" / "file_index.json"
+        legacy_path.parent.mkdir()
+        legacy_save(legacy_path, entries)
+
+        store_path = Path(tmp) / "store" / "file_index.json"
+        store_path.parent.mkdir()
+        legacy_save(store_path, entries)
+        load_start = time.perf_counter()
+        store = FileIndexStore(store_path)
+        load_ms = (time.perf_counter() - load_start) * 1000
+
+        legacy_get = timed(lambda: legacy_load(legacy_path).get(random.choice(file_ids)), args.rounds)
+        store_get = timed(lambda: store.get(random.choice(file_ids)), args.rounds * 10)
+
+        def legacy_search():
+            for file_id in random.sample(file_ids, 10):
+                legacy_load(legacy_path).get(file_id)
+
+        def store_search():
+            for file_id in random.sample(file_ids, 10):
+                store.get(file_id)
+
+        legacy_search_stats = timed(legacy_search, max(args.rounds // 10, 5))
+        store_search_stats = timed(store_search, args.rounds * 10)
+
+        counter = iter(range(args.files, args.files * 10))
+
+        def legacy_put():
+            index = legacy_load(legacy_path)
+            file_id, info = make_entry(next(counter))
+            index[file_id] = info
+            legacy_save(legacy_path, index)
+
+        def store_put():
+            file_id, info = make_entry(next(counter))
+            store.put(file_id, info)
+
+        legacy_put_stats = timed(legacy_put, max(args.rounds // 10, 5))
+        store_put_stats = timed(store_put, args.rounds * 10)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "files": args.files,
+        "store_initial_load_ms": round(load_ms, 1),
+        "get_file_index_lookup": {"legacy": legacy_get, "store": store_get},
+        "search_uploaded_files_10_results": {"legacy": legacy_search_stats, "store": store_search_stats},
+        "add_file": {"legacy": legacy_put_stats, "store": store_put_stats}
+    }
+
+    print("=" * 80)
+    print(f"📁 文件索引基准（{args.files} 个文件）")
+    print("=" * 80)
+    print(f"内存索引初始加载: {report['store_initial_load_ms']} ms（仅启动时一次）")
+    for name, label in [("get_file_index_lookup", "get_file 索引查询"),
+                        ("search_uploaded_files_10_results", "检索10个结果的索引开销"),
+                        ("add_file", "新增文件")]:
+        legacy, store_stats = report[name]["legacy"], report[name]["store"]
+        print(f"{label:<20} 原实现 P50 {legacy['p50_us']:>10.1f} µs   "
+              f"内存索引 P50 {store_stats['p50_us']:>8.1f} µs   "
+              f"加速 {legacy['p50_us'] / max(store_stats['p50_us'], 0.1):.0f}x")
+
+    output_path = Path("logs") / "file_index_benchmark.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 结果已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+出站HTTP连接池基准 - 共享客户端（services/core/http_client.py）对比每次新建连接
+
+对同一URL顺序发送N个GET请求，测量：
+- requests.get（每次新建TCP+TLS连接，迁移前各集成的写法）
+- get_http_session()（共享Session，按host复用长连接）
+- get_async_client()（共享AsyncClient，并发请求；安装h2时走HTTP/2）
+并输出共享客户端记录的按host指标（新建/复用连接数、延迟分位数）。
+
+用法:
+    python scripts/tests/http_pool_benchmark.py --url https://wttr.in/Hong%20Kong?format=j1 --requests 20
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import requests
+from services.core.http_client import (
+    HTTPX_AVAILABLE, get_http_session, get_async_client, aclose_async_client, get_http_stats
+)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 2),
+        "total_ms": round(sum(timings), 2)
+    }
+
+
+def run_sync(get, url: str, count: int):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        get(url, timeout=15).content
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+async def run_async(url: str, count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def fetch():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await get_async_client().get(url, timeout=15)
+            response.content
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch() for _ in range(count)])
+    wall_ms = (time.perf_counter() - start) * 1000
+    await aclose_async_client()
+    return dict(summarize(timings), wall_ms=round(wall_ms, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出站HTTP连接池基准")
+    parser.add_argument("--url", default="https://wttr.in/Hong%20Kong?format=j1", help="请求的URL")
+    parser.add_argument("--requests", type=int, default=20, help="每种方式的请求数")
+    parser.add_argument("--concurrency", type=int, default=5, help="异步客户端的并发数")
+    args = parser.parse_args()
+
+    results = {
+        "requests_get": run_sync(requests.get, args.url, args.requests),
+        "shared_session": run_sync(get_http_session().get, args.url, args.requests)
+    }
+    if HTTPX_AVAILABLE:
+        results["shared_async_client"] = asyncio.run(run_async(args.url, args.requests, args.concurrency))
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "url": args.url,
+        "requests": args.requests,
+        "results": results,
+        "http_stats": get_http_stats()
+    }
+
+    print("=" * 80)
+    print(f"🌐 出站HTTP连接池基准（{args.url}，每种方式 {args.requests} 个请求）")
+    print("=" * 80)
+    print(f"{'方式':<24}{'p50':>12}{'p95':>12}{'合计':>14}")
+    for name, timing in results.items():
+        print(f"{name:<24}{timing['p50_ms']:>10.2f}ms{timing['p95_ms']:>10.2f}ms{timing['total_ms']:>12.2f}ms")
+    print(f"\nHTTP/2: {report['http_stats']['http2']}")
+    for host, stats in report["http_stats"]["hosts"].items():
+        print(f"{host}: {stats['requests']} 个请求, 新建连接 {stats['new_connections']}, "
+              f"复用率 {stats['reuse_ratio']}, p50 {stats['latency_ms']['p50']}ms")
+
+    output_path = Path("logs") / "http_pool_benchmark.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 报告已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
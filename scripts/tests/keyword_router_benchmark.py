@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+关键词路由微基准 - 对比逐组 `any(kw in query_lower ...)` 扫描与Aho-Corasick单次扫描
+查询集使用关键词路由黄金测试中的查询
+"""
+import sys
+import os
+import json
+import time
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.agent.keyword_router import ROUTING_FEATURES, keyword_automaton
+
+GOLDEN_PATH = Path(__file__).parent / "golden" / "keyword_routing_golden.json"
+ROUNDS = 200
+
+
+def naive_scan(query: str) -> int:
+    """原实现方式：每个关键词组重建列表并逐个子串匹配"""
+    query_lower = query.lower()
+    bits = 0
+    for i, keywords in enumerate(ROUTING_FEATURES.values()):
+        if any(kw in query_lower for kw in list(keywords)):
+            bits |= 1 << i
+    return bits
+
+
+def automaton_scan(query: str) -> int:
+    return keyword_automaton.scan_bits(query.lower())
+
+
+def bench(func, queries) -> float:
+    """返回每个查询的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - start) / (ROUNDS * len(queries)) * 1e6
+
+
+def main():
+    queries = [row["query"] for row in json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))]
+    mismatches = [q for q in queries if naive_scan(q) != automaton_scan(q)]
+
+    naive_us = bench(naive_scan, queries)
+    automaton_us = bench(automaton_scan, queries)
+    total_keywords = sum(len(v) for v in ROUTING_FEATURES.values())
+
+    print("=" * 80)
+    print("⚡ 关键词路由微基准")
+    print("=" * 80)
+    print(f"查询数: {len(queries)}，特征组: {len(ROUTING_FEATURES)}，关键词: {total_keywords}，"
+          f"自动机状态数: {keyword_automaton.num_states}")
+    print(f"逐组子串扫描:   {naive_us:8.2f} µs/查询")
+    print(f"Aho-Corasick:   {automaton_us:8.2f} µs/查询")
+    print(f"加速比: {naive_us / automaton_us:.1f}x")
+    print(f"结果一致: {'✅' if not mismatches else f'❌ {len(mismatches)} 个不一致'}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
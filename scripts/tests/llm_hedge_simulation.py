@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+LLM对冲请求模拟 - HedgeController（services/llm/hedging.py）
+
+不调用真实API：用asyncio.sleep模拟两个提供商的延迟分布（对数正态 + 一定比例的长尾慢请求），
+分别在不对冲和对冲两种方式下发出N个请求，比较延迟分位数、对冲比例和各提供商胜出次数。
+
+用法:
+    python scripts/tests/llm_hedge_simulation.py --requests 500 --slow-ratio 0.05
+"""
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.core.config import settings
+from services.llm.hedging import HedgeController
+
+
+def make_provider(name: str, rng: random.Random, median_ms: float, slow_ratio: float, slow_ms: float,
+                  time_scale: float):
+    """返回模拟提供商的协程函数（slow_ratio比例的请求耗时slow_ms）"""
+    async def call():
+        latency_ms = rng.lognormvariate(0, 0.35) * median_ms
+        if rng.random() < slow_ratio:
+            latency_ms = slow_ms
+        await asyncio.sleep(latency_ms / 1000 * time_scale)
+        return {"content": f"{name} answer", "simulated_ms": latency_ms}
+    return call
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 1)
+    return {"p50_ms": percentile(0.5), "p90_ms": percentile(0.9), "p99_ms": percentile(0.99),
+            "max_ms": round(latencies[-1], 1)}
+
+
+async def run(args, hedge: bool):
+    rng = random.Random(args.seed)
+    primary = make_provider("hkgai", rng, args.primary_median_ms, args.slow_ratio, args.slow_ms, args.time_scale)
+    secondary = make_provider("gemini", rng, args.secondary_median_ms, args.slow_ratio / 4, args.slow_ms,
+                              args.time_scale)
+    controller = HedgeController()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            if hedge:
+                await controller.call_async(("hkgai", primary), ("gemini", secondary))
+            else:
+                await primary()
+            latencies.append((time.perf_counter() - start) * 1000 / args.time_scale)
+
+    await asyncio.gather(*[one() for _ in range(args.requests)])
+    result = summarize(latencies)
+    if hedge:
+        stats = controller.stats()
+        result.update(hedge_rate=stats["hedge_rate"], budget_denied=stats["budget_denied"], wins=stats["wins"],
+                      final_delay_ms=round(controller.hedge_delay_ms("hkgai") / args.time_scale, 1))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM对冲请求模拟")
+    parser.add_argument("--requests", type=int, default=500, help="请求数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    parser.add_argument("--primary-median-ms", type=float, default=2500, help="主提供商延迟中位数（毫秒）")
+    parser.add_argument("--secondary-median-ms", type=float, default=3000, help="备用提供商延迟中位数（毫秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="主提供商长尾慢请求比例")
+    parser.add_argument("--slow-ms", type=float, default=25000, help="慢请求耗时（毫秒）")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="模拟时间缩放（0.01表示按1%%的真实时间运行）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    # 控制器按实际经过的时间计量，对冲延迟的上下限和初始值按同样比例缩放
+    for name in ("LLM_HEDGE_MIN_DELAY_MS", "LLM_HEDGE_MAX_DELAY_MS", "LLM_HEDGE_INITIAL_DELAY_MS"):
+        setattr(settings, name, getattr(settings, name) * args.time_scale)
+
+    results = {
+        "no_hedge": asyncio.run(run(args, hedge=False)),
+        "hedge": asyncio.run(run(args, hedge=True))
+    }
+    report = {"timestamp": datetime.now().isoformat(), "config": vars(args), "results": results}
+
+    print("=" * 80)
+    print(f"⚡ LLM对冲请求模拟（{args.requests} 个请求，主提供商慢请求比例 {args.slow_ratio:.0%}）")
+    print("=" * 80)
+    print(f"{'方式':<12}{'p50':>12}{'p90':>12}{'p99':>12}{'max':>12}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['p50_ms']:>10.0f}ms{result['p90_ms']:>10.0f}ms"
+              f"{result['p99_ms']:>10.0f}ms{result['max_ms']:>10.0f}ms")
+    hedge = results["hedge"]
+    print(f"\n对冲比例: {hedge['hedge_rate']:.1%}，预算拒绝: {hedge['budget_denied']}，"
+          f"最终对冲延迟: {hedge['final_delay_ms']}ms，胜出: {hedge['wins']}")
+
+    output_path = Path("logs") / "llm_hedge_simulation.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 报告已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
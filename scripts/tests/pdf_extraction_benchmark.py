@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PDF提取吞吐量基准 - 对比原实现（单进程整体提取后拼接）与逐页流式 + 进程池提取
+
+生成一个N页的合成PDF，测量：
+- 原实现：逐页提取、拼接成一个字符串，记录总耗时（拿到第一页文本的时间 = 总耗时）
+- PDFPageExtractor：进程数从1到CPU核数，记录 pages/sec 和拿到第一页的时间
+
+用法:
+    python scripts/tests/pdf_extraction_benchmark.py --pages 500
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import fitz
+from services.storage.pdf_extractor import PDFPageExtractor
+
+PARAGRAPH = (
+    "Retrieval-augmented generation combines a vector index with a language model. "
+    "Each page of this synthetic document contains several paragraphs of text so that "
+    "text extraction does a realistic amount of layout work per page. "
+)
+
+
+def make_pdf(path: Path, pages: int):
+    """生成每页若干段文字的合成PDF"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = f"Page {page_num + 1}\n\n" + "\n\n".join(PARAGRAPH * 2 for _ in range(8))
+        page.insert_textbox(fitz.Rect(40, 40, 555, 800), text, fontsize=8)
+    doc.save(str(path))
+    doc.close()
+
+
+def legacy_extract(path: Path) -> dict:
+    """原 _process_pdf：整体提取并拼接"""
+    start = time.perf_counter()
+    doc = fitz.open(str(path))
+    text_parts = []
+    for page_num in range(len(doc)):
+        text = doc[page_num].get_text()
+        if text.strip():
+            text_parts.append(f"[页面 {page_num + 1}]\n{text}")
+    doc.close()
+    full_text = "\n\n".join(text_parts)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "first_page_ms": elapsed * 1000, "chars": len(full_text)}
+
+
+def streaming_extract(path: Path, workers: int, pages_per_task: int) -> dict:
+    """逐页流式提取（进程池预先启动，不计入进程启动时间）"""
+    extractor = PDFPageExtractor(workers=workers, pages_per_task=pages_per_task, min_parallel_pages=1)
+    try:
+        if workers > 1:
+            # 预热：启动子进程
+            list(extractor.iter_pages(str(path)))
+        start = time.perf_counter()
+        first_page_ms = None
+        chars = 0
+        expected_page = 1
+        for page_num, text in extractor.iter_pages(str(path)):
+            if first_page_ms is None:
+                first_page_ms = (time.perf_counter() - start) * 1000
+            assert page_num == expected_page, f"页码乱序: {page_num} != {expected_page}"
+            expected_page += 1
+            chars += len(text)
+        return {"seconds": time.perf_counter() - start, "first_page_ms": first_page_ms, "chars": chars}
+    finally:
+        extractor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF提取吞吐量基准")
+    parser.add_argument("--pages", type=int, default=500, help="合成PDF的页数")
+    parser.add_argument("--pages-per-task", type=int, default=8, help="每个进程池任务的页数")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="测试的最大进程数")
+    args = parser.parse_args()
+
+    worker_counts = sorted({1, args.max_workers} | {n for n in (2, 4, 8, 16) if n < args.max_workers})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "benchmark.pdf"
+        make_pdf(pdf_path, args.pages)
+
+        legacy = legacy_extract(pdf_path)
+        runs = []
+        for workers in worker_counts:
+            result = streaming_extract(pdf_path, workers, args.pages_per_task)
+            runs.append({
+                "workers": workers,
+                "pages_per_sec": round(args.pages / result["seconds"], 1),
+                "first_page_ms": round(result["first_page_ms"], 1),
+                "speedup_vs_legacy": round(legacy["seconds"] / result["seconds"], 2)
+            })
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "pages": args.pages,
+        "pages_per_task": args.pages_per_task,
+        "cpu_count": os.cpu_count(),
+        "legacy": {
+            "pages_per_sec": round(args.pages / legacy["seconds"], 1),
+            "first_page_ms": round(legacy["first_page_ms"], 1)
+        },
+        "streaming": runs
+    }
+
+    print("=" * 80)
+    print(f"📄 PDF提取吞吐量（{args.pages} 页，CPU核数 {report['cpu_count']}）")
+    print("=" * 80)
+    print(f"{'实现':<16}{'pages/sec':>12}{'首页耗时(ms)':>16}{'加速':>10}")
+    print(f"{'原实现':<16}{report['legacy']['pages_per_sec']:>12}{report['legacy']['first_page_ms']:>16}{'1.0x':>10}")
+    for run in runs:
+        label = f"流式 {run['workers']} 进程"
+        print(f"{label:<16}{run['pages_per_sec']:>12}{run['first_page_ms']:>16}{str(run['speedup_vs_legacy']) + 'x':>10}")
+
+    output_path = Path("logs") / "pdf_extraction_benchmark.json"
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 结果已保存到: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
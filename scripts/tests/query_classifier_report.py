@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+查询分类器评估报告 - 对比本地分类器与当前关键词路由
+
+使用训练脚本缓存的标注（LLM规划器作为参考答案），默认只评估留出集，统计：
+- 是否调用LLM规划的判断准确率：关键词规则 vs 分类器 vs 线上组合策略（分类器置信度不足时交给LLM规划器）
+- 调用规划器次数、无效调用（规划器返回不需要工作流）、漏掉的工作流，以及估算节省的规划时间
+- 工具集合准确率（完全一致 / Jaccard）
+- 路由延迟（关键词规则 vs 分类器冷启动embedding vs 仅分类头）
+
+用法:
+    python scripts/tests/query_classifier_report.py              # 最新版本，留出集
+    python scripts/tests/query_classifier_report.py --version 2  # 指定版本
+    python scripts/tests/query_classifier_report.py --all        # 全部标注数据
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+from services.core.config import settings
+from services.core.cache import clear_cache
+from services.agent.agent import agent
+from services.agent.keyword_router import _scan_cached
+from services.agent.query_classifier import load_query_classifier
+from scripts.train_query_classifier import load_labels, is_holdout, model_dir
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def percentile(values, q) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def decision_stats(decisions, records, planning_ms: float) -> dict:
+    """是否调用规划器的判断统计"""
+    calls = sum(decisions)
+    return {
+        "accuracy": round(sum(d == r["requires_workflow"] for d, r in zip(decisions, records)) / len(records), 4),
+        "planner_calls": calls,
+        "wasted_planner_calls": sum(d and not r["requires_workflow"] for d, r in zip(decisions, records)),
+        "missed_workflows": sum(not d and r["requires_workflow"] for d, r in zip(decisions, records)),
+        "planner_time_s": round(calls * planning_ms / 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询分类器评估报告")
+    parser.add_argument("--version", type=int, default=0, help="模型版本（默认最新）")
+    parser.add_argument("--all", action="store_true", help="评估全部标注数据（默认只评估留出集）")
+    args = parser.parse_args()
+
+    classifier = load_query_classifier(str(model_dir()), args.version or None)
+    if classifier is None:
+        raise SystemExit("❌ 没有可用的分类器模型，请先运行 python scripts/train_query_classifier.py")
+
+    holdout_ratio = classifier.training.get("holdout_ratio", 0.2)
+    records = [r for r in load_labels().values() if args.all or is_holdout(r["query"], holdout_ratio)]
+    if not records:
+        raise SystemExit("❌ 没有可评估的标注数据")
+    planning_ms = float(np.mean([r["planning_ms"] for r in records]))
+    min_confidence = settings.QUERY_CLASSIFIER_MIN_CONFIDENCE
+
+    print("=" * 80)
+    print(f"🔎 查询分类器v{classifier.version}评估（{'全部' if args.all else '留出集'} {len(records)} 条，"
+          f"置信度阈值 {min_confidence}）")
+    print("=" * 80)
+
+    rows = []
+    for record in records:
+        query = record["query"]
+
+        _scan_cached.cache_clear()
+        start = time.perf_counter()
+        router_plan = agent._is_complex_query(query)
+        router_tools = agent.detect_question_type(query)
+        router_ms = (time.perf_counter() - start) * 1000
+
+        clear_cache("embedding")
+        start = time.perf_counter()
+        prediction = classifier.predict(query)
+        classifier_ms = (time.perf_counter() - start) * 1000
+
+        vector = classifier._query_vector(query)
+        start = time.perf_counter()
+        classifier.predict_vector(vector)
+        head_ms = (time.perf_counter() - start) * 1000
+
+        confident = prediction.confidence >= min_confidence
+        rows.append({
+            "query": query,
+            "label": {k: record[k] for k in ("requires_workflow", "workflow_type", "tools")},
+            "router": {"plan": router_plan, "tools": router_tools, "ms": router_ms},
+            "classifier": {**prediction.to_dict(), "ms": classifier_ms, "head_ms": head_ms},
+            "combined_plan": prediction.requires_workflow if confident else True
+        })
+
+    router_decisions = [r["router"]["plan"] for r in rows]
+    classifier_decisions = [r["classifier"]["requires_workflow"] for r in rows]
+    combined_decisions = [r["combined_plan"] for r in rows]
+    confident_rows = [r for r in rows if r["classifier"]["confidence"] >= min_confidence]
+    typed = [r for r in rows if r["label"]["requires_workflow"] and r["classifier"]["requires_workflow"]]
+
+    summary = {
+        "model_version": classifier.version,
+        "samples": len(rows),
+        "avg_planning_ms": round(planning_ms, 1),
+        "confident_ratio": round(len(confident_rows) / len(rows), 4),
+        "decision": {
+            "keyword_router": decision_stats(router_decisions, records, planning_ms),
+            "classifier": decision_stats(classifier_decisions, records, planning_ms),
+            "combined": decision_stats(combined_decisions, records, planning_ms)
+        },
+        "workflow_type_accuracy": round(sum(r["classifier"]["workflow_type"] == r["label"]["workflow_type"] for r in typed) / len(typed), 4) if typed else None,
+        "tools": {
+            "keyword_router_exact": round(np.mean([set(r["router"]["tools"]) == set(r["label"]["tools"]) for r in rows]), 4),
+            "classifier_exact": round(np.mean([set(r["classifier"]["tools"]) == set(r["label"]["tools"]) for r in rows]), 4),
+            "keyword_router_jaccard": round(np.mean([jaccard(r["router"]["tools"], r["label"]["tools"]) for r in rows]), 4),
+            "classifier_jaccard": round(np.mean([jaccard(r["classifier"]["tools"], r["label"]["tools"]) for r in rows]), 4)
+        },
+        "latency_ms": {
+            "keyword_router_p50": round(percentile([r["router"]["ms"] for r in rows], 50), 3),
+            "keyword_router_p95": round(percentile([r["router"]["ms"] for r in rows], 95), 3),
+            "classifier_p50": round(percentile([r["classifier"]["ms"] for r in rows], 50), 3),
+            "classifier_p95": round(percentile([r["classifier"]["ms"] for r in rows], 95), 3),
+            "classifier_head_p50": round(percentile([r["classifier"]["head_ms"] for r in rows], 50), 3)
+        }
+    }
+    saved = summary["decision"]["keyword_router"]["planner_time_s"] - summary["decision"]["combined"]["planner_time_s"]
+    summary["estimated_planner_time_saved_s"] = round(saved, 1)
+
+    print("\n📊 是否调用LLM规划（参考答案：规划器的requires_workflow）")
+    for name, stats in summary["decision"].items():
+        print(f"   {name:15s} 准确率 {stats['accuracy']:.1%} | 调用 {stats['planner_calls']} 次 "
+              f"(无效 {stats['wasted_planner_calls']}, 漏判 {stats['missed_workflows']}) | 规划耗时 {stats['planner_time_s']}s")
+    print(f"   分类器高置信度比例: {summary['confident_ratio']:.1%}")
+    print(f"   估算节省规划时间: {summary['estimated_planner_time_saved_s']}s（平均每次规划 {planning_ms / 1000:.1f}s）")
+    if summary["workflow_type_accuracy"] is not None:
+        print(f"   工作流类型准确率: {summary['workflow_type_accuracy']:.1%}")
+    print(f"\n🔧 工具集合: 关键词规则 完全一致 {summary['tools']['keyword_router_exact']:.1%} / Jaccard {summary['tools']['keyword_router_jaccard']:.3f}"
+          f" | 分类器 完全一致 {summary['tools']['classifier_exact']:.1%} / Jaccard {summary['tools']['classifier_jaccard']:.3f}")
+    latency = summary["latency_ms"]
+    print(f"\n⏱️  路由延迟: 关键词规则 p50 {latency['keyword_router_p50']:.3f}ms / p95 {latency['keyword_router_p95']:.3f}ms"
+          f" | 分类器 p50 {latency['classifier_p50']:.2f}ms / p95 {latency['classifier_p95']:.2f}ms"
+          f"（仅分类头 {latency['classifier_head_p50']:.3f}ms）")
+
+    errors = [r for r in rows if r["combined_plan"] != r["label"]["requires_workflow"]]
+    if errors:
+        print(f"\n⚠️  组合策略判断错误的查询（{len(errors)}）:")
+        for r in errors[:20]:
+            print(f"   label={r['label']['requires_workflow']} p={r['classifier']['workflow_probability']:.2f}: {r['query']}")
+
+    os.makedirs(PROJECT_ROOT / "logs", exist_ok=True)
+    report_path = PROJECT_ROOT / "logs" / f"query_classifier_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "rows": rows}, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 报告已保存: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+关键词路由黄金测试 - 确保Aho-Corasick路由与原有关键词扫描的路由结果完全一致
+
+黄金数据（golden/keyword_routing_golden.json）由改造前的实现对测试集问题生成，包含：
+- detect_question_type 返回的工具列表
+- _is_complex_query 判定
+- WorkflowEngine.detect_workflow_type 结果
+- execute / _execute_normal 中的查询类型标记
+
+用法：
+    python scripts/tests/test_keyword_routing_golden.py            # 校验
+    python scripts/tests/test_keyword_routing_golden.py --update   # 路由规则有意修改后重新生成
+"""
+import sys
+import os
+import json
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.agent.agent import RAGAgent
+from services.agent.workflow import WorkflowEngine
+from services.agent.workflow_langgraph import _detect_finance_comparison
+
+GOLDEN_PATH = Path(__file__).parent / "golden" / "keyword_routing_golden.json"
+
+
+def route(agent: RAGAgent, workflow_engine: WorkflowEngine, query: str) -> dict:
+    """计算一个查询的全部路由结果"""
+    return {
+        "query": query,
+        "tools": agent.detect_question_type(query),
+        "complex": agent._is_complex_query(query),
+        "workflow_type": workflow_engine.detect_workflow_type(query),
+        "execute_flags": agent._routing_flags(query),
+        "normal_flags": {k: v for k, v in agent._routing_flags(query, normal=True).items() if k != "historical"}
+    }
+
+
+def main():
+    # 只测试路由逻辑，不初始化工具和LLM工作流
+    agent = RAGAgent.__new__(RAGAgent)
+    workflow_engine = WorkflowEngine(tools={})
+    golden = json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+
+    if "--update" in sys.argv:
+        rows = [route(agent, workflow_engine, row["query"]) for row in golden]
+        GOLDEN_PATH.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 黄金数据已更新: {GOLDEN_PATH}（{len(rows)} 个查询）")
+        return
+
+    failures = []
+    for row in golden:
+        actual = route(agent, workflow_engine, row["query"])
+        # LangGraph引擎与自定义引擎的工作流检测规则一致
+        actual_langgraph = _detect_finance_comparison(row["query"])
+        for key in ("tools", "complex", "workflow_type", "execute_flags", "normal_flags"):
+            if actual[key] != row[key]:
+                failures.append((row["query"], key, row[key], actual[key]))
+        if actual_langgraph != row["workflow_type"]:
+            failures.append((row["query"], "langgraph_workflow_type", row["workflow_type"], actual_langgraph))
+
+    print("=" * 80)
+    print(f"🧭 关键词路由黄金测试: {len(golden)} 个查询")
+    print("=" * 80)
+    if failures:
+        for query, key, expected, actual in failures:
+            print(f"❌ {query!r} [{key}] 期望 {expected}，实际 {actual}")
+        print(f"\n失败: {len(failures)}")
+        sys.exit(1)
+    print("✅ 全部路由结果与黄金数据一致")
+
+
+if __name__ == "__main__":
+    main()
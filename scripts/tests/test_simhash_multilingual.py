@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SimHash多语言检查 - 确保非拉丁、非汉字文本也能得到有区分度的指纹（services/vector/dedup.py）
+
+检查：
+- 韩文、日文、俄文、阿拉伯文、泰文、希腊文、印地文等样本的指纹非空且互不相同，彼此不被判为近似重复
+- 同一段文字改动一个词后仍在阈值附近（比不相关文本近得多）
+- 提取不到特征的文本（空文本、纯标点）没有指纹，不进入LSH索引，也不会与其他结果互相判重
+- 删除文件的指纹后，指向它的关联被移除，相同内容可以重新索引
+
+用法：
+    python scripts/tests/test_simhash_multilingual.py
+"""
+import sys
+import os
+from itertools import combinations
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.vector.dedup import (
+    NO_FINGERPRINT, NearDuplicateIndex, compute_simhash, dedup_results, hamming_distance
+)
+
+THRESHOLD = 3
+
+SAMPLES = {
+    "korean": "서울은 대한민국의 수도이며 정치, 경제, 문화의 중심지입니다. 한강이 도시를 가로질러 흐릅니다.",
+    "korean_2": "부산은 대한민국 제2의 도시로 큰 항구와 해수욕장으로 유명합니다. 매년 국제영화제가 열립니다.",
+    "japanese": "東京は日本の首都であり、政治と経済の中心です。多くの人々が毎日電車で通勤しています。",
+    "japanese_kana": "きょうは とても いい てんき です。こうえんで さんぽを して、ともだちと ひるごはんを たべました。",
+    "russian": "Москва является столицей России и крупнейшим городом страны. Через город протекает река Москва.",
+    "russian_2": "Санкт-Петербург был основан Петром Первым в 1703 году и долгое время оставался столицей империи.",
+    "arabic": "القاهرة هي عاصمة مصر وأكبر مدنها، ويمر بها نهر النيل الذي يعد من أطول الأنهار في العالم.",
+    "thai": "กรุงเทพมหานครเป็นเมืองหลวงของประเทศไทยและเป็นศูนย์กลางทางเศรษฐกิจของประเทศ",
+    "greek": "Η Αθήνα είναι η πρωτεύουσα της Ελλάδας και μία από τις αρχαιότερες πόλεις του κόσμου.",
+    "hindi": "नई दिल्ली भारत की राजधानी है और यहाँ देश की संसद तथा कई सरकारी कार्यालय स्थित हैं।",
+    "chinese": "香港是一个国际金融中心，维多利亚港两岸的夜景非常有名。",
+    "english": "Hong Kong is an international financial centre known for the skyline of Victoria Harbour.",
+}
+
+# (原文样本, 改动一个词后的文本)
+NEAR_VARIANTS = {
+    "korean": "서울은 대한민국의 수도이며 정치, 경제, 문화의 중심지입니다. 한강이 도시를 가로질러 흐른다.",
+    "russian": "Москва является столицей России и крупнейшим городом страны. Через город течёт река Москва.",
+}
+
+EMPTY_TEXTS = ["", "   ", "……！？", "--- *** ---"]
+
+
+def main():
+    failures = []
+    fingerprints = {name: compute_simhash(text) for name, text in SAMPLES.items()}
+
+    for name, fingerprint in fingerprints.items():
+        if fingerprint == NO_FINGERPRINT:
+            failures.append(f"{name}: 没有提取到特征（指纹为空）")
+
+    for (a, fa), (b, fb) in combinations(fingerprints.items(), 2):
+        distance = hamming_distance(fa, fb)
+        if distance <= THRESHOLD:
+            failures.append(f"{a} 与 {b} 被判为近似重复（汉明距离 {distance}）")
+
+    for name, variant in NEAR_VARIANTS.items():
+        near = hamming_distance(fingerprints[name], compute_simhash(variant))
+        nearest_other = min(hamming_distance(fingerprints[name], f) for other, f in fingerprints.items() if other != name)
+        if near >= nearest_other:
+            failures.append(f"{name}: 改动一个词后的距离 {near} 不小于与其他文本的最小距离 {nearest_other}")
+
+    for text in EMPTY_TEXTS:
+        if compute_simhash(text) != NO_FINGERPRINT:
+            failures.append(f"{text!r}: 应没有指纹")
+
+    index = NearDuplicateIndex(threshold=THRESHOLD)
+    index.add("empty#c0", NO_FINGERPRINT)
+    if len(index) or index.find_duplicate(NO_FINGERPRINT) is not None:
+        failures.append("NO_FINGERPRINT 不应进入LSH索引或被匹配")
+    for name, fingerprint in fingerprints.items():
+        if index.find_duplicate(fingerprint) is not None:
+            failures.append(f"{name}: 在只有不同文本的索引中找到了重复")
+        index.add(f"{name}#c0", fingerprint)
+
+    # 删除规范chunk所在文件后，相同内容的重复chunk不再关联到它，新的上传也不再被判为重复
+    index.add("copy#c0", fingerprints["korean"])
+    index.link("copy#c0", "korean#c0")
+    index.remove_prefix("korean#")
+    if index.stats()["linked_duplicates"]:
+        failures.append("remove_prefix 后仍有指向已删除chunk的关联")
+    if index.find_duplicate(fingerprints["korean"]) != "copy#c0":
+        failures.append("删除原文件后，重复chunk没有成为新的规范chunk")
+    index.remove_prefix("copy#")
+    if index.find_duplicate(fingerprints["korean"]) is not None:
+        failures.append("删除全部副本后，相同内容仍被判为重复")
+
+    results = [{"text": text} for text in EMPTY_TEXTS + list(SAMPLES.values())]
+    kept = dedup_results(results, threshold=THRESHOLD)
+    if len(kept) != len(results):
+        failures.append(f"dedup_results 丢弃了不重复的结果: {len(results)} -> {len(kept)}")
+
+    print("=" * 80)
+    print(f"🔤 SimHash多语言检查: {len(SAMPLES)} 个样本")
+    print("=" * 80)
+    for name, fingerprint in fingerprints.items():
+        print(f"{name:<16}{fingerprint:016x}")
+    if failures:
+        print()
+        for failure in failures:
+            print(f"❌ {failure}")
+        print(f"\n失败: {len(failures)}")
+        sys.exit(1)
+    print("\n✅ 各语言样本的指纹非空且互不重复")
+
+
+if __name__ == "__main__":
+    main()
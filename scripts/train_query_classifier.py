@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+训练本地查询分类器（services/agent/query_classifier.py）
+
+1. 收集查询：测试集、扩展评估集、关键词路由golden集、logs/ 和 test_results/ 中记录的查询，以及 --queries 指定的文件
+2. 标注：以 LLMWorkflowPlanner 为教师模型得到 requires_workflow / workflow_type，
+   工具集合优先使用记录中的 expected_tools / tools_used，其次使用计划步骤中的工具，最后使用当前关键词路由。
+   标注结果缓存在 {QUERY_CLASSIFIER_DIR}/labels.jsonl，重复训练不会重复调用LLM
+3. 训练：共享embedding模型编码 + 三个逻辑回归头（numpy全批量梯度下降）
+4. 在留出集上评估，保存为新版本 query_classifier_v{N}.json（包含训练数据统计和评估指标）
+
+用法:
+    python scripts/train_query_classifier.py                       # 标注新查询并训练
+    python scripts/train_query_classifier.py --no-label            # 只使用已有标注训练
+    python scripts/train_query_classifier.py --queries queries.txt # 追加查询（每行一个，或JSONL中的query/question字段）
+"""
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+import numpy as np
+from services.core.config import settings
+from services.agent.query_classifier import (
+    ARTIFACT_FORMAT, QueryClassifier, artifact_path, list_artifact_versions, current_embedding_model_name
+)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+AGENT_TOOLS = ["local_rag", "web_search", "weather", "finance", "transport"]
+# LLM规划失败时 _create_simple_plan 返回的推理说明（这类结果不能作为标注）
+FALLBACK_REASONING_PREFIX = "LLM规划失败"
+
+
+def model_dir() -> Path:
+    path = Path(settings.QUERY_CLASSIFIER_DIR)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def labels_path() -> Path:
+    return model_dir() / "labels.jsonl"
+
+
+def is_holdout(query: str, ratio: float) -> bool:
+    """按查询文本哈希确定性地划分留出集（训练和报告使用同一划分）"""
+    bucket = int(hashlib.md5(query.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < ratio
+
+
+def _collect_records(obj, found: Dict[str, Optional[List[str]]]):
+    """从评估结果JSON中递归提取查询及记录的工具"""
+    if isinstance(obj, list):
+        for item in obj:
+            _collect_records(item, found)
+        return
+    if not isinstance(obj, dict):
+        return
+    query = obj.get("question") or obj.get("query")
+    if isinstance(query, str) and query.strip():
+        result = obj.get("result") if isinstance(obj.get("result"), dict) else {}
+        tools = obj.get("expected_tools") or obj.get("tools_used") or result.get("tools_used")
+        if found.get(query.strip()) is None:
+            found[query.strip()] = [t for t in tools if t in AGENT_TOOLS] if isinstance(tools, list) else None
+    for value in obj.values():
+        if isinstance(value, (dict, list)):
+            _collect_records(value, found)
+
+
+def collect_queries(extra_files: List[str]) -> Dict[str, Optional[List[str]]]:
+    """
+    收集训练查询
+
+    Returns:
+        查询 -> 记录中的工具列表（没有记录时为None）
+    """
+    from scripts.tests.test_all_sets_complete import TEST_SET_1, TEST_SET_2, TEST_SET_3
+    from scripts.tests.test_extended_evaluation import EXTENDED_TEST_QUESTIONS
+
+    found: Dict[str, Optional[List[str]]] = {}
+    _collect_records(TEST_SET_1 + TEST_SET_2 + TEST_SET_3 + EXTENDED_TEST_QUESTIONS, found)
+
+    golden_path = PROJECT_ROOT / "scripts" / "tests" / "golden" / "keyword_routing_golden.json"
+    if golden_path.exists():
+        with open(golden_path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                query = item["query"].strip()
+                if query:
+                    found.setdefault(query, None)
+
+    for pattern in ("logs/*.json", "test_results/*.json"):
+        for path in sorted(PROJECT_ROOT.glob(pattern)):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    _collect_records(json.load(f), found)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  跳过 {path}: {e}")
+
+    for extra in extra_files:
+        with open(extra, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    _collect_records(json.loads(line), found)
+                else:
+                    found.setdefault(line, None)
+
+    return found
+
+
+def load_labels() -> Dict[str, Dict]:
+    """读取已缓存的标注"""
+    labels = {}
+    path = labels_path()
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    labels[record["query"]] = record
+    return labels
+
+
+def label_queries(queries: Dict[str, Optional[List[str]]], labels: Dict[str, Dict]) -> int:
+    """用LLM规划器标注尚未标注的查询（逐条追加写入，中断后可继续）"""
+    from services.agent.agent import agent
+    from services.agent.workflow_llm_planner import LLMWorkflowPlanner
+
+    settings.PLAN_CACHE_ENABLED = False  # 标注需要每条查询的真实规划结果
+    planner = LLMWorkflowPlanner(AGENT_TOOLS)
+    pending = [q for q in queries if q not in labels]
+    print(f"🏷️  需要标注 {len(pending)} 条查询（已有 {len(labels)} 条）")
+
+    os.makedirs(model_dir(), exist_ok=True)
+    labeled = 0
+    with open(labels_path(), "a", encoding="utf-8") as f:
+        for i, query in enumerate(pending, 1):
+            start = time.time()
+            plan = planner.analyze_query(query)
+            planning_ms = (time.time() - start) * 1000
+            if plan.reasoning.startswith(FALLBACK_REASONING_PREFIX):
+                print(f"   [{i}/{len(pending)}] ⚠️  规划失败，跳过: {query}")
+                continue
+
+            plan_tools = [s.tool for s in plan.steps if s.tool in AGENT_TOOLS]
+            if queries[query] is not None:
+                tools, tools_source = queries[query], "recorded"
+            elif plan.requires_workflow and plan_tools:
+                tools, tools_source = list(dict.fromkeys(plan_tools)), "planner"
+            else:
+                tools, tools_source = agent.detect_question_type(query), "keyword_router"
+
+            record = {
+                "query": query,
+                "requires_workflow": bool(plan.requires_workflow),
+                "workflow_type": plan.workflow_type if plan.requires_workflow else None,
+                "tools": tools,
+                "tools_source": tools_source,
+                "planner_confidence": plan.confidence,
+                "planning_ms": round(planning_ms, 1)
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            labels[query] = record
+            labeled += 1
+            print(f"   [{i}/{len(pending)}] workflow={record['requires_workflow']} "
+                  f"type={record['workflow_type']} tools={tools} ({planning_ms / 1000:.1f}s): {query}")
+    return labeled
+
+
+def encode(queries: List[str]) -> np.ndarray:
+    """用检索器的embedding模型批量编码（归一化，与线上预测一致）"""
+    from services.vector.retriever import retriever
+    return np.asarray(
+        retriever.embedding_model.encode(queries, batch_size=64, show_progress_bar=True, normalize_embeddings=True),
+        dtype=np.float32
+    )
+
+
+def fit_sigmoid(X: np.ndarray, Y: np.ndarray, epochs: int, lr: float, l2: float, balance: bool = True):
+    """
+    训练独立的逻辑回归（二分类或多标签），返回(权重[d, k], 偏置[k])
+
+    balance=True 时按正负样本比例加权，避免少数类（如需要工作流）被忽略。
+    """
+    n, d = X.shape
+    k = Y.shape[1]
+    W = np.zeros((d, k), dtype=np.float32)
+    b = np.zeros(k, dtype=np.float32)
+    weights = np.ones_like(Y, dtype=np.float32)
+    if balance:
+        positives = Y.sum(axis=0).clip(1, n - 1)
+        weights = np.where(Y > 0, n / (2 * positives), n / (2 * (n - positives))).astype(np.float32)
+    for _ in range(epochs):
+        P = 1.0 / (1.0 + np.exp(-(X @ W + b)))
+        G = (P - Y) * weights / n
+        W -= lr * (X.T @ G + l2 * W)
+        b -= lr * G.sum(axis=0)
+    return W, b
+
+
+def fit_softmax(X: np.ndarray, y: np.ndarray, k: int, epochs: int, lr: float, l2: float):
+    """训练多分类逻辑回归，返回(权重[d, k], 偏置[k])"""
+    n, d = X.shape
+    W = np.zeros((d, k), dtype=np.float32)
+    b = np.zeros(k, dtype=np.float32)
+    Y = np.eye(k, dtype=np.float32)[y]
+    for _ in range(epochs):
+        Z = X @ W + b
+        Z -= Z.max(axis=1, keepdims=True)
+        P = np.exp(Z)
+        P /= P.sum(axis=1, keepdims=True)
+        G = (P - Y) / n
+        W -= lr * (X.T @ G + l2 * W)
+        b -= lr * G.sum(axis=0)
+    return W, b
+
+
+def evaluate(classifier: QueryClassifier, X: np.ndarray, records: List[Dict], min_confidence: float) -> Dict:
+    """在给定样本上评估分类器"""
+    if not records:
+        return {}
+    predictions = [classifier.predict_vector(x) for x in X]
+    workflow_correct = sum(p.requires_workflow == r["requires_workflow"] for p, r in zip(predictions, records))
+    confident = [(p, r) for p, r in zip(predictions, records) if p.confidence >= min_confidence]
+    typed = [(p, r) for p, r in zip(predictions, records) if r["requires_workflow"] and p.requires_workflow]
+    tools_exact = sum(set(p.tools) == set(r["tools"]) for p, r in zip(predictions, records))
+    return {
+        "samples": len(records),
+        "requires_workflow_accuracy": round(workflow_correct / len(records), 4),
+        "confident_ratio": round(len(confident) / len(records), 4),
+        "confident_accuracy": round(sum(p.requires_workflow == r["requires_workflow"] for p, r in confident) / len(confident), 4) if confident else None,
+        "workflow_type_accuracy": round(sum(p.workflow_type == r["workflow_type"] for p, r in typed) / len(typed), 4) if typed else None,
+        "tools_exact_match": round(tools_exact / len(records), 4)
+    }
+
+
+def train(labels: Dict[str, Dict], holdout: float, epochs: int, lr: float, l2: float) -> Dict:
+    """训练并返回模型字典"""
+    records = list(labels.values())
+    queries = [r["query"] for r in records]
+    print(f"🔢 编码 {len(queries)} 条查询...")
+    X_all = encode(queries)
+    test_mask = np.array([is_holdout(q, holdout) for q in queries])
+    X, train_records = X_all[~test_mask], [r for r, m in zip(records, test_mask) if not m]
+    X_test, test_records = X_all[test_mask], [r for r, m in zip(records, test_mask) if m]
+
+    y_workflow = np.array([[float(r["requires_workflow"])] for r in train_records], dtype=np.float32)
+    if y_workflow.sum() == 0 or y_workflow.sum() == len(train_records):
+        raise SystemExit("❌ 训练集中只有一种requires_workflow标注，无法训练（请补充查询后重试）")
+    W_workflow, b_workflow = fit_sigmoid(X, y_workflow, epochs, lr, l2)
+
+    type_labels = sorted({r["workflow_type"] for r in train_records if r["requires_workflow"] and r["workflow_type"]})
+    type_rows = [(x, type_labels.index(r["workflow_type"])) for x, r in zip(X, train_records)
+                 if r["requires_workflow"] and r["workflow_type"] in type_labels]
+    if type_rows:
+        W_type, b_type = fit_softmax(
+            np.asarray([x for x, _ in type_rows]), np.asarray([y for _, y in type_rows]), len(type_labels), epochs, lr, l2
+        )
+    else:
+        W_type, b_type = np.zeros((X.shape[1], 0), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    tool_labels = [t for t in AGENT_TOOLS if any(t in r["tools"] for r in train_records)]
+    y_tools = np.array([[float(t in r["tools"]) for t in tool_labels] for r in train_records], dtype=np.float32)
+    W_tools, b_tools = fit_sigmoid(X, y_tools, epochs, lr, l2)
+
+    versions = list_artifact_versions(str(model_dir()))
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": (versions[-1] if versions else 0) + 1,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "embedding_model": current_embedding_model_name(),
+        "dimension": int(X_all.shape[1]),
+        "training": {
+            "samples": len(train_records),
+            "holdout_samples": len(test_records),
+            "holdout_ratio": holdout,
+            "requires_workflow_positive": int(y_workflow.sum()),
+            "workflow_types": {label: sum(r["workflow_type"] == label for r in train_records) for label in type_labels},
+            "tools": {label: int(y_tools[:, i].sum()) for i, label in enumerate(tool_labels)},
+            "epochs": epochs,
+            "learning_rate": lr,
+            "l2": l2
+        },
+        "heads": {
+            "requires_workflow": {"weights": W_workflow[:, 0].round(6).tolist(), "bias": float(b_workflow[0])},
+            "workflow_type": {"labels": type_labels, "weights": W_type.round(6).tolist(), "bias": b_type.round(6).tolist()},
+            "tools": {"labels": tool_labels, "weights": W_tools.round(6).tolist(), "bias": b_tools.round(6).tolist(), "threshold": 0.5}
+        }
+    }
+
+    classifier = QueryClassifier(artifact)
+    artifact["metrics"] = {
+        "train": evaluate(classifier, X, train_records, settings.QUERY_CLASSIFIER_MIN_CONFIDENCE),
+        "holdout": evaluate(classifier, X_test, test_records, settings.QUERY_CLASSIFIER_MIN_CONFIDENCE)
+    }
+    return artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练本地查询分类器")
+    parser.add_argument("--queries", nargs="*", default=[], help="额外的查询文件（每行一个查询或JSONL）")
+    parser.add_argument("--no-label", action="store_true", help="不调用LLM标注新查询，只使用已有标注")
+    parser.add_argument("--holdout", type=float, default=0.2, help="留出集比例")
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--lr", type=float, default=2.0)
+    parser.add_argument("--l2", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🧠 训练本地查询分类器")
+    print("=" * 80)
+
+    labels = load_labels()
+    if not args.no_label:
+        queries = collect_queries(args.queries)
+        print(f"📚 收集到 {len(queries)} 条查询")
+        label_queries(queries, labels)
+
+    if len(labels) < 10:
+        raise SystemExit(f"❌ 标注数据太少（{len(labels)} 条），无法训练")
+
+    artifact = train(labels, args.holdout, args.epochs, args.lr, args.l2)
+    path = artifact_path(str(model_dir()), artifact["version"])
+    os.makedirs(model_dir(), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False)
+
+    print("\n📊 评估结果")
+    for split, metrics in artifact["metrics"].items():
+        print(f"   {split}: {json.dumps(metrics, ensure_ascii=False)}")
+    print(f"\n💾 模型已保存: {path}（v{artifact['version']}）")
+    print("   运行 python scripts/tests/query_classifier_report.py 与当前关键词路由对比")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,12 +49,11 @@ ls -lh "$DOCS_DIR" | tail -n +2
 
 echo ""
 echo "⚠️  注意："
-echo "1. Markdown文件需要先转换为PDF才能使用当前的ingest.py"
-echo "2. 或者你可以修改ingest.py支持直接读取Markdown文件"
-echo "3. 你可以手动添加更多文档到 $DOCS_DIR/ 目录"
+echo "1. scripts/ingest.py 支持 PDF、Markdown、TXT、DOCX 等格式"
+echo "2. 你可以手动添加更多文档到 $DOCS_DIR/ 目录"
 echo ""
 echo "下一步："
 echo "1. 将其他需要的PDF文档放入 $DOCS_DIR/ 目录"
-echo "2. 运行: python scripts/utils/ingest.py"
+echo "2. 运行: python scripts/ingest.py $DOCS_DIR/"
 echo "3. 或者使用API上传文件: curl -X POST http://localhost:8000/api/upload"
 
@@ -4,15 +4,26 @@
 新增：动态工作流支持（多步骤查询）
 - LLM驱动的智能工作流规划（优先）
 - 基于规则的工作流模板（Fallback）
+
+execute_async 是主实现（工具和LLM调用走异步HTTP，不阻塞FastAPI事件循环），execute 是它的同步封装。
+传入 emit 回调时，工具/工作流事件在生成答案前发出，最终答案逐个增量以 "token" 事件流式发出。
 """
-from typing import Dict, List, Optional
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from services.llm.unified_client import unified_llm_client
-from services.agent.tools.local_rag_tool import get_local_knowledge_context
-from services.agent.tools.web_search_tool import get_web_search_context
-from services.agent.tools.weather_tool import get_weather_context
-from services.agent.tools.finance_tool import get_finance_context
-from services.agent.tools.transport_tool import get_transport_context
-from services.agent.workflow import WorkflowEngine, get_workflow_engine
+from services.core.config import settings
+from services.core.http_client import run_sync
+from services.vector.context_packer import get_context_packer
+from services.agent.tools.local_rag_tool import get_local_knowledge_context, get_local_knowledge_context_async
+from services.agent.tools.web_search_tool import get_web_search_context, get_web_search_context_async
+from services.agent.tools.weather_tool import get_weather_context, get_weather_context_async, extract_location
+from services.agent.tools.finance_tool import get_finance_context, get_finance_context_async
+from services.agent.tools.transport_tool import get_transport_context, get_transport_context_async
+from services.agent.workflow import RULE_WORKFLOW_TYPES, WorkflowEngine, get_workflow_engine
+from services.agent.keyword_router import get_query_features
+from services.agent.tool_executor import ToolBatch, get_tool_executor
+from services.agent.tool_cache import get_tool_cache
+from services.agent.query_classifier import QueryPrediction, get_query_classifier
 from services.core.logger import logger
 import re
 
@@ -41,6 +52,17 @@ except ImportError:
     get_llm_workflow_planner = None
     get_dynamic_workflow_engine = None
 
+# 事件回调: emit(事件名, 数据)
+EmitCallback = Callable[[str, Dict], Awaitable[None]]
+
+
+def _llm_timing(llm_result: Dict) -> Optional[Dict]:
+    """LLM耗时和给出答案的提供商（流式时含首token耗时，对冲请求时含hedged）"""
+    if "latency_ms" not in llm_result:
+        return None
+    return {"ttft_ms": llm_result.get("ttft_ms"), "latency_ms": llm_result["latency_ms"],
+            "provider": llm_result.get("provider"), "hedged": llm_result.get("hedged", False)}
+
 
 class RAGAgent:
     """RAG Agent - 根据问题类型智能选择工具（支持多种工具）"""
@@ -53,6 +75,18 @@ class RAGAgent:
             "finance": get_finance_context,
             "transport": get_transport_context
         }
+        # 异步版本（execute_async 路径使用）
+        self.async_tools = {
+            "local_rag": get_local_knowledge_context_async,
+            "web_search": get_web_search_context_async,
+            "weather": get_weather_context_async,
+            "finance": get_finance_context_async,
+            "transport": get_transport_context_async
+        }
+        if settings.TOOL_CACHE_ENABLED:
+            # 外部工具走结果缓存（工作流引擎也使用同一注册表，同步和异步版本共用缓存条目）
+            self.async_tools = get_tool_cache().wrap_async(self.async_tools, self.tools)
+            self.tools = get_tool_cache().wrap(self.tools)
         
         # 初始化LLM驱动的工作流系统（优先）
         self.llm_planner = None
@@ -61,7 +95,7 @@ class RAGAgent:
             try:
                 tool_names = list(self.tools.keys())
                 self.llm_planner = get_llm_workflow_planner(tool_names)
-                self.dynamic_engine = get_dynamic_workflow_engine(self.tools)
+                self.dynamic_engine = get_dynamic_workflow_engine(self.tools, self.async_tools)
                 logger.info("✨ 使用LLM驱动的智能工作流系统")
             except Exception as e:
                 logger.warning(f"LLM工作流系统初始化失败: {e}")
@@ -90,42 +124,33 @@ class RAGAgent:
         Returns:
             工具名称列表（如果返回空列表，表示直接调用LLM不使用任何工具）
         """
-        query_lower = query.lower()
+        features = get_query_features(query)
         tools = []
         
         # 🌐 翻译/语言学习问题 - 直接用LLM，不需要任何工具
-        translation_keywords = [
-            "怎么说", "怎么读", "发音", "翻译", "用粤语", "用普通话", "用英文",
-            "how to say", "how do you say", "pronounce", "pronunciation", 
-            "translation", "translate", "in cantonese", "in english", "in chinese"
-        ]
-        if any(keyword in query_lower for keyword in translation_keywords):
+        if features.has("translation"):
             logger.info("🌐 检测到翻译/语言学习问题，直接调用LLM（不使用RAG）")
             return []  # 空列表表示不使用任何工具
         
         # 检测历史时间关键词（昨天、上周、上月等）
         # 历史查询通常需要web_search，因为实时工具可能不支持历史数据
-        historical_keywords = ["yesterday", "昨天", "last week", "上周", "last month", "上月", "past", "过去", "以前", "之前"]
-        is_historical_query = any(kw in query_lower for kw in historical_keywords)
+        is_historical_query = features.has("historical")
         
         # 检测金融查询
-        if any(kw in query_lower for kw in ["stock", "股票", "price", "股价", "crypto", "加密货币", "bitcoin", "btc", "ethereum", "eth"]):
+        if features.has("finance_tool"):
             tools.append("finance")
         
         # 检测交通查询 → 使用web_search获取实时路线信息
-        if any(kw in query_lower for kw in ["怎么去", "怎么到", "如何去", "如何到", "从", "到", "travel", "route", "路线", "how to get", "how long"]):
+        if features.has("transport_tool"):
             if "web_search" not in tools:
                 tools.append("web_search")
                 logger.info("检测到交通查询，使用web_search获取路线信息")
         
         # 检测天气查询 - 优先使用weather API（更快更准确）
         # 注意：如果是历史天气查询或未来天气，应该使用web_search而不是weather工具
-        weather_keywords = ["weather", "天气", "rain", "下雨", "temperature", "温度", 
-                           "forecast", "预报", "cloud", "云", "怎麼樣", "怎么样", "今天", "now", "现在"]
-        future_keywords = ["tomorrow", "明天", "next week", "下周", "will", "会不会", "會不會"]
-        is_future_query = any(kw in query_lower for kw in future_keywords)
+        is_future_query = features.has("future")
         
-        if any(kw in query_lower for kw in weather_keywords):
+        if features.has("weather_tool"):
             if is_historical_query or is_future_query:
                 # 历史/未来天气查询：使用web_search（weather工具只支持当前天气）
                 tools.append("web_search")
@@ -137,10 +162,7 @@ class RAGAgent:
         
         # 检测实时/新闻查询（需要网页搜索）
         # ⚠️ 排除已经有工具的查询（避免重复）
-        news_keywords = ["latest", "最新", "news", "新闻", "recently", "最近", 
-                        "now", "现在", "目前", "当前", "currently", "懸掛", "悬挂", 
-                        "开放", "关闭", "营业", "运营", "警告", "信号", "signal", "warning"]
-        if any(kw in query_lower for kw in news_keywords):
+        if features.has("news"):
             # 如果没有其他工具，使用web_search
             if not tools:
                 tools.append("web_search")
@@ -148,41 +170,19 @@ class RAGAgent:
         
         # 检测需要网页搜索的实体查询（如"香港第二大学校"）
         # 这类查询通常包含地名 + 实体描述 + 排名/比较词
-        web_search_indicators = [
-            "largest", "最大", "biggest", "second", "第二", "third", "第三",
-            "best", "最好", "worst", "最差", "top", "排名", "排行",
-            "famous", "著名", "popular", "流行", "well-known", "知名"
-        ]
-        if any(indicator in query_lower for indicator in web_search_indicators):
+        if features.has("web_search_indicator"):
             if "web_search" not in tools:
                 tools.insert(0, "web_search")  # 优先使用web_search
                 logger.info("检测到实体排名/比较查询，优先使用web_search")
         
         # 检测是否需要本地RAG（知识库相关的问题 + 技术概念 + 学术机构）
-        local_kb_indicators = [
-            # 项目相关
-            "project", "项目", "system", "系统", "architecture", "架构",
-            "sereleia", "aetherian", "xylos", "elara",  # 虚构知识库内容
-            "workflow", "工作流", "agent", "这个系统", "本项目", "我们的",
-            # 技术术语 - 优先使用本地知识库
-            "rag", "retrieval", "augmented", "generation", "检索增强",
-            "embedding", "嵌入", "向量", "vector", "milvus",
-            "rerank", "重排", "cross-encoder", "bi-encoder",
-            "chunk", "分块", "索引", "index", "llm", "大模型", "大语言模型",
-            "nlp", "自然语言处理", "transformer", "attention", "注意力",
-            # 学术机构
-            "hkust", "科技大学", "港科大", "清水湾", "university", "大学",
-            "college", "学院", "campus", "校园"
-        ]
-        if not tools and any(indicator in query_lower for indicator in local_kb_indicators):
+        if not tools and features.has("local_kb"):
             tools.append("local_rag")
             logger.info("检测到本地知识库/技术概念/学术查询，使用local_rag")
         
         # 检测地点查询 - 学术机构相关的优先使用local_rag
-        location_question_indicators = ["在哪", "哪里", "位于", "located", "where is", "location"]
-        academic_terms = ["大学", "university", "学院", "college", "hkust", "科技大学", "港科大", "学校", "school"]
-        if not tools and any(indicator in query_lower for indicator in location_question_indicators):
-            if any(term in query_lower for term in academic_terms):
+        if not tools and features.has("location_question"):
+            if features.has("academic"):
                 tools.append("local_rag")
                 logger.info("检测到学术机构地点查询，使用local_rag")
             else:
@@ -190,25 +190,15 @@ class RAGAgent:
                 logger.info("检测到一般地点查询，使用web_search")
         
         # 检测常识问题（应该direct_llm，不需要web_search）
-        common_knowledge_keywords = [
-            "capital", "首都", "president", "总统", "famous", "著名",
-            "olympic", "奥运", "world cup", "世界杯", "wrote", "写了",
-            "invented", "发明", "discovered", "发现"
-        ]
-        is_common_knowledge = any(kw in query_lower for kw in common_knowledge_keywords)
+        is_common_knowledge = features.has("common_knowledge")
         
         # 检测一般疑问（优先web_search获取准确答案）
         # 注意：只有在没有匹配到local_rag时才使用web_search
-        question_indicators = ["什么是", "谁是", "为什么", "怎样", "如何",
-                              "what is", "who is", "why", "how does", "how to"]
-        # 排除已经被local_rag处理的查询
-        if not tools and any(indicator in query_lower for indicator in question_indicators):
-            # 再次检查是否包含技术术语（避免误判）
-            tech_terms = ["rag", "embedding", "vector", "llm", "nlp", "transformer", "大学", "university", "milvus"]
+        if not tools and features.has("question"):
             # 如果是常识问题，不使用web_search
             if is_common_knowledge:
                 logger.info("检测到常识问题，直接使用LLM")
-            elif not any(term in query_lower for term in tech_terms):
+            elif not features.has("tech_term"):
                 tools.append("web_search")
                 logger.info("检测到一般疑问，使用web_search获取答案")
             else:
@@ -223,33 +213,7 @@ class RAGAgent:
     
     def extract_location(self, query: str) -> Optional[str]:
         """从查询中提取地点信息"""
-        query_lower = query.lower()
-        
-        # 常见地点映射
-        common_locations = {
-            "hong kong": "Hong Kong",
-            "香港": "Hong Kong",
-            "beijing": "Beijing",
-            "北京": "Beijing",
-            "shanghai": "Shanghai",
-            "上海": "Shanghai",
-            "shenzhen": "Shenzhen",
-            "深圳": "Shenzhen",
-            "guangzhou": "Guangzhou",
-            "广州": "Guangzhou",
-            "taipei": "Taipei",
-            "台北": "Taipei",
-            "tokyo": "Tokyo",
-            "东京": "Tokyo",
-            "new york": "New York",
-            "london": "London"
-        }
-        
-        for key, value in common_locations.items():
-            if key in query_lower:
-                return value
-        
-        return None
+        return extract_location(query)
     
     def _is_complex_query(self, query: str) -> bool:
         """
@@ -257,27 +221,8 @@ class RAGAgent:
         
         简单查询直接使用规则路由，节省~13秒LLM调用时间
         """
-        query_lower = query.lower()
-        
-        # 复杂查询关键词
-        complex_keywords = [
-            # 比较类
-            "比较", "compare", "对比", "差异", "difference", "vs", "versus", "哪个更", "which is better",
-            "邊個", "边个", "更高", "更低", "更好", "更差",
-            # 分析类
-            "分析", "analyze", "analysis", "評估", "评估", "evaluate", "解释为什么", "explain why",
-            "為什麼", "为什么", "原因", "reason",
-            # 计算类
-            "计算", "calculate", "總共", "总共", "total", "加起来", "sum up", "相加", "相减",
-            # 多步骤类
-            "然后", "接着", "之后", "先...再", "first...then", "步驟", "步骤", "step",
-            "接住", "跟住", "跟着",
-            # 综合类
-            "综合", "整合", "combine", "一起", "together", "同時", "同时", "both", "埋一齊"
-        ]
-        
         # 检测是否包含复杂关键词
-        has_complex_keyword = any(kw in query_lower for kw in complex_keywords)
+        has_complex_keyword = get_query_features(query).has("complex")
         
         # 检测是否包含多个问句（多个问号或多个疑问词）
         question_marks = query.count("？") + query.count("?")
@@ -292,8 +237,206 @@ class RAGAgent:
         
         return is_complex
     
+    def _classify_query(self, query: str) -> Optional[QueryPrediction]:
+        """
+        用本地分类器预测查询路由（几毫秒，代替LLM规划做是否需要工作流的判断）
+        
+        Returns:
+            预测结果（调用方按置信度决定是否采用）；分类器不可用时返回None（调用方回退到关键词规则）
+        """
+        classifier = get_query_classifier()
+        if classifier is None:
+            return None
+        try:
+            prediction = classifier.predict(query)
+        except Exception as e:
+            logger.warning(f"查询分类失败: {e}，使用关键词规则")
+            return None
+        
+        logger.info(f"🔎 查询分类: 需要工作流={prediction.requires_workflow} (置信度 {prediction.confidence:.2f}), "
+                    f"类型={prediction.workflow_type}, 工具={prediction.tools}, 耗时 {prediction.elapsed_ms:.1f}ms")
+        return prediction
+    
+    def _rule_workflow_type(self, query: str, prediction: Optional[QueryPrediction]) -> Optional[str]:
+        """
+        确定基于规则的工作流类型
+        
+        分类器高置信度时直接采用预测：预测不需要工作流时不再做关键词检测，预测的类型有规则模板时直接使用；
+        预测的是规则引擎没有的类型（规划器的类型如 multi_step_research）或没有预测时，使用关键词检测。
+        
+        Args:
+            query: 用户问题
+            prediction: 高置信度的分类结果，None表示没有可用的预测
+        """
+        if prediction is not None:
+            if not prediction.requires_workflow:
+                return None
+            if prediction.workflow_type in RULE_WORKFLOW_TYPES:
+                return prediction.workflow_type
+        return self.workflow_engine.detect_workflow_type(query)
+    
+    def _routing_flags(self, query: str, normal: bool = False) -> Dict[str, bool]:
+        """
+        计算工具调用阶段的查询类型标记（execute 和 _execute_normal 共用）
+        
+        Args:
+            query: 用户问题
+            normal: 是否为 _execute_normal 的判定方式（天气不含口语词，实时查询不排除其他类型）
+            
+        Returns:
+            包含 historical/weather/finance/transport/realtime 的标记字典
+        """
+        features = get_query_features(query)
+        is_weather_query = features.has("weather_query") or (not normal and features.has("weather_query_colloquial"))
+        is_finance_query = features.has("finance_query")
+        is_transport_query = features.has("transport_query")
+        is_realtime_query = features.has("realtime_query")
+        if not normal:
+            # 实时查询：只有在没有特定工具（weather/finance/transport）时才使用web_search
+            is_realtime_query = is_realtime_query and not (is_weather_query or is_finance_query or is_transport_query)
+        return {
+            "historical": features.has("historical"),
+            "weather": is_weather_query,
+            "finance": is_finance_query,
+            "transport": is_transport_query,
+            "realtime": is_realtime_query
+        }
+    
+    def _launch_tools(
+        self,
+        query: str,
+        tools_to_use: List[str],
+        skip_weather: bool = False,
+        batch: Optional[ToolBatch] = None,
+        use_async: bool = False
+    ) -> ToolBatch:
+        """
+        同时提交所有选中的工具调用（调用方按优先级顺序取结果）
+        
+        Args:
+            query: 用户问题
+            tools_to_use: 按优先级排序的工具列表
+            skip_weather: 是否跳过weather工具（历史天气查询改用web_search）
+            batch: 已有的批次（如规划期间推测执行的批次，已提交的工具不会重复调用）
+            use_async: 是否作为asyncio任务提交异步版本（execute_async路径，调用方用aget取结果）
+            
+        Returns:
+            ToolBatch 本次请求的工具调用批次
+        """
+        # 只有一个工具时没有并发收益，直接在取结果时同步调用（异步任务总是并发的）
+        parallel = use_async or (settings.AGENT_TOOL_PARALLEL and len(tools_to_use) > 1)
+        if batch is None:
+            batch = get_tool_executor().batch(parallel=parallel)
+        
+        def submit(tool_name, *args, **kwargs):
+            if use_async:
+                batch.submit_async(tool_name, self.async_tools[tool_name], *args, **kwargs)
+            else:
+                batch.submit(tool_name, self.tools[tool_name], *args, **kwargs)
+        
+        for tool_name in tools_to_use:
+            if tool_name in ("finance", "transport", "web_search"):
+                submit(tool_name, query, num_results=3)
+            elif tool_name == "weather" and not skip_weather:
+                submit(tool_name, self.extract_location(query) or "Hong Kong")
+            elif tool_name == "local_rag":
+                submit(tool_name, query)
+        if parallel and len(tools_to_use) > 1:
+            logger.info(f"🚀 并发调用工具: {', '.join(tools_to_use)}")
+        return batch
+    
+    def _speculate_tools(self, query: str, prediction: Optional[QueryPrediction]) -> Optional[ToolBatch]:
+        """
+        LLM规划期间，按分类器/规则路由预测的工具先行调用（推测执行）
+        
+        规划完成后，工具和参数一致的步骤直接复用结果，其余调用被取消。
+        
+        Returns:
+            推测执行的批次；未启用或没有预测到工具时返回None
+        """
+        if not (settings.AGENT_SPECULATIVE_TOOLS and settings.AGENT_TOOL_PARALLEL):
+            return None
+        tools = prediction.tools if prediction else self.detect_question_type(query)
+        tools = [tool for tool in tools if tool in self.tools]
+        if not tools:
+            return None
+        batch = self._launch_tools(query, tools, batch=get_tool_executor().batch(parallel=True), use_async=True)
+        batch.mark_speculative()
+        logger.info(f"🔮 规划期间推测执行工具: {', '.join(tools)}")
+        return batch
+    
+    def _finish_speculation(self, batch: Optional[ToolBatch]) -> Optional[Dict]:
+        """结束推测执行（取消未用到的调用），返回命中统计"""
+        if batch is None:
+            return None
+        return get_tool_executor().finish_speculation(batch)
+    
+    def _pack_contexts(self, contexts: List[str]) -> Tuple[str, Optional[Dict]]:
+        """
+        把多个工具的上下文合并并控制在Agent总token预算内
+        
+        Args:
+            contexts: 各工具返回的上下文（已带标签，按优先级排序）
+            
+        Returns:
+            (合并后的上下文, 打包统计)，未启用打包时统计为None
+        """
+        if not settings.CONTEXT_PACKING_ENABLED:
+            return "\n\n".join(contexts), None
+        packed = get_context_packer().pack(
+            [{"text": context} for context in contexts],
+            settings.AGENT_CONTEXT_TOKEN_BUDGET
+        )
+        return packed.text, packed.stats()
+    
+    async def _generate_answer(self, system_prompt: str, user_prompt: str, model: Optional[str],
+                               emit: Optional[EmitCallback] = None) -> Dict:
+        """
+        调用LLM生成最终答案（默认使用HKGAI；传入emit时流式生成，每个增量发出 "token" 事件）
+        
+        Returns:
+            与 unified_llm_client.chat_async 相同格式的结果（流式时另有 ttft_ms / latency_ms）
+        """
+        if emit is None:
+            return await unified_llm_client.chat_async(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                max_tokens=2048,
+                temperature=0.7,
+                model=model,  # 如果指定了Gemini模型，会自动使用Gemini
+                provider="hkgai"  # Agent默认使用HKGAI
+            )
+        result = {"error": "LLM没有返回结果"}
+        async for event in unified_llm_client.chat_stream_async(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            max_tokens=2048,
+            temperature=0.7,
+            model=model,
+            provider="hkgai"
+        ):
+            if event["type"] == "delta":
+                await emit("token", {"text": event["text"]})
+            else:
+                result = {key: value for key, value in event.items() if key != "type"}
+        return result
+    
     def execute(self, query: str, model: Optional[str] = None) -> Dict:
         """
+        执行Agent推理（execute_async 的同步封装，供脚本和同步代码使用）
+        
+        Args:
+            query: 用户问题
+            model: 可选的模型名称
+            
+        Returns:
+            包含答案、使用的工具和上下文的字典
+        """
+        return run_sync(self.execute_async(query, model))
+    
+    async def execute_async(self, query: str, model: Optional[str] = None,
+                            emit: Optional[EmitCallback] = None) -> Dict:
+        """
         执行Agent推理，选择合适的工具并获取答案
         支持动态工作流（多步骤查询）
         
@@ -305,44 +448,71 @@ class RAGAgent:
         Args:
             query: 用户问题
             model: 可选的模型名称
+            emit: 可选的事件回调（流式接口使用）：先发出 "tools" / "workflow" 事件，再逐个发出答案的 "token" 事件
             
         Returns:
-            包含答案、使用的工具和上下文的字典
+            包含答案、使用的工具和上下文的字典（流式生成时 llm_timing 含首token耗时）
         """
-        # 0. 智能判断：只对复杂查询使用LLM工作流规划（节省90%查询的13秒）
-        if self.llm_planner and self.dynamic_engine and self._is_complex_query(query):
+        # 0. 智能判断：只对需要工作流的查询使用LLM工作流规划（节省90%查询的13秒）
+        #    本地分类器置信度足够时由它判断，置信度不足时交给LLM规划器判断；分类器不可用时沿用关键词规则
+        #    （分类器要计算embedding，放到线程池避免阻塞事件循环）
+        prediction = await asyncio.to_thread(self._classify_query, query)
+        if prediction is None:
+            needs_planning = self._is_complex_query(query)
+        elif prediction.confidence >= settings.QUERY_CLASSIFIER_MIN_CONFIDENCE:
+            needs_planning = prediction.requires_workflow
+        else:
+            logger.info(f"🔎 查询分类置信度不足 ({prediction.confidence:.2f})，交给LLM规划器判断")
+            needs_planning = True
+            prediction = None
+        speculative = None
+        if self.llm_planner and self.dynamic_engine and needs_planning:
+            # 规划期间先调用预测的工具，规划完成后复用参数一致的结果
+            speculative = self._speculate_tools(query, prediction)
             try:
                 logger.info("🧠 启用LLM驱动的工作流规划...")
-                plan = self.llm_planner.analyze_query(query)
+                plan = await self.llm_planner.analyze_query_async(query)
                 
                 # 检查是否需要工作流且置信度足够
                 if plan.requires_workflow and plan.confidence >= 0.4:
                     logger.info(f"✅ LLM规划成功 (置信度: {plan.confidence:.2f}), 使用动态工作流")
-                    return self._execute_llm_workflow(query, model, plan)
+                    return await self._execute_llm_workflow(query, model, plan, speculative, emit)
                 else:
                     logger.info(f"ℹ️  LLM认为不需要工作流 (置信度: {plan.confidence:.2f}), 使用规则引擎")
             except Exception as e:
                 logger.warning(f"⚠️  LLM工作流规划失败: {e}, 回退到规则引擎")
         
-        # 1. 回退到基于规则的工作流检测
-        workflow_type = self.workflow_engine.detect_workflow_type(query)
+        # 1. 回退到基于规则的工作流（分类器高置信度时直接使用预测的工作流类型）
+        workflow_type = self._rule_workflow_type(query, prediction)
         if workflow_type:
             logger.info(f"📋 规则引擎检测到工作流: {workflow_type}")
-            return self._execute_rule_based_workflow(query, model, workflow_type)
+            self._finish_speculation(speculative)
+            # 基于规则的工作流引擎（含LangGraph）是同步实现，在线程池中执行（答案不流式输出）
+            result = await asyncio.to_thread(self._execute_rule_based_workflow, query, model, workflow_type)
+            if emit is not None:
+                await emit("workflow", {
+                    "workflow_type": workflow_type,
+                    "workflow_engine": result.get("workflow_engine", "rule_based"),
+                    "tools_used": result.get("tools_used", [])
+                })
+            return result
         
         # 1. 检测问题类型，决定使用哪些工具（原有逻辑）
-        tools_to_use = self.detect_question_type(query)
+        if prediction and settings.QUERY_CLASSIFIER_ROUTE_TOOLS:
+            tools_to_use = prediction.tools
+            logger.info(f"🔎 使用分类器预测的工具: {tools_to_use}")
+        else:
+            tools_to_use = self.detect_question_type(query)
         
         # 如果返回空列表，表示直接调用LLM（如翻译问题）
         if not tools_to_use:
             logger.info("⚡ 直接调用LLM，不使用任何工具")
-            llm_result = unified_llm_client.chat(
-                system_prompt="你是一个专业的AI助手，擅长语言翻译和教学。请直接、简洁地回答用户的问题。",
-                user_prompt=query,
-                max_tokens=2048,
-                temperature=0.7,
-                model=model,
-                provider="hkgai"
+            self._finish_speculation(speculative)
+            if emit is not None:
+                await emit("tools", {"tools_used": ["direct_llm"], "tool_timings": None})
+            llm_result = await self._generate_answer(
+                "你是一个专业的AI助手，擅长语言翻译和教学。请直接、简洁地回答用户的问题。",
+                query, model, emit
             )
             
             answer = llm_result.get("content", "无法生成答案")
@@ -364,7 +534,8 @@ class RAGAgent:
                 "contexts_count": 0,
                 "has_context": False,
                 "tokens": tokens_info,
-                "model": llm_result.get("model")
+                "model": llm_result.get("model"),
+                "llm_timing": _llm_timing(llm_result)
             }
         
         # 2. 按优先级收集上下文
@@ -372,29 +543,31 @@ class RAGAgent:
         tools_used = []
         
         # 对于特定类型的问题，只使用对应的工具（不fallback）
-        query_lower = query.lower()
-        
-        # 检测历史时间关键词
-        historical_keywords = ["yesterday", "昨天", "last week", "上周", "last month", "上月", "past", "过去", "以前", "之前"]
-        is_historical_query = any(kw in query_lower for kw in historical_keywords)
-        
-        is_weather_query = any(kw in query_lower for kw in ["weather", "天气", "rain", "下雨", "temperature", "温度", "forecast", "预报", "怎麼樣", "怎么样"])
-        is_finance_query = any(kw in query_lower for kw in ["stock", "股票", "price", "股价", "crypto", "加密货币", "bitcoin", "btc"])
-        is_transport_query = any(kw in query_lower for kw in ["travel", "旅行", "route", "路线", "time", "时间", "how long", "多久"])
-        
         # 实时查询：只有在没有特定工具（weather/finance/transport）时才使用web_search
         # 但是历史天气查询应该使用web_search，所以需要特殊处理
-        is_realtime_query = not (is_weather_query or is_finance_query or is_transport_query) and any(kw in query_lower for kw in ["latest", "最新", "news", "新闻", "current", "现在", "today", "今天", "recent", "最近"])
+        flags = self._routing_flags(query)
+        is_historical_query = flags["historical"]
+        is_weather_query = flags["weather"]
+        is_finance_query = flags["finance"]
+        is_transport_query = flags["transport"]
+        is_realtime_query = flags["realtime"]
         
         # 如果天气查询是历史查询，应该使用web_search而不是weather工具
         if is_weather_query and is_historical_query:
             logger.info("检测到历史天气查询，优先使用web_search工具")
         
+        # 并发启动选中的工具，下面仍按优先级顺序取结果（提前结束时忽略剩余工具）
+        # 规划期间已推测执行的工具直接复用
+        if speculative is not None:
+            speculative.extend_deadline(settings.AGENT_TOOL_DEADLINE)
+        tool_batch = self._launch_tools(query, tools_to_use, skip_weather=is_historical_query, batch=speculative,
+                                        use_async=True)
+        
         for tool_name in tools_to_use:
             context = ""
             
             if tool_name == "finance":
-                context = self.tools["finance"](query, num_results=3)
+                context = await tool_batch.aget("finance")
                 if context:
                     contexts.append(f"[金融信息]\n{context}")
                     tools_used.append("finance")
@@ -403,7 +576,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "transport":
-                context = self.tools["transport"](query, num_results=3)
+                context = await tool_batch.aget("transport")
                 if context:
                     contexts.append(f"[交通信息]\n{context}")
                     tools_used.append("transport")
@@ -418,7 +591,7 @@ class RAGAgent:
                     continue
                 
                 location = self.extract_location(query) or "Hong Kong"
-                context = self.tools["weather"](location)
+                context = await tool_batch.aget("weather")
                 if context:
                     contexts.append(f"[天气信息]\n{context}")
                     tools_used.append("weather")
@@ -434,7 +607,7 @@ class RAGAgent:
                         continue
             
             elif tool_name == "web_search":
-                context = self.tools["web_search"](query, num_results=3)
+                context = await tool_batch.aget("web_search")
                 if context:
                     contexts.append(f"[网络搜索结果]\n{context}")
                     tools_used.append("web_search")
@@ -452,7 +625,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "local_rag":
-                context = self.tools["local_rag"](query)
+                context = await tool_batch.aget("local_rag")
                 if context:
                     contexts.append(f"[本地知识库]\n{context}")
                     tools_used.append("local_rag")
@@ -465,10 +638,14 @@ class RAGAgent:
             if contexts and (is_weather_query or is_finance_query or is_transport_query or (is_realtime_query and "web_search" in tools_used)):
                 break
         
+        tool_timings = tool_batch.timings()
+        speculation = self._finish_speculation(speculative)
+        
         # 3. 构建Prompt并调用LLM
+        context_packing = None
         if contexts:
             # 有工具结果，使用增强回答
-            all_context = "\n\n".join(contexts)
+            all_context, context_packing = self._pack_contexts(contexts)
             system_prompt = (
                 "你是一个智能AI助手。请基于提供的上下文信息回答问题。"
                 "如果上下文中包含相关信息，请优先使用这些信息。"
@@ -498,15 +675,11 @@ class RAGAgent:
                 tools_used = ["direct_llm"]
         
         # 4. 调用LLM（使用统一客户端，默认使用HKGAI）
+        if emit is not None:
+            await emit("tools", {"tools_used": tools_used, "tool_timings": tool_timings,
+                                 "context_packing": context_packing})
         logger.info(f"🤖 准备调用LLM（HKGAI），查询: '{query[:50]}...'")
-        llm_result = unified_llm_client.chat(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            max_tokens=2048,
-            temperature=0.7,
-            model=model,  # 如果指定了Gemini模型，会自动使用Gemini
-            provider="hkgai"  # Agent默认使用HKGAI
-        )
+        llm_result = await self._generate_answer(system_prompt, user_prompt, model, emit)
         
         if "error" in llm_result:
             logger.error(f"❌ LLM调用失败: {llm_result['error']}")
@@ -531,10 +704,21 @@ class RAGAgent:
             "contexts_count": len(contexts),
             "has_context": len(contexts) > 0,
             "tokens": tokens_info,
-            "model": llm_result.get("model")
+            "context_packing": context_packing,
+            "tool_timings": tool_timings,
+            "speculation": speculation,
+            "model": llm_result.get("model"),
+            "llm_timing": _llm_timing(llm_result)
         }
     
-    def _execute_llm_workflow(self, query: str, model: Optional[str], plan) -> Dict:
+    async def _execute_llm_workflow(
+        self,
+        query: str,
+        model: Optional[str],
+        plan,
+        speculative: Optional[ToolBatch] = None,
+        emit: Optional[EmitCallback] = None
+    ) -> Dict:
         """
         执行LLM驱动的动态工作流
         
@@ -542,6 +726,8 @@ class RAGAgent:
             query: 用户问题
             model: 可选的模型名称
             plan: LLM生成的工作流计划
+            speculative: 规划期间推测执行的工具批次（工具和参数一致的步骤直接复用）
+            emit: 可选的事件回调（工作流完成后发出 "workflow" 事件，答案流式输出）
             
         Returns:
             包含答案、使用的工具和上下文的字典
@@ -549,7 +735,10 @@ class RAGAgent:
         logger.info(f"🚀 开始执行LLM驱动的工作流: {plan.workflow_type}")
         
         # 1. 使用动态执行引擎执行计划
-        execution_context = self.dynamic_engine.execute(plan, query)
+        if speculative is not None:
+            speculative.extend_deadline(settings.WORKFLOW_DEADLINE)
+        execution_context = await self.dynamic_engine.execute_async(plan, query, speculative)
+        speculation = self._finish_speculation(speculative)
         
         # 2. 综合执行结果
         workflow_context = self.dynamic_engine.synthesize_results(execution_context)
@@ -558,7 +747,10 @@ class RAGAgent:
         tools_used = self.dynamic_engine.get_tool_usage_summary(execution_context)
         
         # 4. 构建Prompt并调用LLM生成最终答案
+        context_packing = None
         if workflow_context:
+            workflow_context, context_packing = self._pack_contexts([workflow_context])
+            
             # 检测是否是翻译/语言学习类问题
             is_translation_query = any(keyword in query for keyword in [
                 "怎么说", "怎么读", "发音", "翻译", "用粤语", "用普通话", "用英文",
@@ -592,14 +784,15 @@ class RAGAgent:
             logger.warning("LLM工作流执行无结果，回退到直接回答")
         
         # 5. 调用LLM生成答案
-        llm_result = unified_llm_client.chat(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            max_tokens=2048,
-            temperature=0.7,
-            model=model,
-            provider="hkgai"
-        )
+        if emit is not None:
+            await emit("workflow", {
+                "workflow_type": plan.workflow_type,
+                "workflow_engine": "llm_driven",
+                "tools_used": tools_used,
+                "workflow_steps_completed": len(execution_context.completed_steps),
+                "wall_time_ms": round(execution_context.wall_time_ms, 1)
+            })
+        llm_result = await self._generate_answer(system_prompt, user_prompt, model, emit)
         
         answer = llm_result.get("content", "无法生成答案")
         if "error" in llm_result:
@@ -621,11 +814,21 @@ class RAGAgent:
             "contexts_count": len(execution_context.completed_steps),
             "has_context": len(workflow_context) > 0,
             "tokens": tokens_info,
+            "context_packing": context_packing,
             "model": llm_result.get("model"),
+            "llm_timing": _llm_timing(llm_result),
             "workflow_type": plan.workflow_type,
             "workflow_engine": "llm_driven",
             "workflow_confidence": plan.confidence,
-            "workflow_steps_completed": len(execution_context.completed_steps)
+            "workflow_plan_cache": plan.metadata.get("plan_cache"),
+            "speculation": speculation,
+            "workflow_steps_completed": len(execution_context.completed_steps),
+            "workflow_timing": {
+                "wall_time_ms": round(execution_context.wall_time_ms, 1),
+                "critical_path": execution_context.critical_path,
+                "critical_path_ms": round(execution_context.critical_path_ms, 1),
+                "steps": execution_context.step_timings
+            }
         }
     
     def _execute_rule_based_workflow(self, query: str, model: Optional[str], workflow_type: str) -> Dict:
@@ -666,8 +869,9 @@ class RAGAgent:
             steps_completed = sum(1 for s in workflow_state.steps if s.status.value == "completed")
         
         # 4. 构建Prompt并调用LLM生成最终答案
-        
+        context_packing = None
         if workflow_context:
+            workflow_context, context_packing = self._pack_contexts([workflow_context])
             system_prompt = (
                 "你是一个专业的AI助手。用户提出了一个复杂的问题，我已经通过多个步骤收集了相关信息。"
                 "请基于以下工作流执行结果，综合分析并回答用户的问题。"
@@ -711,6 +915,7 @@ class RAGAgent:
             "contexts_count": steps_completed if isinstance(self.workflow_engine, LangGraphWorkflowEngine) else len(workflow_state.steps),
             "has_context": len(workflow_context) > 0,
             "tokens": tokens_info,
+            "context_packing": context_packing,
             "model": llm_result.get("model"),
             "workflow_type": workflow_type,
             "workflow_engine": "rule_based",  # 标记为基于规则的工作流
@@ -727,17 +932,19 @@ class RAGAgent:
         contexts = []
         tools_used = []
         
-        query_lower = query.lower()
-        is_weather_query = any(kw in query_lower for kw in ["weather", "天气", "rain", "下雨", "temperature", "温度", "forecast", "预报"])
-        is_finance_query = any(kw in query_lower for kw in ["stock", "股票", "price", "股价", "crypto", "加密货币", "bitcoin", "btc"])
-        is_transport_query = any(kw in query_lower for kw in ["travel", "旅行", "route", "路线", "time", "时间", "how long", "多久"])
-        is_realtime_query = any(kw in query_lower for kw in ["latest", "最新", "news", "新闻", "current", "现在", "today", "今天", "recent", "最近"])
+        flags = self._routing_flags(query, normal=True)
+        is_weather_query = flags["weather"]
+        is_finance_query = flags["finance"]
+        is_transport_query = flags["transport"]
+        is_realtime_query = flags["realtime"]
+        
+        tool_batch = self._launch_tools(query, tools_to_use)
         
         for tool_name in tools_to_use:
             context = ""
             
             if tool_name == "finance":
-                context = self.tools["finance"](query, num_results=3)
+                context = tool_batch.get("finance")
                 if context:
                     contexts.append(f"[金融信息]\n{context}")
                     tools_used.append("finance")
@@ -745,7 +952,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "transport":
-                context = self.tools["transport"](query, num_results=3)
+                context = tool_batch.get("transport")
                 if context:
                     contexts.append(f"[交通信息]\n{context}")
                     tools_used.append("transport")
@@ -753,8 +960,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "weather":
-                location = self.extract_location(query) or "Hong Kong"
-                context = self.tools["weather"](location)
+                context = tool_batch.get("weather")
                 if context:
                     contexts.append(f"[天气信息]\n{context}")
                     tools_used.append("weather")
@@ -762,7 +968,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "web_search":
-                context = self.tools["web_search"](query, num_results=3)
+                context = tool_batch.get("web_search")
                 if context:
                     contexts.append(f"[网络搜索结果]\n{context}")
                     tools_used.append("web_search")
@@ -774,7 +980,7 @@ class RAGAgent:
                         break
             
             elif tool_name == "local_rag":
-                context = self.tools["local_rag"](query)
+                context = tool_batch.get("local_rag")
                 if context:
                     contexts.append(f"[本地知识库]\n{context}")
                     tools_used.append("local_rag")
@@ -784,9 +990,12 @@ class RAGAgent:
             if contexts and (is_weather_query or is_finance_query or is_transport_query or (is_realtime_query and "web_search" in tools_used)):
                 break
         
+        tool_timings = tool_batch.timings()
+        
         # 构建Prompt并调用LLM
+        context_packing = None
         if contexts:
-            all_context = "\n\n".join(contexts)
+            all_context, context_packing = self._pack_contexts(contexts)
             system_prompt = (
                 "你是一个智能AI助手。请基于提供的上下文信息回答问题。"
                 "如果上下文中包含相关信息，请优先使用这些信息。"
@@ -832,6 +1041,8 @@ class RAGAgent:
             "contexts_count": len(contexts),
             "has_context": len(contexts) > 0,
             "tokens": tokens_info,
+            "context_packing": context_packing,
+            "tool_timings": tool_timings,
             "model": llm_result.get("model")
         }
 
@@ -0,0 +1,224 @@
+"""
+关键词路由器 - 基于Aho-Corasick自动机的多模式匹配
+
+Agent和工作流引擎的路由决策都依赖"查询中是否包含某组关键词"。
+原实现每次调用都重建关键词列表并逐个 `kw in query_lower` 扫描，同一组关键词在一次请求中会被扫描多次。
+这里把所有关键词组在启动时编译成一个Aho-Corasick自动机，单次遍历查询即可得到特征位图，
+所有路由判断都从位图读取。
+
+匹配语义与 `kw in query.lower()` 完全一致（子串匹配）。
+"""
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+
+# 路由特征 -> 关键词列表（保持原路由逻辑中的关键词和语义不变）
+ROUTING_FEATURES: Dict[str, List[str]] = {
+    # ===== RAGAgent.detect_question_type =====
+    "translation": [
+        "怎么说", "怎么读", "发音", "翻译", "用粤语", "用普通话", "用英文",
+        "how to say", "how do you say", "pronounce", "pronunciation",
+        "translation", "translate", "in cantonese", "in english", "in chinese"
+    ],
+    "historical": ["yesterday", "昨天", "last week", "上周", "last month", "上月", "past", "过去", "以前", "之前"],
+    "finance_tool": ["stock", "股票", "price", "股价", "crypto", "加密货币", "bitcoin", "btc", "ethereum", "eth"],
+    "transport_tool": ["怎么去", "怎么到", "如何去", "如何到", "从", "到", "travel", "route", "路线", "how to get", "how long"],
+    "weather_tool": [
+        "weather", "天气", "rain", "下雨", "temperature", "温度",
+        "forecast", "预报", "cloud", "云", "怎麼樣", "怎么样", "今天", "now", "现在"
+    ],
+    "future": ["tomorrow", "明天", "next week", "下周", "will", "会不会", "會不會"],
+    "news": [
+        "latest", "最新", "news", "新闻", "recently", "最近",
+        "now", "现在", "目前", "当前", "currently", "懸掛", "悬挂",
+        "开放", "关闭", "营业", "运营", "警告", "信号", "signal", "warning"
+    ],
+    "web_search_indicator": [
+        "largest", "最大", "biggest", "second", "第二", "third", "第三",
+        "best", "最好", "worst", "最差", "top", "排名", "排行",
+        "famous", "著名", "popular", "流行", "well-known", "知名"
+    ],
+    "local_kb": [
+        # 项目相关
+        "project", "项目", "system", "系统", "architecture", "架构",
+        "sereleia", "aetherian", "xylos", "elara",  # 虚构知识库内容
+        "workflow", "工作流", "agent", "这个系统", "本项目", "我们的",
+        # 技术术语 - 优先使用本地知识库
+        "rag", "retrieval", "augmented", "generation", "检索增强",
+        "embedding", "嵌入", "向量", "vector", "milvus",
+        "rerank", "重排", "cross-encoder", "bi-encoder",
+        "chunk", "分块", "索引", "index", "llm", "大模型", "大语言模型",
+        "nlp", "自然语言处理", "transformer", "attention", "注意力",
+        # 学术机构
+        "hkust", "科技大学", "港科大", "清水湾", "university", "大学",
+        "college", "学院", "campus", "校园"
+    ],
+    "location_question": ["在哪", "哪里", "位于", "located", "where is", "location"],
+    "academic": ["大学", "university", "学院", "college", "hkust", "科技大学", "港科大", "学校", "school"],
+    "common_knowledge": [
+        "capital", "首都", "president", "总统", "famous", "著名",
+        "olympic", "奥运", "world cup", "世界杯", "wrote", "写了",
+        "invented", "发明", "discovered", "发现"
+    ],
+    "question": ["什么是", "谁是", "为什么", "怎样", "如何", "what is", "who is", "why", "how does", "how to"],
+    "tech_term": ["rag", "embedding", "vector", "llm", "nlp", "transformer", "大学", "university", "milvus"],
+
+    # ===== RAGAgent.execute / _execute_normal =====
+    "weather_query": ["weather", "天气", "rain", "下雨", "temperature", "温度", "forecast", "预报"],
+    "weather_query_colloquial": ["怎麼樣", "怎么样"],  # 仅execute中的天气判断包含
+    "finance_query": ["stock", "股票", "price", "股价", "crypto", "加密货币", "bitcoin", "btc"],
+    "transport_query": ["travel", "旅行", "route", "路线", "time", "时间", "how long", "多久"],
+    "realtime_query": ["latest", "最新", "news", "新闻", "current", "现在", "today", "今天", "recent", "最近"],
+
+    # ===== RAGAgent._is_complex_query =====
+    "complex": [
+        # 比较类
+        "比较", "compare", "对比", "差异", "difference", "vs", "versus", "哪个更", "which is better",
+        "邊個", "边个", "更高", "更低", "更好", "更差",
+        # 分析类
+        "分析", "analyze", "analysis", "評估", "评估", "evaluate", "解释为什么", "explain why",
+        "為什麼", "为什么", "原因", "reason",
+        # 计算类
+        "计算", "calculate", "總共", "总共", "total", "加起来", "sum up", "相加", "相减",
+        # 多步骤类
+        "然后", "接着", "之后", "先...再", "first...then", "步驟", "步骤", "step",
+        "接住", "跟住", "跟着",
+        # 综合类
+        "综合", "整合", "combine", "一起", "together", "同時", "同时", "both", "埋一齊"
+    ],
+
+    # ===== WorkflowEngine.detect_workflow_type =====
+    "finance_comparison": [
+        "compare", "对比", "vs", "versus", "difference", "差异",
+        "impact", "影响", "earnings", "财报", "stock price", "股价"
+    ],
+    "compare": ["compare"],
+    "stock": ["stock"],
+}
+
+# 工作流中识别的公司（每个公司单独一个特征位，用于统计出现的公司数量）
+WORKFLOW_COMPANIES: List[str] = ["nvidia", "amd", "apple", "microsoft", "google", "tesla"]
+for _company in WORKFLOW_COMPANIES:
+    ROUTING_FEATURES[f"company:{_company}"] = [_company]
+
+
+class QueryFeatures:
+    """查询特征位图（只读）"""
+
+    __slots__ = ("bits", "_index")
+
+    def __init__(self, bits: int, index: Dict[str, int]):
+        self.bits = bits
+        self._index = index
+
+    def has(self, feature: str) -> bool:
+        """是否包含某个特征（特征名不存在时抛出KeyError，避免拼写错误被静默忽略）"""
+        return bool(self.bits >> self._index[feature] & 1)
+
+    def any(self, *features: str) -> bool:
+        """是否包含任意一个特征"""
+        return any(self.has(feature) for feature in features)
+
+    def count(self, features: Iterable[str]) -> int:
+        """包含的特征个数"""
+        return sum(1 for feature in features if self.has(feature))
+
+    def names(self) -> List[str]:
+        """包含的所有特征名"""
+        return [name for name, bit in self._index.items() if self.bits >> bit & 1]
+
+    def __contains__(self, feature: str) -> bool:
+        return self.has(feature)
+
+    def __repr__(self) -> str:
+        return f"QueryFeatures({', '.join(self.names())})"
+
+
+class KeywordAutomaton:
+    """Aho-Corasick多模式匹配自动机，输出匹配到的特征位图"""
+
+    def __init__(self, features: Dict[str, List[str]]):
+        """
+        构建自动机
+
+        Args:
+            features: 特征名 -> 关键词列表（关键词会被转为小写）
+        """
+        self.feature_index: Dict[str, int] = {name: i for i, name in enumerate(features)}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [0]  # 每个状态命中的特征位（已合并fail链上的输出）
+
+        for name, keywords in features.items():
+            bit = 1 << self.feature_index[name]
+            for keyword in keywords:
+                self._add(keyword.lower(), bit)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, bit: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            state = next_state
+        self._output[state] |= bit
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    @property
+    def num_states(self) -> int:
+        return len(self._goto)
+
+    def scan_bits(self, text: str) -> int:
+        """单次遍历文本，返回命中的特征位图（text应已小写）"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state, bits = 0, 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            bits |= output[state]
+        return bits
+
+    def scan(self, text: str) -> QueryFeatures:
+        """返回文本的特征位图"""
+        return QueryFeatures(self.scan_bits(text.lower()), self.feature_index)
+
+
+# 全局关键词自动机（启动时构建一次）
+keyword_automaton = KeywordAutomaton(ROUTING_FEATURES)
+
+
+@lru_cache(maxsize=256)
+def _scan_cached(query: str) -> QueryFeatures:
+    return keyword_automaton.scan(query)
+
+
+def get_query_features(query: str) -> QueryFeatures:
+    """
+    获取查询的路由特征（同一请求内多处路由判断共享同一次扫描结果）
+
+    Args:
+        query: 用户查询（原文，内部会转为小写）
+
+    Returns:
+        QueryFeatures 特征位图
+    """
+    return _scan_cached(query)
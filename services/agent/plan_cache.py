@@ -0,0 +1,405 @@
+"""
+工作流计划缓存 - 按"去实体化"的查询模板复用LLM规划结果
+
+LLM规划一次约需十几秒，而很多复杂查询只是实体不同（"比较英伟达和AMD的股价" / "比较苹果和微软的股价"）。
+这里把查询中的公司/股票代码、地点、日期替换成槽位得到查询模板：
+1. 模板完全相同 -> 直接命中
+2. 模板embedding相似度超过阈值且槽位一致 -> 语义命中
+命中后把新查询的实体重新绑定到缓存计划的各个步骤中，跳过LLM调用。
+
+只缓存置信度达到下限的LLM计划（fallback计划不缓存），条目带TTL。
+"""
+import copy
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+from services.agent.tools.finance_tool import COMPANY_TO_TICKER
+from services.agent.tools.weather_tool import COMMON_LOCATIONS
+
+# 槽位标记（不使用花括号，避免与动态工作流的 {step_N} 占位符冲突）
+_SLOT_PATTERN = re.compile(r"<<(\w+?)_(\d+)(:value)?>>")
+
+# 明确写出的股票代码（只接受已知代码，避免把 AI、GDP 等缩写当成实体）
+_KNOWN_TICKERS = {ticker for ticker in COMPANY_TO_TICKER.values()}
+_TICKER_PATTERN = re.compile(r"(?<![A-Za-z0-9.])([A-Z]{2,5}|\d{4,6})(\.(?:HK|SS|SZ))?(?![A-Za-z0-9])")
+
+# 日期表达（年份、年月日、季度、相对日期）
+_DATE_PATTERN = re.compile(
+    r"(?:19|20)\d{2}\s*[-/年]\s*\d{1,2}(?:\s*[-/月]\s*\d{1,2}\s*日?)?"
+    r"|(?:19|20)\d{2}\s*年?\s*(?:q[1-4]|第?[一二三四1-4]季度)?"
+    r"|(?<![a-z])q[1-4](?![a-z0-9])|第[一二三四]季度"
+    r"|(?<![a-z])(?:today|tomorrow|yesterday)(?![a-z])|今天|明天|昨天|前天|后天",
+    re.IGNORECASE
+)
+
+
+def _lexicon_pattern(keys) -> re.Pattern:
+    """把词表编译成一个正则（长词优先；英文词要求单词边界，避免 meta 匹配 metadata）"""
+    alternatives = []
+    for key in sorted(keys, key=len, reverse=True):
+        escaped = re.escape(key)
+        if key.isascii():
+            escaped = rf"(?<![a-z0-9]){escaped}(?![a-z0-9])"
+        alternatives.append(escaped)
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+_COMPANY_PATTERN = _lexicon_pattern(COMPANY_TO_TICKER)
+_LOCATION_PATTERN = _lexicon_pattern(COMMON_LOCATIONS)
+
+
+@dataclass
+class QueryEntity:
+    """查询中的一个实体"""
+    kind: str  # company / location / date
+    surface: str  # 查询中的原文写法
+    value: str  # 规范值（股票代码、标准地名；日期与原文相同）
+    start: int
+    end: int
+
+
+def extract_query_entities(query: str) -> List[QueryEntity]:
+    """
+    用本地词表和正则提取查询中的实体（不调用LLM）
+
+    Args:
+        query: 用户查询
+
+    Returns:
+        按出现位置排序、互不重叠的实体列表
+    """
+    candidates: List[QueryEntity] = []
+    for match in _COMPANY_PATTERN.finditer(query):
+        candidates.append(QueryEntity("company", match.group(0), COMPANY_TO_TICKER[match.group(0).lower()], match.start(), match.end()))
+    for match in _TICKER_PATTERN.finditer(query):
+        if match.group(0) in _KNOWN_TICKERS:
+            candidates.append(QueryEntity("company", match.group(0), match.group(0), match.start(), match.end()))
+    for match in _LOCATION_PATTERN.finditer(query):
+        candidates.append(QueryEntity("location", match.group(0), COMMON_LOCATIONS[match.group(0).lower()], match.start(), match.end()))
+    for match in _DATE_PATTERN.finditer(query):
+        surface = match.group(0).strip()
+        if surface:
+            candidates.append(QueryEntity("date", surface, surface, match.start(), match.start() + len(surface)))
+
+    # 重叠时保留较长的实体
+    candidates.sort(key=lambda e: (e.start, -(e.end - e.start)))
+    entities: List[QueryEntity] = []
+    for entity in candidates:
+        if entities and entity.start < entities[-1].end:
+            continue
+        entities.append(entity)
+    return entities
+
+
+def build_query_template(query: str) -> Tuple[str, Dict[str, QueryEntity]]:
+    """
+    把查询中的实体替换成槽位，得到查询模板
+
+    同一规范值的实体共用一个槽位（"苹果和AAPL" 只产生一个槽位）。
+
+    Args:
+        query: 用户查询
+
+    Returns:
+        (模板, 槽位名 -> 实体)
+    """
+    slots: Dict[str, QueryEntity] = {}
+    slot_by_value: Dict[Tuple[str, str], str] = {}
+    counters: Dict[str, int] = {}
+    parts, last = [], 0
+    for entity in extract_query_entities(query):
+        key = (entity.kind, entity.value.lower())
+        slot = slot_by_value.get(key)
+        if slot is None:
+            counters[entity.kind] = counters.get(entity.kind, 0) + 1
+            slot = f"{entity.kind}_{counters[entity.kind]}"
+            slot_by_value[key] = slot
+            slots[slot] = entity
+        parts.append(query[last:entity.start])
+        parts.append(f"<<{slot}>>")
+        last = entity.end
+    parts.append(query[last:])
+    template = re.sub(r"\s+", " ", "".join(parts)).strip().lower()
+    return template, slots
+
+
+def _map_strings(obj: Any, func):
+    """对嵌套的dict/list中的所有字符串应用func"""
+    if isinstance(obj, str):
+        return func(obj)
+    if isinstance(obj, list):
+        return [_map_strings(item, func) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _map_strings(value, func) for key, value in obj.items()}
+    return obj
+
+
+def _abstract_text(text: str, slots: Dict[str, QueryEntity]) -> str:
+    """把计划文本中的实体写法替换成槽位标记（原文写法 -> <<slot>>，规范值和别名 -> <<slot:value>>）"""
+    replacements: Dict[str, str] = {}
+    for slot, entity in slots.items():
+        aliases = [entity.value]
+        if entity.kind == "company":
+            aliases += [name for name, ticker in COMPANY_TO_TICKER.items() if ticker == entity.value]
+        elif entity.kind == "location":
+            aliases += [name for name, value in COMMON_LOCATIONS.items() if value == entity.value]
+        for alias in aliases:
+            replacements.setdefault(alias.lower(), f"<<{slot}:value>>")
+        replacements[entity.surface.lower()] = f"<<{slot}>>" if entity.surface.lower() != entity.value.lower() else f"<<{slot}:value>>"
+    if not replacements:
+        return text
+    pattern = _lexicon_pattern(replacements)
+    return pattern.sub(lambda m: replacements[m.group(0).lower()], text)
+
+
+def _bind_text(text: str, slots: Dict[str, QueryEntity]) -> str:
+    """把槽位标记替换成新查询的实体"""
+    def replace(match):
+        entity = slots[f"{match.group(1)}_{match.group(2)}"]
+        return entity.value if match.group(3) else entity.surface
+    return _SLOT_PATTERN.sub(replace, text)
+
+
+def _has_foreign_entity(obj: Any) -> bool:
+    """去实体化后的计划中是否还残留不属于查询槽位的公司或地点（如LLM自行补充的对比对象）"""
+    found = []
+
+    def check(text: str) -> str:
+        entities = extract_query_entities(_SLOT_PATTERN.sub(" ", text))
+        # LLM补充的日期（如默认年份）与查询实体无关，按原样保留
+        if any(entity.kind != "date" for entity in entities):
+            found.append(text)
+        return text
+
+    _map_strings(obj, check)
+    return bool(found)
+
+
+@dataclass
+class CachedPlan:
+    """缓存的计划模板"""
+    template: str
+    signature: Tuple[str, ...]  # 排序后的槽位名（语义命中时必须一致才能重新绑定）
+    plan: Any  # 去实体化的WorkflowPlan
+    planning_ms: float  # 生成该计划的LLM规划耗时
+    created_at: float = field(default_factory=time.time)
+    vector: Optional[List[float]] = None
+    hits: int = 0
+
+
+class PlanCache:
+    """按查询模板缓存的工作流计划"""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: int = 86400,
+        min_confidence: float = 0.7,
+        similarity_threshold: float = 0.92,
+        embedding_model=None
+    ):
+        """
+        初始化计划缓存
+
+        Args:
+            max_size: 最大缓存条目数（LRU淘汰）
+            ttl: 条目过期时间（秒）
+            min_confidence: 可缓存计划的最低置信度
+            similarity_threshold: 模板语义命中的最低余弦相似度（embedding不可用时只做精确匹配）
+            embedding_model: SentenceTransformer模型，None时首次使用时复用检索器的模型
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self._embedding_loaded = embedding_model is not None
+        self._entries: "OrderedDict[str, CachedPlan]" = OrderedDict()
+        self.lock = Lock()
+        self._stats = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "rejected": 0,
+            "latency_saved_ms": 0.0
+        }
+
+    def _embed(self, template: str) -> Optional[List[float]]:
+        """计算模板的归一化向量（模型不可用时返回None）"""
+        if not self._embedding_loaded:
+            self._embedding_loaded = True
+            try:
+                from services.vector.retriever import retriever
+                self.embedding_model = retriever.embedding_model
+            except Exception as e:
+                logger.warning(f"计划缓存无法加载embedding模型，只使用精确匹配: {e}")
+        if self.embedding_model is None:
+            return None
+        try:
+            vector = self.embedding_model.encode([template], show_progress_bar=False, normalize_embeddings=True)[0]
+            return [float(x) for x in vector]
+        except Exception as e:
+            logger.warning(f"计划模板向量计算失败: {e}")
+            return None
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, query: str):
+        """
+        查找可复用的计划
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            重新绑定实体后的WorkflowPlan（metadata["plan_cache"]记录命中信息），未命中返回None
+        """
+        start = time.time()
+        template, slots = build_query_template(query)
+        signature = tuple(sorted(slots))
+        hit_type = None
+
+        with self.lock:
+            self._stats["lookups"] += 1
+            self._evict_expired(start)
+            entry = self._entries.get(template)
+            if entry is not None:
+                hit_type = "exact"
+            candidates = [] if entry else [e for e in self._entries.values() if e.signature == signature and e.vector]
+
+        similarity = 1.0
+        if entry is None and candidates and self.similarity_threshold < 1.0:
+            vector = self._embed(template)
+            if vector is not None:
+                best, best_score = None, -1.0
+                for candidate in candidates:
+                    score = sum(a * b for a, b in zip(vector, candidate.vector))
+                    if score > best_score:
+                        best, best_score = candidate, score
+                if best_score >= self.similarity_threshold:
+                    entry, hit_type, similarity = best, "semantic", best_score
+
+        if entry is None:
+            with self.lock:
+                self._stats["misses"] += 1
+            return None
+
+        plan = copy.deepcopy(entry.plan)
+        for step in plan.steps:
+            step.action = _bind_text(step.action, slots)
+            step.query = _bind_text(step.query, slots)
+            step.reason = _bind_text(step.reason, slots)
+            step.entities = _map_strings(step.entities, lambda text: _bind_text(text, slots))
+        plan.entities = _map_strings(plan.entities, lambda text: _bind_text(text, slots))
+        plan.reasoning = _bind_text(plan.reasoning, slots)
+
+        lookup_ms = (time.time() - start) * 1000
+        saved_ms = max(entry.planning_ms - lookup_ms, 0.0)
+        plan.metadata["plan_cache"] = {
+            "hit": hit_type,
+            "template": entry.template,
+            "similarity": round(similarity, 4),
+            "lookup_ms": round(lookup_ms, 2),
+            "latency_saved_ms": round(saved_ms, 1)
+        }
+        with self.lock:
+            entry.hits += 1
+            if entry.template in self._entries:
+                self._entries.move_to_end(entry.template)
+            self._stats[f"{hit_type}_hits"] += 1
+            self._stats["latency_saved_ms"] += saved_ms
+
+        logger.info(f"♻️  计划缓存{'精确' if hit_type == 'exact' else '语义'}命中: '{entry.template}' "
+                    f"(相似度 {similarity:.3f}, 节省约 {saved_ms / 1000:.1f}s)")
+        return plan
+
+    def store(self, query: str, plan, planning_ms: float) -> bool:
+        """
+        缓存LLM生成的计划
+
+        Args:
+            query: 生成该计划的用户查询
+            plan: WorkflowPlan
+            planning_ms: LLM规划耗时（毫秒），命中时据此统计节省的延迟
+
+        Returns:
+            是否已缓存（置信度不足或计划中含有无法去实体化的内容时不缓存）
+        """
+        if plan.confidence < self.min_confidence:
+            with self.lock:
+                self._stats["rejected"] += 1
+            return False
+
+        template, slots = build_query_template(query)
+        abstract = copy.deepcopy(plan)
+        abstract.metadata = {}
+        for step in abstract.steps:
+            step.result = None
+            step.status = "pending"
+            step.action = _abstract_text(step.action, slots)
+            step.query = _abstract_text(step.query, slots)
+            step.reason = _abstract_text(step.reason, slots)
+            step.entities = _map_strings(step.entities, lambda text: _abstract_text(text, slots))
+        abstract.entities = _map_strings(abstract.entities, lambda text: _abstract_text(text, slots))
+        abstract.reasoning = _abstract_text(abstract.reasoning, slots)
+
+        # 计划中出现查询里没有的实体时，重新绑定后会指向错误对象，不缓存
+        if _has_foreign_entity([[s.action, s.query, s.entities] for s in abstract.steps]):
+            logger.info(f"计划包含查询之外的实体，不缓存: '{template}'")
+            with self.lock:
+                self._stats["rejected"] += 1
+            return False
+
+        entry = CachedPlan(
+            template=template,
+            signature=tuple(sorted(slots)),
+            plan=abstract,
+            planning_ms=planning_ms,
+            vector=self._embed(template) if self.similarity_threshold < 1.0 else None
+        )
+        with self.lock:
+            self._entries[template] = entry
+            self._entries.move_to_end(template)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._stats["stored"] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率和节省的规划延迟"""
+        with self.lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats["hit_rate"] = f"{hits / stats['lookups'] * 100:.1f}%" if stats["lookups"] else "0.0%"
+        stats["latency_saved_ms"] = round(stats["latency_saved_ms"], 1)
+        return stats
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self._entries.clear()
+
+
+# 全局计划缓存实例
+_plan_cache = PlanCache(
+    max_size=settings.PLAN_CACHE_MAX_SIZE,
+    ttl=settings.PLAN_CACHE_TTL,
+    min_confidence=settings.PLAN_CACHE_MIN_CONFIDENCE,
+    similarity_threshold=settings.PLAN_CACHE_SIMILARITY
+)
+
+
+def get_plan_cache() -> PlanCache:
+    """获取全局计划缓存实例"""
+    return _plan_cache
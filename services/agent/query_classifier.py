@@ -0,0 +1,257 @@
+"""
+本地查询分类器 - 用embedding + 线性分类头代替LLM规划做路由决策
+
+`_is_complex_query` 靠关键词决定是否花十几秒调用LLM规划器，而规划器经常返回"不需要工作流"。
+这里用共享的embedding模型编码查询，再用离线训练好的三个线性头在几毫秒内预测：
+- requires_workflow（二分类，概率即置信度）
+- workflow_type（多分类）
+- 需要的工具集合（多标签）
+
+模型文件由 scripts/train_query_classifier.py 生成，按版本保存为
+{QUERY_CLASSIFIER_DIR}/query_classifier_v{N}.json，默认加载最新版本。
+
+分类器会改变线上路由，默认关闭（QUERY_CLASSIFIER_ENABLED）。开启前需要：
+1. 运行 scripts/train_query_classifier.py 标注并训练，生成新版本模型文件
+2. 运行 scripts/tests/query_classifier_report.py，确认留出集上组合策略的准确率不低于关键词规则、漏判的工作流不增加
+3. 随模型文件提交评估报告，再设置 QUERY_CLASSIFIER_ENABLED=true
+"""
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional
+from services.core.config import settings
+from services.core.logger import logger
+from services.core.cache import get_embedding_cache, _generate_cache_key
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 模型文件格式版本（字段结构变化时递增）
+ARTIFACT_FORMAT = 1
+_ARTIFACT_PATTERN = re.compile(r"^query_classifier_v(\d+)\.json$")
+
+
+def current_embedding_model_name() -> str:
+    """检索器当前使用的embedding模型名（分类器必须与之一致）"""
+    return settings.MULTILINGUAL_EMBEDDING_MODEL if settings.USE_MULTILINGUAL_EMBEDDING else settings.EMBEDDING_MODEL
+
+
+def artifact_path(model_dir: str, version: int) -> str:
+    """指定版本的模型文件路径"""
+    return os.path.join(model_dir, f"query_classifier_v{version}.json")
+
+
+def list_artifact_versions(model_dir: str) -> List[int]:
+    """目录中已有的模型版本（升序）"""
+    if not os.path.isdir(model_dir):
+        return []
+    versions = []
+    for name in os.listdir(model_dir):
+        match = _ARTIFACT_PATTERN.match(name)
+        if match:
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    e = np.exp(x - np.max(x))
+    return e / e.sum()
+
+
+@dataclass
+class QueryPrediction:
+    """分类结果"""
+    requires_workflow: bool
+    workflow_probability: float  # requires_workflow=True 的概率
+    confidence: float  # 二分类置信度 max(p, 1-p)
+    workflow_type: Optional[str] = None
+    tools: List[str] = field(default_factory=list)
+    tool_probabilities: Dict[str, float] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+    model_version: int = 0
+
+    def to_dict(self) -> Dict:
+        """转换为可序列化的字典（用于日志和接口返回）"""
+        return {
+            "requires_workflow": self.requires_workflow,
+            "workflow_probability": round(self.workflow_probability, 4),
+            "confidence": round(self.confidence, 4),
+            "workflow_type": self.workflow_type,
+            "tools": self.tools,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "model_version": self.model_version
+        }
+
+
+class QueryClassifier:
+    """基于embedding的本地查询分类器"""
+
+    def __init__(self, artifact: Dict, embedding_model=None):
+        """
+        从模型文件内容初始化
+
+        Args:
+            artifact: 训练脚本保存的模型字典
+            embedding_model: 已加载的SentenceTransformer模型，None时首次预测时复用检索器的模型
+        """
+        if artifact.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"不支持的分类器模型格式: {artifact.get('format')}")
+        self.version = artifact["version"]
+        self.embedding_model_name = artifact["embedding_model"]
+        self.dimension = artifact["dimension"]
+        self.training = artifact.get("training", {})
+        self.metrics = artifact.get("metrics", {})
+        self.embedding_model = embedding_model
+
+        heads = artifact["heads"]
+        self.workflow_weights = np.asarray(heads["requires_workflow"]["weights"], dtype=np.float32)
+        self.workflow_bias = float(heads["requires_workflow"]["bias"])
+        self.type_labels: List[str] = heads["workflow_type"]["labels"]
+        self.type_weights = np.asarray(heads["workflow_type"]["weights"], dtype=np.float32).reshape(self.dimension, len(self.type_labels))
+        self.type_bias = np.asarray(heads["workflow_type"]["bias"], dtype=np.float32)
+        self.tool_labels: List[str] = heads["tools"]["labels"]
+        self.tool_weights = np.asarray(heads["tools"]["weights"], dtype=np.float32).reshape(self.dimension, len(self.tool_labels))
+        self.tool_bias = np.asarray(heads["tools"]["bias"], dtype=np.float32)
+        self.tool_threshold = float(heads["tools"].get("threshold", 0.5))
+
+    @classmethod
+    def load(cls, path: str, embedding_model=None) -> "QueryClassifier":
+        """从JSON文件加载分类器"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), embedding_model)
+
+    def _query_vector(self, query: str):
+        """获取归一化的查询向量（复用检索阶段缓存的embedding）"""
+        embedding_cache = get_embedding_cache()
+        embedding_key = _generate_cache_key(query)
+        vector = embedding_cache.get(embedding_key)
+        if vector is None:
+            if self.embedding_model is None:
+                from services.vector.retriever import retriever
+                self.embedding_model = retriever.embedding_model
+            vector = self.embedding_model.encode([query], show_progress_bar=False)[0].tolist()
+            embedding_cache.set(embedding_key, vector)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def predict_vector(self, vector, elapsed_start: Optional[float] = None) -> QueryPrediction:
+        """
+        用已归一化的查询向量预测
+
+        Args:
+            vector: 查询向量（维度须与模型一致）
+            elapsed_start: 计时起点（time.time()），None时从本函数开始计时
+
+        Returns:
+            QueryPrediction 分类结果
+        """
+        start = elapsed_start or time.time()
+        if vector.shape[0] != self.dimension:
+            raise ValueError(f"查询向量维度 {vector.shape[0]} 与分类器维度 {self.dimension} 不一致")
+
+        p_workflow = float(_sigmoid(vector @ self.workflow_weights + self.workflow_bias))
+        requires_workflow = p_workflow >= 0.5
+
+        workflow_type = None
+        if requires_workflow and self.type_labels:
+            type_probs = _softmax(vector @ self.type_weights + self.type_bias)
+            workflow_type = self.type_labels[int(np.argmax(type_probs))]
+
+        tool_probs = _sigmoid(vector @ self.tool_weights + self.tool_bias) if self.tool_labels else []
+        tool_probabilities = {label: float(p) for label, p in zip(self.tool_labels, tool_probs)}
+        # 按概率从高到低排列（调用方按顺序作为工具优先级）
+        tools = sorted((label for label, p in tool_probabilities.items() if p >= self.tool_threshold),
+                       key=lambda label: -tool_probabilities[label])
+
+        return QueryPrediction(
+            requires_workflow=requires_workflow,
+            workflow_probability=p_workflow,
+            confidence=max(p_workflow, 1 - p_workflow),
+            workflow_type=workflow_type,
+            tools=tools,
+            tool_probabilities=tool_probabilities,
+            elapsed_ms=(time.time() - start) * 1000,
+            model_version=self.version
+        )
+
+    def predict(self, query: str) -> QueryPrediction:
+        """
+        预测查询的路由信息
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            QueryPrediction 分类结果
+        """
+        start = time.time()
+        return self.predict_vector(self._query_vector(query), elapsed_start=start)
+
+
+# 全局分类器实例（延迟加载；模型文件缺失或不可用时为None，调用方回退到关键词规则）
+_query_classifier: Optional[QueryClassifier] = None
+_classifier_loaded = False
+_classifier_lock = Lock()
+
+
+def load_query_classifier(model_dir: str = None, version: int = None) -> Optional[QueryClassifier]:
+    """
+    加载指定版本（默认最新）的分类器
+
+    Args:
+        model_dir: 模型目录，默认使用配置
+        version: 模型版本，默认使用配置（0表示最新）
+
+    Returns:
+        QueryClassifier，不可用时返回None
+    """
+    if not NUMPY_AVAILABLE:
+        logger.warning("numpy不可用，查询分类器已禁用")
+        return None
+    model_dir = model_dir or settings.QUERY_CLASSIFIER_DIR
+    version = version or settings.QUERY_CLASSIFIER_VERSION
+    if not version:
+        versions = list_artifact_versions(model_dir)
+        if not versions:
+            logger.info(f"未找到查询分类器模型（{model_dir}），使用关键词规则判断是否需要LLM规划")
+            return None
+        version = versions[-1]
+
+    path = artifact_path(model_dir, version)
+    try:
+        classifier = QueryClassifier.load(path)
+    except Exception as e:
+        logger.warning(f"加载查询分类器失败（{path}）: {e}")
+        return None
+
+    if classifier.embedding_model_name != current_embedding_model_name():
+        logger.warning(f"查询分类器v{classifier.version}基于 {classifier.embedding_model_name} 训练，"
+                       f"与当前embedding模型 {current_embedding_model_name()} 不一致，已禁用")
+        return None
+
+    logger.info(f"查询分类器v{classifier.version}已加载（{path}）")
+    return classifier
+
+
+def get_query_classifier() -> Optional[QueryClassifier]:
+    """获取全局查询分类器实例（未启用或不可用时返回None）"""
+    global _query_classifier, _classifier_loaded
+    if not settings.QUERY_CLASSIFIER_ENABLED:
+        return None
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                _query_classifier = load_query_classifier()
+                _classifier_loaded = True
+    return _query_classifier
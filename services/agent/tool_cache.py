@@ -0,0 +1,341 @@
+"""
+工具结果缓存 - 按工具设置TTL，过期后先返回旧结果再后台刷新（stale-while-revalidate）
+
+天气、行情、路线、搜索结果在短时间内不会变化，重复查询没必要每次都调用外部API。
+包装RAGAgent.tools中的外部工具：
+- 每个工具独立TTL（加密货币行情最短，路线最长）
+- 缓存键按语义归一化：地点规范化为天气API地名，金融查询归一化为识别出的股票/加密货币代码
+- 过期但仍在宽限期内时立即返回旧结果，并在后台刷新（同一键只刷新一次）
+- 热门键（命中次数达到阈值）在过期前提前刷新
+- 空结果和调用异常不缓存
+
+本地RAG不包装（检索器已有查询缓存，且结果依赖知识库内容）。
+"""
+import re
+import time
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+from services.agent.tools.weather_tool import extract_location
+from services.agent.tools.finance_tool import extract_finance_symbols
+from services.agent.tools.transport_tool import extract_location_pair, is_transport_query
+
+
+def _normalize_text(text: str) -> str:
+    """忽略大小写和多余空白"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _canonical_place(name: str) -> str:
+    """地点规范化：能识别的用天气API地名，否则用归一化文本"""
+    return extract_location(name) or _normalize_text(name)
+
+
+def weather_cache_key(location: str) -> Optional[tuple]:
+    """天气：按规范化地点缓存（"香港"与"Hong Kong"共用一条）"""
+    return (_canonical_place(location),)
+
+
+def finance_cache_key(query: str, num_results: int = 3) -> Optional[tuple]:
+    """金融：按识别出的股票代码和加密货币代码缓存；都没识别出时不缓存"""
+    tickers, cryptos = extract_finance_symbols(query)
+    if not tickers and not cryptos:
+        return None
+    return tuple(t.upper() for t in tickers[:num_results]), tuple(cryptos), num_results
+
+
+def transport_cache_key(query: str, num_results: int = 3) -> Optional[tuple]:
+    """交通：按规范化的(起点, 终点)缓存；非交通查询或无法提取地点对时不缓存"""
+    if not is_transport_query(query):
+        return None
+    location_pair = extract_location_pair(query)
+    if not location_pair:
+        return None
+    origin, destination = location_pair
+    return _canonical_place(origin), _canonical_place(destination)
+
+
+def web_search_cache_key(query: str, num_results: int = 3) -> Optional[tuple]:
+    """网页搜索：按归一化查询和结果数量缓存"""
+    return _normalize_text(query), num_results
+
+
+@dataclass
+class ToolCachePolicy:
+    """单个工具的缓存策略"""
+    ttl: float  # 新鲜期（秒）
+    key_func: Callable[..., Optional[tuple]]  # 调用参数 -> 缓存键（None表示不缓存）
+    ttl_func: Optional[Callable[[tuple], float]] = None  # 按缓存键决定TTL（None时使用ttl）
+
+    def ttl_for(self, key: tuple) -> float:
+        return self.ttl_func(key) if self.ttl_func else self.ttl
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    stored_at: float
+    ttl: float
+    hits: int = 0
+    refreshing: bool = False
+
+
+def _new_tool_stats() -> Dict[str, int]:
+    return {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_ahead": 0, "errors": 0}
+
+
+class ToolResultCache:
+    """外部工具结果缓存（LRU + 按工具TTL + stale-while-revalidate）"""
+
+    def __init__(self, policies: Dict[str, ToolCachePolicy], max_size: int = 500,
+                 stale_factor: float = 1.0, refresh_ahead: float = 0.8,
+                 popular_hits: int = 3, refresh_workers: int = 2):
+        """
+        Args:
+            policies: 工具名 -> 缓存策略
+            max_size: 最大缓存条目数
+            stale_factor: 宽限期相对TTL的倍数（过期后 ttl*stale_factor 秒内仍先返回旧结果）
+            refresh_ahead: 热门键在 ttl*refresh_ahead 秒后提前刷新（>=1表示不提前刷新）
+            popular_hits: 命中多少次算热门键
+            refresh_workers: 后台刷新线程数
+        """
+        self.policies = policies
+        self.max_size = max_size
+        self.stale_factor = stale_factor
+        self.refresh_ahead = refresh_ahead
+        self.popular_hits = popular_hits
+        self.lock = Lock()
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {name: _new_tool_stats() for name in policies}
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="tool-cache-refresh")
+
+    def wrap(self, tools: Dict[str, Callable]) -> Dict[str, Callable]:
+        """
+        包装工具注册表：有缓存策略的工具改为走缓存，其他工具原样返回
+
+        Args:
+            tools: 工具名 -> 工具函数
+
+        Returns:
+            新的工具注册表
+        """
+        wrapped = {}
+        for name, func in tools.items():
+            if name in self.policies:
+                wrapped[name] = self._wrap_tool(name, func)
+            else:
+                wrapped[name] = func
+        return wrapped
+
+    def wrap_async(self, async_tools: Dict[str, Callable], sync_tools: Dict[str, Callable]) -> Dict[str, Callable]:
+        """
+        包装异步工具注册表（与同步工具共用缓存条目，后台刷新使用同步实现）
+
+        Args:
+            async_tools: 工具名 -> 异步工具函数
+            sync_tools: 工具名 -> 未包装的同步工具函数
+
+        Returns:
+            新的异步工具注册表
+        """
+        wrapped = {}
+        for name, func in async_tools.items():
+            if name in self.policies and name in sync_tools:
+                wrapped[name] = self._wrap_async_tool(name, func, sync_tools[name])
+            else:
+                wrapped[name] = func
+        return wrapped
+
+    def _wrap_tool(self, name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def cached_tool(*args, **kwargs):
+            return self.call(name, func, *args, **kwargs)
+        return cached_tool
+
+    def _wrap_async_tool(self, name: str, func: Callable, sync_func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def cached_tool(*args, **kwargs):
+            return await self.call_async(name, func, sync_func, *args, **kwargs)
+        return cached_tool
+
+    def call(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        通过缓存调用工具
+
+        Args:
+            name: 工具名称
+            func: 原始工具函数
+            *args, **kwargs: 工具参数
+
+        Returns:
+            工具结果（可能是宽限期内的旧结果）
+        """
+        key = self._cache_key(name, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+        found, value = self._serve(name, key, func, args, kwargs)
+        if found:
+            return value
+
+        value = func(*args, **kwargs)
+        self._store((name, key), value, self.policies[name].ttl_for(key))
+        return value
+
+    async def call_async(self, name: str, func: Callable, sync_func: Callable, *args, **kwargs) -> Any:
+        """
+        call 的异步版本（未命中时await异步实现，后台刷新在刷新线程中调用同步实现）
+
+        Args:
+            name: 工具名称
+            func: 原始异步工具函数
+            sync_func: 原始同步工具函数（用于后台刷新）
+            *args, **kwargs: 工具参数
+
+        Returns:
+            工具结果（可能是宽限期内的旧结果）
+        """
+        key = self._cache_key(name, args, kwargs)
+        if key is None:
+            return await func(*args, **kwargs)
+        found, value = self._serve(name, key, sync_func, args, kwargs)
+        if found:
+            return value
+
+        value = await func(*args, **kwargs)
+        self._store((name, key), value, self.policies[name].ttl_for(key))
+        return value
+
+    def _cache_key(self, name: str, args: tuple, kwargs: dict) -> Optional[tuple]:
+        """计算缓存键（None表示不缓存）"""
+        try:
+            return self.policies[name].key_func(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"工具 {name} 缓存键计算失败，直接调用: {e}")
+            return None
+
+    def _serve(self, name: str, key: tuple, refresh_func: Callable, args: tuple, kwargs: dict) -> Tuple[bool, Any]:
+        """
+        查找缓存条目，需要时提交后台刷新
+
+        Returns:
+            (是否命中, 缓存结果)；过期超过宽限期或不存在时返回(False, None)
+        """
+        cache_key = (name, key)
+        refresh_kind = None
+        with self.lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                age = time.time() - entry.stored_at
+                if age < entry.ttl:
+                    entry.hits += 1
+                    self._stats[name]["hits"] += 1
+                    if (entry.hits >= self.popular_hits and age >= entry.ttl * self.refresh_ahead
+                            and not entry.refreshing):
+                        refresh_kind = "refresh_ahead"
+                elif age < entry.ttl * (1 + self.stale_factor):
+                    entry.hits += 1
+                    self._stats[name]["stale_hits"] += 1
+                    if not entry.refreshing:
+                        refresh_kind = "refreshes"
+                else:
+                    del self._entries[cache_key]
+                    entry = None
+
+            if entry is None:
+                self._stats[name]["misses"] += 1
+                return False, None
+            self._entries.move_to_end(cache_key)
+            if refresh_kind:
+                entry.refreshing = True
+                self._stats[name][refresh_kind] += 1
+            value = entry.value
+
+        if refresh_kind:
+            logger.debug(f"🔄 工具 {name} 缓存后台刷新（{refresh_kind}）: {key}")
+            self._refresher.submit(self._refresh, name, cache_key, self.policies[name].ttl_for(key),
+                                   refresh_func, args, kwargs)
+        return True, value
+
+    def _refresh(self, name: str, cache_key: Hashable, ttl: float, func: Callable, args: tuple, kwargs: dict):
+        """后台刷新一个缓存条目（失败或空结果时保留旧结果）"""
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            value = None
+            with self.lock:
+                self._stats[name]["errors"] += 1
+            logger.warning(f"工具 {name} 缓存后台刷新失败: {e}")
+        if value:
+            self._store(cache_key, value, ttl)
+            return
+        with self.lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def _store(self, cache_key: Hashable, value: Any, ttl: float):
+        """写入缓存（空结果不缓存；保留原条目的命中次数以便继续提前刷新）"""
+        if not value:
+            return
+        with self.lock:
+            previous = self._entries.pop(cache_key, None)
+            self._entries[cache_key] = _CacheEntry(
+                value=value,
+                stored_at=time.time(),
+                ttl=ttl,
+                hits=previous.hits if previous else 0
+            )
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self._entries.clear()
+        logger.info("已清空工具结果缓存")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self.lock:
+            per_tool = {name: dict(counters) for name, counters in self._stats.items()}
+            size = len(self._entries)
+        for counters in per_tool.values():
+            served = counters["hits"] + counters["stale_hits"]
+            total = served + counters["misses"]
+            counters["hit_rate"] = f"{served / total * 100:.1f}%" if total else "0.0%"
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "tools": per_tool
+        }
+
+
+def _finance_ttl(key: tuple) -> float:
+    """包含加密货币时使用更短的TTL"""
+    _, cryptos, _ = key
+    return settings.TOOL_CACHE_CRYPTO_TTL if cryptos else settings.TOOL_CACHE_FINANCE_TTL
+
+
+# 全局工具结果缓存实例
+_tool_cache = ToolResultCache(
+    policies={
+        "weather": ToolCachePolicy(ttl=settings.TOOL_CACHE_WEATHER_TTL, key_func=weather_cache_key),
+        "finance": ToolCachePolicy(ttl=settings.TOOL_CACHE_FINANCE_TTL, key_func=finance_cache_key, ttl_func=_finance_ttl),
+        "transport": ToolCachePolicy(ttl=settings.TOOL_CACHE_TRANSPORT_TTL, key_func=transport_cache_key),
+        "web_search": ToolCachePolicy(ttl=settings.TOOL_CACHE_WEB_SEARCH_TTL, key_func=web_search_cache_key),
+    },
+    max_size=settings.TOOL_CACHE_MAX_SIZE,
+    stale_factor=settings.TOOL_CACHE_STALE_FACTOR,
+    refresh_ahead=settings.TOOL_CACHE_REFRESH_AHEAD,
+    popular_hits=settings.TOOL_CACHE_POPULAR_HITS
+)
+
+
+def get_tool_cache() -> ToolResultCache:
+    """获取全局工具结果缓存实例"""
+    return _tool_cache
@@ -0,0 +1,324 @@
+"""
+并发工具执行器 - 在请求级截止时间内并行调用Agent工具
+
+Agent选中多个工具时，原实现按优先级依次阻塞调用，延迟叠加。
+这里先把所有选中的工具同时提交到线程池，再按原优先级顺序依次取结果：
+- 优先级逻辑不变（调用方仍按原顺序检查结果并决定是否提前结束）
+- 提前结束时，未开始的调用被取消，已在运行的调用结果被忽略
+- 超过截止时间的工具视为无结果
+
+推测执行：LLM规划期间先按规则路由的预测提交工具调用（mark_speculative），
+规划完成后，参数一致的步骤直接复用结果（take），未用到的调用被取消。
+
+异步路径（execute_async）用 submit_async 把工具协程作为asyncio任务提交，用 aget/atake 取结果，
+同一批次里线程池提交的调用也可以用 aget 等待。
+"""
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+
+
+def _call_key(args: tuple, kwargs: dict) -> tuple:
+    """调用参数的比较键（字符串忽略大小写和多余空白）"""
+    def normalize(value):
+        return re.sub(r"\s+", " ", value).strip().lower() if isinstance(value, str) else value
+    return tuple(normalize(a) for a in args), tuple(sorted((k, normalize(v)) for k, v in kwargs.items()))
+
+
+class ToolBatch:
+    """一次请求中并发提交的一批工具调用"""
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor], deadline: float):
+        """
+        Args:
+            executor: 执行工具调用的线程池（None表示在get时同步调用，不并发）
+            deadline: 截止时间（time.time()时间戳）
+        """
+        self.executor = executor
+        self.deadline = deadline
+        self.started_at = time.time()
+        self._futures: Dict[str, Future] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}  # submit_async 提交的异步调用
+        self._deferred: Dict[str, Callable] = {}
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self._calls: Dict[str, tuple] = {}  # 工具名 -> 调用参数的比较键
+        self._speculative: Set[str] = set()  # 推测执行提交的工具
+        self._consumed: Set[str] = set()  # 已被取用结果的工具
+
+    def submit(self, name: str, func: Callable, *args, **kwargs):
+        """提交工具调用（同名工具只提交一次）"""
+        if self._submitted(name):
+            return
+        timing = self._timings.setdefault(name, {"status": "pending"})
+        self._calls[name] = _call_key(args, kwargs)
+
+        def run():
+            start = time.time()
+            timing["queued_ms"] = round((start - self.started_at) * 1000, 1)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing["elapsed_ms"] = round((time.time() - start) * 1000, 1)
+
+        if self.executor is None:
+            self._deferred[name] = run
+        else:
+            self._futures[name] = self.executor.submit(run)
+
+    def submit_async(self, name: str, coro_func: Callable, *args, **kwargs):
+        """
+        在当前事件循环中提交异步工具调用（同名工具只提交一次，必须在协程中调用）
+
+        Args:
+            name: 工具名称
+            coro_func: 异步工具函数
+            *args, **kwargs: 工具参数
+        """
+        if self._submitted(name):
+            return
+        timing = self._timings.setdefault(name, {"status": "pending"})
+        self._calls[name] = _call_key(args, kwargs)
+
+        async def run():
+            start = time.time()
+            timing["queued_ms"] = round((start - self.started_at) * 1000, 1)
+            try:
+                return await coro_func(*args, **kwargs)
+            finally:
+                timing["elapsed_ms"] = round((time.time() - start) * 1000, 1)
+
+        self._tasks[name] = asyncio.ensure_future(run())
+
+    def _submitted(self, name: str) -> bool:
+        return name in self._futures or name in self._tasks or name in self._deferred
+
+    def get(self, name: str) -> Any:
+        """
+        获取工具结果（阻塞到结果返回或截止时间）
+
+        Args:
+            name: 工具名称
+
+        Returns:
+            工具返回值；超时、出错或未提交时返回空字符串
+        """
+        if name in self._deferred:
+            self._consumed.add(name)
+            return self._run_deferred(name)
+        future = self._futures.get(name)
+        if future is None:
+            return ""
+        self._consumed.add(name)
+        timing = self._timings[name]
+        wait_start = time.time()
+        remaining = self.deadline - wait_start
+        try:
+            result = future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            timing["status"] = "timeout"
+            future.cancel()
+            logger.warning(f"⏱️  工具 {name} 超过截止时间，跳过")
+            return ""
+        except Exception as e:
+            timing["status"] = "error"
+            timing["error"] = str(e)
+            logger.error(f"工具 {name} 调用失败: {e}")
+            return ""
+        finally:
+            timing["waited_ms"] = round((time.time() - wait_start) * 1000, 1)
+        timing["status"] = "ok" if result else "empty"
+        return result
+
+    async def aget(self, name: str) -> Any:
+        """
+        get 的异步版本（等待时不阻塞事件循环，线程池提交的调用也可以等待）
+
+        Args:
+            name: 工具名称
+
+        Returns:
+            工具返回值；超时、出错或未提交时返回空字符串
+        """
+        if name in self._deferred:
+            self._consumed.add(name)
+            return await asyncio.to_thread(self._run_deferred, name)
+        pending = self._tasks.get(name)
+        if pending is None and name in self._futures:
+            pending = asyncio.wrap_future(self._futures[name])
+        if pending is None:
+            return ""
+        self._consumed.add(name)
+        timing = self._timings[name]
+        wait_start = time.time()
+        remaining = self.deadline - wait_start
+        try:
+            # 超时时wait_for会取消任务（线程池中的调用未开始则取消，已运行则忽略结果）
+            result = await asyncio.wait_for(pending, timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            timing["status"] = "timeout"
+            logger.warning(f"⏱️  工具 {name} 超过截止时间，跳过")
+            return ""
+        except Exception as e:
+            timing["status"] = "error"
+            timing["error"] = str(e)
+            logger.error(f"工具 {name} 调用失败: {e}")
+            return ""
+        finally:
+            timing["waited_ms"] = round((time.time() - wait_start) * 1000, 1)
+        timing["status"] = "ok" if result else "empty"
+        return result
+
+    def take(self, name: str, *args, **kwargs) -> Tuple[bool, Any]:
+        """
+        复用已提交的调用结果（工具名和参数都一致时才复用）
+
+        Args:
+            name: 工具名称
+            *args, **kwargs: 调用方本来要使用的参数
+
+        Returns:
+            (是否复用, 结果)；参数不一致、调用出错或超时时返回(False, None)，调用方应自行调用工具
+        """
+        if self._calls.get(name) != _call_key(args, kwargs):
+            return False, None
+        result = self.get(name)
+        if self._timings[name]["status"] not in ("ok", "empty"):
+            return False, None
+        return True, result
+
+    async def atake(self, name: str, *args, **kwargs) -> Tuple[bool, Any]:
+        """take 的异步版本"""
+        if self._calls.get(name) != _call_key(args, kwargs):
+            return False, None
+        result = await self.aget(name)
+        if self._timings[name]["status"] not in ("ok", "empty"):
+            return False, None
+        return True, result
+
+    def mark_speculative(self):
+        """把目前已提交的调用标记为推测执行（用于统计命中率和节省的延迟）"""
+        self._speculative = set(self._futures) | set(self._tasks) | set(self._deferred)
+
+    def extend_deadline(self, seconds: float):
+        """延长截止时间（推测执行的批次在规划完成后交给后续阶段使用）"""
+        self.deadline = max(self.deadline, time.time() + seconds)
+
+    def speculation_summary(self) -> Dict[str, Any]:
+        """推测执行统计：命中的工具、命中率、节省的延迟（工具在被取用前已经运行的时间）"""
+        hits = sorted(name for name in self._speculative if name in self._consumed
+                      and self._timings[name]["status"] in ("ok", "empty"))
+        saved_ms = 0.0
+        for name in hits:
+            timing = self._timings[name]
+            saved_ms += max(timing.get("elapsed_ms", 0.0) - timing.get("waited_ms", 0.0), 0.0)
+        return {
+            "speculated": sorted(self._speculative),
+            "hits": hits,
+            "hit_rate": round(len(hits) / len(self._speculative), 4) if self._speculative else 0.0,
+            "latency_saved_ms": round(saved_ms, 1)
+        }
+
+    def _run_deferred(self, name: str) -> Any:
+        """同步执行未并发提交的调用"""
+        timing = self._timings[name]
+        try:
+            result = self._deferred.pop(name)()
+        except Exception as e:
+            timing["status"] = "error"
+            timing["error"] = str(e)
+            logger.error(f"工具 {name} 调用失败: {e}")
+            return ""
+        timing["status"] = "ok" if result else "empty"
+        return result
+
+    def cancel_pending(self):
+        """取消尚未使用的调用（未开始的直接取消，运行中的结果忽略）"""
+        for name, future in self._futures.items():
+            timing = self._timings[name]
+            if timing["status"] != "pending":
+                continue
+            timing["status"] = "cancelled" if future.cancel() else "ignored"
+        for name, task in self._tasks.items():
+            timing = self._timings[name]
+            if timing["status"] != "pending":
+                continue
+            timing["status"] = "cancelled" if task.cancel() else "ignored"
+        for name in self._deferred:
+            self._timings[name]["status"] = "cancelled"
+        self._deferred.clear()
+
+    def timings(self) -> Dict[str, Dict[str, Any]]:
+        """各工具的耗时和状态"""
+        self.cancel_pending()
+        return {name: dict(timing) for name, timing in self._timings.items()}
+
+
+class ToolExecutor:
+    """Agent工具并发执行器"""
+
+    def __init__(self, max_workers: int = 8, deadline: float = 15.0):
+        """
+        Args:
+            max_workers: 线程池大小
+            deadline: 默认的请求级截止时间（秒）
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+        self.deadline = deadline
+        self.lock = Lock()
+        self._speculation = {"batches": 0, "speculated": 0, "hits": 0, "latency_saved_ms": 0.0}
+
+    def batch(self, deadline: Optional[float] = None, parallel: bool = True) -> ToolBatch:
+        """
+        创建一批工具调用
+
+        Args:
+            deadline: 本次请求的截止秒数，默认使用初始化参数
+            parallel: 是否并发执行（False时在取结果时同步调用，行为与原顺序执行一致）
+        """
+        return ToolBatch(self.executor if parallel else None, time.time() + (deadline or self.deadline))
+
+    def finish_speculation(self, batch: ToolBatch) -> Dict[str, Any]:
+        """
+        结束一次推测执行：取消未用到的调用并累计统计
+
+        Args:
+            batch: 推测执行的批次
+
+        Returns:
+            本次推测执行的统计
+        """
+        batch.cancel_pending()
+        summary = batch.speculation_summary()
+        with self.lock:
+            self._speculation["batches"] += 1
+            self._speculation["speculated"] += len(summary["speculated"])
+            self._speculation["hits"] += len(summary["hits"])
+            self._speculation["latency_saved_ms"] += summary["latency_saved_ms"]
+        logger.info(f"🔮 推测执行: 命中 {summary['hits'] or '无'} / 预取 {summary['speculated']}，"
+                    f"节省约 {summary['latency_saved_ms']:.0f}ms")
+        return summary
+
+    def speculation_stats(self) -> Dict[str, Any]:
+        """推测执行的累计统计"""
+        with self.lock:
+            stats = dict(self._speculation)
+        stats["hit_rate"] = f"{stats['hits'] / stats['speculated'] * 100:.1f}%" if stats["speculated"] else "0.0%"
+        stats["latency_saved_ms"] = round(stats["latency_saved_ms"], 1)
+        return stats
+
+
+# 全局工具执行器实例
+_tool_executor = ToolExecutor(
+    max_workers=settings.AGENT_TOOL_WORKERS,
+    deadline=settings.AGENT_TOOL_DEADLINE
+)
+
+
+def get_tool_executor() -> ToolExecutor:
+    """获取全局工具执行器实例"""
+    return _tool_executor
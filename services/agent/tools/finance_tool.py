@@ -1,11 +1,94 @@
 """
 金融工具 - 获取股票和加密货币数据
 """
-import requests
-from typing import Dict, Optional
+import asyncio
+import re
+from typing import Dict, List, Optional, Tuple
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session
 from services.core.logger import logger
 
 
+# 公司名到股票代码的映射（中英文）
+COMPANY_TO_TICKER: Dict[str, str] = {
+    # 美股
+    "apple": "AAPL", "苹果": "AAPL",
+    "microsoft": "MSFT", "微软": "MSFT",
+    "google": "GOOGL", "alphabet": "GOOGL", "谷歌": "GOOGL",
+    "amazon": "AMZN", "亚马逊": "AMZN",
+    "tesla": "TSLA", "特斯拉": "TSLA",
+    "meta": "META", "facebook": "META",
+    "nvidia": "NVDA", "英伟达": "NVDA",
+    "amd": "AMD",
+    "intel": "INTC", "英特尔": "INTC",
+    "netflix": "NFLX",
+    # 中概股/港股
+    "alibaba": "BABA", "阿里巴巴": "BABA", "阿里": "BABA",
+    "tencent": "0700.HK", "腾讯": "0700.HK",
+    "byd": "002594.SZ", "比亚迪": "002594.SZ",
+    "xiaomi": "1810.HK", "小米": "1810.HK",
+    "baidu": "BIDU", "百度": "BIDU",
+    "jd": "JD", "京东": "JD",
+    "nio": "NIO", "蔚来": "NIO",
+    "xpeng": "XPEV", "小鹏": "XPEV",
+    "li auto": "LI", "理想": "LI",
+}
+
+
+# CoinGecko ID映射（常见币种，CoinGecko使用id而不是symbol）
+COIN_IDS: Dict[str, str] = {
+    "btc": "bitcoin",
+    "eth": "ethereum",
+    "usdt": "tether",
+    "bnb": "binancecoin",
+    "sol": "solana",
+    "ada": "cardano",
+    "doge": "dogecoin",
+    "xrp": "ripple",
+    "dot": "polkadot",
+    "matic": "matic-network"
+}
+
+_YAHOO_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+_COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price"
+
+
+def _stock_symbol(symbol: str, region: str) -> str:
+    """规范化股票代码（港股补全.HK后缀）"""
+    symbol_upper = symbol.upper()
+    if region == "HK" and not symbol_upper.endswith(".HK"):
+        symbol_upper = f"{symbol_upper}.HK"
+    return symbol_upper
+
+
+def _stock_url(symbol_upper: str) -> str:
+    """Yahoo Finance行情接口地址"""
+    return f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol_upper}"
+
+
+def _format_stock_info(symbol_upper: str, data: Dict) -> Optional[str]:
+    """从Yahoo Finance返回的JSON中提取价格信息"""
+    result = data.get("chart", {}).get("result", [])
+    if not result:
+        return None
+    quote = result[0].get("meta", {})
+    current_price = quote.get("regularMarketPrice", "N/A")
+    previous_close = quote.get("previousClose", "N/A")
+    change = quote.get("regularMarketPrice", 0) - quote.get("previousClose", 0)
+    change_percent = (change / quote.get("previousClose", 1)) * 100 if quote.get("previousClose") else 0
+    
+    info = f"股票代码: {symbol_upper}\n"
+    info += f"当前价格: ${current_price:.2f}\n" if isinstance(current_price, (int, float)) else f"当前价格: {current_price}\n"
+    info += f"前收盘价: ${previous_close:.2f}\n" if isinstance(previous_close, (int, float)) else f"前收盘价: {previous_close}\n"
+    if isinstance(change, (int, float)) and isinstance(change_percent, (int, float)):
+        change_sign = "+" if change >= 0 else ""
+        info += f"涨跌: {change_sign}${change:.2f} ({change_sign}{change_percent:.2f}%)\n"
+    
+    logger.info(f"成功获取股票 {symbol_upper} 的价格信息")
+    return info
+
+
 def get_stock_price(symbol: str, region: str = "US") -> Optional[str]:
     """
     获取股票价格（使用免费的Yahoo Finance API模拟）
@@ -20,38 +103,33 @@ def get_stock_price(symbol: str, region: str = "US") -> Optional[str]:
     try:
         # 注意：Yahoo Finance API可能需要认证，这里使用简化的实现
         # 实际生产环境建议使用正式的金融API（如Alpha Vantage）
-        symbol_upper = symbol.upper()
+        symbol_upper = _stock_symbol(symbol, region)
         
-        # 对于港股，使用Yahoo Finance格式
-        if region == "HK" and not symbol_upper.endswith(".HK"):
-            symbol_upper = f"{symbol_upper}.HK"
+        response = get_http_session().get(_stock_url(symbol_upper), headers=_YAHOO_HEADERS, timeout=5)
+        if response.status_code == 200:
+            info = _format_stock_info(symbol_upper, response.json())
+            if info:
+                return info
         
-        # 使用免费的Yahoo Finance API（通过yfinance库或直接API调用）
-        # 这里使用简化的网页搜索方式获取信息
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol_upper}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
+        logger.warning(f"无法获取股票 {symbol_upper} 的价格信息")
+        return None
         
-        response = requests.get(url, headers=headers, timeout=5)
+    except Exception as e:
+        logger.error(f"获取股票价格失败: {e}")
+        return None
+
+
+async def get_stock_price_async(symbol: str, region: str = "US") -> Optional[str]:
+    """get_stock_price 的异步版本"""
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(get_stock_price, symbol, region)
+    try:
+        symbol_upper = _stock_symbol(symbol, region)
+        
+        response = await get_async_client().get(_stock_url(symbol_upper), headers=_YAHOO_HEADERS, timeout=5)
         if response.status_code == 200:
-            data = response.json()
-            result = data.get("chart", {}).get("result", [])
-            if result:
-                quote = result[0].get("meta", {})
-                current_price = quote.get("regularMarketPrice", "N/A")
-                previous_close = quote.get("previousClose", "N/A")
-                change = quote.get("regularMarketPrice", 0) - quote.get("previousClose", 0)
-                change_percent = (change / quote.get("previousClose", 1)) * 100 if quote.get("previousClose") else 0
-                
-                info = f"股票代码: {symbol_upper}\n"
-                info += f"当前价格: ${current_price:.2f}\n" if isinstance(current_price, (int, float)) else f"当前价格: {current_price}\n"
-                info += f"前收盘价: ${previous_close:.2f}\n" if isinstance(previous_close, (int, float)) else f"前收盘价: {previous_close}\n"
-                if isinstance(change, (int, float)) and isinstance(change_percent, (int, float)):
-                    change_sign = "+" if change >= 0 else ""
-                    info += f"涨跌: {change_sign}${change:.2f} ({change_sign}{change_percent:.2f}%)\n"
-                
-                logger.info(f"成功获取股票 {symbol_upper} 的价格信息")
+            info = _format_stock_info(symbol_upper, response.json())
+            if info:
                 return info
         
         logger.warning(f"无法获取股票 {symbol_upper} 的价格信息")
@@ -62,6 +140,40 @@ def get_stock_price(symbol: str, region: str = "US") -> Optional[str]:
         return None
 
 
+def _crypto_params(symbol: str) -> Dict[str, str]:
+    """CoinGecko查询参数"""
+    symbol_lower = symbol.lower()
+    return {
+        "ids": COIN_IDS.get(symbol_lower, symbol_lower),
+        "vs_currencies": "usd",
+        "include_24hr_change": "true"
+    }
+
+
+def _format_crypto_info(symbol: str, coin_id: str, data: Dict) -> Optional[str]:
+    """从CoinGecko返回的JSON中提取价格信息"""
+    if coin_id not in data:
+        return None
+    price_info = data[coin_id]
+    price = price_info.get("usd", "N/A")
+    change_24h = price_info.get("usd_24h_change", "N/A")
+    
+    info = f"加密货币: {symbol.upper()}\n"
+    if isinstance(price, (int, float)):
+        info += f"当前价格: ${price:,.2f}\n"
+    else:
+        info += f"当前价格: {price}\n"
+    
+    if isinstance(change_24h, (int, float)):
+        change_sign = "+" if change_24h >= 0 else ""
+        info += f"24小时涨跌: {change_sign}{change_24h:.2f}%\n"
+    else:
+        info += f"24小时涨跌: {change_24h}\n"
+    
+    logger.info(f"成功获取加密货币 {symbol.upper()} 的价格信息")
+    return info
+
+
 def get_crypto_price(symbol: str) -> Optional[str]:
     """
     获取加密货币价格（使用免费的CoinGecko API）
@@ -73,54 +185,11 @@ def get_crypto_price(symbol: str) -> Optional[str]:
         加密货币价格信息字符串，如果失败返回None
     """
     try:
-        symbol_lower = symbol.lower()
-        
-        # 使用CoinGecko免费API
-        url = f"https://api.coingecko.com/api/v3/simple/price"
-        params = {
-            "ids": symbol_lower,  # CoinGecko使用id而不是symbol
-            "vs_currencies": "usd",
-            "include_24hr_change": "true"
-        }
-        
-        # CoinGecko ID映射（常见币种）
-        coin_ids = {
-            "btc": "bitcoin",
-            "eth": "ethereum",
-            "usdt": "tether",
-            "bnb": "binancecoin",
-            "sol": "solana",
-            "ada": "cardano",
-            "doge": "dogecoin",
-            "xrp": "ripple",
-            "dot": "polkadot",
-            "matic": "matic-network"
-        }
-        
-        coin_id = coin_ids.get(symbol_lower, symbol_lower)
-        params["ids"] = coin_id
-        
-        response = requests.get(url, params=params, timeout=5)
+        params = _crypto_params(symbol)
+        response = get_http_session().get(_COINGECKO_URL, params=params, timeout=5)
         if response.status_code == 200:
-            data = response.json()
-            if coin_id in data:
-                price_info = data[coin_id]
-                price = price_info.get("usd", "N/A")
-                change_24h = price_info.get("usd_24h_change", "N/A")
-                
-                info = f"加密货币: {symbol.upper()}\n"
-                if isinstance(price, (int, float)):
-                    info += f"当前价格: ${price:,.2f}\n"
-                else:
-                    info += f"当前价格: {price}\n"
-                
-                if isinstance(change_24h, (int, float)):
-                    change_sign = "+" if change_24h >= 0 else ""
-                    info += f"24小时涨跌: {change_sign}{change_24h:.2f}%\n"
-                else:
-                    info += f"24小时涨跌: {change_24h}\n"
-                
-                logger.info(f"成功获取加密货币 {symbol.upper()} 的价格信息")
+            info = _format_crypto_info(symbol, params["ids"], response.json())
+            if info:
                 return info
         
         logger.warning(f"无法获取加密货币 {symbol.upper()} 的价格信息")
@@ -131,75 +200,75 @@ def get_crypto_price(symbol: str) -> Optional[str]:
         return None
 
 
-def get_finance_context(query: str, num_results: int = 3) -> str:
+async def get_crypto_price_async(symbol: str) -> Optional[str]:
+    """get_crypto_price 的异步版本"""
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(get_crypto_price, symbol)
+    try:
+        params = _crypto_params(symbol)
+        response = await get_async_client().get(_COINGECKO_URL, params=params, timeout=5)
+        if response.status_code == 200:
+            info = _format_crypto_info(symbol, params["ids"], response.json())
+            if info:
+                return info
+        
+        logger.warning(f"无法获取加密货币 {symbol.upper()} 的价格信息")
+        return None
+        
+    except Exception as e:
+        logger.error(f"获取加密货币价格失败: {e}")
+        return None
+
+
+def _stock_region(ticker: str) -> str:
+    """根据股票代码判断地区"""
+    region = "HK" if ".HK" in ticker else "US"
+    if ".SS" in ticker or ".SZ" in ticker:
+        region = "CN"
+    return region
+
+
+# 股票代码模式（如 AAPL, TSLA, 0700.HK）
+STOCK_PATTERNS = [
+    r'\b([A-Z]{1,5}(?:\.HK|\.SS|\.SZ)?)\b',  # 股票代码
+    r'([0-9]{4}\.(?:HK|SS|SZ))',  # 港股/A股代码
+]
+
+# 加密货币关键词到代码的映射
+CRYPTO_KEYWORDS: Dict[str, str] = {
+    "bitcoin": "btc", "btc": "btc",
+    "ethereum": "eth", "eth": "eth",
+    "usdt": "usdt", "tether": "usdt",
+    "binance": "bnb", "bnb": "bnb",
+    "solana": "sol", "sol": "sol",
+}
+
+
+def extract_finance_symbols(query: str) -> Tuple[List[str], List[str]]:
     """
-    根据查询内容获取金融信息上下文
+    从查询中识别要查询的股票代码和加密货币代码
     
     Args:
         query: 用户查询
-        num_results: 返回结果数量
         
     Returns:
-        金融信息上下文字符串
+        (股票代码列表, 加密货币代码列表)，按查询时的顺序排列
     """
     query_lower = query.lower()
-    contexts = []
-    
-    # 提取股票代码（增强的智能匹配）
-    import re
-    
-    # 公司名到股票代码的映射（中英文）
-    company_to_ticker = {
-        # 美股
-        "apple": "AAPL", "苹果": "AAPL",
-        "microsoft": "MSFT", "微软": "MSFT",
-        "google": "GOOGL", "alphabet": "GOOGL", "谷歌": "GOOGL",
-        "amazon": "AMZN", "亚马逊": "AMZN",
-        "tesla": "TSLA", "特斯拉": "TSLA",
-        "meta": "META", "facebook": "META",
-        "nvidia": "NVDA", "英伟达": "NVDA",
-        "amd": "AMD",
-        "intel": "INTC", "英特尔": "INTC",
-        "netflix": "NFLX",
-        # 中概股/港股
-        "alibaba": "BABA", "阿里巴巴": "BABA", "阿里": "BABA",
-        "tencent": "0700.HK", "腾讯": "0700.HK",
-        "byd": "002594.SZ", "比亚迪": "002594.SZ",
-        "xiaomi": "1810.HK", "小米": "1810.HK",
-        "baidu": "BIDU", "百度": "BIDU",
-        "jd": "JD", "京东": "JD",
-        "nio": "NIO", "蔚来": "NIO",
-        "xpeng": "XPEV", "小鹏": "XPEV",
-        "li auto": "LI", "理想": "LI",
-    }
-    
-    # 匹配股票代码模式（如 AAPL, TSLA, 0700.HK）
-    stock_patterns = [
-        r'\b([A-Z]{1,5}(?:\.HK|\.SS|\.SZ)?)\b',  # 股票代码
-        r'([0-9]{4}\.(?:HK|SS|SZ))',  # 港股/A股代码
-    ]
-    
-    # 匹配加密货币代码
-    crypto_keywords = {
-        "bitcoin": "btc", "btc": "btc",
-        "ethereum": "eth", "eth": "eth",
-        "usdt": "usdt", "tether": "usdt",
-        "binance": "bnb", "bnb": "bnb",
-        "solana": "sol", "sol": "sol",
-    }
+    tickers_found = []
+    cryptos_found = []
     
     # 检测股票相关查询
     if any(kw in query_lower for kw in ["stock", "股票", "股价", "price", "price of"]):
         # 优先尝试从公司名映射中查找
-        tickers_found = []
-        for company_name, ticker in company_to_ticker.items():
+        for company_name, ticker in COMPANY_TO_TICKER.items():
             if company_name in query_lower:
                 tickers_found.append(ticker)
                 logger.info(f"从公司名'{company_name}'识别股票代码: {ticker}")
         
         # 如果没有找到公司名，尝试从查询中提取股票代码
         if not tickers_found:
-            for pattern in stock_patterns:
+            for pattern in STOCK_PATTERNS:
                 matches = re.findall(pattern, query, re.IGNORECASE)
                 for match in matches:
                     if isinstance(match, tuple):
@@ -209,32 +278,68 @@ def get_finance_context(query: str, num_results: int = 3) -> str:
                     # 过滤掉常见的非股票代码词
                     if symbol.upper() not in ["STOCK", "PRICE", "OF", "THE", "AND", "OR", "FOR", "TO", "IN", "ON", "AT"]:
                         tickers_found.append(symbol)
-        
-        # 获取股票信息
-        for ticker in tickers_found[:num_results]:
-            # 判断地区
-            region = "HK" if ".HK" in ticker else "US"
-            if ".SS" in ticker or ".SZ" in ticker:
-                region = "CN"
-            
-            stock_info = get_stock_price(ticker, region)
-            if stock_info:
-                contexts.append(stock_info)
-                if len(contexts) >= num_results:
-                    break
     
     # 检测加密货币相关查询
     if any(kw in query_lower for kw in ["crypto", "加密货币", "bitcoin", "ethereum", "btc", "eth"]):
-        for keyword, symbol in crypto_keywords.items():
-            if keyword in query_lower and len(contexts) < num_results:
-                crypto_info = get_crypto_price(symbol)
-                if crypto_info:
-                    contexts.append(crypto_info)
-                    if len(contexts) >= num_results:
-                        break
+        for keyword, symbol in CRYPTO_KEYWORDS.items():
+            if keyword in query_lower:
+                cryptos_found.append(symbol)
+    
+    return tickers_found, cryptos_found
+
+
+def get_finance_context(query: str, num_results: int = 3) -> str:
+    """
+    根据查询内容获取金融信息上下文
+    
+    Args:
+        query: 用户查询
+        num_results: 返回结果数量
+        
+    Returns:
+        金融信息上下文字符串
+    """
+    tickers_found, cryptos_found = extract_finance_symbols(query)
+    contexts = []
+    
+    # 获取股票信息
+    for ticker in tickers_found[:num_results]:
+        stock_info = get_stock_price(ticker, _stock_region(ticker))
+        if stock_info:
+            contexts.append(stock_info)
+            if len(contexts) >= num_results:
+                break
+    
+    # 获取加密货币信息
+    for symbol in cryptos_found:
+        if len(contexts) >= num_results:
+            break
+        crypto_info = get_crypto_price(symbol)
+        if crypto_info:
+            contexts.append(crypto_info)
     
     if not contexts:
         return ""
     
     return "\n\n".join(contexts)
 
+
+async def get_finance_context_async(query: str, num_results: int = 3) -> str:
+    """
+    get_finance_context 的异步版本：识别出的股票和加密货币同时查询，按原顺序取前num_results个结果
+    
+    Args:
+        query: 用户查询
+        num_results: 返回结果数量
+        
+    Returns:
+        金融信息上下文字符串
+    """
+    tickers_found, cryptos_found = extract_finance_symbols(query)
+    results = await asyncio.gather(
+        *[get_stock_price_async(ticker, _stock_region(ticker)) for ticker in tickers_found[:num_results]],
+        *[get_crypto_price_async(symbol) for symbol in cryptos_found[:num_results]]
+    )
+    contexts = [info for info in results if info][:num_results]
+    
+    return "\n\n".join(contexts)
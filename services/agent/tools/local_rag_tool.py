@@ -2,6 +2,8 @@
 本地知识库RAG工具 - 将RAG封装成Agent工具
 """
 from typing import Dict, List
+from services.core.config import settings
+from services.core.executors import get_executor
 from services.vector.retriever import retriever
 
 
@@ -55,6 +57,11 @@ def get_local_knowledge_context(query: str, top_k: int = 8) -> str:
     if not search_results:
         return ""
     
+    # 压缩并在token预算内打包上下文
+    if settings.CONTEXT_PACKING_ENABLED or settings.CONTEXT_COMPRESSION_ENABLED:
+        context, _ = retriever.build_context(query, search_results)
+        return context
+    
     # 构建上下文（移除调试信息，更简洁）
     context_parts = []
     for result in search_results:
@@ -64,3 +71,7 @@ def get_local_knowledge_context(query: str, top_k: int = 8) -> str:
     
     return "\n\n".join(context_parts)
 
+
+async def get_local_knowledge_context_async(query: str, top_k: int = 8) -> str:
+    """get_local_knowledge_context 的异步版本（embedding、Milvus检索和重排序在embedding执行器池中执行）"""
+    return await get_executor("embedding").run(get_local_knowledge_context, query, top_k)
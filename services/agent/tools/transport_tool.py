@@ -1,7 +1,6 @@
 """
 交通工具 - 获取旅行时间和物流信息
 """
-import requests
 from typing import Dict, Optional
 from services.core.logger import logger
 
@@ -117,6 +116,21 @@ def extract_location_pair(query: str) -> Optional[tuple]:
     return None
 
 
+# 交通相关关键词
+TRANSPORT_KEYWORDS = [
+    "travel", "旅行", "journey", "路线", "route",
+    "time", "时间", "how long", "多久",
+    "distance", "距离", "driving", "驾车",
+    "walking", "步行", "transit", "公共交通"
+]
+
+
+def is_transport_query(query: str) -> bool:
+    """查询中是否包含交通相关关键词"""
+    query_lower = query.lower()
+    return any(kw in query_lower for kw in TRANSPORT_KEYWORDS)
+
+
 def get_transport_context(query: str, num_results: int = 3) -> str:
     """
     根据查询内容获取交通信息上下文
@@ -128,17 +142,7 @@ def get_transport_context(query: str, num_results: int = 3) -> str:
     Returns:
         交通信息上下文字符串
     """
-    query_lower = query.lower()
-    
-    # 检测交通相关关键词
-    transport_keywords = [
-        "travel", "旅行", "journey", "路线", "route",
-        "time", "时间", "how long", "多久",
-        "distance", "距离", "driving", "驾车",
-        "walking", "步行", "transit", "公共交通"
-    ]
-    
-    if not any(kw in query_lower for kw in transport_keywords):
+    if not is_transport_query(query):
         return ""
     
     # 提取地点对
@@ -153,3 +157,7 @@ def get_transport_context(query: str, num_results: int = 3) -> str:
     # 如果没有提取到地点对，返回通用提示
     return "检测到交通查询，但无法从问题中提取起点和终点。请使用格式：'从A到B需要多久' 或 'A to B travel time'"
 
+
+async def get_transport_context_async(query: str, num_results: int = 3) -> str:
+    """get_transport_context 的异步版本（路线估算不访问网络，直接计算）"""
+    return get_transport_context(query, num_results)
@@ -1,9 +1,65 @@
 """
 天气查询工具 - 使用免费的天气API
 """
-import requests
+import asyncio
 from typing import Dict, Optional
 import re
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session
+
+
+# 常见地点映射（查询中的写法 -> 天气API使用的地名）
+COMMON_LOCATIONS: Dict[str, str] = {
+    "hong kong": "Hong Kong",
+    "香港": "Hong Kong",
+    "beijing": "Beijing",
+    "北京": "Beijing",
+    "shanghai": "Shanghai",
+    "上海": "Shanghai",
+    "shenzhen": "Shenzhen",
+    "深圳": "Shenzhen",
+    "guangzhou": "Guangzhou",
+    "广州": "Guangzhou",
+    "taipei": "Taipei",
+    "台北": "Taipei",
+    "tokyo": "Tokyo",
+    "东京": "Tokyo",
+    "new york": "New York",
+    "london": "London"
+}
+
+
+def extract_location(text: str) -> Optional[str]:
+    """从文本中识别常见地点，返回天气API使用的地名（未识别时返回None）"""
+    text_lower = text.lower()
+    for key, value in COMMON_LOCATIONS.items():
+        if key in text_lower:
+            return value
+    return None
+
+
+def _weather_url(location: str) -> str:
+    """wttr.in查询地址（格式：wttr.in/{location}?format=j1 返回JSON）"""
+    location_clean = re.sub(r'[^\w\s-]', '', location).strip()
+    return f"http://wttr.in/{location_clean}?format=j1"
+
+
+def _parse_weather(location: str, data: Dict) -> Dict:
+    """从wttr.in返回的JSON中提取当前天气信息"""
+    current = data.get("current_condition", [{}])[0]
+    weather_info = {
+        "location": location,
+        "temperature": current.get("temp_C", "N/A"),
+        "feels_like": current.get("FeelsLikeC", "N/A"),
+        "condition": current.get("weatherDesc", [{}])[0].get("value", "N/A"),
+        "humidity": current.get("humidity", "N/A"),
+        "wind_speed": current.get("windspeedKmph", "N/A"),
+        "wind_direction": current.get("winddir16Point", "N/A")
+    }
+    
+    return {
+        "success": True,
+        "weather": weather_info
+    }
 
 
 def get_weather(location: str) -> Dict:
@@ -18,30 +74,26 @@ def get_weather(location: str) -> Dict:
     """
     try:
         # 使用wttr.in（免费，无需API key，适合快速测试）
-        # 格式：wttr.in/{location}?format=j1 返回JSON
-        location_clean = re.sub(r'[^\w\s-]', '', location).strip()
-        url = f"http://wttr.in/{location_clean}?format=j1"
-        
-        response = requests.get(url, timeout=10)
+        response = get_http_session().get(_weather_url(location), timeout=10)
         response.raise_for_status()
-        data = response.json()
-        
-        # 提取当前天气信息
-        current = data.get("current_condition", [{}])[0]
-        weather_info = {
-            "location": location,
-            "temperature": current.get("temp_C", "N/A"),
-            "feels_like": current.get("FeelsLikeC", "N/A"),
-            "condition": current.get("weatherDesc", [{}])[0].get("value", "N/A"),
-            "humidity": current.get("humidity", "N/A"),
-            "wind_speed": current.get("windspeedKmph", "N/A"),
-            "wind_direction": current.get("winddir16Point", "N/A")
-        }
+        return _parse_weather(location, response.json())
         
+    except Exception as e:
         return {
-            "success": True,
-            "weather": weather_info
+            "success": False,
+            "error": str(e),
+            "weather": {}
         }
+
+
+async def get_weather_async(location: str) -> Dict:
+    """get_weather 的异步版本（共享AsyncClient，不阻塞事件循环）"""
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(get_weather, location)
+    try:
+        response = await get_async_client().get(_weather_url(location), timeout=10)
+        response.raise_for_status()
+        return _parse_weather(location, response.json())
         
     except Exception as e:
         return {
@@ -51,18 +103,8 @@ def get_weather(location: str) -> Dict:
         }
 
 
-def get_weather_context(location: str) -> str:
-    """
-    获取天气信息的文本描述
-    
-    Args:
-        location: 地点名称
-        
-    Returns:
-        格式化的天气信息文本
-    """
-    weather_result = get_weather(location)
-    
+def _format_weather_context(location: str, weather_result: Dict) -> str:
+    """把天气信息字典格式化为文本"""
     if not weather_result["success"]:
         return ""
     
@@ -77,3 +119,20 @@ def get_weather_context(location: str) -> str:
     
     return context
 
+
+def get_weather_context(location: str) -> str:
+    """
+    获取天气信息的文本描述
+    
+    Args:
+        location: 地点名称
+        
+    Returns:
+        格式化的天气信息文本
+    """
+    return _format_weather_context(location, get_weather(location))
+
+
+async def get_weather_context_async(location: str) -> str:
+    """get_weather_context 的异步版本"""
+    return _format_weather_context(location, await get_weather_async(location))
@@ -1,13 +1,127 @@
 """
 网页搜索工具 - 使用Tavily AI / Google Custom Search / DuckDuckGo进行网页搜索
 """
-import requests
+import asyncio
 from typing import Dict, List, Optional
 from urllib.parse import quote
 from services.core.config import settings
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session
 from services.core.logger import logger
 
 
+def _tavily_enabled() -> bool:
+    """是否配置并启用了Tavily AI Search"""
+    tavily_api_key = getattr(settings, 'TAVILY_API_KEY', None)
+    use_tavily = getattr(settings, 'USE_TAVILY_SEARCH', True)
+    return bool(tavily_api_key and use_tavily)
+
+
+def _format_tavily(query: str, tavily_result: Dict) -> Optional[Dict]:
+    """Tavily结果转换为统一格式（无结果或出错时返回None）"""
+    if "error" in tavily_result or not tavily_result.get("results"):
+        return None
+    results = []
+    for item in tavily_result["results"]:
+        results.append({
+            "title": item.get("title", ""),
+            "snippet": item.get("content", "")[:200],  # 限制长度
+            "url": item.get("url", ""),
+            "type": "tavily_search",
+            "score": item.get("score", 0.0)
+        })
+    
+    logger.info(f"✅ 使用Tavily AI搜索获取 {len(results)} 个结果")
+    
+    return {
+        "success": True,
+        "query": query,
+        "results": results,
+        "ai_answer": tavily_result.get("answer", "")  # Tavily的AI答案摘要
+    }
+
+
+_GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+
+def _google_params(query: str, num_results: int) -> Optional[Dict]:
+    """Google Custom Search API参数（需要API Key和CSE ID，未配置时返回None）"""
+    google_api_key = getattr(settings, 'GOOGLE_SEARCH_API_KEY', None)
+    google_cse_id = getattr(settings, 'GOOGLE_CSE_ID', None)
+    if not (google_api_key and google_api_key != "your-google-search-api-key-here" and google_cse_id):
+        return None
+    return {
+        "key": google_api_key,
+        "cx": google_cse_id,
+        "q": query,
+        "num": min(num_results, 10)  # Google API最多返回10个结果
+    }
+
+
+def _parse_google(query: str, data: Dict, num_results: int) -> Optional[Dict]:
+    """Google搜索结果转换为统一格式（无结果时返回None）"""
+    results = []
+    for item in data.get("items", [])[:num_results]:
+        results.append({
+            "title": item.get("title", ""),
+            "snippet": item.get("snippet", ""),
+            "url": item.get("link", ""),
+            "type": "google_search"
+        })
+    
+    if not results:
+        return None
+    logger.info(f"使用Google搜索API获取 {len(results)} 个结果")
+    return {
+        "success": True,
+        "query": query,
+        "results": results
+    }
+
+
+def _duckduckgo_url(query: str) -> str:
+    return f"https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1"
+
+
+def _parse_duckduckgo(query: str, data: Dict, num_results: int) -> Dict:
+    """DuckDuckGo结果转换为统一格式"""
+    results = []
+    
+    # Abstract (直接答案)
+    if data.get("Abstract"):
+        results.append({
+            "title": data.get("Heading", ""),
+            "snippet": data.get("Abstract", ""),
+            "url": data.get("AbstractURL", ""),
+            "type": "abstract"
+        })
+    
+    # Related Topics
+    for topic in data.get("RelatedTopics", [])[:num_results]:
+        if isinstance(topic, dict):
+            results.append({
+                "title": topic.get("Text", ""),
+                "snippet": topic.get("Text", ""),
+                "url": topic.get("FirstURL", ""),
+                "type": "related"
+            })
+    
+    # Definition
+    if data.get("Definition"):
+        results.append({
+            "title": "定义",
+            "snippet": data.get("Definition", ""),
+            "url": data.get("DefinitionURL", ""),
+            "type": "definition"
+        })
+    
+    logger.info(f"使用DuckDuckGo API获取 {len(results)} 个结果")
+    return {
+        "success": True,
+        "query": query,
+        "results": results[:num_results]
+    }
+
+
 def web_search(query: str, num_results: int = 5) -> Dict:
     """
     网页搜索工具（优先级：Tavily > Google > DuckDuckGo）
@@ -20,129 +134,86 @@ def web_search(query: str, num_results: int = 5) -> Dict:
         搜索结果字典
     """
     # 🌟 优先使用Tavily AI Search（专为AI优化）
-    tavily_api_key = getattr(settings, 'TAVILY_API_KEY', None)
-    use_tavily = getattr(settings, 'USE_TAVILY_SEARCH', True)
-    
-    if tavily_api_key and use_tavily:
+    if _tavily_enabled():
         try:
             from services.tools.tavily_search import get_tavily_client
             
-            tavily_client = get_tavily_client()
-            tavily_result = tavily_client.search(
+            tavily_result = get_tavily_client().search(
                 query=query,
                 max_results=num_results,
                 search_depth="basic",  # 可选: "basic" (平衡) 或 "advanced" (深度)
                 include_answer=True
-                # 注意: timeout是requests的参数，不是Tavily API的参数
             )
-            
-            if "error" not in tavily_result and tavily_result.get("results"):
-                # 转换为统一格式
-                results = []
-                for item in tavily_result["results"]:
-                    results.append({
-                        "title": item.get("title", ""),
-                        "snippet": item.get("content", "")[:200],  # 限制长度
-                        "url": item.get("url", ""),
-                        "type": "tavily_search",
-                        "score": item.get("score", 0.0)
-                    })
-                
-                logger.info(f"✅ 使用Tavily AI搜索获取 {len(results)} 个结果")
-                
-                return {
-                    "success": True,
-                    "query": query,
-                    "results": results,
-                    "ai_answer": tavily_result.get("answer", "")  # Tavily的AI答案摘要
-                }
+            result = _format_tavily(query, tavily_result)
+            if result:
+                return result
         except Exception as e:
             logger.warning(f"⚠️  Tavily搜索失败: {e}，回退到Google/DuckDuckGo")
     
     # 回退到Google Custom Search API
-    google_api_key = getattr(settings, 'GOOGLE_SEARCH_API_KEY', None)
-    google_cse_id = getattr(settings, 'GOOGLE_CSE_ID', None)
-    
-    # Google Custom Search API需要API Key和CSE ID
-    if google_api_key and google_api_key != "your-google-search-api-key-here" and google_cse_id:
+    params = _google_params(query, num_results)
+    if params:
         try:
-            # 使用Google Custom Search API
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                "key": google_api_key,
-                "cx": google_cse_id,
-                "q": query,
-                "num": min(num_results, 10)  # Google API最多返回10个结果
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = get_http_session().get(_GOOGLE_SEARCH_URL, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for item in data.get("items", [])[:num_results]:
-                results.append({
-                    "title": item.get("title", ""),
-                    "snippet": item.get("snippet", ""),
-                    "url": item.get("link", ""),
-                    "type": "google_search"
-                })
-            
-            if results:
-                logger.info(f"使用Google搜索API获取 {len(results)} 个结果")
-                return {
-                    "success": True,
-                    "query": query,
-                    "results": results
-                }
+            result = _parse_google(query, response.json(), num_results)
+            if result:
+                return result
         except Exception as e:
             logger.warning(f"Google搜索API失败: {e}，回退到DuckDuckGo")
     
     # 回退到DuckDuckGo API (免费，无需API key)
     try:
-        url = f"https://api.duckduckgo.com/?q={quote(query)}&format=json&no_html=1&skip_disambig=1"
-        
-        response = requests.get(url, timeout=10)
+        response = get_http_session().get(_duckduckgo_url(query), timeout=10)
         response.raise_for_status()
-        data = response.json()
-        
-        # 提取结果
-        results = []
-        
-        # Abstract (直接答案)
-        if data.get("Abstract"):
-            results.append({
-                "title": data.get("Heading", ""),
-                "snippet": data.get("Abstract", ""),
-                "url": data.get("AbstractURL", ""),
-                "type": "abstract"
-            })
-        
-        # Related Topics
-        for topic in data.get("RelatedTopics", [])[:num_results]:
-            if isinstance(topic, dict):
-                results.append({
-                    "title": topic.get("Text", ""),
-                    "snippet": topic.get("Text", ""),
-                    "url": topic.get("FirstURL", ""),
-                    "type": "related"
-                })
+        return _parse_duckduckgo(query, response.json(), num_results)
         
-        # Definition
-        if data.get("Definition"):
-            results.append({
-                "title": "定义",
-                "snippet": data.get("Definition", ""),
-                "url": data.get("DefinitionURL", ""),
-                "type": "definition"
-            })
-        
-        logger.info(f"使用DuckDuckGo API获取 {len(results)} 个结果")
+    except Exception as e:
+        logger.error(f"DuckDuckGo搜索失败: {e}")
         return {
-            "success": True,
-            "query": query,
-            "results": results[:num_results]
+            "success": False,
+            "error": str(e),
+            "results": []
         }
+
+
+async def web_search_async(query: str, num_results: int = 5) -> Dict:
+    """web_search 的异步版本（回退顺序相同，共享AsyncClient）"""
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(web_search, query, num_results)
+    
+    if _tavily_enabled():
+        try:
+            from services.tools.tavily_search import get_tavily_client
+            
+            tavily_result = await get_tavily_client().search_async(
+                query=query,
+                max_results=num_results,
+                search_depth="basic",
+                include_answer=True
+            )
+            result = _format_tavily(query, tavily_result)
+            if result:
+                return result
+        except Exception as e:
+            logger.warning(f"⚠️  Tavily搜索失败: {e}，回退到Google/DuckDuckGo")
+    
+    client = get_async_client()
+    params = _google_params(query, num_results)
+    if params:
+        try:
+            response = await client.get(_GOOGLE_SEARCH_URL, params=params, timeout=10)
+            response.raise_for_status()
+            result = _parse_google(query, response.json(), num_results)
+            if result:
+                return result
+        except Exception as e:
+            logger.warning(f"Google搜索API失败: {e}，回退到DuckDuckGo")
+    
+    try:
+        response = await client.get(_duckduckgo_url(query), timeout=10)
+        response.raise_for_status()
+        return _parse_duckduckgo(query, response.json(), num_results)
         
     except Exception as e:
         logger.error(f"DuckDuckGo搜索失败: {e}")
@@ -153,19 +224,8 @@ def web_search(query: str, num_results: int = 5) -> Dict:
         }
 
 
-def get_web_search_context(query: str, num_results: int = 3) -> str:
-    """
-    获取网页搜索结果的文本上下文
-    
-    Args:
-        query: 搜索查询
-        num_results: 返回结果数量
-        
-    Returns:
-        格式化的搜索上下文文本
-    """
-    search_result = web_search(query, num_results)
-    
+def _format_search_context(search_result: Dict) -> str:
+    """把搜索结果格式化为文本上下文"""
     if not search_result["success"] or not search_result["results"]:
         return ""
     
@@ -180,3 +240,22 @@ def get_web_search_context(query: str, num_results: int = 3) -> str:
                 context_parts.append(f"[搜索结果{i}]: {snippet}")
     
     return "\n\n".join(context_parts)
+
+
+def get_web_search_context(query: str, num_results: int = 3) -> str:
+    """
+    获取网页搜索结果的文本上下文
+    
+    Args:
+        query: 搜索查询
+        num_results: 返回结果数量
+        
+    Returns:
+        格式化的搜索上下文文本
+    """
+    return _format_search_context(web_search(query, num_results))
+
+
+async def get_web_search_context_async(query: str, num_results: int = 3) -> str:
+    """get_web_search_context 的异步版本"""
+    return _format_search_context(await web_search_async(query, num_results))
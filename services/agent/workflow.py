@@ -11,6 +11,7 @@ from typing import Dict, List, Optional, Any, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 from services.core.logger import logger
+from services.agent.keyword_router import get_query_features, WORKFLOW_COMPANIES
 
 # 尝试导入LangGraph版本（如果可用）
 try:
@@ -20,6 +21,9 @@ except ImportError:
     LangGraphWorkflowEngine = None
     get_langgraph_workflow_engine = None
 
+# 规则引擎（自定义引擎和LangGraph引擎）支持的工作流类型
+RULE_WORKFLOW_TYPES = ("finance_comparison",)
+
 
 class WorkflowStepStatus(Enum):
     """工作流步骤状态"""
@@ -105,21 +109,15 @@ class WorkflowEngine:
         Returns:
             工作流类型名称，如果不需要工作流则返回None
         """
-        query_lower = query.lower()
+        features = get_query_features(query)
         
         # 检测金融对比查询（如NVIDIA vs AMD）
-        finance_comparison_keywords = [
-            "compare", "对比", "vs", "versus", "difference", "差异",
-            "impact", "影响", "earnings", "财报", "stock price", "股价"
-        ]
-        
-        if any(kw in query_lower for kw in finance_comparison_keywords):
+        if features.has("finance_comparison"):
             # 检查是否涉及多个股票/公司
             # 简单检测：包含多个股票代码或公司名
-            company_keywords = ["nvidia", "amd", "apple", "microsoft", "google", "tesla"]
-            company_count = sum(1 for company in company_keywords if company in query_lower)
+            company_count = features.count(f"company:{company}" for company in WORKFLOW_COMPANIES)
             
-            if company_count >= 2 or ("compare" in query_lower and "stock" in query_lower):
+            if company_count >= 2 or (features.has("compare") and features.has("stock")):
                 return "finance_comparison"
         
         # 可以添加更多工作流类型检测
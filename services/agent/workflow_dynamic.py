@@ -4,15 +4,26 @@
 特点：
 1. 支持任意步骤组合，不局限于预定义模板
 2. 处理步骤依赖关系
-3. 并行执行无依赖的步骤（可选）
+3. 按依赖关系（DAG）并行执行无依赖的步骤（asyncio任务 + 并发上限 + 计划级截止时间）
 4. 提供详细的执行日志和错误处理
 5. 支持步骤级的重试和回退
+
+execute_async 是主实现：有异步版本的工具直接await，其余工具在线程池中执行；execute 是它的同步封装。
 """
-from typing import Dict, List, Optional, Any, Callable
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional, Any, Callable, Set, Tuple
 from dataclasses import dataclass, field
 from services.agent.workflow_llm_planner import WorkflowPlan, WorkflowStep
+from services.agent.tool_executor import ToolBatch
+from services.core.config import settings
+from services.core.http_client import run_sync
 from services.core.logger import logger
 
+# 查询中引用其他步骤结果的占位符，例如 {step_1_company}
+_STEP_PLACEHOLDER = re.compile(r'\{step_(\d+)\w*\}')
+
 
 @dataclass
 class ExecutionContext:
@@ -23,31 +34,67 @@ class ExecutionContext:
     completed_steps: List[int] = field(default_factory=list)  # 已完成的步骤ID
     failed_steps: List[int] = field(default_factory=list)  # 失败的步骤ID
     metadata: Dict[str, Any] = field(default_factory=dict)  # 额外的元数据
+    step_timings: Dict[int, Dict[str, float]] = field(default_factory=dict)  # 步骤耗时（start_ms/end_ms/elapsed_ms，相对工作流开始）
+    critical_path: List[int] = field(default_factory=list)  # 关键路径上的步骤ID（按执行顺序）
+    critical_path_ms: float = 0.0  # 关键路径总耗时
+    wall_time_ms: float = 0.0  # 工作流实际耗时
 
 
 class DynamicWorkflowEngine:
     """动态工作流执行引擎"""
     
-    def __init__(self, tools: Dict[str, Callable]):
+    def __init__(
+        self,
+        tools: Dict[str, Callable],
+        max_workers: int = 4,
+        deadline: float = 30.0,
+        async_tools: Optional[Dict[str, Callable]] = None
+    ):
         """
         初始化执行引擎
         
         Args:
             tools: 工具字典，键为工具名称，值为工具函数
+            max_workers: 同时执行的步骤数上限
+            deadline: 单个计划的截止时间（秒）
+            async_tools: 异步工具字典（有异步版本的工具优先使用，不占用线程）
         """
         self.tools = tools
+        self.async_tools = async_tools or {}
+        self.max_workers = max_workers
+        self.deadline = deadline
         logger.info(f"动态工作流执行引擎初始化，可用工具: {list(tools.keys())}")
     
-    def execute(self, plan: WorkflowPlan, query: str) -> ExecutionContext:
+    def execute(self, plan: WorkflowPlan, query: str, speculative: Optional[ToolBatch] = None) -> ExecutionContext:
         """
-        执行工作流计划
+        执行工作流计划（execute_async 的同步封装）
         
         Args:
             plan: 工作流计划
             query: 原始查询
+            speculative: 规划期间推测执行的工具批次（可选）
             
         Returns:
-            执行上下文（包含所有步骤结果）
+            执行上下文（包含所有步骤结果和关键路径耗时）
+        """
+        return run_sync(self.execute_async(plan, query, speculative))
+    
+    async def execute_async(
+        self,
+        plan: WorkflowPlan,
+        query: str,
+        speculative: Optional[ToolBatch] = None
+    ) -> ExecutionContext:
+        """
+        执行工作流计划（按依赖关系调度，无依赖的步骤并行执行）
+        
+        Args:
+            plan: 工作流计划
+            query: 原始查询
+            speculative: 规划期间推测执行的工具批次（可选）
+            
+        Returns:
+            执行上下文（包含所有步骤结果和关键路径耗时）
         """
         # 初始化执行上下文
         context = ExecutionContext(query=query, plan=plan)
@@ -61,135 +108,237 @@ class DynamicWorkflowEngine:
         logger.info(f"   计划步骤数: {len(plan.steps)}")
         logger.info(f"   LLM推理: {plan.reasoning[:100]}...")
         
-        # 按步骤ID排序
-        sorted_steps = sorted(plan.steps, key=lambda s: s.step_id)
+        dependencies = self._resolve_dependencies(plan.steps)
+        start = time.time()
+        deadline = start + self.deadline
+        
+        # 按步骤ID排序，同时就绪的步骤按ID顺序提交
+        pending = sorted(plan.steps, key=lambda s: s.step_id)
+        running: Dict[asyncio.Task, WorkflowStep] = {}
+        slots = asyncio.Semaphore(self.max_workers)
+        finished: Set[int] = set()  # 已结束（完成/失败/跳过）的步骤
+        
+        while pending or running:
+            # 跳过依赖失败/跳过的步骤，提交依赖全部完成的步骤
+            for step in list(pending):
+                deps = dependencies[step.step_id]
+                if any(dep in finished and dep not in context.completed_steps for dep in deps):
+                    pending.remove(step)
+                    self._skip_step(step, context, "依赖步骤失败或被跳过")
+                    finished.add(step.step_id)
+                elif all(dep in context.completed_steps for dep in deps):
+                    pending.remove(step)
+                    running[self._submit_step(step, context, start, slots, speculative)] = step
+            
+            if not running:
+                # 剩余步骤的依赖无法满足（引用不存在的步骤或存在循环依赖）
+                for step in pending:
+                    self._skip_step(step, context, "依赖无法满足")
+                break
+            
+            done, _ = await asyncio.wait(list(running), timeout=max(deadline - time.time(), 0),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # 计划级截止时间已到：运行中的步骤记为失败，未开始的步骤跳过
+                logger.warning(f"⏱️  工作流超过截止时间 {self.deadline}s，停止等待剩余步骤")
+                for task, step in running.items():
+                    task.cancel()
+                    step.status = "failed"
+                    step.result = None
+                    context.failed_steps.append(step.step_id)
+                    context.step_timings.setdefault(step.step_id, {})["timeout"] = True
+                for step in pending:
+                    self._skip_step(step, context, "工作流超过截止时间")
+                context.metadata["deadline_exceeded"] = True
+                break
+            
+            for task in done:
+                step = running.pop(task)
+                self._record_step_result(step, task, context)
+                finished.add(step.step_id)
         
-        # 执行每个步骤
-        for step in sorted_steps:
-            self._execute_step(step, context)
+        context.wall_time_ms = (time.time() - start) * 1000
+        self._compute_critical_path(context, dependencies)
         
         # 总结执行结果
+        serial_ms = sum(t.get("elapsed_ms", 0.0) for t in context.step_timings.values())
         logger.info(f"✅ 工作流执行完成:")
         logger.info(f"   - 成功步骤: {len(context.completed_steps)}/{len(plan.steps)}")
         logger.info(f"   - 失败步骤: {len(context.failed_steps)}/{len(plan.steps)}")
+        logger.info(f"   - 耗时: {context.wall_time_ms:.0f}ms（关键路径 {context.critical_path} "
+                    f"{context.critical_path_ms:.0f}ms，串行合计 {serial_ms:.0f}ms）")
         
         return context
     
-    def _execute_step(self, step: WorkflowStep, context: ExecutionContext) -> None:
+    def _resolve_dependencies(self, steps: List[WorkflowStep]) -> Dict[int, Set[int]]:
         """
-        执行单个步骤
+        计算每个步骤的实际依赖
         
-        Args:
-            step: 工作流步骤
-            context: 执行上下文
+        除了计划中声明的dependencies，查询中引用 {step_N_xxx} 占位符的步骤也隐式依赖步骤N
+        （原来按ID顺序串行执行时这一点是自动满足的）
         """
-        # 检查依赖关系
-        if not self._check_dependencies(step, context):
-            logger.warning(f"步骤 {step.step_id} 的依赖未满足，跳过执行")
-            step.status = "skipped"
-            context.failed_steps.append(step.step_id)
-            return
-        
+        step_ids = {step.step_id for step in steps}
+        dependencies = {}
+        for step in steps:
+            deps = set(step.dependencies or [])
+            for match in _STEP_PLACEHOLDER.finditer(step.query or ""):
+                dep_id = int(match.group(1))
+                if dep_id in step_ids and dep_id != step.step_id:
+                    deps.add(dep_id)
+            dependencies[step.step_id] = deps
+        return dependencies
+    
+    def _submit_step(
+        self,
+        step: WorkflowStep,
+        context: ExecutionContext,
+        start: float,
+        slots: asyncio.Semaphore,
+        speculative: Optional[ToolBatch] = None
+    ) -> asyncio.Task:
+        """把单个步骤提交为asyncio任务（同时运行的步骤数受slots限制）"""
         step.status = "running"
         logger.info(f"▶️  执行步骤 {step.step_id}: {step.action}")
         logger.info(f"   - 工具: {step.tool}")
         logger.info(f"   - 查询: {step.query[:80]}...")
         logger.info(f"   - 原因: {step.reason}")
         
+        timing = context.step_timings.setdefault(step.step_id, {})
+        # 在调度协程中准备查询，依赖步骤的结果此时都已写入context
+        query = self._prepare_query(step, context)
+        
+        async def run():
+            async with slots:
+                timing["start_ms"] = (time.time() - start) * 1000
+                try:
+                    if step.tool not in self.tools and step.tool not in self.async_tools:
+                        raise ValueError(f"工具 '{step.tool}' 不可用")
+                    return await self._call_tool(step.tool, step, query, speculative)
+                finally:
+                    timing["end_ms"] = (time.time() - start) * 1000
+                    timing["elapsed_ms"] = timing["end_ms"] - timing["start_ms"]
+        
+        return asyncio.ensure_future(run())
+    
+    def _record_step_result(self, step: WorkflowStep, task: asyncio.Task, context: ExecutionContext) -> None:
+        """
+        记录步骤执行结果（只在调度协程中修改step和context）
+        
+        Args:
+            step: 工作流步骤
+            task: 步骤的asyncio任务
+            context: 执行上下文
+        """
         try:
-            # 获取工具函数
-            tool_func = self.tools.get(step.tool)
-            
-            if not tool_func:
-                raise ValueError(f"工具 '{step.tool}' 不可用")
-            
-            # 根据工具类型调用
-            result = self._call_tool(step.tool, tool_func, step, context)
-            
-            # 保存结果
-            step.result = result
-            step.status = "completed"
-            context.step_results[step.step_id] = result
-            context.completed_steps.append(step.step_id)
-            
-            logger.info(f"✅ 步骤 {step.step_id} 完成")
-            if result:
-                preview = str(result)[:100] if result else "无结果"
-                logger.debug(f"   结果预览: {preview}...")
-            
+            result = task.result()
         except Exception as e:
             step.status = "failed"
             step.result = None
             context.failed_steps.append(step.step_id)
             logger.error(f"❌ 步骤 {step.step_id} 失败: {e}")
             
-            # 容错：继续执行后续步骤
-            logger.info("   继续执行后续步骤（容错模式）")
+            # 容错：继续执行不依赖该步骤的其他步骤
+            logger.info("   继续执行其他步骤（容错模式）")
+            return
+        
+        # 保存结果
+        step.result = result
+        step.status = "completed"
+        context.step_results[step.step_id] = result
+        context.completed_steps.append(step.step_id)
+        
+        logger.info(f"✅ 步骤 {step.step_id} 完成 ({context.step_timings[step.step_id].get('elapsed_ms', 0):.0f}ms)")
+        if result:
+            preview = str(result)[:100] if result else "无结果"
+            logger.debug(f"   结果预览: {preview}...")
+    
+    def _skip_step(self, step: WorkflowStep, context: ExecutionContext, reason: str) -> None:
+        """跳过步骤（依赖未满足），与原实现一致记入failed_steps"""
+        logger.warning(f"步骤 {step.step_id} 跳过: {reason}")
+        step.status = "skipped"
+        context.failed_steps.append(step.step_id)
     
-    def _check_dependencies(self, step: WorkflowStep, context: ExecutionContext) -> bool:
+    def _compute_critical_path(self, context: ExecutionContext, dependencies: Dict[int, Set[int]]) -> None:
         """
-        检查步骤的依赖是否满足
+        计算关键路径：沿依赖链累加步骤耗时，取总耗时最长的一条
         
         Args:
-            step: 工作流步骤
             context: 执行上下文
-            
-        Returns:
-            依赖是否满足
+            dependencies: 步骤依赖关系
         """
-        if not step.dependencies:
-            return True
-        
-        for dep_id in step.dependencies:
-            if dep_id not in context.completed_steps:
-                logger.warning(f"步骤 {step.step_id} 依赖步骤 {dep_id}，但该步骤未完成")
-                return False
+        finish: Dict[int, float] = {}
+        previous: Dict[int, Optional[int]] = {}
+        
+        def longest(step_id: int) -> float:
+            if step_id in finish:
+                return finish[step_id]
+            finish[step_id] = 0.0  # 防止循环依赖导致无限递归
+            best_dep, best = None, 0.0
+            for dep in dependencies.get(step_id, ()):
+                if dep in context.step_timings:
+                    value = longest(dep)
+                    if value > best:
+                        best_dep, best = dep, value
+            finish[step_id] = best + context.step_timings[step_id].get("elapsed_ms", 0.0)
+            previous[step_id] = best_dep
+            return finish[step_id]
+        
+        for step_id in context.step_timings:
+            longest(step_id)
+        if not finish:
+            return
         
-        return True
+        end = max(finish, key=finish.get)
+        path = []
+        while end is not None:
+            path.append(end)
+            end = previous.get(end)
+        context.critical_path = list(reversed(path))
+        context.critical_path_ms = finish[context.critical_path[-1]]
     
-    def _call_tool(
+    async def _call_tool(
         self, 
         tool_name: str, 
-        tool_func: Callable, 
         step: WorkflowStep, 
-        context: ExecutionContext
+        query: str,
+        speculative: Optional[ToolBatch] = None
     ) -> Any:
         """
-        调用工具函数
+        调用工具函数（有异步版本时直接await，否则在线程池中执行）
         
         Args:
             tool_name: 工具名称
-            tool_func: 工具函数
             step: 当前步骤
-            context: 执行上下文
+            query: 已替换占位符的查询
+            speculative: 规划期间推测执行的工具批次（工具和参数一致时直接复用结果）
             
         Returns:
             工具执行结果
         """
-        # 准备查询参数（可以从context中动态获取）
-        query = self._prepare_query(step, context)
-        
-        # 根据工具类型调用
-        if tool_name == "finance":
-            return tool_func(query, num_results=3)
-        
-        elif tool_name == "web_search":
-            return tool_func(query, num_results=3)
+        args, kwargs = self._tool_args(tool_name, step, query)
+        if speculative is not None:
+            reused, result = await speculative.atake(tool_name, *args, **kwargs)
+            if reused:
+                logger.info(f"🔮 步骤 {step.step_id} 复用推测执行的 {tool_name} 结果")
+                return result
+        async_func = self.async_tools.get(tool_name)
+        if async_func is not None:
+            return await async_func(*args, **kwargs)
+        return await asyncio.to_thread(self.tools[tool_name], *args, **kwargs)
+    
+    def _tool_args(self, tool_name: str, step: WorkflowStep, query: str) -> Tuple[tuple, dict]:
+        """根据工具类型确定调用参数"""
+        if tool_name in ("finance", "web_search", "transport"):
+            return (query,), {"num_results": 3}
         
         elif tool_name == "weather":
             # 从entities中提取地点，或使用默认值
             location = step.entities.get("location", "Hong Kong")
-            return tool_func(location)
-        
-        elif tool_name == "transport":
-            return tool_func(query, num_results=3)
-        
-        elif tool_name == "local_rag":
-            return tool_func(query)
+            return (location,), {}
         
         else:
-            # 通用调用
-            return tool_func(query)
+            # local_rag 及通用调用
+            return (query,), {}
     
     def _prepare_query(self, step: WorkflowStep, context: ExecutionContext) -> str:
         """
@@ -206,7 +355,6 @@ class DynamicWorkflowEngine:
         
         # 如果查询中包含占位符，从context中替换
         # 例如：{step_1_company} -> 从步骤1的结果中提取的公司名
-        import re
         placeholders = re.findall(r'\{(\w+)\}', query)
         
         for placeholder in placeholders:
@@ -282,10 +430,18 @@ class DynamicWorkflowEngine:
 _dynamic_engine: Optional[DynamicWorkflowEngine] = None
 
 
-def get_dynamic_workflow_engine(tools: Dict[str, Callable]) -> DynamicWorkflowEngine:
+def get_dynamic_workflow_engine(
+    tools: Dict[str, Callable],
+    async_tools: Optional[Dict[str, Callable]] = None
+) -> DynamicWorkflowEngine:
     """获取或创建动态工作流执行引擎实例"""
     global _dynamic_engine
     if _dynamic_engine is None:
-        _dynamic_engine = DynamicWorkflowEngine(tools)
+        _dynamic_engine = DynamicWorkflowEngine(
+            tools,
+            max_workers=settings.WORKFLOW_MAX_PARALLEL,
+            deadline=settings.WORKFLOW_DEADLINE,
+            async_tools=async_tools
+        )
     return _dynamic_engine
 
@@ -8,6 +8,7 @@
 """
 from typing import Dict, List, Optional, Any, Callable, TypedDict, Annotated
 from services.core.logger import logger
+from services.agent.keyword_router import get_query_features, WORKFLOW_COMPANIES
 
 try:
     from langgraph.graph import StateGraph, END
@@ -18,6 +19,16 @@ except ImportError:
     END = None
 
 
+def _detect_finance_comparison(query: str) -> Optional[str]:
+    """检测金融对比工作流（与WorkflowEngine.detect_workflow_type规则一致）"""
+    features = get_query_features(query)
+    if features.has("finance_comparison"):
+        company_count = features.count(f"company:{company}" for company in WORKFLOW_COMPANIES)
+        if company_count >= 2 or (features.has("compare") and features.has("stock")):
+            return "finance_comparison"
+    return None
+
+
 class WorkflowState(TypedDict):
     """工作流状态（LangGraph兼容）"""
     query: str  # 原始查询
@@ -86,26 +97,9 @@ class LangGraphWorkflowEngine:
     
     def _detect_workflow_node(self, state: WorkflowState) -> WorkflowState:
         """检测工作流类型节点"""
-        query = state["query"]
-        query_lower = query.lower()
-        
-        # 检测金融对比查询
-        finance_keywords = [
-            "compare", "对比", "vs", "versus", "difference", "差异",
-            "impact", "影响", "earnings", "财报", "stock price", "股价"
-        ]
-        
-        if any(kw in query_lower for kw in finance_keywords):
-            company_keywords = ["nvidia", "amd", "apple", "microsoft", "google", "tesla"]
-            company_count = sum(1 for company in company_keywords if company in query_lower)
-            
-            if company_count >= 2 or ("compare" in query_lower and "stock" in query_lower):
-                state["context"]["workflow_type"] = "finance_comparison"
-                logger.info("检测到金融对比工作流")
-            else:
-                state["context"]["workflow_type"] = None
-        else:
-            state["context"]["workflow_type"] = None
+        state["context"]["workflow_type"] = _detect_finance_comparison(state["query"])
+        if state["context"]["workflow_type"]:
+            logger.info("检测到金融对比工作流")
         
         state["current_step"] = "detect_workflow"
         state["steps_completed"].append("detect_workflow")
@@ -241,20 +235,7 @@ class LangGraphWorkflowEngine:
         if not LANGGRAPH_AVAILABLE:
             return None
         
-        query_lower = query.lower()
-        finance_keywords = [
-            "compare", "对比", "vs", "versus", "difference", "差异",
-            "impact", "影响", "earnings", "财报", "stock price", "股价"
-        ]
-        
-        if any(kw in query_lower for kw in finance_keywords):
-            company_keywords = ["nvidia", "amd", "apple", "microsoft", "google", "tesla"]
-            company_count = sum(1 for company in company_keywords if company in query_lower)
-            
-            if company_count >= 2 or ("compare" in query_lower and "stock" in query_lower):
-                return "finance_comparison"
-        
-        return None
+        return _detect_finance_comparison(query)
     
     def execute_workflow(self, query: str, workflow_type: Optional[str] = None) -> WorkflowState:
         """
@@ -51,11 +51,16 @@ LLM生成的计划：
     }
 }
 """
+import asyncio
 import json
+import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
 from services.llm.unified_client import unified_llm_client
+from services.core.http_client import run_sync
+from services.core.config import settings
 from services.core.logger import logger
+from services.agent.plan_cache import get_plan_cache
 
 
 @dataclass
@@ -81,6 +86,7 @@ class WorkflowPlan:
     entities: Dict[str, Any] = field(default_factory=dict)  # 全局提取的实体
     confidence: float = 0.0  # LLM规划的置信度
     reasoning: str = ""  # LLM的推理过程
+    metadata: Dict[str, Any] = field(default_factory=dict)  # 附加信息（如计划缓存命中情况）
 
 
 class LLMWorkflowPlanner:
@@ -97,6 +103,18 @@ class LLMWorkflowPlanner:
         logger.info(f"LLM工作流规划器初始化，可用工具: {', '.join(available_tools)}")
     
     def analyze_query(self, query: str) -> WorkflowPlan:
+        """
+        使用LLM分析查询并生成工作流计划（analyze_query_async 的同步封装）
+        
+        Args:
+            query: 用户查询
+            
+        Returns:
+            工作流计划
+        """
+        return run_sync(self.analyze_query_async(query))
+    
+    async def analyze_query_async(self, query: str) -> WorkflowPlan:
         """
         使用LLM分析查询并生成工作流计划
         
@@ -106,7 +124,15 @@ class LLMWorkflowPlanner:
         Returns:
             工作流计划
         """
+        # 相同结构的查询（只是实体不同）直接复用缓存的计划
+        if settings.PLAN_CACHE_ENABLED:
+            # 模板匹配可能需要计算embedding，放到线程池避免阻塞事件循环
+            cached_plan = await asyncio.to_thread(get_plan_cache().lookup, query)
+            if cached_plan is not None:
+                return cached_plan
+
         logger.info(f"🧠 LLM开始分析查询: '{query[:100]}...'")
+        planning_start = time.time()
         
         # 构建LLM提示词
         system_prompt = self._build_planner_prompt()
@@ -120,7 +146,7 @@ class LLMWorkflowPlanner:
         
         try:
             # 调用LLM进行规划
-            llm_result = unified_llm_client.chat(
+            llm_result = await unified_llm_client.chat_async(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
                 max_tokens=1500,
@@ -146,6 +172,9 @@ class LLMWorkflowPlanner:
                        f"需要工作流={workflow_plan.requires_workflow}, "
                        f"步骤数={len(workflow_plan.steps)}")
             
+            if settings.PLAN_CACHE_ENABLED:
+                await asyncio.to_thread(get_plan_cache().store, query, workflow_plan, (time.time() - planning_start) * 1000)
+            
             return workflow_plan
             
         except Exception as e:
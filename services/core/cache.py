@@ -8,6 +8,7 @@ import time
 from typing import Any, Optional, Dict, List
 from functools import wraps
 from collections import OrderedDict
+from threading import RLock
 from services.core.logger import logger
 
 
@@ -26,6 +27,7 @@ class LRUCache:
         self.ttl = ttl
         self.cache: OrderedDict = OrderedDict()
         self.timestamps: Dict[str, float] = {}
+        self.lock = RLock()  # Agent工具并发调用时会在多个线程中读写同一缓存
         logger.info(f"初始化LRU缓存: max_size={max_size}, ttl={ttl}s")
     
     def _is_expired(self, key: str) -> bool:
@@ -57,22 +59,23 @@ class LRUCache:
         Returns:
             缓存值，如果不存在或已过期则返回None
         """
-        # 先清理过期项
-        self._clean_expired()
+        with self.lock:
+            # 先清理过期项
+            self._clean_expired()
         
-        if key in self.cache:
-            if not self._is_expired(key):
-                # 移到末尾（最近使用）
-                self.cache.move_to_end(key)
-                logger.debug(f"缓存命中: {key[:50]}...")
-                return self.cache[key]
-            else:
-                # 已过期，删除
-                self.cache.pop(key, None)
-                self.timestamps.pop(key, None)
-                logger.debug(f"缓存已过期: {key[:50]}...")
+            if key in self.cache:
+                if not self._is_expired(key):
+                    # 移到末尾（最近使用）
+                    self.cache.move_to_end(key)
+                    logger.debug(f"缓存命中: {key[:50]}...")
+                    return self.cache[key]
+                else:
+                    # 已过期，删除
+                    self.cache.pop(key, None)
+                    self.timestamps.pop(key, None)
+                    logger.debug(f"缓存已过期: {key[:50]}...")
         
-        return None
+            return None
     
     def set(self, key: str, value: Any):
         """
@@ -82,37 +85,40 @@ class LRUCache:
             key: 缓存键
             value: 缓存值
         """
-        # 先清理过期项
-        self._clean_expired()
+        with self.lock:
+            # 先清理过期项
+            self._clean_expired()
         
-        # 如果超过最大大小，删除最旧的项
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            # 删除最旧的项（第一个）
-            oldest_key = next(iter(self.cache))
-            self.cache.pop(oldest_key)
-            self.timestamps.pop(oldest_key, None)
-            logger.debug(f"缓存已满，删除最旧项: {oldest_key[:50]}...")
+            # 如果超过最大大小，删除最旧的项
+            if len(self.cache) >= self.max_size and key not in self.cache:
+                # 删除最旧的项（第一个）
+                oldest_key = next(iter(self.cache))
+                self.cache.pop(oldest_key)
+                self.timestamps.pop(oldest_key, None)
+                logger.debug(f"缓存已满，删除最旧项: {oldest_key[:50]}...")
         
-        # 添加新项
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
-        self.cache.move_to_end(key)
-        logger.debug(f"缓存已设置: {key[:50]}... (当前大小: {len(self.cache)})")
+            # 添加新项
+            self.cache[key] = value
+            self.timestamps[key] = time.time()
+            self.cache.move_to_end(key)
+            logger.debug(f"缓存已设置: {key[:50]}... (当前大小: {len(self.cache)})")
     
     def clear(self):
         """清空所有缓存"""
-        self.cache.clear()
-        self.timestamps.clear()
-        logger.info("缓存已清空")
+        with self.lock:
+            self.cache.clear()
+            self.timestamps.clear()
+            logger.info("缓存已清空")
     
     def stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        self._clean_expired()
-        return {
-            "size": len(self.cache),
-            "max_size": self.max_size,
-            "ttl": self.ttl
-        }
+        with self.lock:
+            self._clean_expired()
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "ttl": self.ttl
+            }
 
 
 def _generate_cache_key(query: str, extra_params: Optional[Dict] = None) -> str:
@@ -79,6 +79,22 @@ class Settings(BaseModel):
     GEMINI_ENABLED: bool = get_env_bool("GEMINI_ENABLED", True)
     GEMINI_PROJECT_NUMBER: str = get_env("GEMINI_PROJECT_NUMBER", "your-project-number-here")
     
+    # LLM流式输出配置（/rag_query/stream、/agent_query/stream）
+    LLM_STREAM_CONNECT_TIMEOUT: float = float(get_env("LLM_STREAM_CONNECT_TIMEOUT", "10"))  # 建立连接的超时（秒）
+    LLM_STREAM_READ_TIMEOUT: float = float(get_env("LLM_STREAM_READ_TIMEOUT", "30"))  # 相邻两个数据块之间的最长等待（秒）
+
+    # LLM对冲请求配置（HKGAI超过自适应延迟未返回时并发请求Gemini，取先成功的结果）
+    LLM_HEDGE_ENABLED: bool = get_env_bool("LLM_HEDGE_ENABLED", True)  # 是否启用对冲（需要配置Gemini）
+    LLM_HEDGE_PERCENTILE: float = float(get_env("LLM_HEDGE_PERCENTILE", "0.9"))  # 对冲延迟取HKGAI最近延迟的该分位数
+    LLM_HEDGE_MIN_DELAY_MS: float = float(get_env("LLM_HEDGE_MIN_DELAY_MS", "1000"))  # 对冲延迟下限（毫秒）
+    LLM_HEDGE_MAX_DELAY_MS: float = float(get_env("LLM_HEDGE_MAX_DELAY_MS", "15000"))  # 对冲延迟上限（毫秒）
+    LLM_HEDGE_INITIAL_DELAY_MS: float = float(get_env("LLM_HEDGE_INITIAL_DELAY_MS", "8000"))  # 样本不足时的对冲延迟（毫秒）
+    LLM_HEDGE_MIN_SAMPLES: int = get_env_int("LLM_HEDGE_MIN_SAMPLES", 20)  # 使用分位数前需要的最少样本数
+    LLM_HEDGE_WINDOW: int = get_env_int("LLM_HEDGE_WINDOW", 200)  # 每个提供商保留的最近延迟样本数
+    LLM_HEDGE_BUDGET_RATIO: float = float(get_env("LLM_HEDGE_BUDGET_RATIO", "0.2"))  # 对冲请求占全部请求的比例上限（按p90对冲时正常约10%，需留余量）
+    LLM_HEDGE_BUDGET_BURST: float = float(get_env("LLM_HEDGE_BUDGET_BURST", "10"))  # 预算令牌桶容量（允许的连续对冲次数）
+    LLM_HEDGE_SYNC_WORKERS: int = get_env_int("LLM_HEDGE_SYNC_WORKERS", 16)  # 同步接口运行备用提供商请求的线程数（主请求在调用方线程上执行）
+    
     # 豆包API配置（字节跳动，支持多模态）
     DOUBAO_API_KEY: str = get_env("DOUBAO_API_KEY", "")  # 请在.env文件中设置
     DOUBAO_DEFAULT_MODEL: str = get_env("DOUBAO_DEFAULT_MODEL", "doubao-seed-1-6-251015")
@@ -89,18 +105,137 @@ class Settings(BaseModel):
     TOP_K: int = get_env_int("TOP_K", 5)
     CHUNK_SIZE: int = get_env_int("CHUNK_SIZE", 500)
     CHUNK_OVERLAP: int = get_env_int("CHUNK_OVERLAP", 50)
+    CHUNK_LENGTH_UNIT: str = get_env("CHUNK_LENGTH_UNIT", "chars")  # chunk长度单位：chars（字符）或 tokens（tiktoken）
+    CHUNK_TOKEN_ENCODING: str = get_env("CHUNK_TOKEN_ENCODING", "cl100k_base")  # 按token计长时的tiktoken编码
+    CHUNK_CJK_SENTENCES: bool = get_env_bool("CHUNK_CJK_SENTENCES", True)  # 是否按中文句末标点（。！？）切分
     USE_RERANKER: bool = get_env_bool("USE_RERANKER", True)  # 是否使用Reranker
-    
+
+    # 近似重复检测配置（SimHash + LSH）
+    DEDUP_ENABLED: bool = get_env_bool("DEDUP_ENABLED", True)  # 是否在索引时检测近似重复chunk
+    DEDUP_MODE: str = get_env("DEDUP_MODE", "link")  # link: 仍然写入但记录关联（查询时按指纹去重）; reject: 跳过重复chunk（重复上传的文件不拥有chunk，原文件删除后内容随之消失）
+    DEDUP_HAMMING_THRESHOLD: int = get_env_int("DEDUP_HAMMING_THRESHOLD", 3)  # 64位指纹的汉明距离阈值
+
+    # 上下文打包配置（控制送入LLM的上下文token数）
+    CONTEXT_PACKING_ENABLED: bool = get_env_bool("CONTEXT_PACKING_ENABLED", True)
+    CONTEXT_TOKEN_BUDGET: int = get_env_int("CONTEXT_TOKEN_BUDGET", 1500)  # 单次检索上下文的token预算
+    AGENT_CONTEXT_TOKEN_BUDGET: int = get_env_int("AGENT_CONTEXT_TOKEN_BUDGET", 3000)  # Agent合并多个工具上下文后的总预算
+    CONTEXT_COMPRESSION_ENABLED: bool = get_env_bool("CONTEXT_COMPRESSION_ENABLED", False)  # 是否启用句子级抽取式压缩
+    COMPRESSION_MAX_SENTENCES: int = get_env_int("COMPRESSION_MAX_SENTENCES", 12)  # 压缩后最多保留的句子数
+    COMPRESSION_MIN_SCORE: float = float(get_env("COMPRESSION_MIN_SCORE", "0.25"))  # 句子与查询的最低余弦相似度
+
+    # Agent工具并发执行配置
+    AGENT_TOOL_PARALLEL: bool = get_env_bool("AGENT_TOOL_PARALLEL", True)  # 选中多个工具时是否并发调用
+    AGENT_TOOL_WORKERS: int = get_env_int("AGENT_TOOL_WORKERS", 8)  # 工具调用线程池大小
+    AGENT_TOOL_DEADLINE: int = get_env_int("AGENT_TOOL_DEADLINE", 15)  # 单次请求所有工具调用的截止时间（秒）
+    AGENT_SPECULATIVE_TOOLS: bool = get_env_bool("AGENT_SPECULATIVE_TOOLS", True)  # LLM规划期间是否先行调用预测的工具
+
+    # 异步HTTP客户端配置（execute_async路径下的工具和LLM调用）
+    ASYNC_HTTP_TIMEOUT: float = float(get_env("ASYNC_HTTP_TIMEOUT", "30"))  # 默认超时（秒），各调用方可单独指定
+    ASYNC_HTTP_MAX_CONNECTIONS: int = get_env_int("ASYNC_HTTP_MAX_CONNECTIONS", 100)  # 每个事件循环的最大连接数
+    ASYNC_HTTP_MAX_KEEPALIVE: int = get_env_int("ASYNC_HTTP_MAX_KEEPALIVE", 20)  # 保持的空闲长连接数
+
+    # 共享HTTP客户端配置（所有外部集成的出站请求，services/core/http_client.py）
+    HTTP_POOL_HOSTS: int = get_env_int("HTTP_POOL_HOSTS", 32)  # 同步Session缓存连接池的host数
+    HTTP_POOL_MAXSIZE: int = get_env_int("HTTP_POOL_MAXSIZE", 16)  # 同步Session每个host保持的长连接数
+    HTTP_CONNECT_TIMEOUT: float = float(get_env("HTTP_CONNECT_TIMEOUT", "5"))  # 建立连接的超时（秒）
+    HTTP_READ_TIMEOUT: float = float(get_env("HTTP_READ_TIMEOUT", "30"))  # 调用方未指定超时时的读取超时（秒）
+    HTTP_KEEPALIVE_EXPIRY: float = float(get_env("HTTP_KEEPALIVE_EXPIRY", "60"))  # 异步客户端空闲连接保留时间（秒）
+    HTTP2_ENABLED: bool = get_env_bool("HTTP2_ENABLED", True)  # 异步客户端启用HTTP/2（需要安装h2）
+    HTTP_METRICS_WINDOW: int = get_env_int("HTTP_METRICS_WINDOW", 512)  # 每个host保留的延迟样本数（计算分位数）
+
+    # 子系统执行器池配置（阻塞调用移出事件循环）
+    EXECUTOR_EMBEDDING_WORKERS: int = get_env_int("EXECUTOR_EMBEDDING_WORKERS", 4)  # 检索（embedding + Milvus）线程数
+    EXECUTOR_RERANK_WORKERS: int = get_env_int("EXECUTOR_RERANK_WORKERS", 2)  # Cross-Encoder重排序线程数
+    EXECUTOR_STT_WORKERS: int = get_env_int("EXECUTOR_STT_WORKERS", 1)  # Whisper语音识别/语音合成线程数
+    EXECUTOR_OCR_WORKERS: int = get_env_int("EXECUTOR_OCR_WORKERS", 4)  # 图片预处理和多模态OCR线程数
+    EXECUTOR_INGEST_WORKERS: int = get_env_int("EXECUTOR_INGEST_WORKERS", 2)  # 文件保存、解析和索引线程数
+    EXECUTOR_MAX_QUEUE: int = get_env_int("EXECUTOR_MAX_QUEUE", 64)  # 每个池的最大排队数，超过时返回503
+
+    # 动态工作流并行执行配置
+    WORKFLOW_MAX_PARALLEL: int = get_env_int("WORKFLOW_MAX_PARALLEL", 4)  # 同时执行的无依赖步骤数
+    WORKFLOW_DEADLINE: int = get_env_int("WORKFLOW_DEADLINE", 30)  # 单个工作流计划的截止时间（秒）
+
+    # 外部工具结果缓存配置（按工具TTL，过期后先返回旧结果再后台刷新）
+    TOOL_CACHE_ENABLED: bool = get_env_bool("TOOL_CACHE_ENABLED", True)
+    TOOL_CACHE_MAX_SIZE: int = get_env_int("TOOL_CACHE_MAX_SIZE", 500)  # 最大缓存条目数
+    TOOL_CACHE_WEATHER_TTL: int = get_env_int("TOOL_CACHE_WEATHER_TTL", 600)  # 天气结果新鲜期（秒）
+    TOOL_CACHE_FINANCE_TTL: int = get_env_int("TOOL_CACHE_FINANCE_TTL", 60)  # 股票行情新鲜期（秒）
+    TOOL_CACHE_CRYPTO_TTL: int = get_env_int("TOOL_CACHE_CRYPTO_TTL", 10)  # 加密货币行情新鲜期（秒）
+    TOOL_CACHE_TRANSPORT_TTL: int = get_env_int("TOOL_CACHE_TRANSPORT_TTL", 86400)  # 路线/旅行时间新鲜期（秒）
+    TOOL_CACHE_WEB_SEARCH_TTL: int = get_env_int("TOOL_CACHE_WEB_SEARCH_TTL", 1800)  # 网页搜索结果新鲜期（秒）
+    TOOL_CACHE_STALE_FACTOR: float = float(get_env("TOOL_CACHE_STALE_FACTOR", "1.0"))  # 过期后仍先返回旧结果的宽限期（TTL的倍数，0表示不返回旧结果）
+    TOOL_CACHE_REFRESH_AHEAD: float = float(get_env("TOOL_CACHE_REFRESH_AHEAD", "0.8"))  # 热门键在TTL的该比例时提前刷新
+    TOOL_CACHE_POPULAR_HITS: int = get_env_int("TOOL_CACHE_POPULAR_HITS", 3)  # 命中多少次算热门键
+
+    # 工作流计划缓存配置（按去实体化的查询模板复用LLM规划结果）
+    PLAN_CACHE_ENABLED: bool = get_env_bool("PLAN_CACHE_ENABLED", True)
+    PLAN_CACHE_MAX_SIZE: int = get_env_int("PLAN_CACHE_MAX_SIZE", 256)  # 最大缓存计划数
+    PLAN_CACHE_TTL: int = get_env_int("PLAN_CACHE_TTL", 86400)  # 计划过期时间（秒）
+    PLAN_CACHE_MIN_CONFIDENCE: float = float(get_env("PLAN_CACHE_MIN_CONFIDENCE", "0.7"))  # 可缓存计划的最低置信度
+    PLAN_CACHE_SIMILARITY: float = float(get_env("PLAN_CACHE_SIMILARITY", "0.92"))  # 模板语义命中的最低相似度（设为1只做精确匹配）
+
+    # 本地查询分类器配置（代替LLM规划判断是否需要工作流）
+    # 默认关闭：开启前先运行 scripts/train_query_classifier.py 生成模型，并用 scripts/tests/query_classifier_report.py 确认留出集上的效果
+    QUERY_CLASSIFIER_ENABLED: bool = get_env_bool("QUERY_CLASSIFIER_ENABLED", False)  # 是否由分类器决定路由；模型文件不存在时回退到关键词规则
+    QUERY_CLASSIFIER_DIR: str = get_env("QUERY_CLASSIFIER_DIR", "models/query_classifier")  # 模型目录（query_classifier_v{N}.json）
+    QUERY_CLASSIFIER_VERSION: int = get_env_int("QUERY_CLASSIFIER_VERSION", 0)  # 使用的模型版本，0表示最新
+    QUERY_CLASSIFIER_MIN_CONFIDENCE: float = float(get_env("QUERY_CLASSIFIER_MIN_CONFIDENCE", "0.85"))  # 低于该置信度时交给LLM规划器判断
+    QUERY_CLASSIFIER_ROUTE_TOOLS: bool = get_env_bool("QUERY_CLASSIFIER_ROUTE_TOOLS", False)  # 是否用预测的工具集合代替关键词选工具
+
     # 文件上传存储配置
     UPLOAD_STORAGE_DIR: str = get_env("UPLOAD_STORAGE_DIR", "uploaded_files")
     MAX_UPLOAD_SIZE: int = get_env_int("MAX_UPLOAD_SIZE", 50 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE: int = get_env_int("UPLOAD_CHUNK_SIZE", 1024 * 1024)  # 流式上传的分块大小（字节），决定每个上传的内存占用
+    FILE_INDEX_COMPACT_THRESHOLD: int = get_env_int("FILE_INDEX_COMPACT_THRESHOLD", 1000)  # 文件索引日志条目数超过该值时写入新快照
+    FILE_CATALOG_DB: str = get_env("FILE_CATALOG_DB", "./file_catalog.db")  # 已索引文件目录（/files 从这里查询chunk数）
+    PDF_EXTRACT_WORKERS: int = get_env_int("PDF_EXTRACT_WORKERS", 4)  # PDF文本提取进程数（<=1时在当前进程中顺序提取）
+    PDF_PAGES_PER_TASK: int = get_env_int("PDF_PAGES_PER_TASK", 8)  # 每个提取任务的页数
+    PDF_PARALLEL_MIN_PAGES: int = get_env_int("PDF_PARALLEL_MIN_PAGES", 16)  # 页数达到该值才使用进程池
+    INDEX_INSERT_BATCH: int = get_env_int("INDEX_INSERT_BATCH", 256)  # 索引上传文件时每攒满该数量的chunk写入Milvus一次（决定峰值内存）
     ALLOWED_EXTENSIONS: list = [
         ".pdf", ".png", ".jpg", ".jpeg", ".gif", ".py", ".txt", ".md", ".json", ".csv"
     ]
     
+    # 图片OCR配置（本地Tesseract）
+    OCR_LANG: str = get_env("OCR_LANG", "chi_sim+eng")  # Tesseract识别语言
+    OCR_TILE_WORKERS: int = get_env_int("OCR_TILE_WORKERS", 4)  # 大图条带并发识别数
+    OCR_TILE_HEIGHT: int = get_env_int("OCR_TILE_HEIGHT", 1600)  # 条带高度（像素），更矮的图片整体识别
+    OCR_TILE_OVERLAP: int = get_env_int("OCR_TILE_OVERLAP", 100)  # 相邻条带的重叠像素，需大于一行文字的高度
+    OCR_CACHE_SIZE: int = get_env_int("OCR_CACHE_SIZE", 512)  # 按图片内容哈希缓存的OCR结果数（本地和多模态OCR共用）
+    
     # 存储后端配置
     STORAGE_BACKEND: str = get_env("STORAGE_BACKEND", "milvus")
     DATABASE_URL: str = get_env("DATABASE_URL", "sqlite:///./file_storage.db")
+    DATABASE_POOL_SIZE: int = get_env_int("DATABASE_POOL_SIZE", 10)  # PostgreSQL连接池常驻连接数
+    DATABASE_MAX_OVERFLOW: int = get_env_int("DATABASE_MAX_OVERFLOW", 20)  # 连接池满时允许额外创建的连接数
+    DATABASE_POOL_TIMEOUT: float = float(get_env("DATABASE_POOL_TIMEOUT", "30"))  # 等待空闲连接的秒数
+    DATABASE_POOL_RECYCLE: int = get_env_int("DATABASE_POOL_RECYCLE", 1800)  # 连接使用超过该秒数后重建，避免被服务端断开
+    DATABASE_SQLITE_MMAP_SIZE: int = get_env_int("DATABASE_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)  # SQLite内存映射读取的字节数
+    FILES_PAGE_MAX_LIMIT: int = get_env_int("FILES_PAGE_MAX_LIMIT", 1000)  # /files 分页时每页最多文件数
+    
+    # 后台文件索引队列配置（SQLite持久化）
+    INGEST_QUEUE_DB: str = get_env("INGEST_QUEUE_DB", "./ingest_jobs.db")  # 队列数据库文件
+    INGEST_WORKERS: int = get_env_int("INGEST_WORKERS", 2)  # 索引工作线程数
+    INGEST_MAX_ATTEMPTS: int = get_env_int("INGEST_MAX_ATTEMPTS", 3)  # 每个任务的最大尝试次数
+    INGEST_RETRY_BACKOFF: float = float(get_env("INGEST_RETRY_BACKOFF", "5"))  # 第一次重试等待秒数，之后每次翻倍
+    INGEST_LEASE_SECONDS: float = float(get_env("INGEST_LEASE_SECONDS", "60"))  # 运行中任务的租约时长，持有进程停止续约超过该时间后由其他进程接管
+    
+    # 批量导入配置（scripts/ingest.py）
+    BULK_INGEST_WORKERS: int = get_env_int("BULK_INGEST_WORKERS", 0)  # 提取/切分进程数，0表示CPU核数
+    BULK_INGEST_EMBED_BATCH: int = get_env_int("BULK_INGEST_EMBED_BATCH", 64)  # 每次向量化的chunk数
+    BULK_INGEST_INSERT_BATCH: int = get_env_int("BULK_INGEST_INSERT_BATCH", 1000)  # 每次写入Milvus的chunk数
+    BULK_INGEST_QUEUE_SIZE: int = get_env_int("BULK_INGEST_QUEUE_SIZE", 64)  # 阶段之间队列长度，决定在途内存上限
+    BULK_INGEST_CHECKPOINT: str = get_env("BULK_INGEST_CHECKPOINT", "./ingest_checkpoint.jsonl")  # 断点续传检查点文件
+    BULK_ARTIFACT_FORMAT: str = get_env("BULK_ARTIFACT_FORMAT", "numpy")  # 离线索引产物格式：numpy 或 parquet
+    BULK_ARTIFACT_SHARD_ROWS: int = get_env_int("BULK_ARTIFACT_SHARD_ROWS", 50000)  # 离线索引产物每个分片的chunk数
+    BULK_LOAD_INSERT_BATCH: int = get_env_int("BULK_LOAD_INSERT_BATCH", 5000)  # 不能用do_bulk_insert时每批insert的行数
+    
+    # Milvus对象存储（MinIO）配置，离线索引产物通过do_bulk_insert导入时上传分片
+    MILVUS_MINIO_ENDPOINT: str = get_env("MILVUS_MINIO_ENDPOINT", "localhost:9000")
+    MILVUS_MINIO_ACCESS_KEY: str = get_env("MILVUS_MINIO_ACCESS_KEY", "minioadmin")
+    MILVUS_MINIO_SECRET_KEY: str = get_env("MILVUS_MINIO_SECRET_KEY", "minioadmin")
+    MILVUS_MINIO_BUCKET: str = get_env("MILVUS_MINIO_BUCKET", "a-bucket")  # Milvus默认使用的bucket
+    MILVUS_MINIO_SECURE: bool = get_env_bool("MILVUS_MINIO_SECURE", False)
     
     # 日志配置
     LOG_LEVEL: str = get_env("LOG_LEVEL", "INFO")
@@ -0,0 +1,170 @@
+"""
+子系统执行器池 - 把阻塞的CPU/IO调用移出事件循环
+
+每个子系统（embedding、rerank、STT、OCR、ingest）有独立的有界线程池：
+- 池大小限制同时运行的调用数（模型推理不会互相抢占全部CPU）
+- 排队数超过上限时直接拒绝（PoolSaturatedError），避免请求无限堆积
+- 记录排队深度、运行数、等待/执行耗时，用于 /executors/stats
+
+使用线程池而不是进程池：这些调用是进程内单例（已加载的模型、Milvus连接）上的方法，
+无法廉价地序列化到子进程；PyTorch推理、PIL和HTTP调用在执行时会释放GIL。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock
+from typing import Any, Callable, Dict
+from services.core.config import settings
+from services.core.logger import logger
+
+
+class PoolSaturatedError(RuntimeError):
+    """执行器池排队已满"""
+
+
+class BoundedExecutor:
+    """有界线程池（带排队深度统计）"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """
+        Args:
+            name: 子系统名称
+            max_workers: 线程数
+            max_queue: 最多排队的调用数（不含正在运行的）
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self.lock = Lock()
+        self._local = threading.local()
+        self._stats = {
+            "queued": 0, "active": 0, "max_queue_depth": 0,
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+            "wait_ms": 0.0, "run_ms": 0.0
+        }
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        提交调用
+
+        Raises:
+            PoolSaturatedError: 排队数已达上限
+        """
+        with self.lock:
+            if self._stats["queued"] >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise PoolSaturatedError(f"{self.name} 执行器繁忙（排队 {self._stats['queued']}），请稍后重试")
+            self._stats["queued"] += 1
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queued"])
+        submitted_at = time.time()
+
+        def run():
+            start = time.time()
+            with self.lock:
+                self._stats["queued"] -= 1
+                self._stats["active"] += 1
+                self._stats["wait_ms"] += (start - submitted_at) * 1000
+            self._local.inside = True
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._local.inside = False
+                with self.lock:
+                    self._stats["active"] -= 1
+                    self._stats["failed" if failed else "completed"] += 1
+                    self._stats["run_ms"] += (time.time() - start) * 1000
+
+        try:
+            return self.executor.submit(run)
+        except RuntimeError:
+            # 池已关闭
+            with self.lock:
+                self._stats["queued"] -= 1
+            raise
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在池中执行并等待结果（在协程中调用，不阻塞事件循环）"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def run_sync(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        同步代码中在池中执行并阻塞等待结果（用于限制子步骤的并发，如重排序）
+
+        已经在本池的线程中时直接调用，避免池内任务互相等待造成死锁
+        """
+        if getattr(self._local, "inside", False):
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """排队深度和耗时统计"""
+        with self.lock:
+            stats = dict(self._stats)
+        finished = stats["completed"] + stats["failed"]
+        stats["max_workers"] = self.max_workers
+        stats["max_queue"] = self.max_queue
+        stats["avg_wait_ms"] = round(stats.pop("wait_ms") / max(finished + stats["active"], 1), 1)
+        stats["avg_run_ms"] = round(stats.pop("run_ms") / max(finished, 1), 1)
+        return stats
+
+    def shutdown(self):
+        """关闭线程池（不等待运行中的调用）"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 子系统名称 -> 线程数
+_POOL_SIZES = {
+    "embedding": settings.EXECUTOR_EMBEDDING_WORKERS,
+    "rerank": settings.EXECUTOR_RERANK_WORKERS,
+    "stt": settings.EXECUTOR_STT_WORKERS,
+    "ocr": settings.EXECUTOR_OCR_WORKERS,
+    "ingest": settings.EXECUTOR_INGEST_WORKERS,
+}
+
+# 全局执行器池（首次使用时创建）
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """
+    获取子系统的执行器池
+
+    Args:
+        name: embedding / rerank / stt / ocr / ingest
+
+    Returns:
+        BoundedExecutor 实例
+    """
+    if name not in _POOL_SIZES:
+        raise ValueError(f"未知的执行器池: {name}")
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = BoundedExecutor(name, _POOL_SIZES[name], settings.EXECUTOR_MAX_QUEUE)
+            _executors[name] = executor
+            logger.info(f"创建执行器池 {name}（线程数 {_POOL_SIZES[name]}，最大排队 {settings.EXECUTOR_MAX_QUEUE}）")
+    return executor
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    """所有已创建执行器池的统计"""
+    with _executors_lock:
+        executors = dict(_executors)
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_executors():
+    """关闭所有执行器池（应用关闭时调用）"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
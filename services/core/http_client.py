@@ -0,0 +1,332 @@
+"""
+共享HTTP客户端 - 所有外部集成（LLM、语音、搜索、天气、金融）的出站请求都经过这里
+
+- 同步：进程内共享一个 requests.Session（get_http_session），urllib3按host维护长连接池，
+  不再每次请求都重新TCP+TLS握手；默认连接/读取超时，不保存cookie（与原来无状态的 requests.get 一致）
+- 异步：httpx.AsyncClient 绑定创建它的事件循环，按事件循环各保留一个实例（get_async_client）；
+  安装了h2时启用HTTP/2（同一host的并发请求复用一条连接）
+- 指标：按host统计请求数、错误数、新建连接数、连接复用率和响应头延迟分位数（get_http_stats）
+
+同步入口通过 run_sync 运行协程，结束时关闭该循环的客户端。
+httpx未安装时 HTTPX_AVAILABLE=False，调用方回退到线程池中执行同步实现。
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
+from typing import Any, Awaitable, Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from services.core.config import settings
+from services.core.logger import logger
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+# HTTP/2 依赖h2（pip install httpx[http2]）
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _HostStats:
+    """单个host的请求统计"""
+
+    def __init__(self, window: int):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 2)
+
+        completed = self.requests - self.errors
+        reused = max(completed - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / completed, 3) if completed else None,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99)
+            }
+        }
+
+
+class HTTPMetrics:
+    """按host汇总的出站请求指标（延迟为收到响应头的耗时，流式响应不含读取正文）"""
+
+    def __init__(self, window: int = 512):
+        """
+        Args:
+            window: 每个host保留的最近延迟样本数（用于计算分位数）
+        """
+        self.window = window
+        self.lock = Lock()
+        self.hosts: Dict[str, _HostStats] = {}
+
+    def _host(self, host: str) -> _HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = _HostStats(self.window)
+        return stats
+
+    def record(self, host: str, latency_ms: float, new_connections: int = 0):
+        """记录一次成功的请求"""
+        with self.lock:
+            stats = self._host(host)
+            stats.requests += 1
+            stats.new_connections += new_connections
+            stats.latencies.append(latency_ms)
+
+    def record_error(self, host: str, new_connections: int = 0):
+        """记录一次失败的请求（连接失败、超时等，没有收到响应）"""
+        with self.lock:
+            stats = self._host(host)
+            stats.requests += 1
+            stats.errors += 1
+            stats.new_connections += new_connections
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {host: stats.snapshot() for host, stats in sorted(self.hosts.items())}
+
+    def reset(self):
+        with self.lock:
+            self.hosts.clear()
+
+
+# 全局出站请求指标
+http_metrics = HTTPMetrics(settings.HTTP_METRICS_WINDOW)
+
+
+# ==================== 同步客户端 ====================
+
+class _MeteredSession(requests.Session):
+    """带默认超时和按host指标的Session"""
+
+    def __init__(self):
+        super().__init__()
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_HOSTS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            max_retries=0
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        # 各集成之间不共享cookie
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # 连接池 -> 上次看到的累计新建连接数（urllib3按连接池计数，这里换算成每个host的增量）
+        self._seen_connections: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self._seen_lock = Lock()
+
+    def _new_connections(self, url: str) -> int:
+        """url所在host的连接池自上次统计以来新建的连接数"""
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            manager = self.get_adapter(url).poolmanager
+            keys = manager.pools.keys()
+        except Exception:
+            return 0
+        new_connections = 0
+        with self._seen_lock:
+            # 同一host可能因TLS参数不同对应多个连接池
+            for key in keys:
+                if key.key_scheme != parts.scheme or key.key_host != parts.hostname or key.key_port != port:
+                    continue
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                previous = self._seen_connections.get(pool, 0)
+                self._seen_connections[pool] = pool.num_connections
+                new_connections += max(pool.num_connections - previous, 0)
+        return new_connections
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException:
+            http_metrics.record_error(host, self._new_connections(url))
+            raise
+        http_metrics.record(host, (time.perf_counter() - start) * 1000, self._new_connections(url))
+        return response
+
+
+_http_session: Optional[_MeteredSession] = None
+_session_lock = Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    获取进程内共享的同步Session（线程安全，按host复用长连接）
+
+    Returns:
+        requests.Session 实例，用法与 requests.get/post 相同：get_http_session().post(url, json=..., timeout=...)
+    """
+    global _http_session
+    with _session_lock:
+        if _http_session is None:
+            _http_session = _MeteredSession()
+        return _http_session
+
+
+def close_http_session():
+    """关闭共享Session的连接池（应用关闭时调用）"""
+    global _http_session
+    with _session_lock:
+        session, _http_session = _http_session, None
+    if session is not None:
+        session.close()
+
+
+# ==================== 异步客户端 ====================
+
+if HTTPX_AVAILABLE:
+    class _MeteredAsyncTransport(httpx.AsyncHTTPTransport):
+        """记录按host指标的传输层（通过httpcore的trace扩展判断是否新建了连接）"""
+
+        async def handle_async_request(self, request: "httpx.Request") -> "httpx.Response":
+            new_connections = 0
+            outer_trace = request.extensions.get("trace")
+
+            async def trace(event_name: str, info: Dict[str, Any]):
+                nonlocal new_connections
+                if event_name == "connection.connect_tcp.started":
+                    new_connections += 1
+                if outer_trace is not None:
+                    await outer_trace(event_name, info)
+
+            request.extensions = {**request.extensions, "trace": trace}
+            host = request.url.netloc.decode("ascii")
+            start = time.perf_counter()
+            try:
+                response = await super().handle_async_request(request)
+            except Exception:
+                http_metrics.record_error(host, new_connections)
+                raise
+            http_metrics.record(host, (time.perf_counter() - start) * 1000, new_connections)
+            return response
+
+
+# 事件循环 -> AsyncClient
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_clients_lock = Lock()
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """
+    获取当前事件循环的共享AsyncClient（必须在协程中调用）
+
+    Returns:
+        httpx.AsyncClient 实例
+    """
+    if not HTTPX_AVAILABLE:
+        raise RuntimeError("httpx未安装，无法使用异步HTTP客户端")
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            transport = _MeteredAsyncTransport(
+                http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ASYNC_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(settings.ASYNC_HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+                follow_redirects=True
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def streaming_timeout() -> "httpx.Timeout":
+    """LLM流式请求的超时：连接超时 + 相邻数据块之间的读取超时（不限制总时长）"""
+    return httpx.Timeout(settings.LLM_STREAM_READ_TIMEOUT, connect=settings.LLM_STREAM_CONNECT_TIMEOUT)
+
+
+async def aclose_async_client():
+    """关闭当前事件循环的AsyncClient（应用关闭或 run_sync 结束时调用）"""
+    if not HTTPX_AVAILABLE:
+        return
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _async_clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """
+    出站HTTP客户端统计
+
+    Returns:
+        {"http2": 异步客户端是否启用HTTP/2, "pool": 连接池配置, "hosts": {host: 请求数/错误数/新建与复用连接数/延迟分位数}}
+    """
+    return {
+        "http2": bool(HTTPX_AVAILABLE and settings.HTTP2_ENABLED and HTTP2_AVAILABLE),
+        "pool": {
+            "sync_hosts": settings.HTTP_POOL_HOSTS,
+            "sync_per_host": settings.HTTP_POOL_MAXSIZE,
+            "async_max_connections": settings.ASYNC_HTTP_MAX_CONNECTIONS,
+            "async_max_keepalive": settings.ASYNC_HTTP_MAX_KEEPALIVE
+        },
+        "hosts": http_metrics.snapshot()
+    }
+
+
+async def _run_and_close(coro: Awaitable) -> Any:
+    try:
+        return await coro
+    finally:
+        await aclose_async_client()
+
+
+def run_sync(coro: Awaitable) -> Any:
+    """
+    在同步代码中运行协程（同步API的薄封装）
+
+    当前线程没有运行中的事件循环时直接 asyncio.run；
+    在事件循环内被同步调用时（旧代码在async函数里调用同步接口），改到独立线程运行，避免嵌套事件循环报错。
+
+    Args:
+        coro: 要运行的协程
+
+    Returns:
+        协程的返回值
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run_and_close(coro))
+    logger.debug("在事件循环中调用了同步接口，改到独立线程运行（会阻塞当前事件循环，建议改用异步接口）")
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-sync") as executor:
+        return executor.submit(asyncio.run, _run_and_close(coro)).result()
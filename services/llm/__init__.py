@@ -4,6 +4,7 @@ LLM相关模块
 from services.llm.hkgai_client import HKGAIClient, llm_client
 from services.llm.gemini_client import GeminiClient
 from services.llm.unified_client import UnifiedLLMClient, unified_llm_client
+from services.llm.hedging import HedgeController, get_hedge_controller
 from services.llm.usage_monitor import UsageMonitor, usage_monitor
 
 __all__ = [
@@ -12,6 +13,8 @@ __all__ = [
     "GeminiClient",
     "UnifiedLLMClient",
     "unified_llm_client",
+    "HedgeController",
+    "get_hedge_controller",
     "UsageMonitor",
     "usage_monitor",
 ]
@@ -8,6 +8,7 @@ import base64
 import requests
 from typing import List, Dict, Optional, Any
 from services.core import settings, logger
+from services.core.http_client import get_http_session
 
 
 class DoubaoMultimodalClient:
@@ -156,7 +157,7 @@ class DoubaoMultimodalClient:
             for attempt in range(max_retries):
                 try:
                     logger.info(f"🔄 尝试 {attempt + 1}/{max_retries}")
-                    response = requests.post(
+                    response = get_http_session().post(
                         f"{self.base_url}/chat/completions",
                         headers=self.headers,
                         json=payload,
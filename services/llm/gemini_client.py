@@ -1,9 +1,12 @@
 """
 Gemini API客户端 - 支持多模型选择和用量监控
+chat_stream_async 使用 streamGenerateContent?alt=sse 流式输出
 """
+import asyncio
 import requests
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional
 import json
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session, streaming_timeout
 from services.llm.usage_monitor import usage_monitor
 
 
@@ -39,22 +42,13 @@ class GeminiClient:
         # 这是一个粗略估计，实际应该调用API
         return len(text) // 4 + len(text) // 10  # 混合估算
     
-    def chat(self, system_prompt: str, user_prompt: str,
-             model: Optional[str] = None,
-             max_tokens: int = 2048,
-             temperature: float = 0.7) -> Dict:
+    def _prepare_request(self, system_prompt: str, user_prompt: str, model: Optional[str],
+                         max_tokens: int, temperature: float) -> Dict:
         """
-        发送聊天请求到Gemini API
+        选择模型、检查配额并构建请求
         
-        Args:
-            system_prompt: 系统提示词
-            user_prompt: 用户提示词
-            model: 模型名称，如果为None则使用默认模型
-            max_tokens: 最大生成token数
-            temperature: 温度参数
-            
         Returns:
-            包含content、token使用量等信息的字典
+            请求信息字典；配额用完时返回包含error的字典
         """
         # 选择模型（用户指定的模型名称，用于配额跟踪）
         user_model_name = model or "gemini-2.0-flash"  # 标准化名称
@@ -76,92 +70,125 @@ class GeminiClient:
         # 构建请求
         full_prompt = f"{system_prompt}\n\n{user_prompt}" if system_prompt else user_prompt
         
-        # 估算输入token
-        estimated_input_tokens = self._count_tokens(full_prompt)
-        
-        # Gemini API可以使用query参数或header传递API key
-        # 优先使用query参数方式
-        url = f"{self.base_url}/models/{api_model_name}:generateContent"
-        
-        # 同时设置headers（某些情况下可能需要）
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        # API key通过query参数传递
-        params = {
-            "key": self.api_key
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": full_prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": max_tokens
+        return {
+            "model": model_name_for_quota,
+            "api_model": api_model_name,
+            # 估算输入token
+            "estimated_input_tokens": self._count_tokens(full_prompt),
+            # Gemini API可以使用query参数或header传递API key，优先使用query参数方式
+            "url": f"{self.base_url}/models/{api_model_name}:generateContent",
+            # 同时设置headers（某些情况下可能需要）
+            "headers": {
+                "Content-Type": "application/json"
+            },
+            "params": {
+                "key": self.api_key
+            },
+            "payload": {
+                "contents": [{
+                    "parts": [{
+                        "text": full_prompt
+                    }]
+                }],
+                "generationConfig": {
+                    "temperature": temperature,
+                    "maxOutputTokens": max_tokens
+                }
             }
         }
+    
+    def _parse_response(self, request: Dict, response) -> Dict:
+        """
+        解析响应（requests和httpx的Response都可以）
         
-        try:
-            response = requests.post(url, json=payload, headers=headers, params=params, timeout=30)
-            
-            # 如果响应不成功，尝试提取错误信息
-            if not response.ok:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("error", {}).get("message", f"HTTP {response.status_code}")
-                    return {
-                        "error": f"Gemini API错误: {error_msg}",
-                        "status_code": response.status_code,
-                        "model": model_name_for_quota,
-                        "api_model_tried": api_model_name,
-                        "raw_error": error_data
-                    }
-                except:
-                    return {
-                        "error": f"Gemini API错误: HTTP {response.status_code} - {response.text[:200]}",
-                        "status_code": response.status_code,
-                        "model": model_name_for_quota,
-                        "api_model_tried": api_model_name
-                    }
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取响应内容
-            content = ""
-            if "candidates" in data and len(data["candidates"]) > 0:
-                if "content" in data["candidates"][0]:
-                    if "parts" in data["candidates"][0]["content"]:
-                        for part in data["candidates"][0]["content"]["parts"]:
-                            if "text" in part:
-                                content += part["text"]
-            
-            # 提取token使用量
-            input_tokens = data.get("usageMetadata", {}).get("promptTokenCount", estimated_input_tokens)
-            output_tokens = data.get("usageMetadata", {}).get("candidatesTokenCount", self._count_tokens(content))
-            
-            # 记录使用量（使用标准化的模型名称）
-            usage_monitor.record_usage(model_name_for_quota, input_tokens, output_tokens)
+        Args:
+            request: _prepare_request 返回的请求信息
+            response: HTTP响应
             
-            if not content:
+        Returns:
+            包含content、token使用量等信息的字典
+        """
+        model_name_for_quota = request["model"]
+        # 如果响应不成功，尝试提取错误信息
+        if not 200 <= response.status_code < 300:
+            try:
+                error_data = response.json()
+                error_msg = error_data.get("error", {}).get("message", f"HTTP {response.status_code}")
                 return {
-                    "content": "",
-                    "warning": "Empty content returned from Gemini API",
-                    "raw": data
+                    "error": f"Gemini API错误: {error_msg}",
+                    "status_code": response.status_code,
+                    "model": model_name_for_quota,
+                    "api_model_tried": request["api_model"],
+                    "raw_error": error_data
                 }
-            
+            except:
+                return {
+                    "error": f"Gemini API错误: HTTP {response.status_code} - {response.text[:200]}",
+                    "status_code": response.status_code,
+                    "model": model_name_for_quota,
+                    "api_model_tried": request["api_model"]
+                }
+        
+        data = response.json()
+        
+        # 提取响应内容
+        content = ""
+        if "candidates" in data and len(data["candidates"]) > 0:
+            if "content" in data["candidates"][0]:
+                if "parts" in data["candidates"][0]["content"]:
+                    for part in data["candidates"][0]["content"]["parts"]:
+                        if "text" in part:
+                            content += part["text"]
+        
+        # 提取token使用量
+        input_tokens = data.get("usageMetadata", {}).get("promptTokenCount", request["estimated_input_tokens"])
+        output_tokens = data.get("usageMetadata", {}).get("candidatesTokenCount", self._count_tokens(content))
+        
+        # 记录使用量（使用标准化的模型名称）
+        usage_monitor.record_usage(model_name_for_quota, input_tokens, output_tokens)
+        
+        if not content:
             return {
-                "content": content.strip(),
-                "model": model_name_for_quota,  # 返回用户指定的模型名称
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "total_tokens": input_tokens + output_tokens,
+                "content": "",
+                "warning": "Empty content returned from Gemini API",
                 "raw": data
             }
+        
+        return {
+            "content": content.strip(),
+            "model": model_name_for_quota,  # 返回用户指定的模型名称
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "raw": data
+        }
+    
+    def chat(self, system_prompt: str, user_prompt: str,
+             model: Optional[str] = None,
+             max_tokens: int = 2048,
+             temperature: float = 0.7) -> Dict:
+        """
+        发送聊天请求到Gemini API
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            model: 模型名称，如果为None则使用默认模型
+            max_tokens: 最大生成token数
+            temperature: 温度参数
+            
+        Returns:
+            包含content、token使用量等信息的字典
+        """
+        request = self._prepare_request(system_prompt, user_prompt, model, max_tokens, temperature)
+        if "error" in request:
+            return request
+        model_name_for_quota = request["model"]
+        
+        try:
+            response = get_http_session().post(request["url"], json=request["payload"], headers=request["headers"],
+                                                 params=request["params"], timeout=30)
+            return self._parse_response(request, response)
             
         except requests.exceptions.HTTPError as e:
             # HTTP错误，尝试解析响应
@@ -191,6 +218,93 @@ class GeminiClient:
                 "traceback": error_trace
             }
     
+    async def chat_async(self, system_prompt: str, user_prompt: str,
+                         model: Optional[str] = None,
+                         max_tokens: int = 2048,
+                         temperature: float = 0.7) -> Dict:
+        """chat 的异步版本（共享AsyncClient，参数和返回值相同）"""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.chat, system_prompt, user_prompt, model, max_tokens, temperature)
+        request = self._prepare_request(system_prompt, user_prompt, model, max_tokens, temperature)
+        if "error" in request:
+            return request
+        
+        try:
+            response = await get_async_client().post(request["url"], json=request["payload"], headers=request["headers"],
+                                                     params=request["params"], timeout=30)
+        except Exception as e:
+            return {
+                "error": f"Gemini API请求失败: {str(e)}",
+                "model": request["model"],
+                "raw_error": str(e)
+            }
+        try:
+            return self._parse_response(request, response)
+        except Exception as e:
+            import traceback
+            return {
+                "error": f"Gemini API处理错误: {str(e)}",
+                "model": request["model"],
+                "traceback": traceback.format_exc()
+            }
+    
+    async def chat_stream_async(self, system_prompt: str, user_prompt: str,
+                                model: Optional[str] = None,
+                                max_tokens: int = 2048,
+                                temperature: float = 0.7) -> AsyncIterator[Dict]:
+        """
+        流式发送聊天请求（需要httpx）
+        
+        Yields:
+            {"type": "delta", "text": 增量文本}，最后是 {"type": "end", "model", "input_tokens", "output_tokens",
+            "total_tokens"}；出错时最后是 {"type": "error", "error": 错误信息, ...}
+        """
+        request = self._prepare_request(system_prompt, user_prompt, model, max_tokens, temperature)
+        if "error" in request:
+            yield {"type": "error", **request}
+            return
+        url = request["url"].replace(":generateContent", ":streamGenerateContent")
+        params = dict(request["params"], alt="sse")
+        
+        content, usage = "", {}
+        try:
+            async with get_async_client().stream("POST", url, json=request["payload"], headers=request["headers"],
+                                                 params=params, timeout=streaming_timeout()) as response:
+                if not 200 <= response.status_code < 300:
+                    await response.aread()
+                    yield {"type": "error", **self._parse_response(request, response)}
+                    return
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[5:])
+                    usage = data.get("usageMetadata") or usage
+                    candidates = data.get("candidates") or [{}]
+                    text = "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+                    if text:
+                        content += text
+                        yield {"type": "delta", "text": text}
+        except Exception as e:
+            yield {
+                "type": "error",
+                "error": f"Gemini API流式请求失败: {str(e)}",
+                "model": request["model"],
+                "raw_error": str(e)
+            }
+            return
+        
+        # 记录使用量（最后一个chunk带usageMetadata，没有时估算）
+        input_tokens = usage.get("promptTokenCount", request["estimated_input_tokens"])
+        output_tokens = usage.get("candidatesTokenCount", self._count_tokens(content))
+        usage_monitor.record_usage(request["model"], input_tokens, output_tokens)
+        yield {
+            "type": "end",
+            "model": request["model"],
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+    
     def get_supported_models(self) -> Dict:
         """获取支持的模型列表"""
         return {
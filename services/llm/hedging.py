@@ -0,0 +1,322 @@
+"""
+LLM对冲请求 - 主提供商（HKGAI）迟迟不返回时并发请求备用提供商（Gemini），取先成功的结果
+
+原来只有HKGAI明确失败（或连续失败3次）才切换到Gemini，HKGAI慢的时候（最长30秒超时）用户只能等。
+现在：
+- 主请求超过对冲延迟仍未完成时，向备用提供商发出同样的请求，先成功的结果胜出，另一个请求被取消
+- 对冲延迟自适应：主提供商最近成功请求延迟的p90（限制在最小/最大值之间，样本不足时用初始值）
+- 对冲预算：令牌桶，每个请求存入 LLM_HEDGE_BUDGET_RATIO 个令牌，每次对冲消耗1个，
+  长期对冲比例不超过该值（主提供商整体变慢时不会把全部流量翻倍）
+- 主请求在对冲延迟之前就失败时，与原来一样立即切换到备用提供商（不消耗预算）
+- 每个提供商记录延迟直方图；结果中记录胜出的提供商（provider）、是否发出了对冲（hedged）和总耗时
+
+异步接口会取消输掉的请求。同步接口的主请求在调用方线程上直接执行（不排队，对冲延迟从主请求实际开始时计时），
+只有对冲/切换的备用请求进入线程池；调用方线程阻塞在主请求上，因此对冲只在主请求最终失败（如读取超时）时
+缩短等待，需要降低尾延迟的调用方应使用异步接口。
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Timer
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+
+# 直方图分桶上界（毫秒）
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000, 30000)
+
+# (提供商名称, 发出请求的函数)；返回含 "error" 键的字典表示失败
+AsyncAttempt = Tuple[str, Callable[[], Awaitable[Dict]]]
+SyncAttempt = Tuple[str, Callable[[], Dict]]
+
+
+class LatencyHistogram:
+    """单个提供商的延迟直方图（固定分桶累计计数 + 最近样本窗口，用于计算分位数）"""
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window: 保留的最近样本数
+        """
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.outcomes = {"ok": 0, "error": 0, "cancelled": 0}
+        self.total_ms = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, latency_ms: float, outcome: str):
+        """
+        记录一次请求
+
+        Args:
+            latency_ms: 耗时（毫秒）
+            outcome: ok / error / cancelled（被对冲取消时为取消前已等待的时间，是实际延迟的下界）
+        """
+        self.outcomes[outcome] += 1
+        if outcome == "error":
+            return
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.total_ms += latency_ms
+        # 被取消的请求也计入窗口，否则只有快的请求留下样本，p90偏低导致越来越频繁地对冲
+        self.samples.append(latency_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        observed = self.outcomes["ok"] + self.outcomes["cancelled"]
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            **self.outcomes,
+            "avg_ms": round(self.total_ms / observed, 1) if observed else None,
+            "p50_ms": _round(self.percentile(0.5)),
+            "p90_ms": _round(self.percentile(0.9)),
+            "p99_ms": _round(self.percentile(0.99)),
+            "buckets": dict(zip(labels, self.buckets))
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class HedgeBudget:
+    """对冲预算（令牌桶）：每个请求存入ratio个令牌（上限burst），每次对冲消耗1个"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self):
+        self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HedgeController:
+    """对冲请求调度（自适应延迟、预算、直方图、胜出统计）"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.budget = HedgeBudget(settings.LLM_HEDGE_BUDGET_RATIO, settings.LLM_HEDGE_BUDGET_BURST)
+        self.counters = {"requests": 0, "hedged": 0, "budget_denied": 0, "fallbacks": 0, "failed": 0}
+        self.wins: Dict[str, Dict[str, int]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _histogram(self, provider: str) -> LatencyHistogram:
+        histogram = self.histograms.get(provider)
+        if histogram is None:
+            histogram = self.histograms[provider] = LatencyHistogram(settings.LLM_HEDGE_WINDOW)
+        return histogram
+
+    def observe(self, provider: str, latency_ms: float, outcome: str):
+        """记录一次提供商请求的耗时"""
+        with self.lock:
+            self._histogram(provider).observe(latency_ms, outcome)
+
+    def hedge_delay_ms(self, provider: str) -> float:
+        """
+        主提供商的对冲延迟：最近延迟的分位数（LLM_HEDGE_PERCENTILE），限制在最小/最大值之间
+
+        样本少于 LLM_HEDGE_MIN_SAMPLES 时返回 LLM_HEDGE_INITIAL_DELAY_MS
+        """
+        with self.lock:
+            histogram = self._histogram(provider)
+            if len(histogram.samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+                return settings.LLM_HEDGE_INITIAL_DELAY_MS
+            delay = histogram.percentile(settings.LLM_HEDGE_PERCENTILE)
+        return min(max(delay, settings.LLM_HEDGE_MIN_DELAY_MS), settings.LLM_HEDGE_MAX_DELAY_MS)
+
+    def _begin(self):
+        with self.lock:
+            self.counters["requests"] += 1
+            self.budget.deposit()
+
+    def _try_hedge(self) -> bool:
+        with self.lock:
+            if self.budget.try_spend():
+                self.counters["hedged"] += 1
+                return True
+            self.counters["budget_denied"] += 1
+            return False
+
+    def _count(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _finish(self, result: Dict, provider: str, hedged: bool, delay_ms: float, start: float) -> Dict:
+        """标记胜出的提供商并返回结果"""
+        with self.lock:
+            if "error" in result:
+                self.counters["failed"] += 1
+            else:
+                wins = self.wins.setdefault(provider, {"direct": 0, "hedged": 0})
+                wins["hedged" if hedged else "direct"] += 1
+        result["provider"] = provider
+        result["hedged"] = hedged
+        result["hedge_delay_ms"] = round(delay_ms, 1)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if hedged and "error" not in result:
+            logger.info(f"⚡ 对冲请求完成，{provider} 胜出（对冲延迟 {delay_ms:.0f}ms，总耗时 {result['latency_ms']}ms）")
+        return result
+
+    async def _attempt_async(self, provider: str, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        start = time.perf_counter()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self.observe(provider, (time.perf_counter() - start) * 1000, "cancelled")
+            raise
+        except Exception as e:
+            result = {"error": str(e) or type(e).__name__, "provider": provider}
+        self.observe(provider, (time.perf_counter() - start) * 1000, "error" if "error" in result else "ok")
+        return result
+
+    async def call_async(self, primary: AsyncAttempt, secondary: AsyncAttempt) -> Dict:
+        """
+        发出对冲请求（异步）
+
+        Args:
+            primary: (主提供商名称, 协程函数)
+            secondary: (备用提供商名称, 协程函数)
+
+        Returns:
+            先成功的结果（另含 provider / hedged / hedge_delay_ms / latency_ms）；都失败时返回备用提供商的错误
+        """
+        self._begin()
+        start = time.perf_counter()
+        delay_ms = self.hedge_delay_ms(primary[0])
+        tasks = {asyncio.ensure_future(self._attempt_async(*primary)): primary[0]}
+        waiting_for_hedge, secondary_started, hedged = True, False, False
+        last_error: Dict = {}
+        try:
+            while True:
+                timeout = max(delay_ms / 1000 - (time.perf_counter() - start), 0) if waiting_for_hedge else None
+                done, _ = await asyncio.wait(list(tasks), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    result = task.result()
+                    if "error" not in result:
+                        return self._finish(result, provider, hedged, delay_ms, start)
+                    last_error = result
+                if not done and waiting_for_hedge:
+                    # 主请求超过对冲延迟仍未完成
+                    waiting_for_hedge = False
+                    if self._try_hedge():
+                        logger.info(f"⏱️  {primary[0]} {delay_ms:.0f}ms 未返回，对冲请求 {secondary[0]}")
+                        tasks[asyncio.ensure_future(self._attempt_async(*secondary))] = secondary[0]
+                        secondary_started = hedged = True
+                    continue
+                if not tasks:
+                    if secondary_started:
+                        return self._finish(last_error, last_error.get("provider", secondary[0]), hedged, delay_ms, start)
+                    # 主请求失败：与原来一样立即切换到备用提供商
+                    logger.info(f"🔄 自动切换到{secondary[0]}")
+                    self._count("fallbacks")
+                    tasks[asyncio.ensure_future(self._attempt_async(*secondary))] = secondary[0]
+                    waiting_for_hedge, secondary_started = False, True
+        finally:
+            # 取消输掉的请求（调用方被取消时也取消全部请求）
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _attempt(self, provider: str, func: Callable[[], Dict]) -> Dict:
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as e:
+            result = {"error": str(e) or type(e).__name__, "provider": provider}
+        self.observe(provider, (time.perf_counter() - start) * 1000, "error" if "error" in result else "ok")
+        return result
+
+    def _submit(self, attempt: SyncAttempt) -> Future:
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=settings.LLM_HEDGE_SYNC_WORKERS,
+                                                    thread_name_prefix="llm-hedge")
+        return self._executor.submit(self._attempt, *attempt)
+
+    def call(self, primary: SyncAttempt, secondary: SyncAttempt) -> Dict:
+        """
+        call_async 的同步版本
+
+        主请求在调用方线程上执行，定时器在主请求开始后 hedge_delay_ms 毫秒把备用请求提交到线程池。
+        主请求成功时，若备用请求已先成功完成则采用备用结果；主请求失败时等待已发出的备用请求，
+        没有发出时与原来一样切换到备用提供商。输掉的备用请求无法中断，只丢弃其结果。
+        """
+        self._begin()
+        start = time.perf_counter()
+        delay_ms = self.hedge_delay_ms(primary[0])
+        state = {"primary_done": False, "future": None}
+        state_lock = Lock()
+
+        def fire_hedge():
+            with state_lock:
+                if state["primary_done"] or not self._try_hedge():
+                    return
+                logger.info(f"⏱️  {primary[0]} {delay_ms:.0f}ms 未返回，对冲请求 {secondary[0]}")
+                state["future"] = self._submit(secondary)
+
+        timer = Timer(delay_ms / 1000, fire_hedge)
+        timer.daemon = True
+        timer.start()
+        try:
+            result = self._attempt(*primary)
+        finally:
+            with state_lock:
+                state["primary_done"] = True
+            timer.cancel()
+        future: Optional[Future] = state["future"]
+        hedged = future is not None
+
+        if "error" not in result:
+            if hedged and future.done() and "error" not in future.result():
+                return self._finish(future.result(), secondary[0], hedged, delay_ms, start)
+            if hedged:
+                future.cancel()
+            return self._finish(result, primary[0], hedged, delay_ms, start)
+        if hedged:
+            return self._finish(future.result(), secondary[0], hedged, delay_ms, start)
+        # 主请求失败：与原来一样立即切换到备用提供商（在调用方线程上执行）
+        logger.info(f"🔄 自动切换到{secondary[0]}")
+        self._count("fallbacks")
+        return self._finish(self._attempt(*secondary), secondary[0], hedged, delay_ms, start)
+
+    def stats(self) -> Dict[str, Any]:
+        """对冲统计：请求数、对冲数与比例、预算拒绝数、各提供商胜出次数和延迟直方图"""
+        with self.lock:
+            requests = self.counters["requests"]
+            return {
+                "enabled": settings.LLM_HEDGE_ENABLED,
+                **self.counters,
+                "hedge_rate": round(self.counters["hedged"] / requests, 3) if requests else 0.0,
+                "budget_tokens": round(self.budget.tokens, 2),
+                "wins": {provider: dict(wins) for provider, wins in self.wins.items()},
+                "latency": {provider: histogram.snapshot() for provider, histogram in self.histograms.items()}
+            }
+
+
+# 全局对冲控制器
+_hedge_controller: Optional[HedgeController] = None
+_hedge_controller_lock = Lock()
+
+
+def get_hedge_controller() -> HedgeController:
+    """获取全局对冲控制器"""
+    global _hedge_controller
+    with _hedge_controller_lock:
+        if _hedge_controller is None:
+            _hedge_controller = HedgeController()
+        return _hedge_controller
@@ -1,9 +1,13 @@
 """
 LLM客户端 - 封装HKGAIClient
+chat_stream / chat_stream_async 使用OpenAI风格的 stream=true（SSE，每个 data: 行是一个增量chunk）
 """
+import asyncio
+import json
 import requests
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
 from services.core.config import settings
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session, streaming_timeout
 from services.core.logger import logger
 
 
@@ -19,20 +23,9 @@ class HKGAIClient:
             "Content-Type": "application/json"
         }
 
-    def chat(self, system_prompt: str, user_prompt: str, 
-             max_tokens: int = 500, temperature: float = 0.7) -> Dict:
-        """
-        发送聊天请求到LLM API
-        
-        Args:
-            system_prompt: 系统提示词
-            user_prompt: 用户提示词
-            max_tokens: 最大生成token数
-            temperature: 温度参数
-            
-        Returns:
-            包含content和raw数据的字典
-        """
+    def _build_request(self, system_prompt: str, user_prompt: str,
+                       max_tokens: int, temperature: float, stream: bool = False) -> Tuple[str, Dict]:
+        """构建请求地址和payload（stream=True 时请求流式输出）"""
         endpoint = f"{self.base_url}/chat/completions"
         payload = {
             "model": self.model_id,
@@ -43,20 +36,16 @@ class HKGAIClient:
             "max_tokens": max_tokens,
             "temperature": temperature
         }
+        if stream:
+            payload["stream"] = True
 
-        logger.info(f"🔵 调用HKGAI API: {endpoint}")
+        logger.info(f"🔵 调用HKGAI API{'（流式）' if stream else ''}: {endpoint}")
         logger.debug(f"请求Payload: model={self.model_id}, max_tokens={max_tokens}, temperature={temperature}")
         logger.debug(f"用户提示: {user_prompt[:100]}...")
-        
-        try:
-            response = requests.post(endpoint, headers=self.headers, json=payload, timeout=30)
-            response.raise_for_status()
-            logger.info(f"✅ HKGAI API调用成功，状态码: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ HKGAI API调用失败: {e}")
-            return {"error": str(e)}
+        return endpoint, payload
 
-        data = response.json()
+    def _parse_response(self, data: Dict) -> Dict:
+        """从响应JSON中提取content"""
         content = ""
         try:
             choices = data.get("choices", [])
@@ -89,6 +78,131 @@ class HKGAIClient:
         logger.debug(f"内容预览: {content[:100]}...")
         return {"content": content, "raw": data}
 
+    def chat(self, system_prompt: str, user_prompt: str, 
+             max_tokens: int = 500, temperature: float = 0.7) -> Dict:
+        """
+        发送聊天请求到LLM API
+        
+        Args:
+            system_prompt: 系统提示词
+            user_prompt: 用户提示词
+            max_tokens: 最大生成token数
+            temperature: 温度参数
+            
+        Returns:
+            包含content和raw数据的字典
+        """
+        endpoint, payload = self._build_request(system_prompt, user_prompt, max_tokens, temperature)
+        
+        try:
+            response = get_http_session().post(endpoint, headers=self.headers, json=payload, timeout=30)
+            response.raise_for_status()
+            logger.info(f"✅ HKGAI API调用成功，状态码: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ HKGAI API调用失败: {e}")
+            return {"error": str(e)}
+
+        return self._parse_response(response.json())
+
+    async def chat_async(self, system_prompt: str, user_prompt: str,
+                         max_tokens: int = 500, temperature: float = 0.7) -> Dict:
+        """chat 的异步版本（共享AsyncClient，参数和返回值相同）"""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.chat, system_prompt, user_prompt, max_tokens, temperature)
+        endpoint, payload = self._build_request(system_prompt, user_prompt, max_tokens, temperature)
+        
+        try:
+            response = await get_async_client().post(endpoint, headers=self.headers, json=payload, timeout=30)
+            response.raise_for_status()
+            logger.info(f"✅ HKGAI API调用成功，状态码: {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ HKGAI API调用失败: {e}")
+            return {"error": str(e)}
+
+        return self._parse_response(response.json())
+
+
+    def _parse_stream_line(self, line, state: Dict) -> Optional[Dict]:
+        """
+        解析流式响应的一行（"data: {chunk}"，以 "data: [DONE]" 结束）
+        
+        Args:
+            line: 一行SSE（str或bytes）
+            state: 本次请求的解析状态（记录finish_reason、usage和已输出字符数）
+            
+        Returns:
+            {"type": "delta", "text": 增量文本}；空行、注释、[DONE]和没有文本的chunk返回None
+        """
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.startswith("data:"):
+            return None
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            return None
+        chunk = json.loads(data)
+        if chunk.get("usage"):
+            state["usage"] = chunk["usage"]
+        choices = chunk.get("choices") or []
+        first = choices[0] if choices and isinstance(choices[0], dict) else {}
+        if first.get("finish_reason"):
+            state["finish_reason"] = first["finish_reason"]
+        # Chat schema 的增量在delta中，text-based schema 直接是text
+        text = (first.get("delta") or {}).get("content") or first.get("text") or ""
+        if not text:
+            return None
+        state["chars"] = state.get("chars", 0) + len(text)
+        return {"type": "delta", "text": text}
+    
+    def _stream_end(self, state: Dict) -> Dict:
+        """流式响应结束事件"""
+        logger.info(f"✅ HKGAI流式返回内容长度: {state.get('chars', 0)} 字符")
+        return {"type": "end", "finish_reason": state.get("finish_reason"), "usage": state.get("usage")}
+    
+    def chat_stream(self, system_prompt: str, user_prompt: str,
+                    max_tokens: int = 500, temperature: float = 0.7) -> Iterator[Dict]:
+        """
+        流式发送聊天请求（同步版本）
+        
+        Yields:
+            {"type": "delta", "text": 增量文本}，最后是 {"type": "end", "finish_reason", "usage"}；
+            出错时最后是 {"type": "error", "error": 错误信息}
+        """
+        endpoint, payload = self._build_request(system_prompt, user_prompt, max_tokens, temperature, stream=True)
+        state: Dict = {}
+        try:
+            with get_http_session().post(endpoint, headers=self.headers, json=payload, stream=True,
+                                         timeout=(settings.LLM_STREAM_CONNECT_TIMEOUT, settings.LLM_STREAM_READ_TIMEOUT)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    event = self._parse_stream_line(line, state)
+                    if event:
+                        yield event
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"❌ HKGAI流式调用失败: {e!r}")
+            yield {"type": "error", "error": str(e) or type(e).__name__}
+            return
+        yield self._stream_end(state)
+    
+    async def chat_stream_async(self, system_prompt: str, user_prompt: str,
+                                max_tokens: int = 500, temperature: float = 0.7) -> AsyncIterator[Dict]:
+        """chat_stream 的异步版本（共享AsyncClient，需要httpx，事件格式相同）"""
+        endpoint, payload = self._build_request(system_prompt, user_prompt, max_tokens, temperature, stream=True)
+        state: Dict = {}
+        try:
+            async with get_async_client().stream("POST", endpoint, headers=self.headers, json=payload,
+                                                 timeout=streaming_timeout()) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    event = self._parse_stream_line(line, state)
+                    if event:
+                        yield event
+        except Exception as e:
+            logger.error(f"❌ HKGAI流式调用失败: {e!r}")
+            yield {"type": "error", "error": str(e) or type(e).__name__}
+            return
+        yield self._stream_end(state)
+
 
 # 全局LLM客户端实例
 llm_client = HKGAIClient()
@@ -1,10 +1,16 @@
 """
 统一LLM客户端 - 支持HKGAI和Gemini，自动fallback机制
+
+chat / chat_async 在配置了Gemini时使用对冲请求（services/llm/hedging.py）：
+HKGAI超过自适应延迟未返回时并发请求Gemini，取先成功的结果。
 """
-from typing import Dict, Optional
+import time
+from typing import AsyncIterator, Dict, Optional
 from services.core.config import settings
+from services.core.http_client import HTTPX_AVAILABLE
 from services.llm.hkgai_client import HKGAIClient
 from services.llm.gemini_client import GeminiClient
+from services.llm.hedging import get_hedge_controller
 from services.core.logger import logger
 
 
@@ -43,18 +49,157 @@ class UnifiedLLMClient:
             provider: API提供商 ("gemini" 或 "hkgai")
             
         Returns:
-            包含content、token使用量等信息的字典
+            包含content、token使用量等信息的字典（provider为给出结果的提供商；
+            对冲时另有 hedged / hedge_delay_ms / latency_ms）
         """
-        # 如果明确指定使用Gemini
-        if provider.lower() == "gemini" and self.gemini_client:
+        # 如果明确指定使用Gemini，或HKGAI连续失败多次
+        if self._use_gemini_directly(provider):
             return self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature)
         
-        # 如果HKGAI连续失败多次，直接使用Gemini
-        if self.hkgai_failure_count >= 3 and self.gemini_client:
-            logger.warning(f"⚠️  HKGAI已连续失败{self.hkgai_failure_count}次，直接使用Gemini")
-            return self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature)
+        # HKGAI超过对冲延迟未返回时并发请求Gemini（HKGAI失败时同样切换到Gemini）
+        if self._hedging_enabled():
+            return get_hedge_controller().call(
+                ("hkgai", lambda: self._call_hkgai(system_prompt, user_prompt, max_tokens, temperature)),
+                ("gemini", lambda: self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature))
+            )
         
         # 尝试使用HKGAI
+        result = self._call_hkgai(system_prompt, user_prompt, max_tokens, temperature)
+        if "error" not in result:
+            return result
+        
+        # 自动fallback到Gemini
+        if self.gemini_client:
+            logger.info("🔄 自动切换到Gemini API")
+            return self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature)
+        logger.error("❌ 没有可用的fallback API")
+        return result
+    
+    async def chat_async(self, system_prompt: str, user_prompt: str,
+                         max_tokens: int = 2048,
+                         temperature: float = 0.7,
+                         model: Optional[str] = None,
+                         provider: str = "hkgai") -> Dict:
+        """chat 的异步版本（fallback和对冲逻辑相同，输掉的对冲请求会被取消）"""
+        if self._use_gemini_directly(provider):
+            return await self._call_gemini_async(system_prompt, user_prompt, model, max_tokens, temperature)
+        
+        if self._hedging_enabled():
+            return await get_hedge_controller().call_async(
+                ("hkgai", lambda: self._call_hkgai_async(system_prompt, user_prompt, max_tokens, temperature)),
+                ("gemini", lambda: self._call_gemini_async(system_prompt, user_prompt, model, max_tokens, temperature))
+            )
+        
+        result = await self._call_hkgai_async(system_prompt, user_prompt, max_tokens, temperature)
+        if "error" not in result:
+            return result
+        
+        if self.gemini_client:
+            logger.info("🔄 自动切换到Gemini API")
+            return await self._call_gemini_async(system_prompt, user_prompt, model, max_tokens, temperature)
+        logger.error("❌ 没有可用的fallback API")
+        return result
+    
+    async def chat_stream_async(self, system_prompt: str, user_prompt: str,
+                                max_tokens: int = 2048,
+                                temperature: float = 0.7,
+                                model: Optional[str] = None,
+                                provider: str = "hkgai") -> AsyncIterator[Dict]:
+        """
+        流式发送聊天请求（带自动fallback：还没有输出任何文本时失败才切换到Gemini）
+        
+        Yields:
+            {"type": "delta", "text": 增量文本}，最后是
+            {"type": "end", "content": 完整答案, "provider", "ttft_ms": 首个token耗时, "latency_ms": 总耗时, ...}
+            或 {"type": "error", "error": 错误信息, "provider", "partial": 是否已输出部分文本}
+        """
+        start = time.perf_counter()
+        if not HTTPX_AVAILABLE:
+            # 没有httpx时不能流式读取，完整答案作为一个增量返回
+            result = await self.chat_async(system_prompt, user_prompt, max_tokens, temperature, model, provider)
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            if "error" in result:
+                yield {"type": "error", "partial": False, **result}
+                return
+            if result.get("content"):
+                yield {"type": "delta", "text": result["content"]}
+            result.pop("raw", None)
+            yield {"type": "end", **result, "ttft_ms": elapsed_ms, "latency_ms": elapsed_ms}
+            return
+        
+        if self._use_gemini_directly(provider):
+            providers = ["gemini"]
+        else:
+            providers = ["hkgai", "gemini"] if self.gemini_client else ["hkgai"]
+        
+        error = None
+        for name in providers:
+            if error is not None:
+                logger.info("🔄 自动切换到Gemini API")
+            if name == "hkgai":
+                stream = self.hkgai_client.chat_stream_async(system_prompt, user_prompt, max_tokens, temperature)
+            else:
+                stream = self.gemini_client.chat_stream_async(
+                    system_prompt, user_prompt, model or settings.GEMINI_DEFAULT_MODEL, max_tokens, temperature
+                )
+            parts, ttft_ms, end, error = [], None, None, None
+            try:
+                async for event in stream:
+                    if event["type"] == "delta":
+                        if ttft_ms is None:
+                            ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                        parts.append(event["text"])
+                        yield event
+                    elif event["type"] == "error":
+                        error = {**event, "provider": name, "partial": bool(parts)}
+                        break
+                    else:
+                        end = event
+            except Exception as e:
+                error = {"type": "error", "error": str(e) or type(e).__name__, "provider": name, "partial": bool(parts)}
+            finally:
+                await stream.aclose()
+            
+            if name == "hkgai":
+                succeeded = self._hkgai_succeeded(error or {})
+            else:
+                succeeded = error is None
+            if succeeded:
+                latency_ms = round((time.perf_counter() - start) * 1000, 1)
+                yield {
+                    **(end or {}),
+                    "type": "end",
+                    "content": "".join(parts).strip(),
+                    "provider": name,
+                    "ttft_ms": ttft_ms if ttft_ms is not None else latency_ms,
+                    "latency_ms": latency_ms
+                }
+                return
+            if parts:
+                # 已经输出了部分答案，不能再切换提供商
+                break
+        
+        if error["provider"] == "hkgai" and not self.gemini_client:
+            logger.error("❌ 没有可用的fallback API")
+        yield error
+    
+    def _use_gemini_directly(self, provider: str) -> bool:
+        """明确指定Gemini，或HKGAI连续失败多次时直接使用Gemini"""
+        if not self.gemini_client:
+            return False
+        if provider.lower() == "gemini":
+            return True
+        if self.hkgai_failure_count >= 3:
+            logger.warning(f"⚠️  HKGAI已连续失败{self.hkgai_failure_count}次，直接使用Gemini")
+            return True
+        return False
+    
+    def _hedging_enabled(self) -> bool:
+        """配置了Gemini且启用了对冲"""
+        return self.gemini_client is not None and settings.LLM_HEDGE_ENABLED
+    
+    def _call_hkgai(self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float) -> Dict:
+        """调用HKGAI API（更新失败计数）"""
         try:
             result = self.hkgai_client.chat(
                 system_prompt=system_prompt,
@@ -62,37 +207,42 @@ class UnifiedLLMClient:
                 max_tokens=max_tokens,
                 temperature=temperature
             )
-            
-            # 检查是否有错误
-            if "error" in result:
-                self.hkgai_failure_count += 1
-                logger.warning(f"⚠️  HKGAI调用失败 (失败计数: {self.hkgai_failure_count})")
-                
-                # 自动fallback到Gemini
-                if self.gemini_client:
-                    logger.info("🔄 自动切换到Gemini API")
-                    return self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature)
-                else:
-                    logger.error("❌ 没有可用的fallback API")
-                    return result
-            else:
-                # 成功，重置失败计数
-                if self.hkgai_failure_count > 0:
-                    logger.info(f"✅ HKGAI恢复正常，重置失败计数（之前: {self.hkgai_failure_count}）")
-                    self.hkgai_failure_count = 0
-                result["provider"] = "hkgai"
-                return result
-                
         except Exception as e:
+            result = self._hkgai_exception(e)
+        self._hkgai_succeeded(result)
+        return result
+    
+    async def _call_hkgai_async(self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float) -> Dict:
+        """异步调用HKGAI API（更新失败计数；被对冲取消时不计入失败）"""
+        try:
+            result = await self.hkgai_client.chat_async(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+        except Exception as e:
+            result = self._hkgai_exception(e)
+        self._hkgai_succeeded(result)
+        return result
+    
+    def _hkgai_exception(self, e: Exception) -> Dict:
+        """HKGAI调用抛出异常时转换为错误结果"""
+        logger.error(f"❌ HKGAI异常: {e}")
+        return {"error": str(e), "provider": "hkgai"}
+    
+    def _hkgai_succeeded(self, result: Dict) -> bool:
+        """检查HKGAI结果并更新失败计数"""
+        if "error" in result:
             self.hkgai_failure_count += 1
-            logger.error(f"❌ HKGAI异常: {e} (失败计数: {self.hkgai_failure_count})")
-            
-            # 自动fallback到Gemini
-            if self.gemini_client:
-                logger.info("🔄 自动切换到Gemini API")
-                return self._call_gemini(system_prompt, user_prompt, model, max_tokens, temperature)
-            else:
-                return {"error": str(e), "provider": "hkgai"}
+            logger.warning(f"⚠️  HKGAI调用失败 (失败计数: {self.hkgai_failure_count})")
+            return False
+        # 成功，重置失败计数
+        if self.hkgai_failure_count > 0:
+            logger.info(f"✅ HKGAI恢复正常，重置失败计数（之前: {self.hkgai_failure_count}）")
+            self.hkgai_failure_count = 0
+        result["provider"] = "hkgai"
+        return True
     
     def _call_gemini(self, system_prompt: str, user_prompt: str, 
                      model: Optional[str], max_tokens: int, temperature: float) -> Dict:
@@ -111,6 +261,23 @@ class UnifiedLLMClient:
             logger.error(f"❌ Gemini API调用也失败: {e}")
             return {"error": str(e), "provider": "gemini"}
     
+    async def _call_gemini_async(self, system_prompt: str, user_prompt: str,
+                                 model: Optional[str], max_tokens: int, temperature: float) -> Dict:
+        """异步调用Gemini API"""
+        try:
+            result = await self.gemini_client.chat_async(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                model=model or settings.GEMINI_DEFAULT_MODEL,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            result["provider"] = "gemini"
+            return result
+        except Exception as e:
+            logger.error(f"❌ Gemini API调用也失败: {e}")
+            return {"error": str(e), "provider": "gemini"}
+    
     def get_supported_models(self) -> Dict:
         """获取支持的模型列表"""
         result = {
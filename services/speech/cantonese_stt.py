@@ -8,6 +8,7 @@ import requests
 from typing import Optional, Dict
 from services.core.logger import logger
 from services.core.config import settings
+from services.core.http_client import get_http_session
 
 class CantoneseSTT:
     """粤语专用语音转文本服务"""
@@ -77,7 +78,7 @@ class CantoneseSTT:
                 }
                 
                 # 发送请求
-                response = requests.post(
+                response = get_http_session().post(
                     self.api_url,
                     headers=headers,
                     files=files,
@@ -8,6 +8,7 @@ import uuid
 from typing import Dict, Optional
 from services.core.logger import logger
 from services.core.config import settings
+from services.core.http_client import get_http_session
 
 
 class HKGAISpeechClient:
@@ -87,7 +88,7 @@ class HKGAISpeechClient:
         logger.info("🎤 调用HKGAI语音识别API...")
         
         try:
-            response = requests.post(
+            response = get_http_session().post(
                 endpoint,
                 headers=headers,
                 json=payload,
@@ -226,7 +227,7 @@ class HKGAISpeechClient:
         logger.info("🎤 调用HKGAI会议转录API（带说话人识别）...")
         
         try:
-            response = requests.post(
+            response = get_http_session().post(
                 endpoint,
                 headers=headers,
                 json=payload,
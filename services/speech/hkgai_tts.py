@@ -8,6 +8,7 @@ import os
 from typing import Optional
 from services.core.logger import logger
 from services.core.config import settings
+from services.core.http_client import get_http_session
 
 
 class HKGAITTSClient:
@@ -81,7 +82,7 @@ class HKGAITTSClient:
         logger.info(f"🎤 调用HKGAI TTS API: text='{text[:30]}...', language={language}, voice={voice}")
         
         try:
-            response = requests.get(
+            response = get_http_session().get(
                 self.base_url,
                 params=params,
                 headers=headers,
@@ -7,6 +7,7 @@ from services.core.logger import logger
 from services.speech.voice_service import get_voice_service
 from services.agent import agent
 from services.core.config import settings
+from services.core.executors import get_executor
 import json
 import asyncio
 import numpy as np
@@ -175,7 +176,8 @@ class VoiceWebSocketHandler:
             
             # 语音转文本（使用自动语言检测，支持中文、粤语、英语）
             logger.info("开始语音转文本...")
-            transcription_result = self.voice_service.transcribe_audio(
+            transcription_result = await get_executor("stt").run(
+                self.voice_service.transcribe_audio,
                 audio_bytes=audio_bytes,
                 audio_format=audio_format,
                 language=None  # None表示自动检测，支持中文、粤语、英语混合识别
@@ -211,7 +213,7 @@ class VoiceWebSocketHandler:
                 if query_text:
                     try:
                         logger.info(f"开始执行Agent查询: '{query_text}'")
-                        agent_result = agent.execute(query_text, model=None)
+                        agent_result = await agent.execute_async(query_text, model=None)
                         answer = agent_result.get("answer", "")
                         tools_used = agent_result.get("tools_used", [])
                         logger.info(f"Agent查询完成，答案长度: {len(answer) if answer else 0}")
@@ -223,7 +225,7 @@ class VoiceWebSocketHandler:
                 if transcribed_text:
                     logger.info(f"未检测到唤醒词，但尝试直接回答: '{transcribed_text}'")
                     try:
-                        agent_result = agent.execute(transcribed_text, model=None)
+                        agent_result = await agent.execute_async(transcribed_text, model=None)
                         answer = agent_result.get("answer", "")
                         tools_used = agent_result.get("tools_used", [])
                     except Exception as e:
@@ -1,8 +1,12 @@
 """
 存储后端抽象接口 - 支持多种存储方式
 """
+import base64
+import json
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, List
+from datetime import datetime
+from typing import Iterable, Optional, Dict, List, Tuple
+from services.core.config import settings
 from services.core.logger import logger
 
 
@@ -34,10 +38,80 @@ class StorageBackend(ABC):
     def delete_file_metadata(self, file_id: str) -> bool:
         """删除文件元数据"""
         pass
+    
+    def get_many(self, file_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量获取文件元数据
+        
+        Returns:
+            file_id -> 元数据（不存在的文件不在结果中）
+        """
+        result = {}
+        for file_id in dict.fromkeys(file_ids):
+            metadata = self.get_file_metadata(file_id)
+            if metadata:
+                result[file_id] = metadata
+        return result
+    
+    def update_many(self, updates: Dict[str, Dict]) -> int:
+        """
+        批量更新文件元数据
+        
+        Args:
+            updates: file_id -> 要更新的字段
+            
+        Returns:
+            更新成功的文件数
+        """
+        return sum(1 for file_id, fields in updates.items() if self.update_file_metadata(file_id, fields))
+    
+    def list_files_page(self, file_type: Optional[str] = None, processed: Optional[bool] = None,
+                        limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按上传时间倒序分页列出文件（键集分页：cursor为上一页最后一个文件的 (上传时间, file_id)）
+        
+        Args:
+            limit: 每页文件数
+            cursor: 上一页返回的next_cursor，第一页为None
+            
+        Returns:
+            (本页文件列表, 下一页的cursor；没有下一页时为None)
+        """
+        after = decode_cursor(cursor) if cursor else None
+        files = sorted(
+            self.list_files(file_type=file_type, processed=processed),
+            key=lambda f: (f.get("uploaded_at") or "", f.get("file_id") or ""),
+            reverse=True
+        )
+        if after:
+            files = [f for f in files if (f.get("uploaded_at") or "", f.get("file_id") or "") < after]
+        page = files[:limit]
+        next_cursor = encode_cursor(page[-1].get("uploaded_at"), page[-1]["file_id"]) if len(files) > limit else None
+        return page, next_cursor
+
+
+def encode_cursor(uploaded_at: Optional[str], file_id: str) -> str:
+    """分页cursor：(上传时间, file_id) 的URL安全编码"""
+    raw = json.dumps([uploaded_at or "", file_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解析分页cursor
+    
+    Raises:
+        ValueError: cursor格式错误
+    """
+    try:
+        uploaded_at, file_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError(f"无效的分页cursor: {cursor}")
+    return str(uploaded_at), str(file_id)
 
 
 class MilvusStorageBackend(StorageBackend):
-    """Milvus存储后端 - 通过查询Milvus获取元数据"""
+    """Milvus存储后端 - 元数据来自索引器维护的文件目录（可从Milvus重建）"""
     
     def __init__(self):
         from services.storage.milvus_metadata import milvus_metadata
@@ -49,12 +123,12 @@ class MilvusStorageBackend(StorageBackend):
         return True
     
     def get_file_metadata(self, file_id: str) -> Optional[Dict]:
-        """从Milvus查询文件元数据"""
+        """从文件目录查询文件元数据"""
         return self.milvus_metadata.get_file_metadata_from_milvus(file_id)
     
     def list_files(self, file_type: Optional[str] = None, 
                    processed: Optional[bool] = None) -> List[Dict]:
-        """从Milvus列出文件"""
+        """从文件目录列出已索引的文件"""
         files = self.milvus_metadata.list_files_from_milvus()
         
         # 过滤
@@ -65,22 +139,34 @@ class MilvusStorageBackend(StorageBackend):
         
         return files
     
+    def list_files_page(self, file_type: Optional[str] = None, processed: Optional[bool] = None,
+                        limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """按 (上传时间, file_id) 倒序在文件目录上键集分页，每页只读取limit+1行"""
+        after = decode_cursor(cursor) if cursor else None
+        if processed is False:
+            # 目录中只有已索引的文件
+            return [], None
+        files = self.milvus_metadata.list_files_page(file_type=file_type, limit=limit + 1, after=after)
+        page = files[:limit]
+        next_cursor = encode_cursor(page[-1]["uploaded_at"], page[-1]["file_id"]) if len(files) > limit else None
+        return page, next_cursor
+    
     def update_file_metadata(self, file_id: str, updates: Dict) -> bool:
-        """Milvus后端的元数据更新通过重新索引实现"""
-        # 由于元数据存储在Milvus的source_file字段中，更新需要重新索引
-        # 这里返回True表示操作已记录，实际更新需要重新索引文件
+        """Milvus后端的元数据由索引器写入文件目录（chunk数等在写入向量时记录）"""
         return True
     
     def delete_file_metadata(self, file_id: str) -> bool:
-        """从Milvus删除文件元数据（通过删除相关chunks）"""
-        # 注意：实际实现需要删除Milvus中所有相关chunks
-        # 这是一个复杂操作，建议通过外部函数实现
+        """删除文件目录记录和Milvus中该文件的所有chunk"""
+        self.milvus_metadata.delete_file(file_id)
         return True
 
 
 class DatabaseStorageBackend(StorageBackend):
     """传统数据库存储后端 - 使用SQLite/PostgreSQL存储元数据"""
     
+    # IN查询每批的参数个数（SQLite默认上限999）
+    IN_BATCH_SIZE = 500
+    
     def __init__(self, database_url: str = "sqlite:///./file_storage.db"):
         """
         初始化数据库后端
@@ -88,7 +174,7 @@ class DatabaseStorageBackend(StorageBackend):
         Args:
             database_url: 数据库URL（SQLite或PostgreSQL）
         """
-        from sqlalchemy import create_engine, Column, String, DateTime, Integer, Boolean, Text
+        from sqlalchemy import create_engine, event, Column, String, DateTime, Integer, Boolean, Text, Index
         from sqlalchemy.ext.declarative import declarative_base
         from sqlalchemy.orm import sessionmaker
         
@@ -96,6 +182,12 @@ class DatabaseStorageBackend(StorageBackend):
         
         class FileMetadata(Base):
             __tablename__ = "file_metadata"
+            # 分页按 (上传时间, file_id) 倒序；按类型/处理状态过滤时也能直接按索引顺序读取一页
+            __table_args__ = (
+                Index("ix_file_metadata_uploaded_at_file_id", "uploaded_at", "file_id"),
+                Index("ix_file_metadata_file_type_uploaded_at", "file_type", "uploaded_at", "file_id"),
+                Index("ix_file_metadata_processed_uploaded_at", "processed", "uploaded_at", "file_id"),
+            )
             
             file_id = Column(String, primary_key=True)
             filename = Column(String, nullable=False)
@@ -112,6 +204,12 @@ class DatabaseStorageBackend(StorageBackend):
         
         self.Base = Base
         self.FileMetadata = FileMetadata
+        # 列表查询不读取文本摘要（content_text最多1万字符）
+        self._list_columns = [
+            FileMetadata.file_id, FileMetadata.filename, FileMetadata.file_path, FileMetadata.file_type,
+            FileMetadata.file_size, FileMetadata.uploaded_at, FileMetadata.processed, FileMetadata.chunk_count,
+            FileMetadata.metadata_json
+        ]
         
         # 创建数据库引擎
         if database_url.startswith("sqlite"):
@@ -119,24 +217,92 @@ class DatabaseStorageBackend(StorageBackend):
                 database_url,
                 connect_args={"check_same_thread": False}
             )
+            
+            @event.listens_for(self.engine, "connect")
+            def _configure_sqlite(dbapi_connection, connection_record):
+                # WAL下读写互不阻塞；synchronous=NORMAL在WAL下只在检查点时fsync；mmap减少读取时的内存拷贝
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute(f"PRAGMA mmap_size={settings.DATABASE_SQLITE_MMAP_SIZE}")
+                cursor.close()
         else:
-            self.engine = create_engine(database_url)
+            self.engine = create_engine(
+                database_url,
+                pool_size=settings.DATABASE_POOL_SIZE,
+                max_overflow=settings.DATABASE_MAX_OVERFLOW,
+                pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+                pool_recycle=settings.DATABASE_POOL_RECYCLE,
+                pool_pre_ping=True
+            )
         
-        # 创建表
+        # 创建表（已有的表补建新增的索引）
         Base.metadata.create_all(self.engine)
+        for index in FileMetadata.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
         
-        # 创建会话工厂
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        # 创建会话工厂（提交后不再重新加载对象）
+        self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
+    
+    @staticmethod
+    def _parse_datetime(value) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    
+    def _to_metadata(self, record, include_content: bool = False) -> Dict:
+        """数据库记录（ORM对象或列表查询的行）-> 元数据字典"""
+        metadata = {
+            "file_id": record.file_id,
+            "filename": record.filename,
+            "file_path": record.file_path,
+            "file_type": record.file_type,
+            "file_size": record.file_size,
+            "uploaded_at": record.uploaded_at.isoformat() if record.uploaded_at else None,
+            "processed": record.processed,
+            "chunk_count": record.chunk_count
+        }
+        if include_content:
+            metadata.update({
+                "mime_type": record.mime_type,
+                "processed_at": record.processed_at.isoformat() if record.processed_at else None,
+                "content_text": record.content_text
+            })
+        
+        # 解析额外元数据（大多数文件为空对象，跳过解析）
+        if record.metadata_json and record.metadata_json != "{}":
+            try:
+                metadata.update(json.loads(record.metadata_json))
+            except ValueError:
+                pass
+        
+        return metadata
+    
+    def _apply_updates(self, record, updates: Dict):
+        """把更新字段写入ORM对象"""
+        if "processed" in updates:
+            record.processed = updates["processed"]
+        if "processed_at" in updates:
+            record.processed_at = self._parse_datetime(updates["processed_at"])
+        if "chunk_count" in updates:
+            record.chunk_count = updates["chunk_count"]
+        if "content_text" in updates:
+            record.content_text = updates["content_text"]
+        if "metadata" in updates:
+            record.metadata_json = json.dumps(updates["metadata"])
+    
+    def _fetch_records(self, db, file_ids: List[str]) -> List:
+        """按file_id分批IN查询完整记录"""
+        records = []
+        for i in range(0, len(file_ids), self.IN_BATCH_SIZE):
+            batch = file_ids[i:i + self.IN_BATCH_SIZE]
+            records.extend(db.query(self.FileMetadata).filter(self.FileMetadata.file_id.in_(batch)).all())
+        return records
     
     def save_file_metadata(self, file_id: str, metadata: Dict) -> bool:
         """保存文件元数据到数据库"""
-        from datetime import datetime
-        import json
-        
         db = self.SessionLocal()
         try:
             # 检查是否已存在
-            existing = db.query(self.FileMetadata).filter_by(file_id=file_id).first()
+            existing = db.get(self.FileMetadata, file_id)
             if existing:
                 return True
             
@@ -148,7 +314,7 @@ class DatabaseStorageBackend(StorageBackend):
                 file_type=metadata.get("file_type", ""),
                 file_size=metadata.get("file_size", 0),
                 mime_type=metadata.get("mime_type"),
-                uploaded_at=datetime.fromisoformat(metadata.get("uploaded_at", datetime.utcnow().isoformat())) if isinstance(metadata.get("uploaded_at"), str) else metadata.get("uploaded_at", datetime.utcnow()),
+                uploaded_at=self._parse_datetime(metadata.get("uploaded_at")) or datetime.utcnow(),
                 processed=metadata.get("processed", False),
                 chunk_count=metadata.get("chunk_count", 0),
                 metadata_json=json.dumps(metadata.get("metadata", {}))
@@ -166,108 +332,80 @@ class DatabaseStorageBackend(StorageBackend):
     
     def get_file_metadata(self, file_id: str) -> Optional[Dict]:
         """从数据库获取文件元数据"""
-        import json
-        from datetime import datetime
-        
         db = self.SessionLocal()
         try:
-            record = db.query(self.FileMetadata).filter_by(file_id=file_id).first()
-            if not record:
-                return None
-            
-            metadata = {
-                "file_id": record.file_id,
-                "filename": record.filename,
-                "file_path": record.file_path,
-                "file_type": record.file_type,
-                "file_size": record.file_size,
-                "mime_type": record.mime_type,
-                "uploaded_at": record.uploaded_at.isoformat() if record.uploaded_at else None,
-                "processed": record.processed,
-                "processed_at": record.processed_at.isoformat() if record.processed_at else None,
-                "content_text": record.content_text,
-                "chunk_count": record.chunk_count
+            record = db.get(self.FileMetadata, file_id)
+            return self._to_metadata(record, include_content=True) if record else None
+        finally:
+            db.close()
+    
+    def get_many(self, file_ids: Iterable[str]) -> Dict[str, Dict]:
+        """批量获取文件元数据（一个会话，按file_id分批IN查询）"""
+        file_ids = list(dict.fromkeys(file_ids))
+        if not file_ids:
+            return {}
+        db = self.SessionLocal()
+        try:
+            return {
+                record.file_id: self._to_metadata(record, include_content=True)
+                for record in self._fetch_records(db, file_ids)
             }
-            
-            # 解析额外元数据
-            if record.metadata_json:
-                try:
-                    metadata.update(json.loads(record.metadata_json))
-                except:
-                    pass
-            
-            return metadata
         finally:
             db.close()
     
+    def _list_query(self, db, file_type: Optional[str], processed: Optional[bool]):
+        query = db.query(*self._list_columns)
+        if file_type:
+            query = query.filter(self.FileMetadata.file_type == file_type)
+        if processed is not None:
+            query = query.filter(self.FileMetadata.processed == processed)
+        return query
+    
     def list_files(self, file_type: Optional[str] = None, 
                    processed: Optional[bool] = None) -> List[Dict]:
-        """从数据库列出文件"""
-        import json
-        from datetime import datetime
+        """从数据库列出文件（只查询列表需要的列）"""
+        db = self.SessionLocal()
+        try:
+            return [self._to_metadata(row) for row in self._list_query(db, file_type, processed)]
+        finally:
+            db.close()
+    
+    def list_files_page(self, file_type: Optional[str] = None, processed: Optional[bool] = None,
+                        limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """按 (上传时间, file_id) 倒序键集分页，每页只扫描索引中的limit+1行"""
+        from sqlalchemy import and_, or_
         
+        FileMetadata = self.FileMetadata
         db = self.SessionLocal()
         try:
-            query = db.query(self.FileMetadata)
-            
-            if file_type:
-                query = query.filter_by(file_type=file_type)
-            if processed is not None:
-                query = query.filter_by(processed=processed)
-            
-            records = query.all()
-            files = []
-            
-            for record in records:
-                metadata = {
-                    "file_id": record.file_id,
-                    "filename": record.filename,
-                    "file_path": record.file_path,
-                    "file_type": record.file_type,
-                    "file_size": record.file_size,
-                    "uploaded_at": record.uploaded_at.isoformat() if record.uploaded_at else None,
-                    "processed": record.processed,
-                    "chunk_count": record.chunk_count
-                }
-                
-                if record.metadata_json:
-                    try:
-                        metadata.update(json.loads(record.metadata_json))
-                    except:
-                        pass
-                
-                files.append(metadata)
-            
-            return files
+            query = self._list_query(db, file_type, processed)
+            if cursor:
+                # 上传时间在保存时总会写入，不处理NULL
+                uploaded_at, file_id = decode_cursor(cursor)
+                uploaded_at = datetime.fromisoformat(uploaded_at)
+                query = query.filter(or_(
+                    FileMetadata.uploaded_at < uploaded_at,
+                    and_(FileMetadata.uploaded_at == uploaded_at, FileMetadata.file_id < file_id)
+                ))
+            rows = query.order_by(
+                FileMetadata.uploaded_at.desc(), FileMetadata.file_id.desc()
+            ).limit(limit + 1).all()
         finally:
             db.close()
+        
+        files = [self._to_metadata(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(files[-1]["uploaded_at"], files[-1]["file_id"]) if len(rows) > limit else None
+        return files, next_cursor
     
     def update_file_metadata(self, file_id: str, updates: Dict) -> bool:
         """更新文件元数据"""
-        import json
-        from datetime import datetime
-        
         db = self.SessionLocal()
         try:
-            record = db.query(self.FileMetadata).filter_by(file_id=file_id).first()
+            record = db.get(self.FileMetadata, file_id)
             if not record:
                 return False
             
-            # 更新字段
-            if "processed" in updates:
-                record.processed = updates["processed"]
-            if "processed_at" in updates:
-                if isinstance(updates["processed_at"], str):
-                    record.processed_at = datetime.fromisoformat(updates["processed_at"])
-                else:
-                    record.processed_at = updates["processed_at"]
-            if "chunk_count" in updates:
-                record.chunk_count = updates["chunk_count"]
-            if "content_text" in updates:
-                record.content_text = updates["content_text"]
-            if "metadata" in updates:
-                record.metadata_json = json.dumps(updates["metadata"])
-            
+            self._apply_updates(record, updates)
             db.commit()
             return True
         except Exception as e:
@@ -277,11 +415,29 @@ class DatabaseStorageBackend(StorageBackend):
         finally:
             db.close()
     
+    def update_many(self, updates: Dict[str, Dict]) -> int:
+        """批量更新文件元数据（一个事务）"""
+        if not updates:
+            return 0
+        db = self.SessionLocal()
+        try:
+            records = self._fetch_records(db, list(updates))
+            for record in records:
+                self._apply_updates(record, updates[record.file_id])
+            db.commit()
+            return len(records)
+        except Exception as e:
+            logger.error(f"批量更新文件元数据失败: {e}")
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+    
     def delete_file_metadata(self, file_id: str) -> bool:
         """从数据库删除文件元数据"""
         db = self.SessionLocal()
         try:
-            record = db.query(self.FileMetadata).filter_by(file_id=file_id).first()
+            record = db.get(self.FileMetadata, file_id)
             if not record:
                 return False
             
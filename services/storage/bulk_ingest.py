@@ -0,0 +1,636 @@
+"""
+批量导入流水线 - 把大量本地文档导入知识库（scripts/ingest.py 使用）
+
+分阶段的生产者/消费者流水线，阶段之间用有界队列连接：
+  discover（遍历目录）→ extract（读取、提取文本并切分，进程池）→ embed（批量向量化）→ insert（批量写入）
+- 队列长度和进程池在途任务数都有上限，内存占用与文档总数无关
+- 断点续传：一个文档的第一批chunk写入前，向检查点文件（每行一个JSON）追加一条started记录，
+  所有chunk写入后追加完成记录；再次运行时路径、大小、修改时间都未变的文件直接跳过，
+  只有started记录的文档（上次中断时写了一部分）先删除已写入的chunk再重新导入
+- 提取进程池在启动流水线线程（和加载embedding模型）之前一次性fork出全部子进程
+  （create_worker_pool），不会从多线程的进程中fork
+- 内容哈希去重：内容与已导入文档（检查点中或本次运行中）相同的文件跳过
+- 运行中定期输出吞吐量和预计剩余时间，结束时返回各阶段耗时报告
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from services.storage.text_chunker import TextChunker
+from services.vector.dedup import compute_simhash
+from services.core.config import settings
+from services.core.logger import logger
+
+# 默认导入的文件类型（图片OCR较慢，需要时通过 extensions 参数显式加入）
+DEFAULT_EXTENSIONS = {".pdf", ".md", ".txt", ".docx", ".py", ".json", ".csv"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif"}
+
+# 队列结束标记
+_END = object()
+
+
+@dataclass
+class SourceDocument:
+    """待导入的文档（文件路径，或直接给出文本内容）"""
+    source_file: str  # 写入Milvus的source_file
+    path: Optional[str] = None
+    text: Optional[str] = None
+    size: int = 0
+    mtime: float = 0.0
+
+
+@dataclass
+class _ExtractedDocument:
+    doc: SourceDocument
+    content_hash: str
+    chunks: List[Tuple[str, int, int]]  # (文本, 页码, SimHash)
+    error: Optional[str] = None
+
+
+@dataclass
+class _Batch:
+    texts: List[str] = field(default_factory=list)
+    source_files: List[str] = field(default_factory=list)
+    pages: List[int] = field(default_factory=list)
+    simhashes: List[int] = field(default_factory=list)
+    doc_keys: List[str] = field(default_factory=list)
+    vectors: Any = None
+    # 最后一个chunk已在本批次（或之前批次）中的文档，本批次写入后记录到检查点
+    completed: List[Tuple[SourceDocument, str, int]] = field(default_factory=list)
+
+
+def _read_text_file(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='gbk', errors='ignore') as f:
+            return f.read()
+
+
+def _extract_sections(path: str) -> Iterable[Tuple[int, str]]:
+    """按文件类型提取文本，产出 (页码, 文本)，非PDF页码为0"""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".pdf":
+        from services.storage.pdf_extractor import PDFPageExtractor
+        # 已经在进程池的子进程中，逐页顺序提取
+        return PDFPageExtractor(workers=1).iter_pages(path)
+    if suffix == ".docx":
+        from docx import Document
+        return [(0, "\n".join(paragraph.text for paragraph in Document(path).paragraphs))]
+    if suffix in IMAGE_EXTENSIONS:
+        from services.vision.ocr_pipeline import get_ocr_pipeline
+        return [(0, get_ocr_pipeline().ocr_file(path)["text"])]
+    return [(0, _read_text_file(path))]
+
+
+def _hash_file(path: str) -> str:
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def _extract_and_chunk(doc: SourceDocument, chunk_size: int, chunk_overlap: int) -> Tuple[_ExtractedDocument, float]:
+    """
+    读取文档、提取文本并切分（在进程池的子进程中执行）
+
+    Returns:
+        (提取结果, 耗时秒数)
+    """
+    start = time.perf_counter()
+    chunker = TextChunker(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        cjk_sentences=settings.CHUNK_CJK_SENTENCES,
+        length_unit=settings.CHUNK_LENGTH_UNIT,
+        token_encoding=settings.CHUNK_TOKEN_ENCODING
+    )
+    try:
+        if doc.text is not None:
+            content_hash = hashlib.sha256(doc.text.encode('utf-8')).hexdigest()
+            sections = [(0, doc.text)]
+        else:
+            content_hash = _hash_file(doc.path)
+            sections = _extract_sections(doc.path)
+        chunks = [(chunk, page, compute_simhash(chunk)) for page, chunk in chunker.split_pages(sections)]
+        result = _ExtractedDocument(doc, content_hash, chunks)
+    except Exception as e:
+        result = _ExtractedDocument(doc, "", [], error=f"{type(e).__name__}: {e}")
+    return result, time.perf_counter() - start
+
+
+def create_worker_pool(workers: int = 0) -> ProcessPoolExecutor:
+    """
+    创建提取/切分进程池并立即启动全部子进程
+
+    子进程要导入services（切分器、SimHash），只能fork；spawn/forkserver的子进程会重新执行services包的初始化。
+    应在启动其他线程、加载embedding模型之前调用，避免fork时其他线程持有的锁被复制到子进程中。
+
+    Args:
+        workers: 进程数（0表示CPU核数）
+    """
+    workers = workers or os.cpu_count() or 1
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    if start_method == "fork" and threading.active_count() > 1:
+        logger.warning(f"创建提取进程池时已有 {threading.active_count()} 个线程，fork出的子进程可能死锁")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+    # fork方式下第一次提交任务时一次性启动全部子进程
+    pool.submit(os.getpid).result()
+    return pool
+
+
+def quote_expr_string(value: str) -> str:
+    """转义为Milvus布尔表达式中的字符串字面量"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+class IngestCheckpoint:
+    """导入检查点（每行一个JSON：完成记录为路径、大小、修改时间、内容哈希、chunk数；开始写入时另有started记录）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 检查点文件路径
+        """
+        self.path = Path(path)
+        self.by_path: Dict[str, Dict] = {}
+        self.hashes = set()
+        # 开始写入但没有完成记录的文档（上次运行中断时可能已写入部分chunk）
+        self.unfinished = set()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时留下的不完整行
+                        continue
+                    if entry.get("status") == "started":
+                        self.unfinished.add(entry["source_file"])
+                        continue
+                    self.unfinished.discard(entry["source_file"])
+                    self.by_path[entry["source_file"]] = entry
+                    self.hashes.add(entry["hash"])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def is_unchanged(self, doc: SourceDocument) -> bool:
+        """文件自上次导入后没有变化（路径、大小、修改时间都相同）"""
+        entry = self.by_path.get(doc.source_file)
+        return (entry is not None and doc.path is not None
+                and entry.get("size") == doc.size and entry.get("mtime") == doc.mtime)
+
+    def record_started(self, source_file: str):
+        """文档的第一批chunk写入前调用（中断后由 discard 清理已写入的部分）"""
+        entry = {"source_file": source_file, "status": "started", "at": time.time()}
+        with self.lock:
+            self.unfinished.add(source_file)
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def discard(self, source_file: str):
+        """忘记文档之前的完成记录（已写入的chunk被删除后调用，文档会被重新导入）"""
+        with self.lock:
+            self.unfinished.discard(source_file)
+            if self.by_path.pop(source_file, None) is not None:
+                self.hashes = {entry["hash"] for entry in self.by_path.values()}
+
+    def record(self, doc: SourceDocument, content_hash: str, chunks: int):
+        """记录一个已完整写入的文档"""
+        entry = {
+            "source_file": doc.source_file,
+            "size": doc.size,
+            "mtime": doc.mtime,
+            "hash": content_hash,
+            "chunks": chunks,
+            "at": time.time()
+        }
+        with self.lock:
+            self.unfinished.discard(doc.source_file)
+            self.by_path[doc.source_file] = entry
+            self.hashes.add(content_hash)
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+
+
+class MilvusSink:
+    """写入Milvus（批量insert，结束时统一flush）"""
+
+    def __init__(self, reset: bool = False, dimension: Optional[int] = None):
+        """
+        Args:
+            reset: 是否先删除并重建集合
+            dimension: 向量维度（创建集合时使用）
+        """
+        from services.vector.milvus_client import milvus_client
+        self.client = milvus_client
+        if not self.client.connect():
+            raise RuntimeError("无法连接到Milvus，请确保Milvus服务正在运行（docker compose up -d）")
+        if reset:
+            from pymilvus import utility
+            if utility.has_collection(self.client.collection_name):
+                utility.drop_collection(self.client.collection_name)
+                logger.info(f"已删除集合: {self.client.collection_name}")
+        self.client.create_collection_if_not_exists(dimension=dimension or settings.EMBEDDING_DIMENSION)
+
+    def delete_source(self, source_file: str):
+        """删除某个文档之前写入的chunk（文档内容变化后重新导入时调用）"""
+        self.client.delete_by_source_file(source_file)
+
+    def write(self, batch: _Batch):
+        if not self.client.insert(batch.texts, batch.vectors.tolist(), batch.source_files,
+                                  auto_flush=False, simhashes=batch.simhashes, pages=batch.pages):
+            raise RuntimeError("写入Milvus失败")
+
+    def close(self):
+        from pymilvus import Collection
+        try:
+            Collection(self.client.collection_name).flush(timeout=30)
+        except Exception as e:
+            logger.warning(f"Flush警告（数据已插入，Milvus会在后台flush）: {e}")
+
+
+class BulkIngestPipeline:
+    """分阶段批量导入流水线"""
+
+    def __init__(self, embed_func: Callable[[List[str]], Any], sink: Any,
+                 checkpoint: Optional[IngestCheckpoint] = None,
+                 workers: int = 0, chunk_size: int = 500, chunk_overlap: int = 50,
+                 embed_batch_size: int = 64, insert_batch_size: int = 1000,
+                 queue_size: int = 64, progress_interval: float = 2.0,
+                 pool: Optional[ProcessPoolExecutor] = None):
+        """
+        Args:
+            embed_func: 批量向量化函数（文本列表 -> float32矩阵）
+            sink: 写入目标（write(batch) / close()，可选 delete_source(source_file)），如 MilvusSink
+            checkpoint: 检查点（None时不续传、不按内容去重已导入的文档）
+            workers: 提取/切分进程数（0表示CPU核数）
+            chunk_size: chunk大小
+            chunk_overlap: chunk重叠
+            embed_batch_size: 每次向量化的chunk数
+            insert_batch_size: 每次写入的chunk数
+            queue_size: 阶段之间队列的长度（文档数/批次数）
+            progress_interval: 进度输出间隔（秒，0表示不输出）
+            pool: 预先用 create_worker_pool 创建的进程池（None时在run开始时创建；运行结束时关闭）
+        """
+        self.embed_func = embed_func
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self.insert_batch_size = max(insert_batch_size, embed_batch_size)
+        self.queue_size = queue_size
+        self.progress_interval = progress_interval
+        self.pool = pool
+
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+        self._seen_hashes = set()
+        self._failed_docs = set()
+        self._replaced = set()
+        self.stats = {
+            "discovered": 0, "ingested": 0, "skipped_unchanged": 0, "skipped_duplicate": 0,
+            "empty": 0, "failed": 0, "chunks": 0, "discovery_done": False
+        }
+        # 各阶段累计工作时间（秒）；extract为所有子进程时间之和
+        self.stage_seconds = {"discover": 0.0, "extract": 0.0, "embed": 0.0, "insert": 0.0}
+        self.failures: List[Dict[str, str]] = []
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _put(self, q: queue.Queue, item: Any):
+        """放入有界队列（下游已停止时放弃）"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _stage(self, name: str, func: Callable, *args):
+        """运行一个阶段，异常时停止整个流水线"""
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"导入流水线 {name} 阶段失败: {e}")
+            self._errors.append(e)
+            self._stop.set()
+
+    def _discover(self, sources: Iterable[SourceDocument], out_q: queue.Queue):
+        sources = iter(sources)
+        while not self._stop.is_set():
+            # 只统计遍历本身的耗时，不含等待下游队列的时间
+            start = time.perf_counter()
+            doc = next(sources, _END)
+            self.stage_seconds["discover"] += time.perf_counter() - start
+            if doc is _END:
+                break
+            self._count("discovered")
+            self._put(out_q, doc)
+        self.stats["discovery_done"] = True
+        self._put(out_q, _END)
+
+    def _extract(self, pool: ProcessPoolExecutor, in_q: queue.Queue, out_q: queue.Queue):
+        # 在途任务上限：让所有进程保持忙碌，同时限制已提取未向量化的文档数
+        pending = deque()
+        max_in_flight = self.workers * 2
+        finished = False
+        while not self._stop.is_set() and (pending or not finished):
+            while not finished and len(pending) < max_in_flight:
+                doc = self._get(in_q)
+                if doc is _END:
+                    finished = True
+                    break
+                if self.checkpoint and self.checkpoint.is_unchanged(doc):
+                    self._count("skipped_unchanged")
+                    continue
+                pending.append(pool.submit(_extract_and_chunk, doc, self.chunk_size, self.chunk_overlap))
+            if not pending:
+                continue
+            result, seconds = pending.popleft().result()
+            with self._lock:
+                self.stage_seconds["extract"] += seconds
+            if result.error:
+                self._fail(result.doc, result.error)
+                continue
+            known = self.checkpoint.hashes if self.checkpoint else ()
+            with self._lock:
+                duplicate = result.content_hash in known or result.content_hash in self._seen_hashes
+                self._seen_hashes.add(result.content_hash)
+            if duplicate:
+                self._count("skipped_duplicate")
+                previous = self.checkpoint.by_path.get(result.doc.source_file) if self.checkpoint else None
+                if previous and previous["hash"] == result.content_hash:
+                    # 只有修改时间变了，更新检查点，下次按修改时间直接跳过
+                    self.checkpoint.record(result.doc, result.content_hash, previous["chunks"])
+                continue
+            self._put(out_q, result)
+        self._put(out_q, _END)
+
+    def _fail(self, doc: SourceDocument, error: str):
+        self._count("failed")
+        with self._lock:
+            self.failures.append({"source_file": doc.source_file, "error": error})
+        logger.warning(f"导入失败 {doc.source_file}: {error}")
+
+    def _embed(self, in_q: queue.Queue, out_q: queue.Queue):
+        batch = _Batch()
+
+        def flush():
+            nonlocal batch
+            if batch.texts:
+                start = time.perf_counter()
+                batch.vectors = self.embed_func(batch.texts)
+                self.stage_seconds["embed"] += time.perf_counter() - start
+            if batch.texts or batch.completed:
+                self._put(out_q, batch)
+            batch = _Batch()
+
+        while True:
+            item = self._get(in_q)
+            if item is _END:
+                break
+            doc_key = item.doc.source_file
+            for text, page, simhash in item.chunks:
+                batch.texts.append(text)
+                batch.source_files.append(item.doc.source_file)
+                batch.pages.append(page)
+                batch.simhashes.append(simhash)
+                batch.doc_keys.append(doc_key)
+                if len(batch.texts) >= self.embed_batch_size:
+                    flush()
+            # 文档的最后一个chunk已经进入本批次或之前的批次
+            batch.completed.append((item.doc, item.content_hash, len(item.chunks)))
+        flush()
+        self._put(out_q, _END)
+
+    def _insert(self, in_q: queue.Queue):
+        pending = _Batch()
+
+        def write():
+            nonlocal pending
+            if pending.texts:
+                start = time.perf_counter()
+                try:
+                    self._replace_previous(pending.doc_keys)
+                    self._write_with_retry(pending)
+                    self._count("chunks", len(pending.texts))
+                except Exception as e:
+                    # 本批次涉及的文档都不记录检查点，下次运行时重新导入
+                    with self._lock:
+                        self._failed_docs.update(pending.doc_keys)
+                    logger.error(f"写入批次失败（{len(pending.texts)} 个chunk）: {e}")
+                self.stage_seconds["insert"] += time.perf_counter() - start
+            for doc, content_hash, chunk_count in pending.completed:
+                if doc.source_file in self._failed_docs:
+                    self._fail(doc, "写入失败")
+                elif chunk_count == 0:
+                    self._count("empty")
+                    if self.checkpoint:
+                        self.checkpoint.record(doc, content_hash, 0)
+                else:
+                    self._count("ingested")
+                    if self.checkpoint:
+                        self.checkpoint.record(doc, content_hash, chunk_count)
+            pending = _Batch()
+
+        while True:
+            batch = self._get(in_q)
+            if batch is _END:
+                break
+            # 合并成更大的写入批次
+            if pending.texts and batch.texts:
+                pending.vectors = np.concatenate([pending.vectors, batch.vectors])
+            elif batch.texts:
+                pending.vectors = batch.vectors
+            for name in ("texts", "source_files", "pages", "simhashes", "doc_keys", "completed"):
+                getattr(pending, name).extend(getattr(batch, name))
+            if len(pending.texts) >= self.insert_batch_size:
+                write()
+        write()
+
+    def _replace_previous(self, doc_keys: List[str]):
+        """文档第一次写入新chunk前：记录started，内容变化的文档先删除旧chunk"""
+        if not self.checkpoint:
+            return
+        for doc_key in dict.fromkeys(doc_keys):
+            if doc_key in self._replaced:
+                continue
+            if doc_key in self.checkpoint.by_path and hasattr(self.sink, "delete_source"):
+                self.sink.delete_source(doc_key)
+            self.checkpoint.record_started(doc_key)
+            self._replaced.add(doc_key)
+
+    def _clean_unfinished(self):
+        """删除上次运行中断时只写入了一部分的文档的chunk（之后按新文档重新导入）"""
+        if not self.checkpoint or not self.checkpoint.unfinished:
+            return
+        if not hasattr(self.sink, "delete_source"):
+            logger.warning(f"{len(self.checkpoint.unfinished)} 个文档上次中断时只写入了一部分，写入目标不支持删除，可能有重复chunk")
+            return
+        unfinished = sorted(self.checkpoint.unfinished)
+        for doc_key in unfinished:
+            self.sink.delete_source(doc_key)
+            self.checkpoint.discard(doc_key)
+        logger.info(f"已删除上次中断时只写入了一部分的 {len(unfinished)} 个文档的chunk，这些文档将重新导入")
+
+    def _write_with_retry(self, batch: _Batch, attempts: int = 3):
+        for attempt in range(attempts):
+            try:
+                self.sink.write(batch)
+                return
+            except Exception as e:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"写入失败，{2 ** attempt}秒后重试: {e}")
+                time.sleep(2 ** attempt)
+
+    def _progress_line(self, elapsed: float) -> str:
+        stats = self.stats
+        done = stats["ingested"] + stats["skipped_unchanged"] + stats["skipped_duplicate"] + stats["empty"] + stats["failed"]
+        docs_rate = done / elapsed if elapsed else 0.0
+        chunks_rate = stats["chunks"] / elapsed if elapsed else 0.0
+        if stats["discovery_done"] and docs_rate > 0:
+            eta = f"{(stats['discovered'] - done) / docs_rate:.0f}s"
+        else:
+            eta = "?"
+        total = stats["discovered"] if stats["discovery_done"] else f"{stats['discovered']}+"
+        return (f"文档 {done}/{total}  chunk {stats['chunks']}  "
+                f"{docs_rate:.1f} 文档/s  {chunks_rate:.1f} chunk/s  剩余 {eta}")
+
+    def _report_progress(self, started: float):
+        while not self._stop.wait(self.progress_interval):
+            sys.stderr.write("\r" + self._progress_line(time.perf_counter() - started) + "   ")
+            sys.stderr.flush()
+
+    def run(self, sources: Iterable[SourceDocument]) -> Dict[str, Any]:
+        """
+        运行流水线直到所有文档处理完
+
+        Args:
+            sources: 待导入文档的迭代器（惰性遍历，不会一次性展开）
+
+        Returns:
+            导入报告（文档数、chunk数、吞吐量、各阶段耗时）
+        """
+        docs_q = queue.Queue(maxsize=self.queue_size * 4)
+        extracted_q = queue.Queue(maxsize=self.queue_size)
+        embedded_q = queue.Queue(maxsize=max(self.queue_size // 16, 2))
+
+        pool = self.pool or create_worker_pool(self.workers)
+        self._clean_unfinished()
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._stage, args=("discover", self._discover, sources, docs_q), daemon=True),
+            threading.Thread(target=self._stage, args=("extract", self._extract, pool, docs_q, extracted_q), daemon=True),
+            threading.Thread(target=self._stage, args=("embed", self._embed, extracted_q, embedded_q), daemon=True),
+        ]
+        progress = None
+        if self.progress_interval:
+            progress = threading.Thread(target=self._report_progress, args=(started,), daemon=True)
+            progress.start()
+        try:
+            for thread in threads:
+                thread.start()
+            # 写入阶段在当前线程运行
+            self._stage("insert", self._insert, embedded_q)
+        except KeyboardInterrupt:
+            logger.warning("导入被中断，已完成的文档已记录在检查点中")
+            self._errors.append(KeyboardInterrupt())
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.sink.close()
+            if self.checkpoint:
+                self.checkpoint.close()
+            if progress:
+                progress.join(timeout=1)
+                sys.stderr.write("\r" + self._progress_line(time.perf_counter() - started) + "\n")
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "elapsed_seconds": round(elapsed, 2),
+            "workers": self.workers,
+            "documents": {key: value for key, value in self.stats.items() if key not in ("chunks", "discovery_done")},
+            "chunks": self.stats["chunks"],
+            "docs_per_sec": round(self.stats["ingested"] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(self.stats["chunks"] / elapsed, 2) if elapsed else 0.0,
+            "stage_seconds": {name: round(seconds, 2) for name, seconds in self.stage_seconds.items()},
+            "failures": self.failures[:100],
+            "completed": not self._errors
+        }
+        if self._errors and not isinstance(self._errors[0], KeyboardInterrupt):
+            report["error"] = str(self._errors[0])
+        return report
+
+
+def discover_files(paths: Iterable[str], extensions: Optional[Iterable[str]] = None,
+                   root: Optional[str] = None) -> Iterable[SourceDocument]:
+    """
+    遍历文件和目录（递归），惰性产出待导入文档
+
+    Args:
+        paths: 文件或目录路径
+        extensions: 导入的文件扩展名（默认 DEFAULT_EXTENSIONS）
+        root: source_file 相对于该目录（默认当前目录；不在其下的文件使用绝对路径）
+
+    Yields:
+        SourceDocument
+    """
+    extensions = {ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS)}
+    root_path = Path(root or os.getcwd()).resolve()
+
+    def make_doc(file_path: Path) -> SourceDocument:
+        resolved = file_path.resolve()
+        try:
+            source_file = str(resolved.relative_to(root_path))
+        except ValueError:
+            source_file = str(resolved)
+        stat = resolved.stat()
+        return SourceDocument(source_file=source_file, path=str(resolved), size=stat.st_size, mtime=stat.st_mtime)
+
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            yield make_doc(path)
+        elif path.is_dir():
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                for filename in sorted(filenames):
+                    if Path(filename).suffix.lower() in extensions:
+                        yield make_doc(Path(dirpath) / filename)
+        else:
+            logger.warning(f"路径不存在，跳过: {path}")
@@ -0,0 +1,268 @@
+"""
+文件目录 - 记录已索引到向量集合的上传文件（SQLite本地表）
+
+原来 /files 从向量集合中查询所有包含 "||file_id:" 的chunk（最多1万条），再对每个文件单独查询一次
+统计chunk数：文件多时要几秒，chunk超过1万条后结果被静默截断。现在由索引器维护目录：
+- 写入向量前标记为 indexing，写入完成后在同一事务中记录chunk数、字符数、页数并标记为 indexed，
+  失败时标记为 failed；/files 和 /files/{id} 直接查询本表，耗时只与文件数有关
+- 目录丢失或与向量集合不一致时，用 rebuild_from_chunks 从集合中的source_file一次遍历重建
+  （scripts/rebuild_file_catalog.py）
+- 记录文件的上传时间，/files?limit= 按 (上传时间, file_id) 倒序键集分页，每页只读取索引中的limit+1行
+"""
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+
+# 目录状态
+CATALOG_STATUSES = ("indexing", "indexed", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_catalog (
+    file_id TEXT PRIMARY KEY,
+    filename TEXT,
+    file_type TEXT,
+    source_file TEXT NOT NULL,
+    status TEXT NOT NULL,
+    chunk_count INTEGER DEFAULT 0,
+    char_count INTEGER DEFAULT 0,
+    page_count INTEGER DEFAULT 0,
+    error TEXT,
+    uploaded_at TEXT NOT NULL DEFAULT '',
+    indexed_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_file_catalog_type ON file_catalog (file_type);
+"""
+
+# 分页索引（旧版本目录补充uploaded_at列之后再创建）
+_PAGE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_file_catalog_uploaded ON file_catalog (status, uploaded_at, file_id)"
+)
+
+
+def parse_source_file(source_file: str) -> Optional[Dict[str, str]]:
+    """
+    解析上传文件chunk的source_file（格式: "filename||file_id:xxx||file_type:xxx"）
+
+    Returns:
+        {"filename", "file_id", "file_type"}，不是上传文件的chunk时返回None
+    """
+    if "||file_id:" not in source_file:
+        return None
+    parts = source_file.split("||")
+    info = {"filename": parts[0], "file_id": None, "file_type": None}
+    for part in parts[1:]:
+        if part.startswith("file_id:"):
+            info["file_id"] = part[len("file_id:"):]
+        elif part.startswith("file_type:"):
+            info["file_type"] = part[len("file_type:"):]
+    return info if info["file_id"] else None
+
+
+class FileCatalog:
+    """已索引文件目录（file_id -> 文件名、类型、source_file、状态、chunk数）"""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        # 新建的目录为空，首次使用时需要从向量集合重建（兼容升级前已索引的文件）
+        self.is_new = db_path == ":memory:" or not Path(db_path).exists()
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """旧版本目录补充上传时间列（已有记录先用索引时间代替，重建目录时从文件索引补全）"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(file_catalog)")}
+                if "uploaded_at" not in columns:
+                    self.conn.execute("ALTER TABLE file_catalog ADD COLUMN uploaded_at TEXT NOT NULL DEFAULT ''")
+                    self.conn.execute("UPDATE file_catalog SET uploaded_at=COALESCE(indexed_at, updated_at, '')")
+                self.conn.execute(_PAGE_INDEX)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def begin_indexing(self, file_id: str, filename: str, file_type: str, source_file: str,
+                       uploaded_at: Optional[str] = None) -> Optional[Dict]:
+        """
+        写入向量前调用：标记为indexing
+
+        Args:
+            uploaded_at: 文件上传时间（ISO格式，用于分页排序）
+
+        Returns:
+            之前的目录记录（文件曾经索引过时需要先删除旧chunk），没有时返回None
+        """
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            previous = self.conn.execute("SELECT * FROM file_catalog WHERE file_id=?", (file_id,)).fetchone()
+            self.conn.execute(
+                "INSERT INTO file_catalog (file_id, filename, file_type, source_file, status, uploaded_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'indexing', ?, ?) "
+                "ON CONFLICT(file_id) DO UPDATE SET filename=excluded.filename, file_type=excluded.file_type, "
+                "source_file=excluded.source_file, status='indexing', error=NULL, uploaded_at=excluded.uploaded_at, "
+                "updated_at=excluded.updated_at",
+                (file_id, filename, file_type, source_file, uploaded_at or now, now)
+            )
+        return dict(previous) if previous else None
+
+    def record_indexed(self, file_id: str, chunk_count: int, char_count: int = 0, page_count: int = 0):
+        """向量写入完成后调用：记录chunk数并标记为indexed"""
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE file_catalog SET status='indexed', chunk_count=?, char_count=?, page_count=?, "
+                "error=NULL, indexed_at=?, updated_at=? WHERE file_id=?",
+                (chunk_count, char_count, page_count, now, now, file_id)
+            )
+
+    def record_failed(self, file_id: str, error: str):
+        """向量写入失败时调用（旧chunk可能已删除，chunk数清零）"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE file_catalog SET status='failed', chunk_count=0, error=?, updated_at=? WHERE file_id=?",
+                (error[:1000], datetime.utcnow().isoformat(), file_id)
+            )
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """获取目录记录"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM file_catalog WHERE file_id=?", (file_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, file_type: Optional[str] = None, status: Optional[str] = None) -> List[Dict]:
+        """列出目录记录（按索引时间倒序）"""
+        sql, params = "SELECT * FROM file_catalog WHERE 1=1", []
+        if file_type:
+            sql += " AND file_type=?"
+            params.append(file_type)
+        if status:
+            sql += " AND status=?"
+            params.append(status)
+        sql += " ORDER BY indexed_at DESC"
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def list_page(self, file_type: Optional[str] = None, status: Optional[str] = None, limit: int = 100,
+                  after: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """
+        按 (上传时间, file_id) 倒序键集分页读取目录记录
+
+        Args:
+            after: 上一页最后一条记录的 (上传时间, file_id)，第一页为None
+            limit: 最多返回条数（调用方多取一条判断是否有下一页）
+        """
+        sql, params = "SELECT * FROM file_catalog WHERE 1=1", []
+        if status:
+            sql += " AND status=?"
+            params.append(status)
+        if file_type:
+            sql += " AND file_type=?"
+            params.append(file_type)
+        if after:
+            sql += " AND (uploaded_at < ? OR (uploaded_at = ? AND file_id < ?))"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY uploaded_at DESC, file_id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def delete(self, file_id: str) -> Optional[Dict]:
+        """删除目录记录，返回被删除的记录"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM file_catalog WHERE file_id=?", (file_id,)).fetchone()
+            self.conn.execute("DELETE FROM file_catalog WHERE file_id=?", (file_id,))
+        return dict(row) if row else None
+
+    def rebuild_from_chunks(self, chunks: Iterable[Tuple[str, int]],
+                            uploaded_at: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+        """
+        从向量集合中的chunk来源重建目录（一次遍历，替换除indexing之外的全部记录）
+
+        Args:
+            chunks: (source_file, 页码) 迭代器，如 milvus_client.iter_source_files()
+            uploaded_at: file_id -> 上传时间（向量集合中没有该字段，来自文件索引）；
+                缺失时沿用目录中原有的值，都没有时用重建时间
+
+        Returns:
+            {"files": 文件数, "chunks": 上传文件的chunk数}
+        """
+        files: Dict[str, Dict] = {}
+        total_chunks = 0
+        for source_file, page in chunks:
+            info = parse_source_file(source_file)
+            if info is None:
+                continue
+            total_chunks += 1
+            entry = files.get(info["file_id"])
+            if entry is None:
+                entry = files[info["file_id"]] = dict(info, source_file=source_file, chunk_count=0, page_count=0)
+            entry["chunk_count"] += 1
+            entry["page_count"] = max(entry["page_count"], page or 0)
+
+        now = datetime.utcnow().isoformat()
+        uploaded_at = uploaded_at or {}
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = dict(self.conn.execute("SELECT file_id, uploaded_at FROM file_catalog").fetchall())
+                # 正在索引的文件由索引器完成后更新
+                self.conn.execute("DELETE FROM file_catalog WHERE status != 'indexing'")
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO file_catalog (file_id, filename, file_type, source_file, status, chunk_count, "
+                    "page_count, uploaded_at, indexed_at, updated_at) VALUES (?, ?, ?, ?, 'indexed', ?, ?, ?, ?, ?)",
+                    [
+                        (file_id, entry["filename"], entry["file_type"], entry["source_file"],
+                         entry["chunk_count"], entry["page_count"],
+                         uploaded_at.get(file_id) or previous.get(file_id) or now, now, now)
+                        for file_id, entry in files.items()
+                    ]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.is_new = False
+        logger.info(f"文件目录已重建: {len(files)} 个文件, {total_chunks} 个chunk")
+        return {"files": len(files), "chunks": total_chunks}
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的文件数和chunk总数"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS files, SUM(chunk_count) AS chunks FROM file_catalog GROUP BY status"
+            ).fetchall()
+        stats = {status: 0 for status in CATALOG_STATUSES}
+        stats["chunks"] = 0
+        for row in rows:
+            stats[row["status"]] = row["files"]
+            stats["chunks"] += row["chunks"] or 0
+        return stats
+
+
+# 全局文件目录（首次使用时创建）
+_file_catalog: Optional[FileCatalog] = None
+_file_catalog_lock = Lock()
+
+
+def get_file_catalog() -> FileCatalog:
+    """获取全局文件目录"""
+    global _file_catalog
+    with _file_catalog_lock:
+        if _file_catalog is None:
+            _file_catalog = FileCatalog(settings.FILE_CATALOG_DB)
+        return _file_catalog
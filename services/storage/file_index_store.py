@@ -0,0 +1,127 @@
+"""
+文件索引存储 - 内存中的 file_id -> 文件信息 映射，用追加日志持久化
+
+原实现每次 get_file / list_files 都重新读取并解析 file_index.json，每次保存都整体重写。
+这里启动时加载一次（快照 file_index.json + 重放日志），之后：
+- 读取直接查内存
+- 写入先更新内存，再向日志（file_index.json.journal，每行一个JSON操作）追加一行
+- 日志条目数超过阈值时压缩：把内存中的完整索引写成新快照（临时文件 + 原子重命名），清空日志
+
+快照格式与原 file_index.json 相同，旧数据无需迁移。
+假设只有一个进程写入索引（与原实现相同，原实现的锁也只在进程内有效）。
+"""
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from services.core.logger import logger
+
+
+class FileIndexStore:
+    """内存文件索引 + 追加日志"""
+
+    def __init__(self, snapshot_path: Path, compact_threshold: int = 1000):
+        """
+        Args:
+            snapshot_path: 快照文件路径（file_index.json）
+            compact_threshold: 日志条目数超过该值时压缩
+        """
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_name(self.snapshot_path.name + ".journal")
+        self.compact_threshold = compact_threshold
+        self.lock = Lock()
+        self._index: Dict[str, Dict] = {}
+        self._journal_entries = 0
+        self._journal = None
+        self._load()
+
+    def _load(self):
+        """加载快照并重放日志"""
+        if self.snapshot_path.exists():
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except Exception as e:
+                logger.error(f"加载文件索引失败: {e}")
+                self._index = {}
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写入中断留下的不完整行
+                        logger.warning("文件索引日志中有不完整的记录，已跳过")
+                        continue
+                    self._apply(entry)
+                    self._journal_entries += 1
+        if self._journal_entries or not self.snapshot_path.exists():
+            # 启动时把日志合并进快照
+            self._compact()
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _apply(self, entry: Dict):
+        if entry.get("op") == "put":
+            self._index[entry["file_id"]] = entry["info"]
+        elif entry.get("op") == "delete":
+            self._index.pop(entry["file_id"], None)
+
+    def _append(self, entry: Dict):
+        """应用一个操作并追加到日志"""
+        self._apply(entry)
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self._journal_entries += 1
+        if self._journal_entries >= self.compact_threshold:
+            self._compact()
+
+    def _compact(self):
+        """写入新快照并清空日志（调用方持有锁，或在初始化时调用）"""
+        temp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            logger.error(f"保存文件索引失败: {e}")
+            return
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'w', encoding='utf-8')
+        self._journal_entries = 0
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """获取文件信息（返回副本）"""
+        info = self._index.get(file_id)
+        return dict(info) if info is not None else None
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        """所有 (file_id, 文件信息) 的副本"""
+        with self.lock:
+            return [(file_id, dict(info)) for file_id, info in self._index.items()]
+
+    def put(self, file_id: str, info: Dict):
+        """新增或覆盖文件信息"""
+        with self.lock:
+            self._append({"op": "put", "file_id": file_id, "info": info})
+
+    def delete(self, file_id: str) -> bool:
+        """删除文件信息（不存在时返回False）"""
+        with self.lock:
+            if file_id not in self._index:
+                return False
+            self._append({"op": "delete", "file_id": file_id})
+            return True
+
+    def compact(self):
+        """立即压缩日志"""
+        with self.lock:
+            self._compact()
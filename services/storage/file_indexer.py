@@ -1,11 +1,14 @@
 """
 文件索引服务 - 将上传的文件向量化并添加到Milvus
 """
-from typing import List, Dict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Tuple, Callable, Optional
 from services.storage.file_storage import file_storage
 from services.storage.file_processor import file_processor
+from services.storage.text_chunker import get_text_chunker
+from services.storage.milvus_metadata import milvus_metadata
+from services.storage.file_catalog import parse_source_file
 from services.vector.milvus_client import milvus_client
+from services.vector.dedup import compute_simhash, get_near_duplicate_index
 from services.core.config import settings
 from services.core.logger import logger
 import json
@@ -15,46 +18,34 @@ class FileIndexer:
     """文件索引器 - 处理上传文件并索引到Milvus"""
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            length_function=len
-        )
+        self.text_splitter = get_text_chunker()
     
-    def index_file(self, file_id: str) -> Dict:
+    def index_file(self, file_id: str,
+                   progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict:
         """
         处理并索引上传的文件
         
         Args:
             file_id: 文件ID
+            progress_callback: 可选的进度回调 (阶段, 总体进度0~1)，
+                阶段依次为 extracting / embedding（逐页切分、去重、向量化，攒满一批时 inserting）/ inserting
             
         Returns:
-            索引结果信息
-        """
-        # 1. 处理文件，提取文本
-        logger.info(f"开始处理文件: {file_id}")
-        processed_result = file_processor.process_file(file_id)
-        text = processed_result.get("text", "")
-        metadata = processed_result.get("metadata", {})
-        
-        if not text.strip():
-            return {
-                "success": False,
-                "message": "文件未包含可提取的文本内容",
-                "chunks_indexed": 0
-            }
+            索引结果信息（写入Milvus失败时带 retryable=True）
         
-        # 2. 切分文本
-        chunks = self.text_splitter.split_text(text)
+        第一次写入前把目录标记为indexing，全部写入后标记为indexed，中途失败标记为failed
+        （已写入的部分chunk在重试时删除），/files 直接读取目录
+        """
+        def report(stage: str, progress: float):
+            if progress_callback:
+                progress_callback(stage, progress)
         
-        if not chunks:
-            return {
-                "success": False,
-                "message": "文本切分后为空",
-                "chunks_indexed": 0
-            }
+        # 1. 流式处理文件（PDF逐页提取，边提取边切分、向量化）
+        logger.info(f"开始处理文件: {file_id}")
+        report("extracting", 0.0)
+        metadata, sections = file_processor.stream_file(file_id)
         
-        # 3. 获取文件信息
+        # 2. 获取文件信息
         file_info = file_storage.get_file(file_id)
         if not file_info:
             return {
@@ -63,53 +54,187 @@ class FileIndexer:
                 "chunks_indexed": 0
             }
         
-        # 4. 生成向量并插入Milvus
-        data_to_insert = []
-        for idx, chunk in enumerate(chunks):
-            # 生成向量
-            vector = milvus_client.get_embedding(chunk)
+        # 准备数据
+        # 将file_id和file_type信息添加到source_file中，便于识别和过滤
+        source_file_str = f"{file_info['filename']}||file_id:{file_id}||file_type:{file_info['file_type']}"
+        
+        # 获取文件上传时间
+        uploaded_at = file_info.get('uploaded_at', '')
+        
+        # 3. 逐段（PDF为逐页）切分、去重、向量化，每攒满 INDEX_INSERT_BATCH 个chunk写入一批，
+        #    内存中只保留一批chunk和向量，与文件大小无关
+        total_sections = max(metadata.get("page_count", 1), 1)
+        dedup_stats = {"total_chunks": 0, "duplicates": 0, "mode": settings.DEDUP_MODE if settings.DEDUP_ENABLED else "off"}
+        catalog = milvus_metadata.catalog()
+        batch_size = max(settings.INDEX_INSERT_BATCH, 1)
+        pending: List[Dict] = []
+        kept_count, inserted_count, started = 0, 0, False
+        summary_parts, summary_len, char_count = [], 0, 0
+        
+        def flush(final: bool = False):
+            """
+            写入已攒下的chunk；第一次写入前登记目录（重新索引时先删除该文件的旧chunk）
+            
+            中间批次不flush（Milvus会在后台flush，插入的数据可以直接检索），避免产生大量小segment
+            """
+            nonlocal inserted_count, started
+            if not started:
+                previous = catalog.begin_indexing(
+                    file_id, file_info['filename'], file_info['file_type'], source_file_str, uploaded_at=uploaded_at
+                )
+                if previous:
+                    milvus_client.delete_by_source_file(source_file_str)
+                started = True
+            if pending:
+                milvus_client.insert_data(pending, auto_flush=final)
+                inserted_count += len(pending)
+                pending.clear()
+        
+        try:
+            for section_idx, (page, section_text) in enumerate(sections):
+                if not section_text.strip():
+                    continue
+                if page is not None:
+                    section_text = f"[页面 {page}]\n{section_text}"
+                char_count += len(section_text)
+                if summary_len < 10000:
+                    # 只保存前10000字符作为摘要
+                    summary_parts.append(section_text[:10000 - summary_len])
+                    summary_len += len(summary_parts[-1])
+                
+                chunks = self.text_splitter.split_text(section_text)
+                
+                # 近似重复检测（SimHash + LSH），重复的chunk跳过或仅记录关联
+                chunks, simhashes, section_stats = self._dedup_chunks(
+                    chunks, source_file_str, start_idx=kept_count, reset=not dedup_stats["total_chunks"]
+                )
+                dedup_stats["total_chunks"] += section_stats["total_chunks"]
+                dedup_stats["duplicates"] += section_stats["duplicates"]
+                kept_count += len(chunks)
+                
+                # 生成向量（本段的chunk一次批量计算）
+                vectors = milvus_client.get_embeddings(chunks)
+                for chunk, vector, fingerprint in zip(chunks, vectors, simhashes):
+                    pending.append({
+                        "text": chunk,
+                        "vector": vector,
+                        "source_file": source_file_str,
+                        "file_id": file_id,  # 保留用于后续过滤
+                        "file_type": file_info['file_type'],
+                        "uploaded_at": uploaded_at,  # 用于freshness计算
+                        "simhash": fingerprint,
+                        "page": page or 0  # 页码（非PDF为0）
+                    })
+                if len(pending) >= batch_size:
+                    report("inserting", 0.9 * min(section_idx + 1, total_sections) / total_sections)
+                    flush()
+                report("embedding", 0.9 * min(section_idx + 1, total_sections) / total_sections)
             
-            # 准备数据
-            # 将file_id和file_type信息添加到source_file中，便于识别和过滤
-            source_file_str = f"{file_info['filename']}||file_id:{file_id}||file_type:{file_info['file_type']}"
+            metadata["char_count"] = char_count
+            if dedup_stats["duplicates"]:
+                logger.info(f"近似重复检测: {dedup_stats['duplicates']}/{dedup_stats['total_chunks']} 个chunk重复（模式: {settings.DEDUP_MODE}）")
             
-            # 获取文件上传时间
-            uploaded_at = file_info.get('uploaded_at', '')
+            if not started and (not char_count or not dedup_stats["total_chunks"]):
+                # 没有写入过任何chunk，不改动目录和旧chunk
+                if settings.DEDUP_ENABLED:
+                    get_near_duplicate_index().remove_prefix(f"{source_file_str}#")
+                return {
+                    "success": False,
+                    "message": "文件未包含可提取的文本内容" if not char_count else "文本切分后为空",
+                    "chunks_indexed": 0
+                }
             
-            data_to_insert.append({
-                "text": chunk,
-                "vector": vector,
-                "source_file": source_file_str,
-                "file_id": file_id,  # 保留用于后续过滤
-                "file_type": file_info['file_type'],
-                "uploaded_at": uploaded_at  # 用于freshness计算
-            })
-        
-        # 批量插入
-        try:
-            milvus_client.insert_data(data_to_insert)
+            # 4. 写入剩余的chunk并更新文件目录
+            report("inserting", 0.9)
+            flush(final=True)
+            catalog.record_indexed(
+                file_id, inserted_count, char_count=char_count, page_count=metadata.get("page_count") or 0
+            )
             
             # 标记文件为已处理
             file_storage.mark_as_processed(
                 file_id,
-                content_text=text[:10000],  # 只保存前10000字符作为摘要
-                chunk_count=len(chunks)
+                content_text="".join(summary_parts),
+                chunk_count=inserted_count
             )
-            
-            return {
-                "success": True,
-                "message": "文件索引成功",
-                "file_id": file_id,
-                "filename": file_info['filename'],
-                "chunks_indexed": len(chunks),
-                "metadata": metadata
-            }
         except Exception as e:
+            # 已写入的部分chunk由目录的failed状态标记，重试时 begin_indexing 返回旧记录并先删除
+            if started:
+                catalog.record_failed(file_id, str(e))
+            # 撤销本文件刚登记的指纹
+            if settings.DEDUP_ENABLED:
+                get_near_duplicate_index().remove_prefix(f"{source_file_str}#")
             return {
                 "success": False,
                 "message": f"索引失败: {str(e)}",
-                "chunks_indexed": 0
+                "chunks_indexed": 0,
+                "retryable": True
+            }
+        
+        if not inserted_count:
+            # 内容与已索引文件完全重复（如重复上传），无需写入向量
+            return {
+                "success": True,
+                "message": "文件内容与已索引内容重复，未写入新的文本块",
+                "file_id": file_id,
+                "filename": file_info['filename'],
+                "chunks_indexed": 0,
+                "metadata": metadata,
+                "dedup": dedup_stats
             }
+        return {
+            "success": True,
+            "message": "文件索引成功",
+            "file_id": file_id,
+            "filename": file_info['filename'],
+            "chunks_indexed": inserted_count,
+            "metadata": metadata,
+            "dedup": dedup_stats
+        }
+    
+    def _dedup_chunks(self, chunks: List[str], source_file_str: str,
+                      start_idx: int = 0, reset: bool = True) -> Tuple[List[str], List[int], Dict]:
+        """
+        在索引前检测近似重复chunk
+        
+        指纹key为 "source_file#c序号"，序号是保留的chunk在该文件写入Milvus的chunk中的顺序，
+        与重启后 milvus_client.iter_simhashes 加载时的key一致。
+        
+        Args:
+            chunks: 切分后的文本块
+            source_file_str: 该文件在Milvus中的source_file标识
+            start_idx: 本段第一个保留chunk的序号（逐页处理时为之前各页保留的chunk数）
+            reset: 是否先移除该文件的旧指纹（处理文件的第一段时）
+            
+        Returns:
+            (保留的chunk列表, 对应的SimHash列表, 去重统计)
+        """
+        simhashes = [compute_simhash(chunk) for chunk in chunks]
+        stats = {"total_chunks": len(chunks), "duplicates": 0, "mode": settings.DEDUP_MODE}
+        if not settings.DEDUP_ENABLED:
+            stats["mode"] = "off"
+            return chunks, simhashes, stats
+        
+        dedup_index = get_near_duplicate_index()
+        if reset:
+            # 重新索引同一文件时，先移除它自己的旧指纹，避免和自己判重
+            dedup_index.remove_prefix(f"{source_file_str}#")
+        
+        kept_chunks, kept_hashes = [], []
+        for chunk, fingerprint in zip(chunks, simhashes):
+            key = f"{source_file_str}#c{start_idx + len(kept_chunks)}"
+            canonical = dedup_index.find_duplicate(fingerprint)
+            if canonical is not None:
+                stats["duplicates"] += 1
+                logger.debug(f"检测到近似重复chunk: {key} ~ {canonical}")
+                if settings.DEDUP_MODE == "reject":
+                    continue
+                dedup_index.link(key, canonical)
+            dedup_index.add(key, fingerprint)
+            kept_chunks.append(chunk)
+            kept_hashes.append(fingerprint)
+        
+        return kept_chunks, kept_hashes, stats
     
     def search_uploaded_files(self, query: str, top_k: int = None, file_ids: List[str] = None) -> List[Dict]:
         """
@@ -129,35 +254,29 @@ class FileIndexer:
         results = milvus_client.search(query, top_k=top_k * 2)  # 搜索更多结果以便过滤
         
         # 过滤出上传的文件
-        uploaded_results = []
+        # 检查source_file是否包含file_id标记（格式：filename||file_id:xxx||file_type:xxx）
+        candidates = []
         for result in results:
-            source_file = result.get('source_file', '')
-            # 检查source_file是否包含file_id标记（格式：filename||file_id:xxx||file_type:xxx）
-            if '||file_id:' in source_file:
-                # 提取file_id
-                parts = source_file.split('||')
-                file_id = None
-                for part in parts:
-                    if part.startswith('file_id:'):
-                        file_id = part.replace('file_id:', '')
-                        break
-                
-                # 如果指定了file_ids，只返回匹配的文件
-                if file_ids and file_id not in file_ids:
-                    continue
-                
-                # 验证文件是否存在
-                file_info = file_storage.get_file(file_id)
-                if file_info:
-                    # 恢复原始文件名
-                    original_filename = source_file.split('||')[0]
-                    result['source_file'] = original_filename
-                    result['file_id'] = file_id
-                    # 添加uploaded_at字段以支持freshness计算
-                    result['uploaded_at'] = file_info.get('uploaded_at', '')
-                    uploaded_results.append(result)
-                    if len(uploaded_results) >= top_k:
-                        break
+            info = parse_source_file(result.get('source_file', ''))
+            # 如果指定了file_ids，只返回匹配的文件
+            if info is None or (file_ids and info['file_id'] not in file_ids):
+                continue
+            candidates.append((result, info))
+        
+        # 验证文件是否存在（一次批量查询存储后端）
+        files = file_storage.get_files(info['file_id'] for _, info in candidates)
+        uploaded_results = []
+        for result, info in candidates:
+            file_info = files.get(info['file_id'])
+            if file_info:
+                # 恢复原始文件名
+                result['source_file'] = info['filename']
+                result['file_id'] = info['file_id']
+                # 添加uploaded_at字段以支持freshness计算
+                result['uploaded_at'] = file_info.get('uploaded_at', '')
+                uploaded_results.append(result)
+                if len(uploaded_results) >= top_k:
+                    break
         
         return uploaded_results[:top_k]
 
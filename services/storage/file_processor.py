@@ -4,7 +4,7 @@
 import io
 import base64
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Iterator, Tuple
 
 # PyMuPDF依赖（PDF处理）
 try:
@@ -46,6 +46,7 @@ except ImportError:
         print("警告: pytesseract 未安装，图片OCR功能将被禁用。如需使用OCR，请运行: pip install pytesseract")
 
 from services.storage.file_storage import file_storage
+from services.storage.pdf_extractor import get_pdf_extractor, get_page_count
 
 
 class FileProcessor:
@@ -84,6 +85,37 @@ class FileProcessor:
         
         return result
     
+    def stream_file(self, file_id: str) -> Tuple[Dict, Iterator[Tuple[Optional[int], str]]]:
+        """
+        流式处理上传的文件：PDF逐页产出文本，其他类型整体作为一段
+        
+        Args:
+            file_id: 文件ID
+            
+        Returns:
+            (元数据, 生成 (页码, 文本) 的迭代器)，非PDF文件页码为None
+        """
+        file_info = file_storage.get_file(file_id)
+        if not file_info:
+            raise ValueError(f"文件不存在: {file_id}")
+        
+        file_path = file_info['file_path']
+        file_type = file_info['file_type']
+        
+        if file_type not in self.supported_types:
+            raise ValueError(f"不支持的文件类型: {file_type}")
+        
+        if file_type == 'pdf' and PDF_AVAILABLE:
+            try:
+                page_count = get_page_count(file_path)
+            except Exception as e:
+                return {"error": str(e), "note": "PDF处理失败"}, iter(())
+            pages = get_pdf_extractor().iter_pages(file_path, page_count=page_count)
+            return {"page_count": page_count}, pages
+        
+        result = self.supported_types[file_type](file_path)
+        return result.get("metadata", {}), iter([(None, result.get("text", ""))])
+    
     def _process_pdf(self, file_path: str) -> Dict:
         """处理PDF文件"""
         if not PDF_AVAILABLE:
@@ -96,17 +128,12 @@ class FileProcessor:
             }
         
         try:
-            doc = fitz.open(file_path)
+            page_count = get_page_count(file_path)
             text_parts = []
-            page_count = len(doc)
             
-            for page_num in range(page_count):
-                page = doc[page_num]
-                text = page.get_text()
+            for page_num, text in get_pdf_extractor().iter_pages(file_path, page_count=page_count):
                 if text.strip():
-                    text_parts.append(f"[页面 {page_num + 1}]\n{text}")
-            
-            doc.close()
+                    text_parts.append(f"[页面 {page_num}]\n{text}")
             
             full_text = "\n\n".join(text_parts)
             
@@ -147,18 +174,9 @@ class FileProcessor:
             }
         
         try:
-            image = Image.open(file_path)
-            # 使用Tesseract OCR提取文本
-            text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-            
-            return {
-                "text": text.strip(),
-                "metadata": {
-                    "image_size": image.size,
-                    "image_mode": image.mode,
-                    "char_count": len(text.strip())
-                }
-            }
+            # 预处理 + 大图分块并发识别，结果按内容哈希缓存（重复上传直接命中）
+            from services.vision.ocr_pipeline import get_ocr_pipeline
+            return get_ocr_pipeline().ocr_file(file_path)
         except Exception as e:
             # 如果OCR失败，返回空文本
             return {
@@ -3,19 +3,62 @@
 实际文件存储在文件系统，元数据可通过Milvus或传统数据库管理
 """
 import os
-import json
+import uuid
 import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Iterable, Optional, Dict, List, Tuple
 from threading import Lock
 from services.core.config import settings
 from services.core.logger import logger
 from services.storage.backend import get_storage_backend
+from services.storage.file_index_store import FileIndexStore
 
 # 使用可切换的存储后端
 
 
+class UploadWriter:
+    """
+    流式写入上传文件：分块写入存储目录下的临时文件，同时增量计算内容哈希并检查大小限制，
+    commit 时原子重命名到最终路径（内存占用只与分块大小有关）
+    """
+    
+    def __init__(self, manager: "FileStorageManager", filename: str):
+        self.manager = manager
+        self.filename = filename
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._temp_path = manager.storage_dir / f".upload-{uuid.uuid4().hex}.part"
+        self._file = open(self._temp_path, 'wb')
+    
+    def write(self, chunk: bytes):
+        """
+        写入一个分块
+        
+        Raises:
+            ValueError: 累计大小超过 MAX_UPLOAD_SIZE（临时文件会被删除）
+        """
+        self.size += len(chunk)
+        if self.size > settings.MAX_UPLOAD_SIZE:
+            self.abort()
+            raise ValueError(f"文件大小超过限制 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+    
+    def commit(self, mime_type: Optional[str] = None) -> Dict:
+        """完成写入并登记文件（返回值与 FileStorageManager.save_file 相同）"""
+        self._file.close()
+        file_id = self.manager._generate_file_id(self._hash, self.filename)
+        return self.manager._register_upload(self._temp_path, file_id, self.filename, self.size, mime_type)
+    
+    def abort(self):
+        """放弃本次上传，删除临时文件"""
+        if not self._file.closed:
+            self._file.close()
+        if self._temp_path.exists():
+            self._temp_path.unlink()
+
+
 class FileStorageManager:
     """文件存储管理器 - 文件存储在文件系统，元数据使用可切换的后端"""
     
@@ -23,6 +66,7 @@ class FileStorageManager:
         # 创建存储目录
         self.storage_dir = Path(settings.UPLOAD_STORAGE_DIR)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self._cleanup_stale_uploads()
         
         # 初始化存储后端（支持Milvus或传统数据库）
         self.backend = get_storage_backend(
@@ -36,37 +80,29 @@ class FileStorageManager:
         self.index_file = project_root / "file_index.json"  # 轻量级索引，只存储file_id -> file_path映射
         self.lock = Lock()
         
-        self._init_index()
+        # 启动时加载一次到内存，之后的修改追加到日志并定期压缩
+        self.index = FileIndexStore(self.index_file, compact_threshold=settings.FILE_INDEX_COMPACT_THRESHOLD)
     
-    def _init_index(self):
-        """初始化文件索引"""
-        if not self.index_file.exists():
-            self._save_index({})
+    def _cleanup_stale_uploads(self, max_age: float = 3600):
+        """删除中断的上传留下的临时文件（超过max_age秒未修改的 .upload-*.part）"""
+        now = datetime.now().timestamp()
+        for temp_path in self.storage_dir.glob(".upload-*.part"):
+            try:
+                if now - temp_path.stat().st_mtime > max_age:
+                    temp_path.unlink()
+            except OSError:
+                pass
     
-    def _load_index(self) -> Dict:
-        """加载文件索引（仅存储file_id -> file_path的映射）"""
-        if not self.index_file.exists():
-            return {}
-        try:
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"加载文件索引失败: {e}")
-            return {}
-    
-    def _save_index(self, index: Dict):
-        """保存文件索引"""
-        try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(index, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"保存文件索引失败: {e}")
-    
-    def _generate_file_id(self, file_content: bytes, filename: str) -> str:
-        """生成文件唯一ID"""
-        hash_obj = hashlib.sha256(file_content)
-        hash_obj.update(filename.encode())
-        return hash_obj.hexdigest()
+    def _generate_file_id(self, content_hash, filename: str) -> str:
+        """
+        生成文件唯一ID：sha256(文件内容 + 文件名)
+        
+        Args:
+            content_hash: 已增量写入全部文件内容的 hashlib.sha256 对象
+            filename: 原始文件名
+        """
+        content_hash.update(filename.encode())
+        return content_hash.hexdigest()
     
     def _get_file_type(self, filename: str) -> str:
         """根据文件扩展名判断文件类型"""
@@ -80,6 +116,25 @@ class FileStorageManager:
         else:
             return 'text'
     
+    def open_upload(self, filename: str) -> UploadWriter:
+        """
+        开始流式保存上传的文件
+        
+        Args:
+            filename: 原始文件名
+            
+        Returns:
+            UploadWriter（依次调用 write(chunk) 和 commit(mime_type)，出错时调用 abort()）
+            
+        Raises:
+            ValueError: 不支持的文件类型
+        """
+        # 验证文件扩展名
+        ext = Path(filename).suffix.lower()
+        if ext not in settings.ALLOWED_EXTENSIONS:
+            raise ValueError(f"不支持的文件类型: {ext}。支持的类型: {settings.ALLOWED_EXTENSIONS}")
+        return UploadWriter(self, filename)
+    
     def save_file(self, file_content: bytes, filename: str, mime_type: Optional[str] = None) -> Dict:
         """
         保存上传的文件
@@ -92,63 +147,62 @@ class FileStorageManager:
         Returns:
             包含文件信息的字典
         """
-        # 验证文件大小
-        if len(file_content) > settings.MAX_UPLOAD_SIZE:
-            raise ValueError(f"文件大小超过限制 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB")
-        
-        # 验证文件扩展名
+        writer = self.open_upload(filename)
+        try:
+            writer.write(file_content)
+            return writer.commit(mime_type)
+        except Exception:
+            writer.abort()
+            raise
+    
+    def _register_upload(self, temp_path: Path, file_id: str, filename: str,
+                         file_size: int, mime_type: Optional[str]) -> Dict:
+        """把写好的临时文件登记为上传文件（已存在时删除临时文件）"""
         ext = Path(filename).suffix.lower()
-        if ext not in settings.ALLOWED_EXTENSIONS:
-            raise ValueError(f"不支持的文件类型: {ext}。支持的类型: {settings.ALLOWED_EXTENSIONS}")
-        
-        # 生成文件ID和存储路径
-        file_id = self._generate_file_id(file_content, filename)
         file_type = self._get_file_type(filename)
         stored_filename = f"{file_id}{ext}"
         file_path = self.storage_dir / stored_filename
         
         # 检查文件是否已存在（线程安全）
         with self.lock:
-            index = self._load_index()
+            existing = self.index.get(file_id)
             
-            if file_id in index:
-                existing = index[file_id]
+            if existing is not None:
                 # 检查是否已处理（从存储后端查询）
                 existing_meta = self.backend.get_file_metadata(file_id)
                 processed = existing_meta.get("processed", False) if existing_meta else False
+                temp_path.unlink()
                 
                 return {
                     "file_id": file_id,
                     "filename": existing.get("filename"),
                     "file_type": existing.get("file_type"),
+                    "file_size": file_size,
                     "already_exists": True,
                     "processed": processed
                 }
             
-            # 保存文件到磁盘
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
+            # 临时文件原子重命名到最终路径
+            os.replace(temp_path, file_path)
             
             # 保存到文件索引（只存储基本映射）
-            index = self._load_index()
             index_info = {
                 "filename": filename,
                 "stored_filename": stored_filename,
                 "file_path": str(file_path),
                 "file_type": file_type,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "mime_type": mime_type,
                 "uploaded_at": datetime.utcnow().isoformat()
             }
-            index[file_id] = index_info
-            self._save_index(index)
+            self.index.put(file_id, index_info)
             
             # 保存到存储后端
             self.backend.save_file_metadata(file_id, {
                 "filename": filename,
                 "file_path": str(file_path),
                 "file_type": file_type,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "mime_type": mime_type,
                 "uploaded_at": datetime.utcnow().isoformat(),
                 "processed": False
@@ -158,67 +212,79 @@ class FileStorageManager:
                 "file_id": file_id,
                 "filename": filename,
                 "file_type": file_type,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "stored_path": str(file_path),
                 "already_exists": False,
                 "processed": False
             }
     
+    def _merge_index_info(self, metadata: Dict) -> Dict:
+        """补充文件路径等信息（从索引）"""
+        index_info = self.index.get(metadata.get("file_id")) or {}
+        metadata.update({
+            "file_path": index_info.get("file_path", metadata.get("file_path")),
+            "file_size": index_info.get("file_size", metadata.get("file_size")),
+            "uploaded_at": index_info.get("uploaded_at", metadata.get("uploaded_at"))
+        })
+        return metadata
+    
+    def _index_only_info(self, file_id: str, file_info: Dict) -> Dict:
+        """只在索引中、存储后端没有记录的文件（未处理）"""
+        return {
+            "file_id": file_id,
+            "filename": file_info.get("filename"),
+            "file_type": file_info.get("file_type"),
+            "file_size": file_info.get("file_size"),
+            "file_path": file_info.get("file_path"),
+            "uploaded_at": file_info.get("uploaded_at"),
+            "processed": False,
+            "chunk_count": 0
+        }
+    
     def get_file(self, file_id: str) -> Optional[Dict]:
         """获取文件信息（从存储后端查询，补充索引信息）"""
         # 从存储后端查询元数据
         metadata = self.backend.get_file_metadata(file_id)
         
         if metadata:
-            # 补充文件路径等信息（从索引）
-            index = self._load_index()
-            index_info = index.get(file_id, {})
-            metadata.update({
-                "file_path": index_info.get("file_path", metadata.get("file_path")),
-                "file_size": index_info.get("file_size", metadata.get("file_size")),
-                "uploaded_at": index_info.get("uploaded_at", metadata.get("uploaded_at"))
-            })
-            return metadata
+            return self._merge_index_info(metadata)
         
         # 如果后端中没有，从索引查询（未处理的文件）
-        index = self._load_index()
-        file_info = index.get(file_id)
+        file_info = self.index.get(file_id)
         if file_info:
-            return {
-                "file_id": file_id,
-                "filename": file_info.get("filename"),
-                "file_type": file_info.get("file_type"),
-                "file_size": file_info.get("file_size"),
-                "file_path": file_info.get("file_path"),
-                "uploaded_at": file_info.get("uploaded_at"),
-                "processed": False,
-                "chunk_count": 0
-            }
+            return self._index_only_info(file_id, file_info)
         
         return None
     
+    def get_files(self, file_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量获取文件信息（存储后端一次批量查询）
+        
+        Returns:
+            file_id -> 文件信息（不存在的文件不在结果中）
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        files = {file_id: self._merge_index_info(metadata) for file_id, metadata in self.backend.get_many(file_ids).items()}
+        for file_id in file_ids:
+            if file_id not in files:
+                file_info = self.index.get(file_id)
+                if file_info:
+                    files[file_id] = self._index_only_info(file_id, file_info)
+        return files
+    
     def list_files(self, file_type: Optional[str] = None, processed: Optional[bool] = None) -> List[Dict]:
         """列出所有文件（从存储后端查询，补充索引信息）"""
         # 从存储后端查询文件列表
-        files = self.backend.list_files(file_type=file_type, processed=processed)
-        
-        # 补充文件路径等信息（从索引）
-        index = self._load_index()
-        for file_info in files:
-            file_id = file_info.get("file_id")
-            index_info = index.get(file_id, {})
-            file_info.update({
-                "file_path": index_info.get("file_path", file_info.get("file_path")),
-                "file_size": index_info.get("file_size", file_info.get("file_size")),
-                "uploaded_at": index_info.get("uploaded_at", file_info.get("uploaded_at"))
-            })
+        files = [
+            self._merge_index_info(file_info)
+            for file_info in self.backend.list_files(file_type=file_type, processed=processed)
+        ]
         
         # 如果是database后端，可能还需要包含未处理的文件（在索引中但不在数据库中）
         if settings.STORAGE_BACKEND == "database":
-            index = self._load_index()
             backend_file_ids = {f.get("file_id") for f in files}
             
-            for file_id, file_info in index.items():
+            for file_id, file_info in self.index.items():
                 if file_id not in backend_file_ids:
                     # 检查过滤条件
                     if file_type and file_info.get("file_type") != file_type:
@@ -226,23 +292,31 @@ class FileStorageManager:
                     if processed is not None:
                         continue  # 未处理的文件，如果processed过滤器为None则包含
                     
-                    files.append({
-                        "file_id": file_id,
-                        "filename": file_info.get("filename"),
-                        "file_type": file_info.get("file_type"),
-                        "file_size": file_info.get("file_size"),
-                        "file_path": file_info.get("file_path"),
-                        "uploaded_at": file_info.get("uploaded_at"),
-                        "processed": False,
-                        "chunk_count": 0
-                    })
+                    files.append(self._index_only_info(file_id, file_info))
         
         return files
     
-    def mark_as_processed(self, file_id: str, content_text: Optional[str] = None, chunk_count: int = 0):
-        """标记文件为已处理（更新存储后端）"""
-        from datetime import datetime
+    def list_files_page(self, file_type: Optional[str] = None, processed: Optional[bool] = None,
+                        limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按上传时间倒序分页列出文件（键集分页，只包含存储后端中有记录的文件）
         
+        Args:
+            limit: 每页文件数
+            cursor: 上一页返回的next_cursor
+            
+        Returns:
+            (本页文件列表, 下一页的cursor)
+            
+        Raises:
+            ValueError: cursor格式错误
+        """
+        files, next_cursor = self.backend.list_files_page(
+            file_type=file_type, processed=processed, limit=limit, cursor=cursor
+        )
+        return [self._merge_index_info(file_info) for file_info in files], next_cursor
+    
+    def _processed_updates(self, content_text: Optional[str], chunk_count: int) -> Dict:
         updates = {
             "processed": True,
             "processed_at": datetime.utcnow().isoformat(),
@@ -253,17 +327,33 @@ class FileStorageManager:
             # 只保存前10000字符作为摘要
             updates["content_text"] = content_text[:10000] if len(content_text) > 10000 else content_text
         
-        return self.backend.update_file_metadata(file_id, updates)
+        return updates
+    
+    def mark_as_processed(self, file_id: str, content_text: Optional[str] = None, chunk_count: int = 0):
+        """标记文件为已处理（更新存储后端）"""
+        return self.backend.update_file_metadata(file_id, self._processed_updates(content_text, chunk_count))
+    
+    def mark_many_as_processed(self, chunk_counts: Dict[str, int]) -> int:
+        """
+        批量标记文件为已处理并更新chunk数（存储后端一次批量更新，不修改文本摘要）
+        
+        Args:
+            chunk_counts: file_id -> chunk数
+            
+        Returns:
+            更新的文件数
+        """
+        return self.backend.update_many({
+            file_id: self._processed_updates(None, chunk_count) for file_id, chunk_count in chunk_counts.items()
+        })
     
     def delete_file(self, file_id: str) -> bool:
         """删除文件"""
         with self.lock:
-            index = self._load_index()
-            if file_id not in index:
+            file_record = self.index.get(file_id)
+            if file_record is None:
                 return False
             
-            file_record = index[file_id]
-            
             # 删除文件
             file_path = file_record.get("file_path")
             if file_path and os.path.exists(file_path):
@@ -273,8 +363,7 @@ class FileStorageManager:
                     logger.error(f"删除文件失败: {e}")
             
             # 删除索引
-            del index[file_id]
-            self._save_index(index)
+            self.index.delete(file_id)
             
             # 删除存储后端的元数据
             self.backend.delete_file_metadata(file_id)
@@ -0,0 +1,403 @@
+"""
+离线索引产物 - 在一台机器上构建知识库索引，产物复制到服务节点后一次性批量导入Milvus
+
+全量重建时，逐批把Python列表交给 collection.insert 是主要瓶颈。这里把流水线的输出
+（chunk文本、来源、页码、SimHash和float32向量）按列写成分片文件，再整体导入：
+- 格式：numpy（每个分片一个目录，每个字段一个 <字段名>.npy）或 parquet（每个分片一个文件），
+  文件布局与Milvus批量导入（do_bulk_insert）要求的一致，列名即集合字段名
+- manifest.json 记录向量维度、embedding模型、分片列表和每个文件的SHA-256，
+  分片写完（临时目录改名）后才更新manifest，中断后可以续写
+- 导入：安装了minio时把分片上传到Milvus的对象存储并调用 do_bulk_insert（服务端直接读取文件），
+  否则以内存映射方式读取分片（向量列不复制），按大批次insert
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from services.core.config import settings
+from services.core.logger import logger
+from services.storage.bulk_ingest import _Batch, quote_expr_string
+
+# Parquet格式依赖pyarrow（pymilvus的依赖，通常已安装）
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# 上传到Milvus对象存储依赖minio客户端，未安装时只能逐批insert导入
+try:
+    from minio import Minio
+    MINIO_AVAILABLE = True
+except ImportError:
+    MINIO_AVAILABLE = False
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+ARTIFACT_FORMATS = ("numpy", "parquet")
+# 分片中的列（不含自增主键），与集合schema的字段名一致
+ARTIFACT_FIELDS = ("text", "vector", "source_file", "simhash", "page")
+
+
+def _sha256_file(path: Path) -> str:
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def read_manifest(artifact_dir: str) -> Dict[str, Any]:
+    """读取产物目录的manifest（不存在时抛出FileNotFoundError）"""
+    with open(Path(artifact_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ArtifactSink:
+    """把流水线的写入批次保存为离线索引产物（每次write写一个分片）"""
+
+    def __init__(self, output_dir: str, dimension: int, embedding_model: str,
+                 fmt: str = "numpy", reset: bool = False):
+        """
+        Args:
+            output_dir: 产物目录
+            dimension: 向量维度
+            embedding_model: 生成向量的embedding模型（导入时校验与检索使用的模型一致）
+            fmt: numpy 或 parquet
+            reset: 是否清空已有产物
+        """
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"不支持的产物格式: {fmt}（可选 {', '.join(ARTIFACT_FORMATS)}）")
+        if fmt == "parquet" and not PARQUET_AVAILABLE:
+            raise RuntimeError("parquet格式需要安装pyarrow: pip install pyarrow")
+        self.output_dir = Path(output_dir)
+        manifest_path = self.output_dir / MANIFEST_NAME
+        if reset and self.output_dir.exists():
+            if not manifest_path.exists() and any(self.output_dir.iterdir()):
+                raise RuntimeError(f"{self.output_dir} 不是索引产物目录（没有{MANIFEST_NAME}），拒绝清空")
+            shutil.rmtree(self.output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        if manifest_path.exists():
+            # 续写：格式、维度、模型必须与已有分片一致
+            self.manifest = read_manifest(str(self.output_dir))
+            for key, value in (("format", fmt), ("dimension", dimension), ("embedding_model", embedding_model)):
+                if self.manifest[key] != value:
+                    raise RuntimeError(
+                        f"已有产物的{key}为 {self.manifest[key]}，与本次的 {value} 不一致（使用 --reset 重新构建）"
+                    )
+            logger.info(f"续写索引产物: {self.output_dir}（已有 {len(self.manifest['shards'])} 个分片）")
+        else:
+            self.manifest = {
+                "version": MANIFEST_VERSION,
+                "format": fmt,
+                "dimension": dimension,
+                "embedding_model": embedding_model,
+                "fields": list(ARTIFACT_FIELDS),
+                "rows": 0,
+                "shards": [],
+                # 内容变化后重新导入的文档：在before_shard之前的分片中的旧chunk导入时跳过
+                "tombstones": [],
+                "created_at": datetime.now().isoformat()
+            }
+            self._save_manifest()
+        # 清理中断时留下的临时分片
+        for tmp in self.output_dir.glob("*.tmp"):
+            shutil.rmtree(tmp) if tmp.is_dir() else tmp.unlink()
+
+    def _save_manifest(self):
+        self.manifest["updated_at"] = datetime.now().isoformat()
+        tmp_path = self.output_dir / (MANIFEST_NAME + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.output_dir / MANIFEST_NAME)
+
+    def delete_source(self, source_file: str):
+        """记录墓碑：已写入分片中该文档的旧chunk在导入时跳过"""
+        self.manifest["tombstones"].append({
+            "source_file": source_file,
+            "before_shard": len(self.manifest["shards"])
+        })
+        self._save_manifest()
+
+    def write(self, batch: _Batch):
+        from services.vector.dedup import to_signed_int64
+
+        vectors = np.ascontiguousarray(batch.vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.manifest["dimension"]:
+            raise ValueError(f"向量维度 {vectors.shape} 与产物维度 {self.manifest['dimension']} 不一致")
+        columns = {
+            "text": np.array(batch.texts, dtype=str),
+            "vector": vectors,
+            "source_file": np.array(batch.source_files, dtype=str),
+            "simhash": np.array([to_signed_int64(h) for h in batch.simhashes], dtype=np.int64),
+            "page": np.array(batch.pages, dtype=np.int64)
+        }
+        name = f"shard-{len(self.manifest['shards']):05d}"
+        if self.manifest["format"] == "numpy":
+            files = self._write_numpy(name, columns)
+        else:
+            files = self._write_parquet(name, columns)
+        self.manifest["shards"].append({
+            "name": name,
+            "rows": len(batch.texts),
+            "files": files
+        })
+        self.manifest["rows"] += len(batch.texts)
+        self._save_manifest()
+
+    def _write_numpy(self, name: str, columns: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """写入 <name>/<字段>.npy（先写临时目录，完整写完后改名）"""
+        tmp_dir = self.output_dir / f"{name}.tmp"
+        tmp_dir.mkdir()
+        files = {}
+        for field_name, values in columns.items():
+            np.save(tmp_dir / f"{field_name}.npy", values, allow_pickle=False)
+            files[f"{name}/{field_name}.npy"] = _sha256_file(tmp_dir / f"{field_name}.npy")
+        os.replace(tmp_dir, self.output_dir / name)
+        return files
+
+    def _write_parquet(self, name: str, columns: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """写入 <name>.parquet（向量列为 list<float32>）"""
+        vectors = columns["vector"]
+        offsets = np.arange(0, vectors.size + 1, vectors.shape[1], dtype=np.int32)
+        table = pa.table({
+            "text": pa.array(columns["text"].tolist(), type=pa.string()),
+            "vector": pa.ListArray.from_arrays(pa.array(offsets), pa.array(vectors.reshape(-1))),
+            "source_file": pa.array(columns["source_file"].tolist(), type=pa.string()),
+            "simhash": pa.array(columns["simhash"]),
+            "page": pa.array(columns["page"])
+        })
+        tmp_path = self.output_dir / f"{name}.parquet.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self.output_dir / f"{name}.parquet")
+        return {f"{name}.parquet": _sha256_file(self.output_dir / f"{name}.parquet")}
+
+    def close(self):
+        self._save_manifest()
+
+
+def _read_shard(artifact_dir: Path, manifest: Dict[str, Any], shard: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    读取一个分片的各列（numpy以内存映射方式打开，parquet以内存映射读取后零拷贝转为numpy）
+
+    Returns:
+        {字段名: numpy数组}，vector为 (行数, 维度) 的float32矩阵
+    """
+    if manifest["format"] == "numpy":
+        return {
+            field_name: np.load(artifact_dir / shard["name"] / f"{field_name}.npy", mmap_mode='r', allow_pickle=False)
+            for field_name in manifest["fields"]
+        }
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("读取parquet产物需要安装pyarrow: pip install pyarrow")
+    table = pq.read_table(artifact_dir / f"{shard['name']}.parquet", memory_map=True)
+    vector_values = table.column("vector").combine_chunks().flatten().to_numpy()
+    return {
+        "text": np.array(table.column("text").to_pylist(), dtype=object),
+        "vector": vector_values.reshape(-1, manifest["dimension"]),
+        "source_file": np.array(table.column("source_file").to_pylist(), dtype=object),
+        "simhash": table.column("simhash").to_numpy(),
+        "page": table.column("page").to_numpy()
+    }
+
+
+class ArtifactLoader:
+    """把离线索引产物导入Milvus"""
+
+    def __init__(self, artifact_dir: str, mode: str = "auto", reset: bool = False,
+                 verify: bool = True, insert_batch_size: int = 5000,
+                 bulk_insert_timeout: float = 3600.0):
+        """
+        Args:
+            artifact_dir: 产物目录（包含manifest.json）
+            mode: auto（可以时使用do_bulk_insert，否则insert）、bulk_insert 或 insert
+            reset: 是否先删除并重建集合（否则先删除集合中与产物同来源的旧chunk）
+            verify: 是否校验文件SHA-256（产物从其他机器复制过来时建议开启）
+            insert_batch_size: insert导入时每批行数
+            bulk_insert_timeout: 单个do_bulk_insert任务的等待上限（秒）
+        """
+        if mode not in ("auto", "bulk_insert", "insert"):
+            raise ValueError(f"不支持的导入方式: {mode}")
+        if mode == "bulk_insert" and not MINIO_AVAILABLE:
+            raise RuntimeError("bulk_insert需要安装minio客户端上传分片: pip install minio")
+        self.artifact_dir = Path(artifact_dir)
+        self.manifest = read_manifest(artifact_dir)
+        self.mode = mode
+        self.reset = reset
+        self.verify = verify
+        self.insert_batch_size = insert_batch_size
+        self.bulk_insert_timeout = bulk_insert_timeout
+
+    def verify_files(self):
+        """校验所有分片文件的SHA-256（复制不完整或损坏时抛出异常）"""
+        for shard in self.manifest["shards"]:
+            for relative_path, expected in shard["files"].items():
+                path = self.artifact_dir / relative_path
+                if not path.exists():
+                    raise FileNotFoundError(f"缺少分片文件: {path}")
+                if _sha256_file(path) != expected:
+                    raise ValueError(f"分片文件校验失败: {path}")
+
+    def _tombstones_for(self, shard_index: int) -> List[str]:
+        return [
+            tombstone["source_file"] for tombstone in self.manifest["tombstones"]
+            if shard_index < tombstone["before_shard"]
+        ]
+
+    def _prepare_collection(self, collection_name: str):
+        """创建集合（或清空），校验维度；返回集合对象"""
+        from pymilvus import Collection, utility
+        from services.vector.milvus_client import milvus_client
+
+        if not milvus_client.connect():
+            raise RuntimeError("无法连接到Milvus，请确保Milvus服务正在运行（docker compose up -d）")
+        if self.reset and utility.has_collection(collection_name):
+            utility.drop_collection(collection_name)
+            logger.info(f"已删除集合: {collection_name}")
+        milvus_client.create_collection_if_not_exists(dimension=self.manifest["dimension"])
+        collection = Collection(collection_name)
+        vector_field = next(field for field in collection.schema.fields if field.name == "vector")
+        if vector_field.params.get("dim") != self.manifest["dimension"]:
+            raise ValueError(
+                f"集合向量维度 {vector_field.params.get('dim')} 与产物维度 {self.manifest['dimension']} 不一致"
+            )
+        return collection
+
+    def _delete_existing_sources(self, collection):
+        """删除集合中与产物同来源的旧chunk（重复导入同一批产物时不产生重复数据）"""
+        sources = set()
+        for shard in self.manifest["shards"]:
+            sources.update(np.unique(_read_shard(self.artifact_dir, self.manifest, shard)["source_file"]).tolist())
+        sources = sorted(sources)
+        for start in range(0, len(sources), 500):
+            group = ", ".join(quote_expr_string(source) for source in sources[start:start + 500])
+            collection.delete(expr=f"source_file in [{group}]")
+        if sources:
+            logger.info(f"已删除 {len(sources)} 个来源的旧chunk")
+
+    def _insert_shard(self, shard_index: int, shard: Dict[str, Any]) -> int:
+        """逐批insert一个分片（跳过墓碑文档），返回导入行数"""
+        from services.vector.milvus_client import milvus_client
+
+        columns = _read_shard(self.artifact_dir, self.manifest, shard)
+        tombstones = self._tombstones_for(shard_index)
+        rows = np.arange(shard["rows"])
+        if tombstones:
+            rows = rows[~np.isin(columns["source_file"], tombstones)]
+        for start in range(0, len(rows), self.insert_batch_size):
+            selected = rows[start:start + self.insert_batch_size]
+            # 连续行直接切片（内存映射视图，不复制）
+            index = slice(selected[0], selected[-1] + 1) if selected[-1] - selected[0] + 1 == len(selected) else selected
+            if not milvus_client.insert(
+                columns["text"][index].tolist(),
+                columns["vector"][index],
+                columns["source_file"][index].tolist(),
+                auto_flush=False,
+                simhashes=columns["simhash"][index].tolist(),
+                pages=columns["page"][index].tolist()
+            ):
+                raise RuntimeError(f"写入分片 {shard['name']} 失败")
+        return len(rows)
+
+    def _upload_shard(self, shard: Dict[str, Any], field_names: List[str]) -> List[str]:
+        """上传分片文件到Milvus的对象存储，返回do_bulk_insert使用的对象路径"""
+        client = Minio(
+            settings.MILVUS_MINIO_ENDPOINT,
+            access_key=settings.MILVUS_MINIO_ACCESS_KEY,
+            secret_key=settings.MILVUS_MINIO_SECRET_KEY,
+            secure=settings.MILVUS_MINIO_SECURE
+        )
+        prefix = f"bulk_ingest/{self.manifest['created_at'].replace(':', '-')}"
+        object_names = []
+        for relative_path in shard["files"]:
+            if self.manifest["format"] == "numpy" and Path(relative_path).stem not in field_names:
+                # 旧版集合没有该字段
+                continue
+            object_name = f"{prefix}/{relative_path}"
+            client.fput_object(settings.MILVUS_MINIO_BUCKET, object_name, str(self.artifact_dir / relative_path))
+            object_names.append(object_name)
+        return object_names
+
+    def _bulk_insert_shard(self, collection_name: str, object_names: List[str]) -> int:
+        """提交do_bulk_insert任务并等待完成，返回导入行数"""
+        from pymilvus import utility, BulkInsertState
+
+        task_id = utility.do_bulk_insert(collection_name=collection_name, files=object_names)
+        deadline = time.monotonic() + self.bulk_insert_timeout
+        while True:
+            state = utility.get_bulk_insert_state(task_id=task_id)
+            if state.state == BulkInsertState.ImportCompleted:
+                return state.row_count
+            if state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+                raise RuntimeError(f"批量导入任务 {task_id} 失败: {state.failed_reason}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"批量导入任务 {task_id} 超时（状态 {state.state_name}）")
+            time.sleep(2)
+
+    def load(self) -> Dict[str, Any]:
+        """
+        导入所有分片
+
+        Returns:
+            导入报告（总行数、每个分片的导入方式和耗时、吞吐量）
+        """
+        started = time.perf_counter()
+        if self.verify:
+            self.verify_files()
+        collection_name = settings.MILVUS_COLLECTION_NAME
+        collection = self._prepare_collection(collection_name)
+        if not self.reset:
+            self._delete_existing_sources(collection)
+
+        field_names = [field.name for field in collection.schema.fields]
+        # do_bulk_insert按文件整体导入：有墓碑的分片、集合缺少字段时的parquet分片只能insert
+        schema_complete = all(name in field_names for name in ARTIFACT_FIELDS)
+        shard_reports = []
+        total_rows = 0
+        for shard_index, shard in enumerate(self.manifest["shards"]):
+            shard_started = time.perf_counter()
+            method = "insert"
+            can_bulk_insert = (not self._tombstones_for(shard_index)
+                               and (schema_complete or self.manifest["format"] == "numpy"))
+            if self.mode != "insert" and MINIO_AVAILABLE and can_bulk_insert:
+                try:
+                    object_names = self._upload_shard(shard, field_names)
+                    method = "bulk_insert"
+                except Exception as e:
+                    if self.mode == "bulk_insert":
+                        raise
+                    logger.warning(f"上传分片 {shard['name']} 到对象存储失败，改为insert导入: {e}")
+            elif self.mode == "bulk_insert":
+                raise RuntimeError(f"分片 {shard['name']} 有墓碑记录或集合缺少字段，无法使用do_bulk_insert")
+
+            if method == "bulk_insert":
+                rows = self._bulk_insert_shard(collection_name, object_names)
+            else:
+                rows = self._insert_shard(shard_index, shard)
+            total_rows += rows
+            seconds = time.perf_counter() - shard_started
+            shard_reports.append({"name": shard["name"], "method": method, "rows": rows, "seconds": round(seconds, 2)})
+            logger.info(f"已导入分片 {shard['name']}（{method}，{rows} 行，{seconds:.1f}s）")
+
+        try:
+            collection.flush(timeout=60)
+        except Exception as e:
+            logger.warning(f"Flush警告（数据已导入，Milvus会在后台flush）: {e}")
+        elapsed = time.perf_counter() - started
+        return {
+            "artifact_dir": str(self.artifact_dir),
+            "format": self.manifest["format"],
+            "embedding_model": self.manifest["embedding_model"],
+            "dimension": self.manifest["dimension"],
+            "rows": total_rows,
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_sec": round(total_rows / elapsed, 2) if elapsed else 0.0,
+            "shards": shard_reports
+        }
@@ -0,0 +1,441 @@
+"""
+后台文件索引队列 - SQLite持久化的任务队列 + 工作线程池
+
+上传接口只负责保存文件和入队，解析、OCR、切分、向量化和写入Milvus由工作线程执行：
+- 任务持久化在SQLite中，按优先级（数值越大越先执行）和入队时间取任务，多个进程共享同一个库时用 BEGIN IMMEDIATE 保证不重复领取
+- 领取任务时记录持有者（主机:进程号:启动ID）和租约到期时间，运行期间由心跳线程续约；
+  只有租约过期、或持有者是本机上已退出的进程（上一次运行）的任务才会重新排队，其他进程正在执行的任务不受影响
+- 写入Milvus失败或抛出异常的任务按指数退避重试，超过最大次数后标记为失败
+- 记录每个任务的阶段、进度和吞吐量（chunks/s、bytes/s），供 GET /jobs/{id} 查询
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+from services.core.config import settings
+from services.core.logger import logger
+
+# 任务状态
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    filename TEXT,
+    file_size INTEGER DEFAULT 0,
+    batch_id TEXT,
+    priority INTEGER DEFAULT 0,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL DEFAULT 0,
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    error TEXT,
+    result_json TEXT,
+    throughput_json TEXT,
+    next_run_at REAL DEFAULT 0,
+    owner TEXT,
+    lease_expires_at REAL DEFAULT 0,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_batch ON ingest_jobs (batch_id);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_file ON ingest_jobs (file_id);
+"""
+
+# 旧版本数据库缺少的列
+_LEASE_COLUMNS = {"owner": "TEXT", "lease_expires_at": "REAL DEFAULT 0"}
+
+# 本进程的启动ID：同一主机上进程号被复用（如容器重启后仍是1号进程）时，用它区分上一次运行
+_BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def _process_alive(pid: int) -> bool:
+    """本机进程是否存在（非POSIX平台无法判断，视为存在，只依赖租约过期）"""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IngestionQueue:
+    """SQLite持久化的文件索引队列"""
+
+    def __init__(self, db_path: str, index_func: Callable[..., Dict], workers: int = 2,
+                 max_attempts: int = 3, retry_backoff: float = 5.0, poll_interval: float = 1.0,
+                 lease_seconds: float = 60.0):
+        """
+        Args:
+            db_path: SQLite数据库文件路径
+            index_func: 索引函数 index_func(file_id, progress_callback=...) -> 结果字典
+                （success=False且retryable=True的结果会重试）
+            workers: 工作线程数
+            max_attempts: 每个任务的最大尝试次数
+            retry_backoff: 第一次重试的等待秒数（之后每次翻倍）
+            poll_interval: 队列为空时的轮询间隔（秒）
+            lease_seconds: 运行中任务的租约时长（秒），每 1/3 租约时长续约一次
+        """
+        self.db_path = db_path
+        self.index_func = index_func
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.hostname = socket.gethostname()
+        self.owner = f"{self.hostname}:{os.getpid()}:{_BOOT_ID}"
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _migrate(self):
+        """为旧版本数据库补充持有者和租约列"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(ingest_jobs)")}
+                for name, definition in _LEASE_COLUMNS.items():
+                    if name not in columns:
+                        self.conn.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {name} {definition}")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def start(self):
+        """启动工作线程和租约心跳线程（先接管租约过期或上一次运行遗留的任务）"""
+        if self._threads:
+            return
+        self._recover()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._lease_loop, name="ingest-lease", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logger.info(f"索引队列已启动（{self.workers} 个工作线程，数据库: {self.db_path}，持有者: {self.owner}）")
+
+    def stop(self, timeout: float = 5.0):
+        """停止工作线程（未完成的任务停止续约，租约过期后或下次启动时重新排队）"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def enqueue(self, file_id: str, filename: str = "", file_size: int = 0,
+                priority: int = 0, batch_id: Optional[str] = None) -> Dict:
+        """
+        提交索引任务（同一文件已有排队或运行中的任务时直接返回该任务）
+
+        Args:
+            file_id: 文件ID
+            filename: 原始文件名
+            file_size: 文件大小（字节，用于计算吞吐量）
+            priority: 优先级，数值越大越先执行
+            batch_id: 批量上传的批次ID
+
+        Returns:
+            任务信息字典
+        """
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            existing = self.conn.execute(
+                "SELECT job_id FROM ingest_jobs WHERE file_id=? AND status IN ('queued', 'running')",
+                (file_id,)
+            ).fetchone()
+            if existing:
+                job_id = existing["job_id"]
+            else:
+                job_id = uuid.uuid4().hex
+                self.conn.execute(
+                    "INSERT INTO ingest_jobs (job_id, file_id, filename, file_size, batch_id, priority, status, "
+                    "stage, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                    (job_id, file_id, filename, file_size, batch_id, priority, self.max_attempts, now, now)
+                )
+        self._wakeup.set()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """获取任务状态"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM ingest_jobs WHERE job_id=?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, batch_id: Optional[str] = None,
+                  limit: int = 100) -> List[Dict]:
+        """
+        列出任务（按创建时间倒序）
+
+        Args:
+            status: 状态过滤（queued/running/succeeded/failed）
+            batch_id: 批次过滤
+            limit: 最多返回数量
+        """
+        conditions, params = [], []
+        if status:
+            conditions.append("status=?")
+            params.append(status)
+        if batch_id:
+            conditions.append("batch_id=?")
+            params.append(batch_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM ingest_jobs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def stats(self) -> Dict:
+        """各状态的任务数和已完成任务的平均吞吐量"""
+        with self.lock:
+            counts = dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM ingest_jobs GROUP BY status"
+            ).fetchall())
+            recent = self.conn.execute(
+                "SELECT throughput_json FROM ingest_jobs WHERE status='succeeded' "
+                "ORDER BY finished_at DESC LIMIT 50"
+            ).fetchall()
+        throughputs = [json.loads(row["throughput_json"]) for row in recent if row["throughput_json"]]
+        stats = {status: counts.get(status, 0) for status in JOB_STATUSES}
+        stats["workers"] = self.workers
+        stats["running_workers"] = sum(1 for t in self._threads if t.is_alive() and t.name != "ingest-lease")
+        if throughputs:
+            stats["avg_chunks_per_s"] = round(sum(t["chunks_per_s"] for t in throughputs) / len(throughputs), 2)
+            stats["avg_bytes_per_s"] = round(sum(t["bytes_per_s"] for t in throughputs) / len(throughputs), 1)
+        return stats
+
+    def _claim(self) -> Optional[Dict]:
+        """领取一个到期的排队任务并写入持有者和租约（多进程共享数据库时也不会重复领取）"""
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM ingest_jobs WHERE status='queued' AND next_run_at<=? "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (time.time(),)
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE ingest_jobs SET status='running', stage='starting', attempts=attempts+1, "
+                        "owner=?, lease_expires_at=?, started_at=?, updated_at=? WHERE job_id=?",
+                        (self.owner, time.time() + self.lease_seconds, now, now, row["job_id"])
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        job = self._row_to_job(row)
+        job.update(status="running", attempts=job["attempts"] + 1, owner=self.owner)
+        return job
+
+    def _is_orphaned(self, owner: Optional[str], lease_expires_at: Optional[float], now: float) -> bool:
+        """running状态的任务是否已无人执行：租约过期，或持有者是本机上已退出的进程"""
+        if owner == self.owner:
+            return False
+        if (lease_expires_at or 0) < now:
+            return True
+        parts = (owner or "").rsplit(":", 2)
+        if len(parts) != 3 or parts[0] != self.hostname or not parts[1].isdigit():
+            return False
+        pid, boot_id = int(parts[1]), parts[2]
+        if pid == os.getpid():
+            # 进程号相同但启动ID不同：进程号被复用，说明是本进程的上一次运行
+            return boot_id != _BOOT_ID
+        return not _process_alive(pid)
+
+    def _recover(self) -> int:
+        """
+        接管无人执行的running任务：重新排队，已达到最大尝试次数的标记为失败
+
+        Returns:
+            接管的任务数
+        """
+        now_ts = time.time()
+        now = datetime.utcnow().isoformat()
+        requeued, failed = [], []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT job_id, owner, lease_expires_at, attempts, max_attempts FROM ingest_jobs "
+                    "WHERE status='running'"
+                ).fetchall()
+                for row in rows:
+                    if not self._is_orphaned(row["owner"], row["lease_expires_at"], now_ts):
+                        continue
+                    if row["attempts"] >= row["max_attempts"]:
+                        self.conn.execute(
+                            "UPDATE ingest_jobs SET status='failed', stage='failed', error=?, owner=NULL, "
+                            "lease_expires_at=0, finished_at=?, updated_at=? WHERE job_id=?",
+                            (f"工作进程中断（持有者 {row['owner']}）", now, now, row["job_id"])
+                        )
+                        failed.append(row["job_id"])
+                    else:
+                        self.conn.execute(
+                            "UPDATE ingest_jobs SET status='queued', stage='queued', owner=NULL, "
+                            "lease_expires_at=0, next_run_at=0, updated_at=? WHERE job_id=?",
+                            (now, row["job_id"])
+                        )
+                        requeued.append(row["job_id"])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if requeued:
+            logger.info(f"索引队列: {len(requeued)} 个中断的任务重新排队")
+            self._wakeup.set()
+        if failed:
+            logger.warning(f"索引队列: {len(failed)} 个中断的任务已达到最大尝试次数，标记为失败")
+        return len(requeued) + len(failed)
+
+    def _renew_leases(self) -> int:
+        """为本进程持有的running任务续约"""
+        with self.lock:
+            return self.conn.execute(
+                "UPDATE ingest_jobs SET lease_expires_at=? WHERE status='running' AND owner=?",
+                (time.time() + self.lease_seconds, self.owner)
+            ).rowcount
+
+    def _lease_loop(self):
+        """心跳线程：定期续约，并接管其他进程遗留的任务"""
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self._renew_leases()
+                self._recover()
+            except Exception as e:
+                logger.error(f"索引队列续约失败: {e}")
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"索引队列领取任务失败: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run_job(job)
+
+    def _run_job(self, job: Dict):
+        """执行一个任务并记录结果、重试或失败"""
+        job_id = job["job_id"]
+        last_report = {"stage": None, "progress": -1.0}
+
+        def progress_callback(stage: str, progress: float):
+            # 阶段变化或进度前进5%以上时才写库
+            if stage == last_report["stage"] and progress - last_report["progress"] < 0.05:
+                return
+            last_report.update(stage=stage, progress=progress)
+            if not self._update(job_id, stage=stage, progress=round(progress, 3)) and not last_report.get("lost"):
+                last_report["lost"] = True
+                logger.warning(f"⚠️ 索引任务 {job_id} 已被其他进程接管，本次执行的结果将被丢弃")
+
+        logger.info(f"📥 开始索引任务 {job_id}（文件 {job['filename']}，第 {job['attempts']} 次尝试）")
+        start = time.time()
+        try:
+            result = self.index_func(job["file_id"], progress_callback=progress_callback)
+        except Exception as e:
+            logger.error(f"索引任务 {job_id} 异常: {e}")
+            result = {"success": False, "message": str(e), "chunks_indexed": 0, "retryable": True}
+        elapsed = max(time.time() - start, 1e-6)
+        now = datetime.utcnow().isoformat()
+
+        if result.get("success"):
+            throughput = {
+                "elapsed_s": round(elapsed, 3),
+                "chunks_per_s": round(result.get("chunks_indexed", 0) / elapsed, 2),
+                "bytes_per_s": round(job["file_size"] / elapsed, 1)
+            }
+            if not self._update(job_id, status="succeeded", stage="done", progress=1.0, error=None,
+                                result_json=json.dumps(result, ensure_ascii=False, default=str),
+                                throughput_json=json.dumps(throughput), lease_expires_at=0, finished_at=now):
+                return self._lost(job_id)
+            logger.info(f"✅ 索引任务 {job_id} 完成: {result.get('chunks_indexed', 0)} 个文本块，"
+                        f"{throughput['elapsed_s']}s")
+        elif result.get("retryable") and job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff * (2 ** (job["attempts"] - 1))
+            if not self._update(job_id, status="queued", stage="retry_wait", error=result.get("message"),
+                                next_run_at=time.time() + delay, owner=None, lease_expires_at=0):
+                return self._lost(job_id)
+            logger.warning(f"⚠️ 索引任务 {job_id} 失败，{delay:.0f}s 后重试: {result.get('message')}")
+            self._wakeup.set()
+        else:
+            if not self._update(job_id, status="failed", stage="failed", error=result.get("message"),
+                                result_json=json.dumps(result, ensure_ascii=False, default=str),
+                                lease_expires_at=0, finished_at=now):
+                return self._lost(job_id)
+            logger.error(f"❌ 索引任务 {job_id} 失败: {result.get('message')}")
+
+    def _update(self, job_id: str, **fields) -> bool:
+        """更新本进程持有的running任务（任务已被其他进程接管时不写入，返回False）"""
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name}=?" for name in fields)
+        with self.lock:
+            return self.conn.execute(
+                f"UPDATE ingest_jobs SET {assignments} WHERE job_id=? AND owner=? AND status='running'",
+                (*fields.values(), job_id, self.owner)
+            ).rowcount > 0
+
+    @staticmethod
+    def _lost(job_id: str):
+        logger.warning(f"⚠️ 索引任务 {job_id} 已被其他进程接管，丢弃本次执行结果")
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["result"] = json.loads(job.pop("result_json")) if job.get("result_json") else None
+        job["throughput"] = json.loads(job.pop("throughput_json")) if job.get("throughput_json") else None
+        job.pop("next_run_at", None)
+        job.pop("lease_expires_at", None)
+        return job
+
+
+# 全局索引队列实例（首次使用时创建，工作线程在应用启动时start）
+_ingest_queue: Optional[IngestionQueue] = None
+_queue_lock = Lock()
+
+
+def get_ingest_queue() -> IngestionQueue:
+    """获取全局文件索引队列"""
+    global _ingest_queue
+    with _queue_lock:
+        if _ingest_queue is None:
+            from services.storage.file_indexer import file_indexer
+            _ingest_queue = IngestionQueue(
+                db_path=settings.INGEST_QUEUE_DB,
+                index_func=file_indexer.index_file,
+                workers=settings.INGEST_WORKERS,
+                max_attempts=settings.INGEST_MAX_ATTEMPTS,
+                retry_backoff=settings.INGEST_RETRY_BACKOFF,
+                lease_seconds=settings.INGEST_LEASE_SECONDS
+            )
+    return _ingest_queue
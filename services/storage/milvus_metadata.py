@@ -1,154 +1,118 @@
 """
-Milvus元数据管理 - 使用Milvus存储文件元数据
-利用Milvus的查询能力来存储和检索文件元数据
+Milvus元数据管理 - 已索引文件的元数据
+文件名、类型、chunk数记录在索引器维护的文件目录（services/storage/file_catalog.py）中，
+目录可以从向量集合中chunk的source_file重建
 """
-from typing import Optional, Dict, List
+from threading import Lock
+from typing import Optional, Dict, List, Tuple
+from services.storage.file_catalog import FileCatalog, get_file_catalog
 from services.vector.milvus_client import milvus_client
+from services.vector.dedup import get_near_duplicate_index
 from services.core.config import settings
 from services.core.logger import logger
 
 
 class MilvusMetadataManager:
-    """使用Milvus存储文件元数据的管理器"""
+    """Milvus后端的文件元数据管理器（读取文件目录，删除时同步删除向量集合中的chunk）"""
     
     def __init__(self):
         self.collection_name = settings.MILVUS_COLLECTION_NAME
-        self.metadata_collection = f"{self.collection_name}_metadata"  # 文件元数据专用collection
-        self._ensure_metadata_collection()
+        self._rebuild_lock = Lock()
     
-    def _ensure_metadata_collection(self):
-        """确保元数据collection存在"""
-        if not milvus_client.connected:
-            milvus_client.connect()
-        
-        from pymilvus import Collection, utility, CollectionSchema, FieldSchema, DataType
-        
-        # 检查是否存在专门的元数据collection
-        # 如果没有，文件元数据将通过文件ID在main collection中查询
-        # 这种方式更简单，直接利用现有collection
+    def catalog(self) -> FileCatalog:
+        """获取文件目录（新建的空目录先从向量集合重建一次）"""
+        catalog = get_file_catalog()
+        if catalog.is_new:
+            with self._rebuild_lock:
+                if catalog.is_new:
+                    try:
+                        self.rebuild_catalog()
+                    except Exception as e:
+                        logger.error(f"从Milvus重建文件目录失败（可运行 scripts/rebuild_file_catalog.py 重试）: {e}")
+                        catalog.is_new = False
+        return catalog
+    
+    def _to_metadata(self, entry: Dict) -> Dict:
+        """目录记录 -> 文件元数据"""
+        return {
+            "file_id": entry["file_id"],
+            "filename": entry["filename"],
+            "file_type": entry["file_type"],
+            "chunk_count": entry["chunk_count"],
+            "char_count": entry["char_count"],
+            "page_count": entry["page_count"],
+            "status": entry["status"],
+            "error": entry["error"],
+            "uploaded_at": entry["uploaded_at"],
+            "processed_at": entry["indexed_at"],
+            "processed": entry["status"] == "indexed"
+        }
     
     def get_file_metadata_from_milvus(self, file_id: str) -> Optional[Dict]:
         """
-        从Milvus中查询文件元数据（通过搜索该file_id的任意chunk）
+        查询文件元数据（从索引器维护的文件目录读取，不查询向量集合）
         
         Args:
             file_id: 文件ID
             
         Returns:
-            文件元数据字典
+            文件元数据字典，文件未索引过时返回None
         """
-        if not milvus_client.connected:
-            milvus_client.connect()
-        
-        try:
-            from pymilvus import Collection
-            
-            collection = Collection(self.collection_name)
-            collection.load()
-            
-            # 查询包含该file_id的文档（使用表达式查询）
-            # 注意：需要确保source_file字段包含file_id信息
-            expr = f'source_file like "%file_id:{file_id}%"'
-            
-            results = collection.query(
-                expr=expr,
-                output_fields=["source_file"],
-                limit=1  # 只需要一个结果来提取元数据
-            )
-            
-            if results:
-                source_file = results[0].get("source_file", "")
-                # 解析source_file字符串提取元数据
-                # 格式: "filename||file_id:xxx||file_type:xxx"
-                if "||file_id:" in source_file:
-                    parts = source_file.split("||")
-                    filename = parts[0]
-                    file_id_from_source = None
-                    file_type = None
-                    
-                    for part in parts[1:]:
-                        if part.startswith("file_id:"):
-                            file_id_from_source = part.replace("file_id:", "")
-                        elif part.startswith("file_type:"):
-                            file_type = part.replace("file_type:", "")
-                    
-                    # 统计该文件有多少chunks
-                    all_results = collection.query(
-                        expr=expr,
-                        output_fields=["source_file"],
-                        limit=10000  # 获取所有chunks
-                    )
-                    
-                    return {
-                        "file_id": file_id_from_source,
-                        "filename": filename,
-                        "file_type": file_type,
-                        "chunk_count": len(all_results),
-                        "processed": True  # 如果能在Milvus中找到，说明已处理
-                    }
-            
-            return None
-        except Exception as e:
-            logger.error(f"从Milvus查询文件元数据失败: {e}")
-            return None
+        entry = self.catalog().get(file_id)
+        return self._to_metadata(entry) if entry else None
     
     def list_files_from_milvus(self) -> List[Dict]:
         """
-        从Milvus列出所有已索引的文件
+        列出所有已索引的文件（从文件目录读取）
         
         Returns:
             文件列表
         """
-        if not milvus_client.connected:
-            milvus_client.connect()
+        return [self._to_metadata(entry) for entry in self.catalog().list(status="indexed")]
+    
+    def list_files_page(self, file_type: Optional[str] = None, limit: int = 100,
+                        after: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """
+        按上传时间倒序分页列出已索引的文件（文件目录上的键集分页）
         
-        try:
-            from pymilvus import Collection
-            
-            collection = Collection(self.collection_name)
-            collection.load()
-            
-            # 获取所有unique的source_file（包含file_id的）
-            # 使用迭代器获取所有数据，然后去重
-            results = collection.query(
-                expr='source_file like "%||file_id:%"',
-                output_fields=["source_file"],
-                limit=10000
-            )
-            
-            # 提取唯一的文件
-            seen_files = {}
-            for result in results:
-                source_file = result.get("source_file", "")
-                if "||file_id:" in source_file:
-                    parts = source_file.split("||")
-                    filename = parts[0]
-                    file_id = None
-                    file_type = None
-                    
-                    for part in parts[1:]:
-                        if part.startswith("file_id:"):
-                            file_id = part.replace("file_id:", "")
-                        elif part.startswith("file_type:"):
-                            file_type = part.replace("file_type:", "")
-                    
-                    if file_id and file_id not in seen_files:
-                        # 统计chunks
-                        expr = f'source_file like "%file_id:{file_id}%"'
-                        chunks = collection.query(expr=expr, limit=10000)
-                        
-                        seen_files[file_id] = {
-                            "file_id": file_id,
-                            "filename": filename,
-                            "file_type": file_type,
-                            "chunk_count": len(chunks),
-                            "processed": True
-                        }
-            
-            return list(seen_files.values())
-        except Exception as e:
-            logger.error(f"从Milvus列出文件失败: {e}")
-            return []
+        Args:
+            file_type: 文件类型过滤
+            limit: 最多返回数量
+            after: 上一页最后一个文件的 (上传时间, file_id)
+        """
+        entries = self.catalog().list_page(file_type=file_type, status="indexed", limit=limit, after=after)
+        return [self._to_metadata(entry) for entry in entries]
+    
+    def delete_file(self, file_id: str) -> bool:
+        """
+        删除文件在向量集合中的所有chunk、目录记录和近似重复索引中的指纹
+        
+        Returns:
+            目录中是否有该文件
+        """
+        entry = self.catalog().delete(file_id)
+        if entry is None:
+            return False
+        milvus_client.delete_by_source_file(entry["source_file"])
+        if settings.DEDUP_ENABLED:
+            # 不移除的话，reject模式下之后再上传相同内容会被判为重复而写入0个chunk
+            get_near_duplicate_index().remove_prefix(f"{entry['source_file']}#")
+        return True
+    
+    def rebuild_catalog(self) -> Dict[str, int]:
+        """
+        遍历向量集合中上传文件的chunk，重建文件目录
+        
+        Returns:
+            {"files": 文件数, "chunks": chunk数}
+        """
+        # 向量集合中没有上传时间，从文件索引读取
+        from services.storage.file_storage import file_storage
+        uploaded_at = {file_id: info.get("uploaded_at") for file_id, info in file_storage.index.items()}
+        return get_file_catalog().rebuild_from_chunks(
+            milvus_client.iter_source_files(expr='source_file like "%||file_id:%"'),
+            uploaded_at=uploaded_at
+        )
 
 
 # 全局元数据管理器实例
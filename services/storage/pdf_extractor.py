@@ -0,0 +1,134 @@
+"""
+PDF逐页提取器 - 按页流式产出文本，大文件的页区间分发到进程池并行提取
+
+原实现一次性提取所有页、拼接成一个字符串后再切分：只用一个核，峰值内存约为文本大小的3倍，
+并且要等最后一页提取完后续的切分和向量化才能开始。这里：
+- iter_pages 是生成器，按页码顺序逐页产出 (页码, 文本)，调用方可以边提取边切分、向量化
+- 页数较多时把页区间（每个任务 pages_per_task 页）提交到进程池，每个子进程自己打开PDF
+  （PyMuPDF的文档对象不能跨进程传递），文本提取是纯CPU操作，多进程才能用满多核
+- 进程池用forkserver（不支持时用spawn）启动子进程，不从多线程的服务进程直接fork；
+  子进程执行的 workers.pdf_pages.extract_page_range 不导入services包
+- 同时在途的任务数有上限，已提取但还没被消费的页不会无限堆积
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+from threading import Lock
+from typing import Iterator, Optional, Tuple
+from services.core.config import settings
+from services.core.logger import logger
+from workers.pdf_pages import PDF_AVAILABLE, extract_page_range
+
+if PDF_AVAILABLE:
+    import fitz  # PyMuPDF
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """进程池的启动方式：forkserver（POSIX），否则spawn；都不会从当前的多线程进程直接fork"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_page_count(file_path: str) -> int:
+    """PDF页数（只读取文档结构，不提取文本）"""
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+
+class PDFPageExtractor:
+    """PDF逐页提取器（进程池首次并行提取时创建）"""
+
+    def __init__(self, workers: int, pages_per_task: int = 8, min_parallel_pages: int = 16):
+        """
+        Args:
+            workers: 进程数（<=1 时始终在当前进程中顺序提取）
+            pages_per_task: 每个进程池任务提取的页数
+            min_parallel_pages: 页数达到该值才使用进程池（小文件启动任务的开销大于收益）
+        """
+        self.workers = workers
+        self.pages_per_task = max(pages_per_task, 1)
+        self.min_parallel_pages = min_parallel_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                logger.info(f"创建PDF提取进程池（进程数 {self.workers}）")
+            return self._pool
+
+    def iter_pages(self, file_path: str, page_count: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        按页码顺序逐页产出文本
+
+        Args:
+            file_path: PDF文件路径
+            page_count: 已知的页数（未提供时读取）
+
+        Yields:
+            (页码(从1开始), 页面文本)
+        """
+        if page_count is None:
+            page_count = get_page_count(file_path)
+
+        if self.workers <= 1 or page_count < self.min_parallel_pages:
+            with fitz.open(file_path) as doc:
+                for page_num in range(page_count):
+                    yield page_num + 1, doc[page_num].get_text()
+            return
+
+        pool = self._get_pool()
+        ranges = iter(range(0, page_count, self.pages_per_task))
+        # 在途任务上限：足够让所有进程保持忙碌，同时限制已提取未消费的页数
+        max_in_flight = self.workers * 2
+        pending = deque()
+        try:
+            for start in ranges:
+                pending.append(pool.submit(extract_page_range, file_path, start, start + self.pages_per_task))
+                if len(pending) >= max_in_flight:
+                    break
+            while pending:
+                pages = pending.popleft().result()
+                start = next(ranges, None)
+                if start is not None:
+                    pending.append(pool.submit(extract_page_range, file_path, start, start + self.pages_per_task))
+                yield from pages
+        finally:
+            # 调用方提前停止迭代（或出错）时取消尚未开始的任务
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局PDF提取器（首次使用时创建）
+_pdf_extractor: Optional[PDFPageExtractor] = None
+_pdf_extractor_lock = Lock()
+
+
+def get_pdf_extractor() -> PDFPageExtractor:
+    """获取全局PDF提取器"""
+    global _pdf_extractor
+    with _pdf_extractor_lock:
+        if _pdf_extractor is None:
+            _pdf_extractor = PDFPageExtractor(
+                workers=settings.PDF_EXTRACT_WORKERS,
+                pages_per_task=settings.PDF_PAGES_PER_TASK,
+                min_parallel_pages=settings.PDF_PARALLEL_MIN_PAGES
+            )
+        return _pdf_extractor
+
+
+def shutdown_pdf_extractor():
+    """关闭PDF提取进程池（应用关闭时调用）"""
+    with _pdf_extractor_lock:
+        extractor = _pdf_extractor
+    if extractor is not None:
+        extractor.shutdown()
@@ -0,0 +1,216 @@
+"""
+文本切分器 - 替代langchain的RecursiveCharacterTextSplitter
+
+边界语义与 RecursiveCharacterTextSplitter（keep_separator=True）相同：按分隔符优先级
+（段落 → 行 → 句 → 词 → 字符）切成片段，片段不超过chunk_size的合并成chunk，相邻chunk重叠约chunk_overlap。
+不同之处：
+- 片段用 (起点, 终点) 偏移表示：每一级分隔符只在需要细分的范围内查找一次（普通分隔符用str.split，
+  正则用预编译的finditer(pos, endpos)），合并时直接对原文切片，不复制子串、不拼接字符串
+- 中文句末标点（。！？，连同后面的右引号/右括号）作为句子分隔符，标点留在句子末尾；
+  纯中文段落不再退化到按字符切分
+- 长度可以按字符或按token（tiktoken）计算
+- split_pages 逐页流式切分 (页码, 文本) 迭代器
+不导入langchain，启动更快。cjk_sentences=False 且按字符计长度时输出与langchain完全一致。
+"""
+import re
+from collections import deque
+from itertools import accumulate
+from threading import Lock
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from services.core.config import settings
+
+# token计长依赖tiktoken（可选）
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# (分隔符, 是否为正则, 分隔符归属)："start" 分隔符放在后一个片段开头（与langchain一致），"end" 留在前一个片段末尾
+DEFAULT_SEPARATORS: List[Tuple[str, bool, str]] = [
+    ("\n\n", False, "start"),
+    ("\n", False, "start"),
+    (" ", False, "start"),
+    ("", False, "start"),
+]
+# 中文句末标点（连续标点和紧跟的右引号、右括号算作同一个分隔符）
+CJK_SENTENCE_SEPARATOR: Tuple[str, bool, str] = (r"[。！？]+[”’」』）]*", True, "end")
+
+
+def token_length_function(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    返回按token计数的长度函数
+
+    Args:
+        encoding_name: tiktoken编码名称
+    """
+    if not TIKTOKEN_AVAILABLE:
+        raise RuntimeError("按token计算chunk长度需要安装tiktoken: pip install tiktoken")
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class TextChunker:
+    """按分隔符优先级切分并合并成固定大小chunk的文本切分器"""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50,
+                 cjk_sentences: bool = True, length_unit: str = "chars",
+                 token_encoding: str = "cl100k_base",
+                 separators: Optional[List[Tuple[str, str]]] = None):
+        """
+        Args:
+            chunk_size: chunk最大长度
+            chunk_overlap: 相邻chunk的重叠长度
+            cjk_sentences: 是否按中文句末标点切分（位于换行和空格之间）
+            length_unit: 长度单位，chars（字符数）或 tokens（tiktoken token数）
+            token_encoding: 按token计长时使用的tiktoken编码
+            separators: 自定义分隔符 [(分隔符, 是否为正则, "start"/"end"), ...]，按优先级排列，
+                最后一个应为 ("", False, "start")（按字符切分）
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap（{chunk_overlap}）不能大于chunk_size（{chunk_size}）")
+        if length_unit not in ("chars", "tokens"):
+            raise ValueError(f"不支持的长度单位: {length_unit}（可选 chars、tokens）")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_unit = length_unit
+        if separators is None:
+            separators = list(DEFAULT_SEPARATORS)
+            if cjk_sentences:
+                separators.insert(2, CJK_SENTENCE_SEPARATOR)
+        self.separators = separators
+        self._patterns = [re.compile(sep) if is_regex else None for sep, is_regex, _ in separators]
+        self._token_length = token_length_function(token_encoding) if length_unit == "tokens" else None
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        切分一段文本
+
+        Returns:
+            chunk列表（去掉首尾空白，不含空chunk）
+        """
+        if not text:
+            return []
+        chunks: List[str] = []
+        self._split(text, 0, len(text), 0, chunks)
+        return chunks
+
+    def split_pages(self, sections: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[Optional[int], str]]:
+        """
+        逐页流式切分（每页单独切分，有页码的页面加上 "[页面 N]" 前缀）
+
+        Args:
+            sections: (页码或None/0, 文本) 迭代器，如 PDFPageExtractor.iter_pages 的输出
+
+        Yields:
+            (页码, chunk)
+        """
+        for page, text in sections:
+            if not text.strip():
+                continue
+            if page:
+                text = f"[页面 {page}]\n{text}"
+            for chunk in self.split_text(text):
+                yield page, chunk
+
+    def _pieces(self, text: str, start: int, end: int, level: int) -> Optional[List[Tuple[int, int]]]:
+        """
+        用第level级分隔符切分 text[start:end]
+
+        Returns:
+            片段偏移列表（不含空片段）；该范围内没有这一级分隔符时返回None
+        """
+        separator, is_regex, keep = self.separators[level]
+        if is_regex:
+            cuts = [
+                match.end() if keep == "end" else match.start()
+                for match in self._patterns[level].finditer(text, start, end) if match.end() > match.start()
+            ]
+            if not cuts:
+                return None
+            bounds = [start] + cuts + [end]
+        elif not separator:
+            return [(i, i + 1) for i in range(start, end)]
+        else:
+            parts = (text if start == 0 and end == len(text) else text[start:end]).split(separator)
+            if len(parts) == 1:
+                return None
+            # 每个分隔符归入后一个（"start"）或前一个（"end"）片段
+            lengths = [len(part) + len(separator) for part in parts]
+            if keep == "end":
+                lengths[-1] -= len(separator)
+            else:
+                lengths[0] -= len(separator)
+            bounds = list(accumulate(lengths, initial=start))
+        return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+    def _split(self, text: str, start: int, end: int, level: int, chunks: List[str]):
+        """递归切分 [start, end)：用范围内出现的最高优先级分隔符切成片段，过长的片段用更低一级细分"""
+        pieces = None
+        while pieces is None and level < len(self.separators):
+            pieces = self._pieces(text, start, end, level)
+            level += 1
+        # level 现在是下一级分隔符
+        if pieces is None:
+            pieces = [(start, end)]
+
+        good: List[Tuple[int, int, int]] = []
+        token_length = self._token_length
+        for piece_start, piece_end in pieces:
+            length = piece_end - piece_start if token_length is None else token_length(text[piece_start:piece_end])
+            if length < self.chunk_size:
+                good.append((piece_start, piece_end, length))
+                continue
+            if good:
+                self._merge(text, good, chunks)
+                good = []
+            if level >= len(self.separators):
+                chunk = text[piece_start:piece_end].strip()
+                if chunk:
+                    chunks.append(chunk)
+            else:
+                self._split(text, piece_start, piece_end, level, chunks)
+        if good:
+            self._merge(text, good, chunks)
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int, int]], chunks: List[str]):
+        """把相邻的短片段合并成不超过chunk_size的chunk（片段连续，合并即切片）"""
+        current: deque = deque()
+        total = 0
+
+        def emit():
+            chunk = text[current[0][0]:current[-1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+
+        for piece in pieces:
+            length = piece[2]
+            if total + length > self.chunk_size and current:
+                emit()
+                # 保留末尾不超过chunk_overlap的片段作为下一个chunk的开头
+                while current and (total > self.chunk_overlap or (total + length > self.chunk_size and total > 0)):
+                    total -= current.popleft()[2]
+            current.append(piece)
+            total += length
+        if current:
+            emit()
+
+
+# 全局切分器（按配置创建）
+_text_chunker: Optional[TextChunker] = None
+_text_chunker_lock = Lock()
+
+
+def get_text_chunker() -> TextChunker:
+    """获取按配置（CHUNK_SIZE / CHUNK_OVERLAP / CHUNK_LENGTH_UNIT ...）创建的全局切分器"""
+    global _text_chunker
+    with _text_chunker_lock:
+        if _text_chunker is None:
+            _text_chunker = TextChunker(
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP,
+                cjk_sentences=settings.CHUNK_CJK_SENTENCES,
+                length_unit=settings.CHUNK_LENGTH_UNIT,
+                token_encoding=settings.CHUNK_TOKEN_ENCODING
+            )
+        return _text_chunker
@@ -4,10 +4,12 @@
 Tavily AI Search 客户端
 专为AI/RAG优化的搜索API
 """
+import asyncio
 import requests
 import time
 from typing import List, Dict, Optional, Any
 from services.core import logger, settings
+from services.core.http_client import HTTPX_AVAILABLE, get_async_client, get_http_session
 
 # 🔥 简单的内存缓存（避免重复搜索）
 _search_cache = {}
@@ -81,80 +83,137 @@ class TavilySearchClient:
             }
         """
         try:
-            # 🔥 检查缓存
             cache_key = f"{query}_{max_results}_{search_depth}"
-            if cache_key in _search_cache:
-                cached_data, cached_time = _search_cache[cache_key]
-                if time.time() - cached_time < _cache_ttl:
-                    logger.info(f"⚡ 使用缓存结果（避免重复搜索）")
-                    return cached_data
-            
-            # 构建请求
-            payload = {
-                "api_key": self.api_key,
-                "query": query,
-                "max_results": min(max_results, 10),  # Tavily限制最多10个
-                "search_depth": search_depth,
-                "include_answer": include_answer,
-                "include_raw_content": include_raw_content
-            }
-            
-            # 可选参数
-            if include_domains:
-                payload["include_domains"] = include_domains
-            if exclude_domains:
-                payload["exclude_domains"] = exclude_domains
+            cached = self._cached(cache_key)
+            if cached is not None:
+                return cached
             
+            payload = self._build_payload(query, max_results, search_depth, include_answer,
+                                          include_raw_content, include_domains, exclude_domains)
             logger.info(f"🔍 Tavily搜索: '{query}' (max_results={max_results}, depth={search_depth})")
             
             # 发送请求
-            response = requests.post(
+            response = get_http_session().post(
                 self.search_endpoint,
                 json=payload,
                 timeout=10  # 🔥 减少到10秒超时（原30秒）
             )
             
             response.raise_for_status()
-            data = response.json()
+            return self._parse_response(query, cache_key, response.json())
             
-            # 提取结果
-            results = []
-            for item in data.get("results", []):
-                results.append({
-                    "title": item.get("title", ""),
-                    "url": item.get("url", ""),
-                    "content": item.get("content", ""),
-                    "score": item.get("score", 0.0)
-                })
-            
-            result = {
-                "query": query,
-                "answer": data.get("answer", ""),  # AI生成的答案摘要
-                "results": results,
-                "response_time": data.get("response_time", 0)
-            }
-            
-            # 🔥 缓存结果
-            _search_cache[cache_key] = (result, time.time())
+        except requests.exceptions.HTTPError as e:
+            return self._http_error(e.response.status_code, e)
+        except Exception as e:
+            logger.error(f"❌ Tavily搜索失败: {e}")
+            return {"error": str(e), "results": []}
+    
+    async def search_async(
+        self,
+        query: str,
+        max_results: int = 5,
+        search_depth: str = "basic",
+        include_answer: bool = True,
+        include_raw_content: bool = False,
+        include_domains: Optional[List[str]] = None,
+        exclude_domains: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """search 的异步版本（参数和返回值相同）"""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(self.search, query, max_results, search_depth, include_answer,
+                                           include_raw_content, include_domains, exclude_domains)
+        try:
+            cache_key = f"{query}_{max_results}_{search_depth}"
+            cached = self._cached(cache_key)
+            if cached is not None:
+                return cached
             
-            logger.info(f"✅ Tavily搜索成功: 找到{len(results)}个结果，响应时间{result['response_time']:.2f}秒")
+            payload = self._build_payload(query, max_results, search_depth, include_answer,
+                                          include_raw_content, include_domains, exclude_domains)
+            logger.info(f"🔍 Tavily搜索: '{query}' (max_results={max_results}, depth={search_depth})")
             
-            return result
+            response = await get_async_client().post(self.search_endpoint, json=payload, timeout=10)
+            if response.status_code >= 400:
+                return self._http_error(response.status_code, f"HTTP {response.status_code}")
+            return self._parse_response(query, cache_key, response.json())
             
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                logger.error("❌ Tavily API Key无效或已过期")
-                return {"error": "Tavily API Key无效", "results": []}
-            elif e.response.status_code == 429:
-                logger.error("❌ Tavily API配额已用完")
-                return {"error": "API配额已用完", "results": []}
-            else:
-                logger.error(f"❌ Tavily API错误: {e}")
-                return {"error": str(e), "results": []}
         except Exception as e:
             logger.error(f"❌ Tavily搜索失败: {e}")
             return {"error": str(e), "results": []}
     
+    def _cached(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """🔥 检查缓存（避免重复搜索）"""
+        if cache_key in _search_cache:
+            cached_data, cached_time = _search_cache[cache_key]
+            if time.time() - cached_time < _cache_ttl:
+                logger.info(f"⚡ 使用缓存结果（避免重复搜索）")
+                return cached_data
+        return None
+    
+    def _build_payload(
+        self,
+        query: str,
+        max_results: int,
+        search_depth: str,
+        include_answer: bool,
+        include_raw_content: bool,
+        include_domains: Optional[List[str]],
+        exclude_domains: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """构建请求"""
+        payload = {
+            "api_key": self.api_key,
+            "query": query,
+            "max_results": min(max_results, 10),  # Tavily限制最多10个
+            "search_depth": search_depth,
+            "include_answer": include_answer,
+            "include_raw_content": include_raw_content
+        }
+        
+        # 可选参数
+        if include_domains:
+            payload["include_domains"] = include_domains
+        if exclude_domains:
+            payload["exclude_domains"] = exclude_domains
+        return payload
+    
+    def _parse_response(self, query: str, cache_key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """提取结果并写入缓存"""
+        results = []
+        for item in data.get("results", []):
+            results.append({
+                "title": item.get("title", ""),
+                "url": item.get("url", ""),
+                "content": item.get("content", ""),
+                "score": item.get("score", 0.0)
+            })
+        
+        result = {
+            "query": query,
+            "answer": data.get("answer", ""),  # AI生成的答案摘要
+            "results": results,
+            "response_time": data.get("response_time", 0)
+        }
+        
+        # 🔥 缓存结果
+        _search_cache[cache_key] = (result, time.time())
+        
+        logger.info(f"✅ Tavily搜索成功: 找到{len(results)}个结果，响应时间{result['response_time']:.2f}秒")
+        
+        return result
+    
+    def _http_error(self, status_code: int, error) -> Dict[str, Any]:
+        """HTTP错误转换为错误结果"""
+        if status_code == 401:
+            logger.error("❌ Tavily API Key无效或已过期")
+            return {"error": "Tavily API Key无效", "results": []}
+        elif status_code == 429:
+            logger.error("❌ Tavily API配额已用完")
+            return {"error": "API配额已用完", "results": []}
+        else:
+            logger.error(f"❌ Tavily API错误: {error}")
+            return {"error": str(error), "results": []}
+    
     def quick_search(self, query: str, max_results: int = 3) -> List[str]:
         """
         快速搜索，只返回内容列表（用于RAG）
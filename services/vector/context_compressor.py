@@ -0,0 +1,218 @@
+"""
+上下文压缩器 - 抽取式句子级压缩
+
+在检索和LLM调用之间运行（可选）：
+1. 把检索到的chunk切成句子
+2. 用已加载的embedding模型批量计算句子向量（带缓存），与查询向量计算余弦相似度
+3. 只保留得分最高的句子，并记录来源（source_file、chunk序号、句子序号、得分）
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from services.core.config import settings
+from services.core.logger import logger
+from services.core.cache import get_embedding_cache, _generate_cache_key
+from services.vector.context_packer import split_sentences, join_sentences, estimate_tokens
+
+
+@dataclass
+class CompressedContext:
+    """压缩结果"""
+    results: List[Dict]  # 压缩后的检索结果（text只包含保留的句子，sentences记录来源）
+    sentences_total: int = 0
+    sentences_kept: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    cache_hits: int = 0
+    elapsed_ms: float = 0.0
+    kept: List[Dict] = field(default_factory=list)  # 按得分排序的保留句子（含来源）
+
+    def stats(self) -> Dict:
+        """压缩统计（用于日志和接口返回）"""
+        return {
+            "sentences_total": self.sentences_total,
+            "sentences_kept": self.sentences_kept,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": max(self.tokens_before - self.tokens_after, 0),
+            "cache_hits": self.cache_hits,
+            "elapsed_ms": round(self.elapsed_ms, 2)
+        }
+
+
+class ContextCompressor:
+    """基于embedding相似度的抽取式上下文压缩器"""
+
+    def __init__(
+        self,
+        embedding_model,
+        max_sentences: int = 12,
+        min_score: float = 0.25,
+        cache_size: int = 5000,
+        batch_size: int = 64
+    ):
+        """
+        初始化压缩器
+
+        Args:
+            embedding_model: 已加载的SentenceTransformer模型（与检索共用）
+            max_sentences: 最多保留的句子数
+            min_score: 句子与查询的最低余弦相似度（至少保留得分最高的一句）
+            cache_size: 句子向量缓存条目数
+            batch_size: 批量编码的batch大小
+        """
+        self.embedding_model = embedding_model
+        self.max_sentences = max_sentences
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        # 句子向量只取决于句子文本，不需要TTL，使用简单的LRU
+        self._vectors: OrderedDict = OrderedDict()
+        self.lock = Lock()
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        """获取查询向量（复用检索阶段缓存的embedding）"""
+        embedding_cache = get_embedding_cache()
+        embedding_key = _generate_cache_key(query)
+        vector = embedding_cache.get(embedding_key)
+        if vector is None:
+            vector = self.embedding_model.encode([query], show_progress_bar=False)[0].tolist()
+            embedding_cache.set(embedding_key, vector)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sentence_vectors(self, sentences: List[str]) -> Tuple[np.ndarray, int]:
+        """批量获取句子向量（已归一化），返回(向量矩阵, 缓存命中数)"""
+        vectors: List[Optional[np.ndarray]] = [None] * len(sentences)
+        missing: Dict[str, List[int]] = {}
+        with self.lock:
+            for i, sentence in enumerate(sentences):
+                cached = self._vectors.get(sentence)
+                if cached is not None:
+                    self._vectors.move_to_end(sentence)
+                    vectors[i] = cached
+                else:
+                    missing.setdefault(sentence, []).append(i)
+        hits = len(sentences) - sum(len(v) for v in missing.values())
+
+        if missing:
+            texts = list(missing.keys())
+            encoded = self.embedding_model.encode(
+                texts,
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                normalize_embeddings=True
+            )
+            with self.lock:
+                for text, vector in zip(texts, encoded):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    for i in missing[text]:
+                        vectors[i] = vector
+                    self._vectors[text] = vector
+                while len(self._vectors) > self.cache_size:
+                    self._vectors.popitem(last=False)
+
+        return np.vstack(vectors), hits
+
+    def compress(self, query: str, results: List[Dict], max_sentences: int = None) -> CompressedContext:
+        """
+        只保留与查询最相关的句子
+
+        Args:
+            query: 用户查询
+            results: 检索结果（包含text，可选source_file）
+            max_sentences: 最多保留的句子数，默认使用初始化参数
+
+        Returns:
+            CompressedContext 压缩结果（results保持原有的chunk顺序和句子顺序）
+        """
+        start = time.time()
+        max_sentences = max_sentences or self.max_sentences
+
+        units = []  # (chunk序号, 句子序号, 句子)
+        for chunk_index, result in enumerate(results):
+            for sentence_index, sentence in enumerate(split_sentences(result.get("text") or "")):
+                units.append((chunk_index, sentence_index, sentence))
+
+        compressed = CompressedContext(
+            results=results,
+            sentences_total=len(units),
+            tokens_before=sum(estimate_tokens(r.get("text") or "") for r in results)
+        )
+        if not units:
+            return compressed
+
+        query_vector = self._query_vector(query)
+        matrix, compressed.cache_hits = self._sentence_vectors([u[2] for u in units])
+        scores = matrix @ query_vector
+
+        order = np.argsort(-scores)
+        selected = [int(i) for i in order[:max_sentences] if scores[i] >= self.min_score]
+        if not selected:
+            selected = [int(order[0])]
+
+        # 按原chunk和句子顺序重组，保留来源信息
+        by_chunk: Dict[int, List[Dict]] = {}
+        for i in sorted(selected, key=lambda i: (units[i][0], units[i][1])):
+            chunk_index, sentence_index, sentence = units[i]
+            by_chunk.setdefault(chunk_index, []).append({
+                "text": sentence,
+                "score": float(scores[i]),
+                "chunk_index": chunk_index,
+                "sentence_index": sentence_index,
+                "source_file": results[chunk_index].get("source_file", "")
+            })
+
+        compressed_results = []
+        for chunk_index, sentences in by_chunk.items():
+            item = dict(results[chunk_index])
+            item["text"] = join_sentences([s["text"] for s in sentences])
+            item["sentences"] = sentences
+            item["compressed"] = True
+            compressed_results.append(item)
+
+        compressed.results = compressed_results
+        compressed.sentences_kept = len(selected)
+        compressed.tokens_after = sum(estimate_tokens(r["text"]) for r in compressed_results)
+        compressed.kept = sorted(
+            (s for sentences in by_chunk.values() for s in sentences),
+            key=lambda s: s["score"],
+            reverse=True
+        )
+        compressed.elapsed_ms = (time.time() - start) * 1000
+
+        logger.info(
+            f"上下文压缩: {compressed.sentences_total} -> {compressed.sentences_kept} 句, "
+            f"{compressed.tokens_before} -> {compressed.tokens_after} tokens, "
+            f"缓存命中 {compressed.cache_hits}, 耗时 {compressed.elapsed_ms:.1f}ms"
+        )
+        return compressed
+
+    def clear_cache(self):
+        """清空句子向量缓存"""
+        with self.lock:
+            self._vectors.clear()
+
+
+# 全局上下文压缩器实例（延迟创建，复用检索器已加载的embedding模型）
+_context_compressor: Optional[ContextCompressor] = None
+_compressor_lock = Lock()
+
+
+def get_context_compressor() -> ContextCompressor:
+    """获取全局上下文压缩器实例"""
+    global _context_compressor
+    if _context_compressor is None:
+        with _compressor_lock:
+            if _context_compressor is None:
+                from services.vector.retriever import retriever
+                _context_compressor = ContextCompressor(
+                    retriever.embedding_model,
+                    max_sentences=settings.COMPRESSION_MAX_SENTENCES,
+                    min_score=settings.COMPRESSION_MIN_SCORE
+                )
+    return _context_compressor
@@ -0,0 +1,316 @@
+"""
+上下文打包器 - 在token预算内把检索结果拼装成LLM上下文
+
+处理步骤：
+1. 合并同一来源的相邻chunk（去掉切分时的重叠部分）
+2. 按句子去除重复内容（chunk重叠、多份相同段落）
+3. 按排名顺序填充，超出预算时在句子边界截断
+4. 使用本地快速估算token数（不调用tokenizer），并统计节省的token
+"""
+import re
+import math
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from services.core.logger import logger
+
+# 中日韩字符（大多数中文tokenizer约1字1token）
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+# 句子：到句末标点（含紧随的引号/括号）、英文句点+空白或行尾为止
+_SENTENCE_PATTERN = re.compile(r".+?(?:[。！？!?；;]+[」』”’\"')）]*|\.(?=\s)|$)")
+_CJK_PUNCTUATION = "。！？；，、：」』”’）"
+# 句子归一化：去掉空白和标点后比较
+_NORMALIZE_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+# 合并chunk时识别重叠的最小长度（过短的公共前后缀可能是巧合）
+_MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的token数
+
+    CJK字符按1个token计，其余字符按约4个字符1个token计。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    把文本切分成句子（保留原始标点，按行处理）
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        非空句子列表
+    """
+    return [sentence for sentence, _ in _split_units(text)]
+
+
+def join_sentences(sentences: List[str]) -> str:
+    """
+    拼接同一行中的句子（与CJK字符相邻时直接相连，其余以空格分隔）
+
+    Args:
+        sentences: 句子列表
+
+    Returns:
+        拼接后的文本
+    """
+    joined = ""
+    for sentence in sentences:
+        if joined and not _joins_directly(joined, sentence):
+            joined += " "
+        joined += sentence
+    return joined
+
+
+def _joins_directly(left: str, right: str) -> bool:
+    """两段文本相接处是否不需要空格（任一侧为CJK字符或CJK标点）"""
+    return bool(_CJK_PATTERN.match(right) or _CJK_PATTERN.match(left[-1]) or left[-1] in _CJK_PUNCTUATION)
+
+
+def _split_units(text: str) -> List[Tuple[str, bool]]:
+    """切分句子并记录每句是否位于新行开头（用于还原换行结构）"""
+    units = []
+    for line in text.splitlines():
+        first = True
+        for match in _SENTENCE_PATTERN.finditer(line):
+            sentence = match.group(0).strip()
+            if sentence:
+                units.append((sentence, first))
+                first = False
+    return units
+
+
+def _normalize_sentence(sentence: str) -> str:
+    return _NORMALIZE_PATTERN.sub("", sentence.lower())
+
+
+def _stitch(first: str, second: str, max_overlap: int) -> Optional[str]:
+    """如果first的结尾与second的开头重叠，返回拼接后的文本，否则返回None"""
+    limit = min(len(first), len(second), max_overlap)
+    for size in range(limit, _MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+@dataclass
+class PackedContext:
+    """打包结果"""
+    text: str  # 拼装好的上下文
+    sources: List[str] = field(default_factory=list)  # 实际写入的来源（按顺序）
+    tokens_before: int = 0  # 直接拼接全部chunk的估算token数
+    tokens_after: int = 0  # 打包后的估算token数
+    merged_chunks: int = 0  # 被合并进同来源块的chunk数
+    dropped_sentences: int = 0  # 去掉的重复句子数
+    truncated: bool = False  # 是否因预算截断
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_before - self.tokens_after, 0)
+
+    def stats(self) -> Dict:
+        """打包统计（用于日志和接口返回）"""
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "merged_chunks": self.merged_chunks,
+            "dropped_sentences": self.dropped_sentences,
+            "truncated": self.truncated
+        }
+
+
+class ContextPacker:
+    """按token预算打包检索结果的上下文打包器"""
+
+    def __init__(self, max_overlap: int = 200):
+        """
+        初始化打包器
+
+        Args:
+            max_overlap: 合并同来源chunk时检查的最大重叠长度（字符）
+        """
+        self.max_overlap = max_overlap
+        self.lock = Lock()
+        self._requests = 0
+        self._tokens_before = 0
+        self._tokens_saved = 0
+
+    def _group_by_source(self, results: List[Dict]) -> List[Dict]:
+        """
+        合并同来源中首尾重叠的chunk（切分时的chunk_overlap）
+
+        合并后的块位置取其中排名最高的chunk；不能拼接的chunk保持自己的排名位置。
+        """
+        blocks: List[Dict] = []
+        by_source: Dict[str, List[Dict]] = {}
+        for result in results:
+            text = (result.get("text") or "").strip()
+            if not text:
+                continue
+            source = result.get("source_file") or ""
+            for block in by_source.get(source, []):
+                stitched = _stitch(block["text"], text, self.max_overlap) or _stitch(text, block["text"], self.max_overlap)
+                if stitched is not None:
+                    block["text"] = stitched
+                    block["merged"] = block.get("merged", 0) + 1
+                    break
+            else:
+                block = {"source": source, "text": text}
+                blocks.append(block)
+                if source:
+                    by_source.setdefault(source, []).append(block)
+        return blocks
+
+    def pack(
+        self,
+        results: List[Dict],
+        max_tokens: int,
+        label_format: str = "{text}",
+        separator: str = "\n\n"
+    ) -> PackedContext:
+        """
+        在token预算内打包检索结果
+
+        Args:
+            results: 已按相关性排序的检索结果（包含text，可选source_file）
+            max_tokens: token预算
+            label_format: 每个块的格式，可使用 {index}、{source} 和 {text}
+            separator: 块之间的分隔符
+
+        Returns:
+            PackedContext 打包结果
+        """
+        texts = [r.get("text") or "" for r in results]
+        packed = PackedContext(text="", tokens_before=estimate_tokens(separator.join(t for t in texts if t)))
+
+        blocks = self._group_by_source(results)
+        packed.merged_chunks = sum(block.get("merged", 0) for block in blocks)
+
+        seen_sentences = set()
+        separator_tokens = estimate_tokens(separator)
+        remaining = max_tokens
+        output: List[str] = []
+
+        for block in blocks:
+            # 去除重复句子
+            sentences = []
+            for sentence, new_line in _split_units(block["text"]):
+                key = _normalize_sentence(sentence)
+                if not key:
+                    continue
+                if key in seen_sentences:
+                    packed.dropped_sentences += 1
+                    continue
+                seen_sentences.add(key)
+                sentences.append((sentence, new_line))
+            if not sentences:
+                continue
+
+            index = len(output) + 1
+            overhead = estimate_tokens(label_format.format(index=index, source=block["source"], text=""))
+            if output:
+                overhead += separator_tokens
+            budget = remaining - overhead
+            if budget <= 0:
+                packed.truncated = True
+                break
+
+            # 在句子边界截断（按原文换行结构恢复）
+            kept, used = [], 0
+            for unit in sentences:
+                cost = estimate_tokens(unit[0]) + 1
+                if used + cost > budget:
+                    packed.truncated = True
+                    break
+                kept.append(unit)
+                used += cost
+
+            if not kept:
+                if output:
+                    break
+                # 首个句子就超出预算（长段落无标点），按字符硬截断
+                kept = [(self._hard_truncate(sentences[0][0], budget), True)]
+                used = estimate_tokens(kept[0][0])
+                packed.truncated = True
+
+            output.append(label_format.format(index=index, source=block["source"], text=self._join_sentences(kept)))
+            packed.sources.append(block["source"])
+            remaining -= used + overhead
+            if packed.truncated:
+                break
+
+        packed.text = separator.join(output)
+        packed.tokens_after = estimate_tokens(packed.text)
+
+        with self.lock:
+            self._requests += 1
+            self._tokens_before += packed.tokens_before
+            self._tokens_saved += packed.tokens_saved
+
+        if packed.tokens_saved:
+            logger.info(
+                f"上下文打包: {packed.tokens_before} -> {packed.tokens_after} tokens "
+                f"(节省 {packed.tokens_saved}, 合并 {packed.merged_chunks} 个chunk, "
+                f"去重 {packed.dropped_sentences} 句{', 已截断' if packed.truncated else ''})"
+            )
+        return packed
+
+    @staticmethod
+    def _join_sentences(units: List[Tuple[str, bool]]) -> str:
+        """拼接句子：保留原有换行，同行的CJK句子直接相连，其余以空格分隔"""
+        joined = units[0][0]
+        for sentence, new_line in units[1:]:
+            if new_line:
+                joined += "\n" + sentence
+            elif _joins_directly(joined, sentence):
+                joined += sentence
+            else:
+                joined += " " + sentence
+        return joined
+
+    @staticmethod
+    def _hard_truncate(text: str, max_tokens: int) -> str:
+        """按字符截断到预算以内"""
+        if max_tokens <= 0:
+            return ""
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if estimate_tokens(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+    def stats(self) -> Dict:
+        """累计统计"""
+        with self.lock:
+            return {
+                "requests": self._requests,
+                "tokens_before": self._tokens_before,
+                "tokens_saved": self._tokens_saved,
+                "saved_ratio": f"{self._tokens_saved / self._tokens_before * 100:.1f}%" if self._tokens_before else "0.0%"
+            }
+
+
+# 全局上下文打包器实例
+_context_packer = ContextPacker()
+
+
+def get_context_packer() -> ContextPacker:
+    """获取全局上下文打包器实例"""
+    return _context_packer
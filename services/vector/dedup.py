@@ -0,0 +1,263 @@
+"""
+近似重复检测模块 - 基于SimHash签名和LSH分桶索引
+用于索引时拒绝/关联近似重复的chunk，以及查询时基于签名去重
+
+原理：
+1. SimHash：把文本特征（相邻token的bigram；空格分词的文字按词，中日文、泰文等不用空格的文字按字符）
+   哈希后按位加权投票，得到64位指纹，相似文本的指纹汉明距离很小。
+   提取不到特征的文本（空文本、纯标点）没有指纹（NO_FINGERPRINT），不参与判重
+2. LSH分桶：把64位指纹切成 (threshold + 1) 段，由鸽巢原理，
+   汉明距离 <= threshold 的两个指纹至少有一段完全相同，只需比较同桶候选
+"""
+import re
+import hashlib
+from collections import Counter
+from threading import Lock
+from typing import Dict, List, Optional, Set, Tuple
+from services.core.logger import logger
+
+SIMHASH_BITS = 64
+_UINT64_MASK = (1 << SIMHASH_BITS) - 1
+
+# 没有指纹（提取不到特征）；Milvus中存储为0，读取时视为缺失
+NO_FINGERPRINT = 0
+
+# 不用空格分词的文字：日文假名、中日韩汉字、泰文、老挝文、缅甸文、高棉文（每个字符单独成token）
+_UNSPACED_CHARS = (
+    "\u3040-\u30ff\u31f0-\u31ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+    "\u0e00-\u0e7f\u0e80-\u0eff\u1000-\u109f\u1780-\u17ff"
+)
+# 其余文字（拉丁、西里尔、希腊、阿拉伯、韩文等）按Unicode词切分（字母/数字连续段，不含下划线）
+_TOKEN_PATTERN = re.compile(f"[{_UNSPACED_CHARS}]|[^\\W_{_UNSPACED_CHARS}]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """把文本切成token（Unicode词 + 不用空格分词的文字的单个字符）"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _features(text: str) -> Counter:
+    """提取SimHash特征：相邻token组成的bigram（文本过短时退化为unigram）"""
+    tokens = _tokenize(text)
+    if len(tokens) < 2:
+        return Counter(tokens)
+    return Counter(f"{tokens[i]} {tokens[i + 1]}" for i in range(len(tokens) - 1))
+
+
+def _hash64(feature: str) -> int:
+    """稳定的64位特征哈希（不受PYTHONHASHSEED影响）"""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def compute_simhash(text: str) -> int:
+    """
+    计算文本的64位SimHash指纹
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        无符号64位整数指纹；提取不到特征时返回 NO_FINGERPRINT
+    """
+    features = _features(text or "")
+    if not features:
+        return NO_FINGERPRINT
+
+    weights = [0] * SIMHASH_BITS
+    for feature, count in features.items():
+        h = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            if (h >> bit) & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个指纹的汉明距离"""
+    return bin((a ^ b) & _UINT64_MASK).count("1")
+
+
+def to_signed_int64(fingerprint: int) -> int:
+    """无符号指纹 -> Milvus INT64字段可存储的有符号整数"""
+    fingerprint &= _UINT64_MASK
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >= (1 << 63) else fingerprint
+
+
+def from_signed_int64(value: int) -> int:
+    """Milvus INT64字段中读取的有符号整数 -> 无符号指纹"""
+    return int(value) & _UINT64_MASK
+
+
+def get_result_simhash(result: Dict) -> int:
+    """获取检索结果的指纹（优先使用索引时存储的simhash字段，否则现场计算；可能为NO_FINGERPRINT）"""
+    stored = result.get("simhash")
+    if stored not in (None, "", NO_FINGERPRINT):
+        return from_signed_int64(stored)
+    return compute_simhash(result.get("text", ""))
+
+
+class NearDuplicateIndex:
+    """SimHash + LSH分桶的近似重复索引"""
+
+    def __init__(self, threshold: int = 3):
+        """
+        初始化索引
+
+        Args:
+            threshold: 汉明距离阈值，<= 该值视为近似重复（64位指纹下3约等于90%+相似）
+        """
+        self.threshold = threshold
+        self.num_bands = threshold + 1
+        band_width = SIMHASH_BITS // self.num_bands
+        # 每段的(起始位, 位宽)，最后一段吸收余数
+        self._bands: List[Tuple[int, int]] = []
+        for i in range(self.num_bands):
+            start = i * band_width
+            width = band_width if i < self.num_bands - 1 else SIMHASH_BITS - start
+            self._bands.append((start, width))
+
+        self._tables: List[Dict[int, Set[str]]] = [dict() for _ in range(self.num_bands)]
+        self._fingerprints: Dict[str, int] = {}
+        self._links: Dict[str, str] = {}  # 重复chunk -> 规范chunk
+        self.lock = Lock()
+
+    def _band_values(self, fingerprint: int) -> List[int]:
+        return [(fingerprint >> start) & ((1 << width) - 1) for start, width in self._bands]
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def add(self, key: str, fingerprint: int):
+        """把指纹加入索引（NO_FINGERPRINT不加入）"""
+        if fingerprint == NO_FINGERPRINT:
+            return
+        with self.lock:
+            self._fingerprints[key] = fingerprint
+            for table, value in zip(self._tables, self._band_values(fingerprint)):
+                table.setdefault(value, set()).add(key)
+
+    def find_duplicate(self, fingerprint: int) -> Optional[str]:
+        """
+        查找近似重复的已索引chunk
+
+        Args:
+            fingerprint: 待检测的指纹
+
+        Returns:
+            最相近的已索引chunk的key，没有（或fingerprint为NO_FINGERPRINT）时返回None
+        """
+        if fingerprint == NO_FINGERPRINT:
+            return None
+        best_key, best_distance = None, self.threshold + 1
+        with self.lock:
+            candidates: Set[str] = set()
+            for table, value in zip(self._tables, self._band_values(fingerprint)):
+                candidates.update(table.get(value, ()))
+            for key in candidates:
+                distance = hamming_distance(fingerprint, self._fingerprints[key])
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+    def link(self, duplicate_key: str, canonical_key: str):
+        """记录重复chunk与规范chunk的关联"""
+        with self.lock:
+            self._links[duplicate_key] = canonical_key
+
+    def remove_prefix(self, prefix: str) -> int:
+        """
+        删除key以prefix开头的所有指纹（文件删除/重新索引时使用）
+
+        指向被删除chunk的关联一并移除：关联的重复chunk仍在索引中，之后由它作为规范chunk参与判重
+        """
+        with self.lock:
+            keys = [k for k in self._fingerprints if k.startswith(prefix)]
+            for key in keys:
+                fingerprint = self._fingerprints.pop(key)
+                for table, value in zip(self._tables, self._band_values(fingerprint)):
+                    bucket = table.get(value)
+                    if bucket:
+                        bucket.discard(key)
+                        if not bucket:
+                            del table[value]
+                self._links.pop(key, None)
+            if keys:
+                removed = set(keys)
+                for duplicate_key in [k for k, canonical in self._links.items() if canonical in removed]:
+                    del self._links[duplicate_key]
+        return len(keys)
+
+    def clear(self):
+        """清空索引"""
+        with self.lock:
+            for table in self._tables:
+                table.clear()
+            self._fingerprints.clear()
+            self._links.clear()
+
+    def stats(self) -> Dict:
+        """索引统计信息"""
+        return {
+            "fingerprints": len(self._fingerprints),
+            "linked_duplicates": len(self._links),
+            "threshold": self.threshold,
+            "bands": self.num_bands
+        }
+
+
+def dedup_results(results: List[Dict], threshold: int = 3) -> List[Dict]:
+    """
+    基于SimHash签名对检索结果去重（保留排名靠前的结果；没有指纹的结果总是保留）
+
+    Args:
+        results: 已排序的检索结果列表
+        threshold: 汉明距离阈值
+
+    Returns:
+        去重后的结果列表
+    """
+    kept: List[Dict] = []
+    kept_fingerprints: List[int] = []
+    for result in results:
+        fingerprint = get_result_simhash(result)
+        if fingerprint != NO_FINGERPRINT:
+            if any(hamming_distance(fingerprint, f) <= threshold for f in kept_fingerprints):
+                continue
+            kept_fingerprints.append(fingerprint)
+        kept.append(result)
+    return kept
+
+
+# 全局近似重复索引（延迟从Milvus加载）
+_near_duplicate_index: Optional[NearDuplicateIndex] = None
+_index_lock = Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """获取全局近似重复索引实例（首次调用时从Milvus加载已存储的指纹）"""
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        with _index_lock:
+            if _near_duplicate_index is None:
+                from services.core.config import settings
+                index = NearDuplicateIndex(threshold=settings.DEDUP_HAMMING_THRESHOLD)
+                try:
+                    from services.vector.milvus_client import milvus_client
+                    loaded = 0
+                    for key, value in milvus_client.iter_simhashes():
+                        if value in (None, NO_FINGERPRINT):
+                            continue
+                        index.add(key, from_signed_int64(value))
+                        loaded += 1
+                    logger.info(f"近似重复索引已加载: {loaded} 个指纹")
+                except Exception as e:
+                    logger.warning(f"从Milvus加载近似重复索引失败，使用空索引: {e}")
+                _near_duplicate_index = index
+    return _near_duplicate_index
@@ -4,7 +4,9 @@
 """
 from typing import List, Dict
 from datetime import datetime
+from services.core.config import settings
 from services.core.logger import logger
+from services.vector.dedup import NO_FINGERPRINT, get_result_simhash, hamming_distance
 
 
 class ResultFilter:
@@ -15,7 +17,8 @@ class ResultFilter:
         min_credibility: float = 0.3,
         max_age_days: int = 365,
         min_text_length: int = 50,
-        remove_duplicates: bool = True
+        remove_duplicates: bool = True,
+        dedup_threshold: int = 3
     ):
         """
         初始化过滤器
@@ -25,11 +28,13 @@ class ResultFilter:
             max_age_days: 对于时效性查询，超过此天数的结果会被降权（默认365天）
             min_text_length: 最小文本长度（字符数）
             remove_duplicates: 是否移除重复结果
+            dedup_threshold: SimHash汉明距离阈值，<= 该值视为近似重复
         """
         self.min_credibility = min_credibility
         self.max_age_days = max_age_days
         self.min_text_length = min_text_length
         self.remove_duplicates = remove_duplicates
+        self.dedup_threshold = dedup_threshold
         logger.info(f"初始化结果过滤器: min_credibility={min_credibility}, max_age_days={max_age_days}")
     
     def _get_credibility_score(self, result: Dict) -> float:
@@ -183,7 +188,7 @@ class ResultFilter:
             return results
         
         filtered_results = []
-        seen_texts = set()  # 用于去重
+        seen_fingerprints = []  # 已保留结果的SimHash指纹，用于去重
         
         for result in results:
             # 1. 质量过滤：检查文本长度
@@ -212,13 +217,14 @@ class ResultFilter:
                     logger.debug(f"过滤过时结果（时效性查询）: freshness={freshness:.2f}")
                     continue
             
-            # 4. 去重
+            # 4. 去重（基于SimHash签名，同时覆盖完全重复和近似重复）
             if self.remove_duplicates:
-                text_normalized = result.get("text", "").lower().strip()[:100]  # 取前100字符用于去重
-                if text_normalized in seen_texts:
-                    logger.debug("过滤重复结果")
-                    continue
-                seen_texts.add(text_normalized)
+                fingerprint = get_result_simhash(result)
+                if fingerprint != NO_FINGERPRINT:
+                    if any(hamming_distance(fingerprint, seen) <= self.dedup_threshold for seen in seen_fingerprints):
+                        logger.debug("过滤重复结果")
+                        continue
+                    seen_fingerprints.append(fingerprint)
             
             filtered_results.append(result)
         
@@ -227,7 +233,7 @@ class ResultFilter:
 
 
 # 全局过滤器实例
-_result_filter = ResultFilter()
+_result_filter = ResultFilter(dedup_threshold=settings.DEDUP_HAMMING_THRESHOLD)
 
 
 def get_result_filter() -> ResultFilter:
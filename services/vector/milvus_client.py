@@ -2,7 +2,7 @@
 Milvus客户端 - 封装Milvus连接和操作
 """
 from pymilvus import connections, Collection, utility
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple
 from services.core.config import settings
 from services.core.logger import logger
 from sentence_transformers import SentenceTransformer
@@ -64,6 +64,8 @@ class MilvusClient:
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=5000),
             FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=dimension),
             FieldSchema(name="source_file", dtype=DataType.VARCHAR, max_length=500),
+            FieldSchema(name="simhash", dtype=DataType.INT64),  # 近似重复检测指纹
+            FieldSchema(name="page", dtype=DataType.INT64),  # PDF页码（0表示无页码）
         ]
         
         schema = CollectionSchema(fields, "知识库集合")
@@ -84,8 +86,28 @@ class MilvusClient:
         
         logger.info(f"集合 {self.collection_name} 创建成功")
     
+    def _has_field(self, collection: Collection, field_name: str) -> bool:
+        """检查集合schema中是否包含某字段（兼容旧版集合）"""
+        return field_name in [field.name for field in collection.schema.fields]
+    
+    def _build_columns(self, collection: Collection, texts: List[str], vectors: List[List[float]],
+                       source_files: List[str], simhashes: Optional[List[int]] = None,
+                       pages: Optional[List[int]] = None) -> List[List]:
+        """按集合schema构建列式插入数据（有simhash/page字段时附带指纹列/页码列）"""
+        data = [texts, vectors, source_files]
+        if self._has_field(collection, "simhash"):
+            from services.vector.dedup import compute_simhash, to_signed_int64
+            if simhashes is None:
+                simhashes = [compute_simhash(text) for text in texts]
+            data.append([to_signed_int64(h) for h in simhashes])
+        if self._has_field(collection, "page"):
+            data.append(pages if pages is not None else [0] * len(texts))
+        return data
+    
     def insert(self, texts: List[str], vectors: List[List[float]], 
-               source_files: List[str], auto_flush: bool = True) -> bool:
+               source_files: List[str], auto_flush: bool = True,
+               simhashes: Optional[List[int]] = None,
+               pages: Optional[List[int]] = None) -> bool:
         """
         批量插入数据到Milvus
         
@@ -94,6 +116,8 @@ class MilvusClient:
             vectors: 向量列表
             source_files: 源文件列表
             auto_flush: 是否自动flush（批量插入时建议设为False，最后统一flush）
+            simhashes: 可选的SimHash指纹列表（集合包含simhash字段时写入，未提供则自动计算）
+            pages: 可选的页码列表（集合包含page字段时写入，未提供则为0）
             
         Returns:
             是否插入成功
@@ -124,11 +148,7 @@ class MilvusClient:
                 if "already loaded" not in str(load_err).lower() and "is loaded" not in str(load_err).lower():
                     logger.debug(f"集合加载状态: {load_err}")
             
-            data = [
-                texts,
-                vectors,
-                source_files
-            ]
+            data = self._build_columns(collection, texts, vectors, source_files, simhashes, pages)
             
             # 插入数据（不立即flush，避免channel问题）
             collection.insert(data)
@@ -211,12 +231,31 @@ class MilvusClient:
         vector = self._embedding_model.encode([text])[0].tolist()
         return vector
     
-    def insert_data(self, data_list: List[Dict]):
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量获取文本的向量表示（一次前向计算多个文本，比逐条调用get_embedding快）
+        
+        Args:
+            texts: 输入文本列表
+            
+        Returns:
+            向量列表（与输入顺序一致）
+        """
+        if not texts:
+            return []
+        if self._embedding_model is None:
+            logger.info(f"正在加载embedding模型: {settings.EMBEDDING_MODEL}")
+            self._embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        
+        return [vector.tolist() for vector in self._embedding_model.encode(texts)]
+    
+    def insert_data(self, data_list: List[Dict], auto_flush: bool = True):
         """
         插入数据到Milvus（支持灵活的字段）
         
         Args:
             data_list: 数据列表，每个元素包含vector和其他字段
+            auto_flush: 是否插入后立即flush（分批写入同一文件时只在最后一批flush）
         """
         if not self.connected:
             self.connect()
@@ -231,20 +270,19 @@ class MilvusClient:
             source_files = [item.get("source_file", "unknown") for item in data_list]
             file_ids = [item.get("file_id", "") for item in data_list]
             file_types = [item.get("file_type", "") for item in data_list]
+            simhashes = [item["simhash"] for item in data_list] if all("simhash" in item for item in data_list) else None
+            pages = [item.get("page") or 0 for item in data_list]
             
             # 检查集合schema是否需要更新（添加file_id和file_type字段）
             # 注意：如果schema已更改，需要重新创建collection
             # 这里使用简单的插入方法，file_id和file_type作为source_file的一部分
             
             # 构建数据（兼容现有schema）
-            data = [
-                texts,
-                vectors,
-                source_files
-            ]
+            data = self._build_columns(collection, texts, vectors, source_files, simhashes, pages)
             
             collection.insert(data)
-            collection.flush()
+            if auto_flush:
+                collection.flush()
             logger.info(f"成功插入 {len(texts)} 条数据")
         except Exception as e:
             logger.error(f"插入数据失败: {e}")
@@ -295,7 +333,7 @@ class MilvusClient:
             output_fields = ["text", "source_file"]
             
             # 添加可选字段（如果存在）
-            optional_fields = ["file_id", "file_type", "uploaded_at"]
+            optional_fields = ["file_id", "file_type", "uploaded_at", "simhash", "page"]
             for field in optional_fields:
                 if field in schema_fields:
                     output_fields.append(field)
@@ -330,6 +368,98 @@ class MilvusClient:
             logger.error(f"搜索失败: {e}")
             return []
     
+    def iter_simhashes(self, batch_size: int = 1000) -> Iterator[Tuple[str, int]]:
+        """
+        遍历集合中已存储的SimHash指纹（用于重建近似重复索引）
+        
+        Args:
+            batch_size: 每批读取的条数
+            
+        Yields:
+            ("source_file#c序号", simhash) 元组，序号为chunk在该文件中按主键顺序的位置
+            （与 FileIndexer 索引时使用的key一致）
+        """
+        if not self.connected:
+            self.connect()
+        
+        if not utility.has_collection(self.collection_name):
+            return
+        
+        collection = Collection(self.collection_name)
+        if not self._has_field(collection, "simhash"):
+            logger.info("集合没有simhash字段（旧版schema），跳过指纹加载")
+            return
+        collection.load()
+        
+        iterator = collection.query_iterator(
+            batch_size=batch_size,
+            expr="id >= 0",
+            output_fields=["source_file", "simhash"]
+        )
+        # query_iterator按主键升序返回；同一文件的chunk按写入顺序编号
+        ordinals: Dict[str, int] = {}
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    source_file = row.get("source_file")
+                    ordinal = ordinals.get(source_file, 0)
+                    ordinals[source_file] = ordinal + 1
+                    yield f"{source_file}#c{ordinal}", row.get("simhash", 0)
+        finally:
+            iterator.close()
+    
+    def iter_source_files(self, expr: str = "id >= 0", batch_size: int = 1000) -> Iterator[Tuple[str, int]]:
+        """
+        遍历集合中每个chunk的来源（用于从向量集合重建文件目录）
+        
+        Args:
+            expr: 过滤表达式
+            batch_size: 每批读取的条数
+            
+        Yields:
+            (source_file, 页码) 元组（旧版集合没有page字段时页码为0）
+        """
+        if not self.connected:
+            self.connect()
+        
+        if not utility.has_collection(self.collection_name):
+            return
+        
+        collection = Collection(self.collection_name)
+        has_page = self._has_field(collection, "page")
+        collection.load()
+        
+        iterator = collection.query_iterator(
+            batch_size=batch_size,
+            expr=expr,
+            output_fields=["source_file", "page"] if has_page else ["source_file"]
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    yield row.get("source_file", ""), row.get("page", 0) or 0
+        finally:
+            iterator.close()
+    
+    def delete_by_source_file(self, source_file: str):
+        """
+        删除某个来源的所有chunk（重新索引文件、删除文件时调用）
+        
+        Args:
+            source_file: source_file字段的完整值
+        """
+        if not self.connected:
+            self.connect()
+        
+        escaped = source_file.replace("\\", "\\\\").replace('"', '\\"')
+        Collection(self.collection_name).delete(expr=f'source_file == "{escaped}"')
+    
     def get_collection_stats(self) -> Optional[Dict]:
         """获取集合统计信息"""
         if not self.connected:
@@ -1,7 +1,7 @@
 """
 检索器 - 实现RAG的核心检索逻辑（集成Reranker和缓存，支持多语言）
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 from services.core.config import settings
 from services.vector.milvus_client import milvus_client
@@ -9,7 +9,11 @@ from services.vector.reranker import reranker
 from services.core.logger import logger
 from services.core.cache import get_query_cache, get_embedding_cache, _generate_cache_key
 from services.vector.filter import get_result_filter
+from services.vector.dedup import dedup_results
+from services.vector.context_packer import get_context_packer
+from services.vector.context_compressor import get_context_compressor
 from services.core.language_detector import get_language_detector
+from services.core.executors import get_executor
 
 
 class Retriever:
@@ -103,10 +107,19 @@ class Retriever:
         
         results = milvus_client.search_vectors(query_vector, top_k=initial_k)
         
+        # 基于SimHash签名去除近似重复的候选，避免重复chunk占用rerank预算和top-k名额
+        if settings.DEDUP_ENABLED and results:
+            deduped = dedup_results(results, threshold=settings.DEDUP_HAMMING_THRESHOLD)
+            if len(deduped) < len(results):
+                logger.debug(f"候选去重: {len(results)} -> {len(deduped)}")
+            results = deduped
+        
         # 如果启用Reranker且模型可用，进行高级重排序（credibility + freshness）
         if use_reranker and reranker.is_available() and results:
             logger.debug(f"使用高级Reranker对 {len(results)} 个结果进行重排序（credibility + freshness）")
-            results = reranker.rerank(
+            # 在rerank池中执行，限制同时运行的Cross-Encoder数量
+            results = get_executor("rerank").run_sync(
+                reranker.rerank,
                 query_text, 
                 results, 
                 top_k=top_k,
@@ -147,19 +160,30 @@ class Retriever:
         query_lower = query_text.lower()
         return any(kw in query_lower for kw in realtime_keywords)
     
-    def get_context(self, query_text: str, top_k: int = None) -> str:
+    def get_context(self, query_text: str, top_k: int = None, max_tokens: int = None) -> str:
         """
         获取检索到的上下文文本（拼接后的字符串）
         
         Args:
             query_text: 查询文本
             top_k: 返回最相关的k个文档
+            max_tokens: 上下文token预算，默认使用配置值
             
         Returns:
             拼接后的上下文文本
         """
         results = self.search(query_text, top_k)
         
+        if settings.CONTEXT_PACKING_ENABLED or settings.CONTEXT_COMPRESSION_ENABLED:
+            context, _ = self.build_context(
+                query_text,
+                results,
+                max_tokens=max_tokens,
+                label_format="[文档{index}]\n{text}\n",
+                separator="\n"
+            )
+            return context
+        
         # 拼接所有检索到的文本
         context_parts = []
         for i, result in enumerate(results, 1):
@@ -167,6 +191,56 @@ class Retriever:
         
         context = "\n".join(context_parts)
         return context
+    
+    def build_context(
+        self,
+        query_text: str,
+        results: List[Dict],
+        max_tokens: int = None,
+        label_format: str = "{text}",
+        separator: str = "\n\n"
+    ) -> Tuple[str, Optional[Dict]]:
+        """
+        把检索结果构建成LLM上下文（可选句子级压缩 + token预算打包）
+        
+        Args:
+            query_text: 查询文本（用于句子相关性打分）
+            results: 已排序的检索结果
+            max_tokens: 上下文token预算，默认使用配置值
+            label_format: 每个块的格式，可使用 {index}、{source} 和 {text}
+            separator: 块之间的分隔符
+            
+        Returns:
+            (上下文文本, 统计信息)，统计信息包含打包和压缩的token变化
+        """
+        stats: Dict = {}
+        if settings.CONTEXT_COMPRESSION_ENABLED and results:
+            try:
+                compressed = get_context_compressor().compress(query_text, results)
+                results = compressed.results
+                stats["compression"] = compressed.stats()
+            except Exception as e:
+                logger.warning(f"上下文压缩失败，使用原始检索结果: {e}")
+        
+        if settings.CONTEXT_PACKING_ENABLED:
+            packed = get_context_packer().pack(
+                results,
+                max_tokens or settings.CONTEXT_TOKEN_BUDGET,
+                label_format=label_format,
+                separator=separator
+            )
+            stats.update(packed.stats())
+            if "compression" in stats:
+                # 节省量以压缩前的原始chunk为基准
+                stats["tokens_before"] = stats["compression"]["tokens_before"]
+                stats["tokens_saved"] = max(stats["tokens_before"] - stats["tokens_after"], 0)
+            return packed.text, stats
+        
+        context = separator.join(
+            label_format.format(index=i, source=r.get("source_file", ""), text=r["text"])
+            for i, r in enumerate(results, 1)
+        )
+        return context, stats or None
 
 
 # 全局检索器实例
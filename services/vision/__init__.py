@@ -4,11 +4,17 @@
 """
 from .image_processor import ImageProcessor, get_image_processor
 from .image_history import ImageHistoryManager, get_image_history
+from .ocr_pipeline import OCRPipeline, OCRResultCache, get_ocr_pipeline, get_ocr_cache, image_content_hash
 
 __all__ = [
     'ImageProcessor',
     'get_image_processor',
     'ImageHistoryManager',
-    'get_image_history'
+    'get_image_history',
+    'OCRPipeline',
+    'OCRResultCache',
+    'get_ocr_pipeline',
+    'get_ocr_cache',
+    'image_content_hash'
 ]
 
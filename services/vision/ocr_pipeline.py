@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片OCR流水线
+解码一次 -> prepare_for_ocr预处理 -> 大图切成重叠的横向条带并发识别 -> 按阅读顺序拼接，
+结果按内容哈希缓存（重复上传、多模态OCR请求同一张图片时直接返回）
+"""
+import hashlib
+import io
+import re
+import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from PIL import Image
+from services.core.config import settings
+from services.core.logger import logger
+from services.vision.image_processor import get_image_processor
+
+# OCR依赖可选，如果没有安装pytesseract，本地OCR功能将被禁用
+try:
+    import pytesseract
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+# 中日韩字符（相邻的CJK词之间不加空格）
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+
+
+def image_content_hash(image_data: Union[bytes, str]) -> str:
+    """
+    计算图片内容哈希（缓存键）
+
+    Args:
+        image_data: 原始图片字节，或Base64编码的图片（可能包含data URL前缀）
+
+    Returns:
+        SHA-256十六进制字符串
+    """
+    if isinstance(image_data, str):
+        if 'base64,' in image_data:
+            image_data = image_data.split('base64,')[1]
+        image_data = base64.b64decode(image_data)
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class OCRResultCache:
+    """OCR结果LRU缓存（键为 识别引擎 + 图片内容哈希）"""
+
+    def __init__(self, max_entries: int = 512):
+        """
+        Args:
+            max_entries: 最多缓存的结果数
+        """
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, engine: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """获取缓存结果（返回副本，未命中返回None）"""
+        key = f"{engine}:{content_hash}"
+        with self.lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, engine: str, content_hash: str, result: Dict[str, Any]):
+        """写入结果"""
+        key = f"{engine}:{content_hash}"
+        with self.lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, engine: str, content_hash: str,
+                       compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        命中时返回缓存结果，否则调用compute并缓存（带error字段的结果不缓存）
+
+        Args:
+            engine: 识别引擎标识（如 tesseract:chi_sim+eng、doubao:模型名）
+            content_hash: 图片内容哈希
+            compute: 实际执行OCR的函数
+        """
+        cached = self.get(engine, content_hash)
+        if cached is not None:
+            return cached
+        result = compute()
+        if not result.get("error"):
+            self.put(engine, content_hash, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+
+def _join_words(words: List[str]) -> str:
+    """拼接一行中的词（CJK词之间不加空格）"""
+    line = ""
+    for word in words:
+        if line and not (_CJK_RE.match(line[-1]) and _CJK_RE.match(word[0])):
+            line += " "
+        line += word
+    return line
+
+
+class OCRPipeline:
+    """图片OCR流水线（本地Tesseract）"""
+
+    def __init__(self, lang: str = "chi_sim+eng", workers: int = 4,
+                 tile_height: int = 1600, tile_overlap: int = 100,
+                 cache: Optional[OCRResultCache] = None):
+        """
+        Args:
+            lang: Tesseract语言
+            workers: 并发识别的条带数
+            tile_height: 条带高度（像素，不含重叠），高度不超过 tile_height + tile_overlap 的图片整体识别
+            tile_overlap: 相邻条带上下各扩展的像素数，需大于一行文字的高度
+            cache: OCR结果缓存（默认新建一个512条的缓存）
+        """
+        self.lang = lang
+        self.workers = workers
+        self.tile_height = tile_height
+        self.tile_overlap = tile_overlap
+        self.cache = cache or OCRResultCache()
+        # Tesseract在独立进程中运行（pytesseract每次调用启动一个tesseract进程），
+        # 线程只负责等待，线程池即可让多个条带同时占用多个核
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+
+    @property
+    def engine(self) -> str:
+        return f"tesseract:{self.lang}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr-tile")
+            return self._executor
+
+    def ocr_file(self, file_path: str) -> Dict[str, Any]:
+        """
+        识别图片文件中的文字
+
+        Args:
+            file_path: 图片路径
+
+        Returns:
+            {"text": 识别文本, "metadata": {...}}
+        """
+        with open(file_path, 'rb') as f:
+            return self.ocr_bytes(f.read())
+
+    def ocr_bytes(self, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        识别图片字节中的文字（按内容哈希缓存）
+
+        Args:
+            image_bytes: 原始图片字节
+
+        Returns:
+            {"text": 识别文本, "metadata": {...}}，metadata.cached 表示是否命中缓存
+        """
+        content_hash = image_content_hash(image_bytes)
+        cached = self.cache.get(self.engine, content_hash)
+        if cached is not None:
+            cached["metadata"] = dict(cached["metadata"], cached=True)
+            return cached
+
+        # 只解码一次
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        image_size, image_mode = image.size, image.mode
+        prepared = get_image_processor().prepare_for_ocr(image)
+
+        text, tiles, confidence = self._ocr_image(prepared)
+        result = {
+            "text": text,
+            "metadata": {
+                "image_size": image_size,
+                "image_mode": image_mode,
+                "char_count": len(text),
+                "tiles": tiles,
+                "content_hash": content_hash,
+                "cached": False
+            }
+        }
+        if confidence is not None:
+            result["metadata"]["confidence"] = confidence
+        self.cache.put(self.engine, content_hash, result)
+        return result
+
+    def _strip_bounds(self, height: int) -> List[Tuple[int, int, int, int]]:
+        """
+        计算条带范围
+
+        Returns:
+            [(裁剪上边界, 裁剪下边界, 归属上边界, 归属下边界), ...]，
+            中心点落在归属范围内的文字行属于该条带
+        """
+        bounds = []
+        for core_top in range(0, height, self.tile_height):
+            core_bottom = min(core_top + self.tile_height, height)
+            bounds.append((
+                max(core_top - self.tile_overlap, 0),
+                min(core_bottom + self.tile_overlap, height),
+                core_top,
+                core_bottom
+            ))
+        return bounds
+
+    def _ocr_image(self, image: Image.Image) -> Tuple[str, int, Optional[float]]:
+        """
+        识别预处理后的图片
+
+        Returns:
+            (文本, 条带数, 平均置信度（整体识别时为None）)
+        """
+        width, height = image.size
+        if height <= self.tile_height + self.tile_overlap:
+            return pytesseract.image_to_string(image, lang=self.lang).strip(), 1, None
+
+        bounds = self._strip_bounds(height)
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._ocr_strip, image.crop((0, top, width, bottom)), top, core_top, core_bottom)
+            for top, bottom, core_top, core_bottom in bounds
+        ]
+        # 按条带从上到下的顺序拼接
+        paragraphs, confidences = [], []
+        for future in futures:
+            strip_paragraphs, strip_confidences = future.result()
+            paragraphs.extend(strip_paragraphs)
+            confidences.extend(strip_confidences)
+
+        text = "\n\n".join("\n".join(lines) for lines in paragraphs)
+        confidence = round(sum(confidences) / len(confidences), 1) if confidences else None
+        logger.info(f"分块OCR完成: {len(bounds)} 个条带, {len(text)} 字符")
+        return text, len(bounds), confidence
+
+    def _ocr_strip(self, strip: Image.Image, offset: int,
+                   core_top: int, core_bottom: int) -> Tuple[List[List[str]], List[float]]:
+        """
+        识别一个条带，只保留中心点在归属范围内的行（重叠区域的行只归属一个条带）
+
+        Returns:
+            (段落列表（每段为行列表）, 词置信度列表)
+        """
+        data = pytesseract.image_to_data(strip, lang=self.lang, output_type=pytesseract.Output.DICT)
+        lines: "OrderedDict[Tuple[int, int, int], Dict[str, Any]]" = OrderedDict()
+        for i, word in enumerate(data["text"]):
+            word = word.strip()
+            if not word:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            top = data["top"][i] + offset
+            bottom = top + data["height"][i]
+            line = lines.setdefault(key, {"words": [], "top": top, "bottom": bottom, "confs": []})
+            line["words"].append(word)
+            line["top"] = min(line["top"], top)
+            line["bottom"] = max(line["bottom"], bottom)
+            conf = float(data["conf"][i])
+            if conf >= 0:
+                line["confs"].append(conf)
+
+        paragraphs: List[List[str]] = []
+        confidences: List[float] = []
+        current_paragraph = None
+        for (block_num, par_num, _), line in lines.items():
+            center = (line["top"] + line["bottom"]) / 2
+            if not core_top <= center < core_bottom:
+                continue
+            if (block_num, par_num) != current_paragraph:
+                paragraphs.append([])
+                current_paragraph = (block_num, par_num)
+            paragraphs[-1].append(_join_words(line["words"]))
+            confidences.extend(line["confs"])
+        return paragraphs, confidences
+
+
+# 全局单例
+_ocr_cache = None
+_ocr_pipeline = None
+_ocr_pipeline_lock = Lock()
+
+
+def get_ocr_cache() -> OCRResultCache:
+    """获取OCR结果缓存单例（本地OCR和多模态OCR共用）"""
+    global _ocr_cache
+    with _ocr_pipeline_lock:
+        if _ocr_cache is None:
+            _ocr_cache = OCRResultCache(settings.OCR_CACHE_SIZE)
+        return _ocr_cache
+
+
+def get_ocr_pipeline() -> OCRPipeline:
+    """获取OCR流水线单例"""
+    global _ocr_pipeline
+    cache = get_ocr_cache()
+    with _ocr_pipeline_lock:
+        if _ocr_pipeline is None:
+            _ocr_pipeline = OCRPipeline(
+                lang=settings.OCR_LANG,
+                workers=settings.OCR_TILE_WORKERS,
+                tile_height=settings.OCR_TILE_HEIGHT,
+                tile_overlap=settings.OCR_TILE_OVERLAP,
+                cache=cache
+            )
+        return _ocr_pipeline
@@ -0,0 +1,7 @@
+"""
+子进程任务模块 - 进程池中执行的纯计算任务
+
+本包不导入services：进程池使用spawn/forkserver启动全新的解释器（从多线程的服务进程fork子进程时，
+其他线程持有的锁会被复制到子进程中，可能导致死锁），子进程反序列化任务函数时只需导入本包，
+不会执行services包的初始化（加载模型、创建全局对象、清理上传临时文件等）。
+"""
@@ -0,0 +1,21 @@
+"""
+PDF页面文本提取（在进程池子进程中执行，只依赖PyMuPDF）
+"""
+from typing import List, Tuple
+
+try:
+    import fitz  # PyMuPDF
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    提取 [start, end) 页的文本（每次调用自己打开PDF，PyMuPDF的文档对象不能跨进程传递）
+
+    Returns:
+        [(页码(从1开始), 文本), ...]
+    """
+    with fitz.open(file_path) as doc:
+        return [(page_num + 1, doc[page_num].get_text()) for page_num in range(start, min(end, len(doc)))]